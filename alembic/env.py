@@ -25,7 +25,7 @@ config = context.config
 DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
     raise RuntimeError("DATABASE_URL not set in .env")
-config.set_main_option("sqlalchemy.url", DATABASE_URL)
+config.set_main_option("sqlalchemy.url", DATABASE_URL.replace("%", "%%"))  # configparser interpolation
 
 # --- Logging Config ---
 if config.config_file_name is not None:
@@ -0,0 +1,40 @@
+"""order_items.order_id index
+
+Revision ID: 3c9e1f7b2d84
+Revises: f2b6c8e4a913
+Create Date: 2026-10-19 23:41:08.524117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c9e1f7b2d84'
+down_revision: Union[str, Sequence[str], None] = 'f2b6c8e4a913'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# order creation and payment read an order's lines to hold and confirm its stock
+NAME, TABLE, COLUMNS = 'ix_order_items_order_id', 'order_items', ['order_id']
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.get_context().autocommit_block():
+        invalid = op.get_bind().execute(
+            sa.text("SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+                    "WHERE c.relname = :name AND NOT i.indisvalid"),
+            {"name": NAME},
+        ).first()
+        if invalid:
+            op.drop_index(NAME, table_name=TABLE, postgresql_concurrently=True)
+        op.create_index(NAME, TABLE, COLUMNS, unique=False, if_not_exists=True, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index(NAME, table_name=TABLE, if_exists=True, postgresql_concurrently=True)
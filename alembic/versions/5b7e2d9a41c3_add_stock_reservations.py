@@ -0,0 +1,47 @@
+"""add stock_reservations
+
+Revision ID: 5b7e2d9a41c3
+Revises: cefb0915214c
+Create Date: 2026-10-19 11:40:12.381204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b7e2d9a41c3'
+down_revision: Union[str, Sequence[str], None] = 'cefb0915214c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('stock_reservations',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('order_id', sa.String(length=50), nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('location', sa.String(length=100), nullable=False),
+    sa.Column('quantity', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('expires_at', sa.DateTime(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_stock_reservations_order_id'), 'stock_reservations', ['order_id'], unique=False)
+    op.create_index('ix_stock_reservations_held_expiry', 'stock_reservations', ['expires_at'], unique=False,
+                    postgresql_where=sa.text("status = 'held'"))
+    # ✅ Guard against negative stock even if someone bypasses the conditional UPDATE
+    op.create_check_constraint('ck_inventory_quantity_non_negative', 'inventory', 'quantity >= 0')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('ck_inventory_quantity_non_negative', 'inventory', type_='check')
+    op.drop_index('ix_stock_reservations_held_expiry', table_name='stock_reservations')
+    op.drop_index(op.f('ix_stock_reservations_order_id'), table_name='stock_reservations')
+    op.drop_table('stock_reservations')
@@ -0,0 +1,45 @@
+"""payment idempotency keys per order
+
+Revision ID: 6e2a9d4c1b57
+Revises: 3c9e1f7b2d84
+Create Date: 2026-10-20 00:12:46.903215
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6e2a9d4c1b57'
+down_revision: Union[str, Sequence[str], None] = '3c9e1f7b2d84'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # default keys were "<order>:<amount>"; they are now "payment:<order>". Move each
+    # order's first payment to the new key so a retry replays it instead of paying again.
+    op.execute(
+        """
+        UPDATE payment_ledger AS l
+           SET idempotency_key = 'payment:' || l.order_id
+          FROM (SELECT DISTINCT ON (order_id) id
+                  FROM payment_ledger
+                 WHERE idempotency_key = order_id || ':' || amount
+                 ORDER BY order_id, id) first
+         WHERE l.id = first.id
+           AND NOT EXISTS (SELECT 1 FROM payment_ledger p WHERE p.idempotency_key = 'payment:' || l.order_id)
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute(
+        """
+        UPDATE payment_ledger SET idempotency_key = order_id || ':' || amount
+         WHERE idempotency_key = 'payment:' || order_id
+        """
+    )
@@ -0,0 +1,51 @@
+"""unique inventory (product_id, location)
+
+Revision ID: 8d41f0c6b2ea
+Revises: 5b7e2d9a41c3
+Create Date: 2026-10-19 13:05:48.902117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8d41f0c6b2ea'
+down_revision: Union[str, Sequence[str], None] = '5b7e2d9a41c3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # ✅ Fold any duplicate store rows into one before enforcing uniqueness
+    op.execute(
+        """
+        WITH dup AS (
+            SELECT product_id, location, MIN(id) AS keep_id, SUM(quantity) AS total
+              FROM inventory
+             GROUP BY product_id, location
+            HAVING COUNT(*) > 1
+        ),
+        merged AS (
+            UPDATE inventory i
+               SET quantity = dup.total
+              FROM dup
+             WHERE i.id = dup.keep_id
+            RETURNING i.id
+        )
+        DELETE FROM inventory i
+         USING dup
+         WHERE i.product_id = dup.product_id
+           AND i.location = dup.location
+           AND i.id <> dup.keep_id
+        """
+    )
+    op.create_unique_constraint('uq_inventory_product_location', 'inventory', ['product_id', 'location'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('uq_inventory_product_location', 'inventory', type_='unique')
@@ -0,0 +1,71 @@
+"""loyalty upsert and ledger
+
+Revision ID: b91f3d6a2c57
+Revises: a7c2e91d4b36
+Create Date: 2026-10-19 17:42:18.406215
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b91f3d6a2c57'
+down_revision: Union[str, Sequence[str], None] = 'a7c2e91d4b36'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Fold duplicate accounts (left by the old read-then-write accrual) into the oldest row
+    op.execute("""
+        WITH dup AS (
+            SELECT customer_id, MIN(id) AS keep_id, SUM(points) AS total
+              FROM loyalty_accounts
+             GROUP BY customer_id
+            HAVING COUNT(*) > 1
+        ),
+        merged AS (
+            UPDATE loyalty_accounts a SET points = dup.total
+              FROM dup WHERE a.id = dup.keep_id
+            RETURNING a.id
+        )
+        DELETE FROM loyalty_accounts a
+         USING dup
+         WHERE a.customer_id = dup.customer_id AND a.id <> dup.keep_id
+    """)
+    op.create_unique_constraint('uq_loyalty_accounts_customer_id', 'loyalty_accounts', ['customer_id'])
+
+    # Tiers are maintained incrementally from here on, so start from the current balances
+    op.execute("""
+        UPDATE customers c
+           SET loyalty_tier = CASE WHEN a.points >= 5000 THEN 'platinum'
+                                   WHEN a.points >= 2000 THEN 'gold'
+                                   WHEN a.points >= 500 THEN 'silver'
+                                   ELSE 'standard' END
+          FROM loyalty_accounts a
+         WHERE a.customer_id = c.id
+    """)
+
+    op.create_table('loyalty_ledger',
+    sa.Column('id', sa.BigInteger(), nullable=False),
+    sa.Column('customer_id', sa.Integer(), nullable=False),
+    sa.Column('points', sa.Integer(), nullable=False),
+    sa.Column('order_id', sa.String(length=50), nullable=True),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=True),
+    sa.Column('folded_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['customer_id'], ['customers.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_loyalty_ledger_unfolded', 'loyalty_ledger', ['id'], unique=False,
+                    postgresql_where=sa.text('folded_at IS NULL'))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_loyalty_ledger_unfolded', table_name='loyalty_ledger', postgresql_where=sa.text('folded_at IS NULL'))
+    op.drop_table('loyalty_ledger')
+    op.drop_constraint('uq_loyalty_accounts_customer_id', 'loyalty_accounts', type_='unique')
@@ -0,0 +1,31 @@
+"""fulfillment tracking sequence
+
+Revision ID: d5e8a04c7f19
+Revises: b91f3d6a2c57
+Create Date: 2026-10-19 19:10:52.731044
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd5e8a04c7f19'
+down_revision: Union[str, Sequence[str], None] = 'b91f3d6a2c57'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("CREATE SEQUENCE fulfillment_tracking_seq")
+    op.alter_column('fulfillments', 'tracking_id',
+                    server_default=sa.text("'TRK-' || lpad(nextval('fulfillment_tracking_seq')::text, 10, '0')"))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.alter_column('fulfillments', 'tracking_id', server_default=None)
+    op.execute("DROP SEQUENCE fulfillment_tracking_seq")
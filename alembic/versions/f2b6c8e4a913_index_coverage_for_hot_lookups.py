@@ -0,0 +1,49 @@
+"""index coverage for hot lookups
+
+Revision ID: f2b6c8e4a913
+Revises: d5e8a04c7f19
+Create Date: 2026-10-19 21:02:37.118406
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2b6c8e4a913'
+down_revision: Union[str, Sequence[str], None] = 'd5e8a04c7f19'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# loyalty_accounts.customer_id and inventory (product_id, location) are already
+# covered by uq_loyalty_accounts_customer_id and uq_inventory_product_location.
+INDEXES = [
+    ('ix_fulfillments_order_id', 'fulfillments', ['order_id']),
+    ('ix_orders_customer_id', 'orders', ['customer_id']),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # ✅ CONCURRENTLY doesn't block writes, but can't run inside a transaction
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            # an interrupted concurrent build leaves an INVALID index behind; rebuild it
+            invalid = op.get_bind().execute(
+                sa.text("SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+                        "WHERE c.relname = :name AND NOT i.indisvalid"),
+                {"name": name},
+            ).first()
+            if invalid:
+                op.drop_index(name, table_name=table, postgresql_concurrently=True)
+            op.create_index(name, table, columns, unique=False, if_not_exists=True,
+                            postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, if_exists=True, postgresql_concurrently=True)
@@ -1,61 +1,265 @@
 # app/agents/fulfillment_agent.py
 import logging
 import datetime
-import uuid
-from app.services.db import SessionLocal
+from typing import Optional
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from app.services import order_cache
+from app.services.db import SessionLocal, AsyncSessionLocal, session_scope
 from app.models.order import Order
 from app.models.fulfillment import Fulfillment
 
 logger = logging.getLogger("fulfillment_agent")
 
-def fulfill_order_sync(order_id: str, carrier: str = "Delhivery") -> dict:
+# Carrier by order value (₹), highest floor first: (min_total, carrier, transit_days)
+CARRIER_RULES = [(5000, "BlueDart", 2), (0, "Delhivery", 3)]
+
+WAVE_SIZE = 5000
+
+
+def carrier_for(total_amount: int) -> tuple[str, int]:
+    return next((carrier, days) for floor, carrier, days in CARRIER_RULES if (total_amount or 0) >= floor)
+
+
+def _rule_case(expr: str, pick: int) -> str:
+    whens = " ".join(f"WHEN {expr} >= {rule[0]} THEN {rule[pick]!r}" for rule in CARRIER_RULES[:-1])
+    return f"CASE {whens} ELSE {CARRIER_RULES[-1][pick]!r} END"
+
+
+# A wave is two statements in one transaction. The first locks a batch of paid,
+# unshipped orders (SKIP LOCKED, so concurrent waves split the backlog); the
+# second re-checks them under a fresh snapshot — an order shipped by a
+# transaction that committed while we waited for the lock is dropped — then
+# inserts the fulfillments (tracking ids come from the column's sequence
+# default) and marks the orders shipped.
+_PICK_SQL = text(
+    """
+    SELECT o.id
+      FROM orders o
+     WHERE o.payment_status = 'PAID'
+       AND o.status IS DISTINCT FROM 'shipped'
+       AND NOT EXISTS (SELECT 1 FROM fulfillments f WHERE f.order_id = o.id)
+     ORDER BY o.id
+     LIMIT :limit
+       FOR UPDATE OF o SKIP LOCKED
+    """
+)
+
+_WAVE_SQL = text(
+    f"""
+    WITH picked AS (
+        SELECT o.id, COALESCE(o.total_amount, 0) AS total
+          FROM orders o
+         WHERE o.id = ANY(CAST(:ids AS INTEGER[]))
+           AND NOT EXISTS (SELECT 1 FROM fulfillments f WHERE f.order_id = o.id)
+    ),
+    shipped AS (
+        INSERT INTO fulfillments (order_id, carrier, status, estimated_delivery, created_at)
+        SELECT id,
+               COALESCE(CAST(:carrier AS VARCHAR), {_rule_case("total", 1)}),
+               'shipped',
+               CAST(:now AS TIMESTAMP) + make_interval(days => {_rule_case("total", 2)}),
+               CAST(:now AS TIMESTAMP)
+          FROM picked
+         ORDER BY id
+        RETURNING order_id, carrier, tracking_id, estimated_delivery
+    ),
+    marked AS (
+        UPDATE orders o SET status = 'shipped'
+          FROM shipped s
+         WHERE o.id = s.order_id
+        RETURNING {order_cache.state_columns("o.")}, s.carrier, s.tracking_id, s.estimated_delivery
+    )
+    SELECT {order_cache.state_columns()}, carrier, tracking_id, estimated_delivery
+      FROM marked
+     ORDER BY carrier, id
+    """
+)
+
+_MARK_SHIPPED_SQL = text(
+    f"""
+    UPDATE orders SET status = 'shipped'
+     WHERE id = :id
+    RETURNING {order_cache.state_columns()}
+    """
+)
+
+# fulfill_order_async: shipment insert and order update in one round trip
+_SHIP_SQL = text(
+    f"""
+    WITH f AS (
+        INSERT INTO fulfillments (order_id, carrier, status, estimated_delivery, created_at)
+        VALUES (:id, :carrier, 'shipped', :eta, :now)
+        RETURNING order_id, tracking_id
+    )
+    UPDATE orders o SET status = 'shipped'
+      FROM f
+     WHERE o.id = f.order_id
+    RETURNING {order_cache.state_columns("o.")}, f.tracking_id
+    """
+)
+
+
+def fulfill_order_sync(order_id: str, carrier: Optional[str] = None,
+                       db: Optional[Session] = None, order: Optional[Order] = None) -> dict:
     """
     Simulate order fulfillment: create a shipment record & mark order as shipped.
+    The carrier follows CARRIER_RULES unless given.
+    Pass `db` (and optionally the already-loaded `order`) to join the caller's transaction.
     """
-    db = SessionLocal()
+    owns_session = db is None
+    if owns_session:
+        db = SessionLocal()
     try:
-        # Step 1: Locate the order
-        order = db.query(Order).filter(Order.external_id == order_id).one_or_none()
-        if not order:
+        # Step 1: Locate the order (the row is only read when the state cache misses)
+        state = order_cache.state_of(order) if order is not None else order_cache.get_order_state(order_id, db=db)
+        if not state:
             return {"status": "error", "message": f"Order {order_id} not found"}
 
-        # Step 2: Create a tracking ID and estimated delivery date
-        tracking_id = "TRK-" + uuid.uuid4().hex[:8].upper()
-        estimated_delivery = datetime.datetime.utcnow() + datetime.timedelta(days=3)
+        # Step 2: Carrier and estimated delivery date (the tracking ID is assigned by the DB sequence)
+        rule_carrier, transit_days = carrier_for(state["total_amount"])
+        carrier = carrier or rule_carrier
+        estimated_delivery = datetime.datetime.utcnow() + datetime.timedelta(days=transit_days)
 
         # Step 3: Create Fulfillment record
         fulfillment = Fulfillment(
-            order_id=order.id,
+            order_id=state["id"],
             carrier=carrier,
-            tracking_id=tracking_id,
             status="shipped",
             estimated_delivery=estimated_delivery
         )
         db.add(fulfillment)
 
         # Step 4: Update order status
-        order.status = "shipped"
-        db.add(order)
+        if order is not None:
+            order.status = "shipped"
+            db.add(order)
+        db.flush()  # INSERT ... RETURNING tracking_id
+        shipped = order if order is not None else db.execute(_MARK_SHIPPED_SQL, {"id": state["id"]}).one()
+        order_cache.stage(db, shipped)
 
-        db.commit()
-        db.refresh(fulfillment)
-        db.refresh(order)
+        if owns_session:
+            db.commit()
 
         logger.info(f"✅ Order {order_id} marked as shipped via {carrier}")
 
         return {
-            "order_id": order.external_id,
-            "status": order.status,
+            "order_id": state["external_id"],
+            "status": "shipped",
             "carrier": carrier,
-            "tracking_id": tracking_id,
+            "tracking_id": fulfillment.tracking_id,
             "estimated_delivery": estimated_delivery.isoformat() + "Z",
             "db_update": "success"
         }
 
     except Exception as e:
-        db.rollback()
+        if owns_session:
+            db.rollback()
         logger.exception(f"❌ Fulfillment failed for order {order_id}: {e}")
         return {"status": "error", "message": str(e)}
 
     finally:
-        db.close()
+        if owns_session:
+            db.close()
+
+
+async def fulfill_order_async(order_id: str, carrier: Optional[str] = None, db=None) -> dict:
+    """fulfill_order_sync on the async engine. Pass an AsyncSession as `db` to join the caller's transaction."""
+    owns_session = db is None
+    if owns_session:
+        db = AsyncSessionLocal()
+    try:
+        state = await order_cache.get_order_state_async(order_id, db=db)
+        if not state:
+            return {"status": "error", "message": f"Order {order_id} not found"}
+
+        rule_carrier, transit_days = carrier_for(state["total_amount"])
+        carrier = carrier or rule_carrier
+        now = datetime.datetime.utcnow()
+        estimated_delivery = now + datetime.timedelta(days=transit_days)
+
+        shipped = (await db.execute(_SHIP_SQL, {"id": state["id"], "carrier": carrier,
+                                                "eta": estimated_delivery, "now": now})).one()
+        order_cache.stage(db, shipped)
+        if owns_session:
+            await db.commit()
+
+        logger.info(f"✅ Order {order_id} marked as shipped via {carrier}")
+        return {
+            "order_id": state["external_id"],
+            "status": "shipped",
+            "carrier": carrier,
+            "tracking_id": shipped.tracking_id,
+            "estimated_delivery": estimated_delivery.isoformat() + "Z",
+            "db_update": "success"
+        }
+
+    except Exception as e:
+        if owns_session:
+            await db.rollback()
+        logger.exception(f"❌ Fulfillment failed for order {order_id}: {e}")
+        return {"status": "error", "message": str(e)}
+
+    finally:
+        if owns_session:
+            await db.close()
+
+
+def cancel_fulfillment_sync(order_id: str, db: Optional[Session] = None) -> dict:
+    """Compensation for fulfill_order_sync: cancel the order's live shipments."""
+    try:
+        with session_scope(db) as session:
+            cancelled = session.execute(
+                text(
+                    """
+                    UPDATE fulfillments f SET status = 'cancelled'
+                      FROM orders o
+                     WHERE o.id = f.order_id AND o.external_id = :oid AND f.status <> 'cancelled'
+                    RETURNING f.tracking_id
+                    """
+                ),
+                {"oid": order_id},
+            ).scalars().all()
+    except Exception as e:
+        logger.exception(f"❌ Cancelling fulfillment failed for order {order_id}: {e}")
+        return {"status": "error", "message": str(e)}
+
+    logger.info(f"↩️ Cancelled {len(cancelled)} shipment(s) for order {order_id}")
+    return {"order_id": order_id, "status": "cancelled", "tracking_ids": cancelled}
+
+
+def fulfill_wave_sync(limit: int = WAVE_SIZE, carrier: Optional[str] = None,
+                      db: Optional[Session] = None) -> dict:
+    """
+    Ship up to `limit` paid, unshipped orders in one transaction and return a
+    manifest per carrier. Carriers follow CARRIER_RULES unless `carrier` is given.
+    Concurrent waves pick disjoint orders.
+    """
+    now = datetime.datetime.utcnow()
+    try:
+        with session_scope(db) as session:
+            ids = list(session.execute(_PICK_SQL, {"limit": limit}).scalars())
+            rows = session.execute(_WAVE_SQL, {"ids": ids, "carrier": carrier, "now": now}).all() if ids else []
+            order_cache.stage(session, *rows)
+    except Exception as e:
+        logger.exception(f"❌ Fulfillment wave failed: {e}")
+        return {"status": "error", "message": str(e)}
+
+    manifests: dict[str, dict] = {}
+    for r in rows:
+        manifest = manifests.setdefault(r.carrier, {"carrier": r.carrier, "count": 0, "shipments": []})
+        manifest["count"] += 1
+        manifest["shipments"].append({
+            "order_id": r.external_id,
+            "tracking_id": r.tracking_id,
+            "estimated_delivery": r.estimated_delivery.isoformat() + "Z",
+        })
+
+    logger.info(f"📦 Fulfillment wave shipped {len(rows)} order(s): "
+                + ", ".join(f"{c} {m['count']}" for c, m in manifests.items()))
+    return {
+        "shipped": len(rows),
+        "manifests": list(manifests.values()),
+        "timestamp": now.isoformat() + "Z",
+        "db_update": "success",
+    }
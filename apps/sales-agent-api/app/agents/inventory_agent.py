@@ -1,30 +1,59 @@
 # app/agents/inventory_agent.py
 from typing import Dict, Any, Optional
-from app.services.db import get_db_session
+from app.services.db import read_session, run_read
+from app.services import store_locator
 from app.models.product import Product
 from sqlalchemy import select
 
 def check_stock_sync(sku: str, location: Optional[str] = None) -> Dict[str, Any]:
     """
-    Return stock info for a SKU. For now we use `products.stock`.
-    `location` is optional (reserved for store-level inventory later).
+    Return stock info for a SKU: total from `products.stock`, per-store quantities
+    from `inventory`, and a ship ETA from the nearest store that has it.
+    `location` is the customer's "lat,lon" or a store code; without it the default ETA is quoted.
     """
-    db = get_db_session()
-    try:
+    def _query(db):
         stmt = select(Product).where(Product.sku == sku).limit(1)
         p = db.execute(stmt).scalars().first()
+        return p, (store_locator.fetch_store_stock(db, [sku]).get(sku, {}) if p else {})
+
+    # read-only: served by a replica when one is configured and healthy
+    p, per_store = run_read(_query)
+    if not p:
+        return {"sku": sku, "found": False, "message": "SKU not found", "stores": []}
+    return _stock_result(sku, p.stock, per_store, location)
+
+
+async def check_stock_async(sku: str, location: Optional[str] = None) -> Dict[str, Any]:
+    """check_stock_sync on the async engine (a replica when usable; the turn's shared session when there is one)."""
+    async with read_session() as db:
+        p = (await db.execute(select(Product).where(Product.sku == sku).limit(1))).scalars().first()
         if not p:
             return {"sku": sku, "found": False, "message": "SKU not found", "stores": []}
-        # sample store response (mocked)
-        stores = [
-            {"store_id": "STORE-MYLAI", "qty": p.stock},
-        ]
-        return {
-            "sku": sku,
-            "found": True,
-            "total_stock": p.stock,
-            "stores": stores,
-            "ship_eta_days": 2
-        }
-    finally:
-        db.close()
+        per_store = (await store_locator.fetch_store_stock_async(db, [sku])).get(sku, {})
+
+    index = await store_locator.get_store_index_async() if location and per_store else None
+    return _stock_result(sku, p.stock, per_store, location, index)
+
+
+def _stock_result(sku: str, total_stock: int, per_store: Dict[str, int],
+                  location: Optional[str], index=None) -> Dict[str, Any]:
+    stores = [{"store_id": code, "qty": qty} for code, qty in per_store.items()]
+    if not stores:
+        # no store-level rows yet — fall back to the product total
+        stores = [{"store_id": "STORE-MYLAI", "qty": total_stock}]
+
+    result = {
+        "sku": sku,
+        "found": True,
+        "total_stock": total_stock,
+        "stores": stores,
+        "ship_eta_days": store_locator.DEFAULT_ETA_DAYS,
+    }
+
+    if location and per_store:
+        index = index if index is not None else store_locator.get_store_index()
+        origin = store_locator.resolve_location(location, index)
+        est = store_locator.estimate_eta({sku: per_store}, {sku: 1}, origin, index) if origin else None
+        if est:
+            result.update(ship_eta_days=est["ship_eta_days"], ship_from=est["ship_from"])
+    return result
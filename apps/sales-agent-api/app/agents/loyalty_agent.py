@@ -1,56 +1,212 @@
 # app/agents/loyalty_agent.py
+import os
 from datetime import datetime
-from app.services.db import get_db_session
+from typing import Optional
+from app.services.db import AsyncSessionLocal, get_db_session, session_scope
 from sqlalchemy import text
+from sqlalchemy.orm import Session
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Tier thresholds (points), highest first
+TIERS = [(5000, "platinum"), (2000, "gold"), (500, "silver"), (0, "standard")]
+
+# "1": accruals are appended to loyalty_ledger and folded into balances in bulk
+LEDGER_MODE = os.getenv("LOYALTY_LEDGER_MODE", "0") == "1"
+FOLD_BATCH_SIZE = int(os.getenv("LOYALTY_FOLD_BATCH_SIZE", "5000"))
+
+
 def calculate_points(amount: int) -> int:
     """Simple points rule: 1 point for every ₹100 spent."""
     return max(1, amount // 100)
 
 
-def add_loyalty_points_sync(customer_id: int, order_total: int):
-    db = get_db_session()
+def tier_for(points: int) -> str:
+    return next(name for floor, name in TIERS if points >= floor)
+
+
+def _tier_case(expr: str) -> str:
+    whens = " ".join(f"WHEN {expr} >= {floor} THEN '{name}'" for floor, name in TIERS[:-1])
+    return f"CASE {whens} ELSE '{TIERS[-1][1]}' END"
+
+
+# Upsert the balance, then touch customers.loyalty_tier only when this accrual
+# moved the balance across a tier threshold.
+_ACCRUE_SQL = text(
+    f"""
+    WITH acct AS (
+        INSERT INTO loyalty_accounts (customer_id, points) VALUES (:cid, :p)
+        ON CONFLICT (customer_id) DO UPDATE SET points = loyalty_accounts.points + EXCLUDED.points
+        RETURNING customer_id, points
+    ),
+    tiered AS (
+        UPDATE customers c
+           SET loyalty_tier = {_tier_case("acct.points")}
+          FROM acct
+         WHERE c.id = acct.customer_id
+           AND {_tier_case("acct.points - :p")} <> {_tier_case("acct.points")}
+        RETURNING c.loyalty_tier
+    )
+    SELECT acct.points, (SELECT loyalty_tier FROM tiered) AS new_tier FROM acct
+    """
+)
+
+_FOLD_SQL = text(
+    f"""
+    WITH batch AS (
+        SELECT id FROM loyalty_ledger
+         WHERE folded_at IS NULL
+         ORDER BY id
+         LIMIT :batch_size
+           FOR UPDATE SKIP LOCKED
+    ),
+    taken AS (
+        UPDATE loyalty_ledger l SET folded_at = now()
+          FROM batch WHERE l.id = batch.id
+        RETURNING l.customer_id, l.points
+    ),
+    sums AS (
+        SELECT customer_id, SUM(points)::int AS points FROM taken GROUP BY customer_id
+    ),
+    acct AS (
+        INSERT INTO loyalty_accounts (customer_id, points)
+        SELECT customer_id, points FROM sums ORDER BY customer_id
+        ON CONFLICT (customer_id) DO UPDATE SET points = loyalty_accounts.points + EXCLUDED.points
+        RETURNING customer_id, points
+    ),
+    tiered AS (
+        UPDATE customers c
+           SET loyalty_tier = {_tier_case("acct.points")}
+          FROM acct JOIN sums USING (customer_id)
+         WHERE c.id = acct.customer_id
+           AND {_tier_case("acct.points - sums.points")} <> {_tier_case("acct.points")}
+        RETURNING c.id
+    )
+    SELECT (SELECT COUNT(*) FROM taken) AS entries,
+           (SELECT COUNT(*) FROM acct) AS accounts,
+           (SELECT COUNT(*) FROM tiered) AS tier_changes
+    """
+)
+
+
+_LEDGER_SQL = text("INSERT INTO loyalty_ledger (customer_id, points, order_id) VALUES (:cid, :p, :oid)")
+
+
+def _points_statement(customer_id: int, points: int, order_id: Optional[str], deferred: bool):
+    """Ledger append when deferred, otherwise the atomic balance upsert."""
+    if deferred:
+        return _LEDGER_SQL, {"cid": customer_id, "p": points, "oid": order_id}
+    # ✅ One atomic upsert — concurrent orders can't duplicate the account or lose points
+    return _ACCRUE_SQL, {"cid": customer_id, "p": points}
+
+
+def _points_result(customer_id: int, points: int, row) -> dict:
+    """Result dict for an accrual; `row` is the _ACCRUE_SQL row, or None for a ledger append."""
+    result = {
+        "customer_id": customer_id,
+        "points_added": points,
+        "timestamp": datetime.utcnow().isoformat(),
+        "db_update": "success",
+    }
+    if row is None:
+        result.update({"total_points": None, "pending": True})
+        return result
+    result["total_points"] = row.points
+    if row.new_tier:
+        result["loyalty_tier"] = row.new_tier
+        logger.info(f"🏅 Customer {customer_id} moved to tier {row.new_tier}")
+    logger.info(f"✅ Added {points} points (new total: {row.points})")
+    return result
+
+
+def _apply_points(customer_id: int, points: int, db: Optional[Session], order_id: Optional[str],
+                  deferred: Optional[bool]) -> dict:
+    deferred = LEDGER_MODE if deferred is None else deferred
+    owns_session = db is None
+    if owns_session:
+        db = get_db_session()
     try:
-        points_to_add = calculate_points(order_total)
-
-        # ✅ Check if the customer already has a loyalty account
-        account = db.execute(
-            text("SELECT * FROM loyalty_accounts WHERE customer_id = :cid"),
-            {"cid": customer_id}
-        ).fetchone()
-
-        if account:
-            new_balance = account.points + points_to_add
-            db.execute(
-                text("UPDATE loyalty_accounts SET points = :p WHERE customer_id = :cid"),
-                {"p": new_balance, "cid": customer_id}
-            )
-            logger.info(f"✅ Added {points_to_add} points (new total: {new_balance})")
-        else:
-            db.execute(
-                text("INSERT INTO loyalty_accounts (customer_id, points) VALUES (:cid, :p)"),
-                {"cid": customer_id, "p": points_to_add}
-            )
-            new_balance = points_to_add
-            logger.info(f"🎉 Created new loyalty account for customer {customer_id} with {points_to_add} points.")
-
-        db.commit()
-
-        return {
-            "customer_id": customer_id,
-            "points_added": points_to_add,
-            "total_points": new_balance,
-            "timestamp": datetime.utcnow().isoformat(),
-            "db_update": "success"
-        }
+        res = db.execute(*_points_statement(customer_id, points, order_id, deferred))
+        result = _points_result(customer_id, points, None if deferred else res.one())
+
+        if owns_session:
+            db.commit()
+        return result
 
     except Exception as e:
-        db.rollback()
+        if owns_session:
+            db.rollback()
         logger.error(f"❌ Loyalty update failed: {e}")
         return {"status": "error", "message": str(e)}
 
     finally:
-        db.close()
+        if owns_session:
+            db.close()
+
+
+async def add_loyalty_points_async(customer_id: int, order_total: int, db=None,
+                                   order_id: Optional[str] = None, deferred: Optional[bool] = None):
+    """add_loyalty_points_sync on the async engine. Pass an AsyncSession as `db` to join the caller's transaction."""
+    points = calculate_points(order_total)
+    deferred = LEDGER_MODE if deferred is None else deferred
+    owns_session = db is None
+    if owns_session:
+        db = AsyncSessionLocal()
+    try:
+        res = await db.execute(*_points_statement(customer_id, points, order_id, deferred))
+        result = _points_result(customer_id, points, None if deferred else res.one())
+
+        if owns_session:
+            await db.commit()
+        return result
+
+    except Exception as e:
+        if owns_session:
+            await db.rollback()
+        logger.error(f"❌ Loyalty update failed: {e}")
+        return {"status": "error", "message": str(e)}
+
+    finally:
+        if owns_session:
+            await db.close()
+
+
+def add_loyalty_points_sync(customer_id: int, order_total: int, db: Optional[Session] = None,
+                            order_id: Optional[str] = None, deferred: Optional[bool] = None):
+    """
+    Award points for an order. Pass `db` to join the caller's transaction.
+    With `deferred` (default: LOYALTY_LEDGER_MODE) the accrual is only appended to
+    the ledger; `total_points` is then None until the fold job applies it.
+    """
+    return _apply_points(customer_id, calculate_points(order_total), db, order_id, deferred)
+
+
+def reverse_loyalty_points_sync(customer_id: int, order_total: int, db: Optional[Session] = None,
+                                order_id: Optional[str] = None, deferred: Optional[bool] = None):
+    """Compensation for add_loyalty_points_sync: take the order's points back (tier may drop)."""
+    return _apply_points(customer_id, -calculate_points(order_total), db, order_id, deferred)
+
+
+def fold_loyalty_ledger(batch_size: int = FOLD_BATCH_SIZE, session: Optional[Session] = None) -> dict:
+    """
+    Apply pending ledger entries to balances in bulk, one batch per call
+    (one upsert row per customer). Safe to run from several workers at once.
+    """
+    with session_scope(session) as db:
+        row = db.execute(_FOLD_SQL, {"batch_size": batch_size}).one()
+    stats = {"entries": row.entries, "accounts": row.accounts, "tier_changes": row.tier_changes}
+    if row.entries:
+        logger.info(f"📒 Folded {row.entries} loyalty entries into {row.accounts} account(s), "
+                    f"{row.tier_changes} tier change(s)")
+    return stats
+
+
+def fold_all_pending(batch_size: int = FOLD_BATCH_SIZE) -> int:
+    """Fold until the ledger is drained (background job entry point). Returns entries folded."""
+    total = 0
+    while True:
+        entries = fold_loyalty_ledger(batch_size)["entries"]
+        total += entries
+        if entries < batch_size:
+            return total
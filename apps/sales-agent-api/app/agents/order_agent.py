@@ -1,14 +1,19 @@
 # app/agents/order_agent.py
 import logging
 from datetime import datetime
-from app.services.db import SessionLocal
+from app.services import order_service, order_cache
+from app.services.inventory_service import InsufficientStock
 
 logger = logging.getLogger("order_agent")
 
-def create_order_sync(customer_id: str, items: list, total_amount: int, external_id: str | None = None) -> dict:
+def create_order_sync(customer_id: str, items: list, total_amount: int | None = None,
+                      external_id: str | None = None) -> dict:
     """
-    Very small synchronous order creator:
-    - Tries to import Order model and insert a row; otherwise returns a mock order.
+    Create an order and its line items (one round trip via order_service).
+    - customer_id: internal id or customer reference like "CUST-001"
+    - items: list of {sku, quantity, product_id?, unit_price?}
+    Returns the order info; on a DB failure the info carries `db_error`, and when
+    stock can't be held the status is "insufficient_stock" with the `missing` lines.
     """
     order_info = {
         "order_id": external_id or f"ORD-{uuid_format()}",
@@ -20,29 +25,42 @@ def create_order_sync(customer_id: str, items: list, total_amount: int, external
     }
 
     try:
-        from app.models.order import Order  # type: ignore
-        from app.models.order_item import OrderItem  # optional
-        session = SessionLocal()
-        try:
-            order = Order(
-                external_id=order_info["order_id"],
-                customer_id=customer_id,
-                total_amount=total_amount,
-                status="created",
-            )
-            session.add(order)
-            session.commit()
-            session.refresh(order)
-            order_info["db_id"] = order.id
-            order_info["status"] = order.status
-        finally:
-            session.close()
+        created = order_service.create_order(
+            customer_id, items, total_amount=total_amount, external_id=order_info["order_id"]
+        )
+        order_info["db_id"] = created["db_id"]
+        order_info["total_amount"] = created["total_amount"]
+        order_info["item_count"] = created["item_count"]
+    except InsufficientStock as e:
+        logger.info("Order not created: %s", e)
+        order_info.update(status="insufficient_stock", missing=e.missing)
     except Exception as e:
         logger.info("Order DB insert skipped/failed: %s", e)
         order_info["db_error"] = str(e)
 
     return order_info
 
+def get_order_status_sync(order_id: str) -> dict:
+    """
+    Current status of an order by external id (e.g. "ORD-1A2B3C4D") or db id.
+    Served from the order-state cache; Postgres is only read on a cold miss.
+    """
+    return _status_result(order_id, order_cache.get_order_state(order_id))
+
+async def get_order_status_async(order_id: str) -> dict:
+    """get_order_status_sync for async callers (local tier, async Redis, asyncpg on a cold miss)."""
+    return _status_result(order_id, await order_cache.get_order_state_async(order_id))
+
+def _status_result(order_id: str, state: dict | None) -> dict:
+    if state is None:
+        return {"status": "error", "message": f"Order {order_id} not found"}
+    return {
+        "order_id": state["external_id"],
+        "order_status": state["status"],
+        "payment_status": state["payment_status"],
+        "total_amount": state["total_amount"],
+    }
+
 def uuid_format():
     import uuid
     return uuid.uuid4().hex[:8].upper()
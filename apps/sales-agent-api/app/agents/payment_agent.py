@@ -1,84 +1,323 @@
 # app/agents/payment_agent.py
+import os
+import json
+import time
 import logging
 import datetime
 import uuid
 from typing import Dict, Any, Optional
 
-from app.services.db import SessionLocal
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.services import order_cache
+from app.services.db import SessionLocal, AsyncSessionLocal
+from app.services.inventory_service import confirm_order_stock, release_reservations
+from app.services.session_store import get_async_client, get_sync_client
 from app.models.order import Order
 
 logger = logging.getLogger("payment_agent")
 
+# Replays are served from Redis for this long; the ledger table is the durable copy
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("PAYMENT_IDEMPOTENCY_TTL_SECONDS", str(24 * 3600)))
+IDEMPOTENCY_CACHE_KEY = "payments:idem:{}"
+# After a Redis error, go straight to the ledger for this long
+CACHE_RETRY_SECONDS = 30.0
+_cache_down_until = 0.0
+
+_CLAIM_SQL = text(
+    """
+    INSERT INTO payment_ledger (idempotency_key, order_id, amount, currency, auth_code, response)
+    VALUES (:key, :order_id, :amount, :currency, :auth_code, :response)
+    ON CONFLICT (idempotency_key) DO NOTHING
+    RETURNING id
+    """
+)
+
+
+_MARK_PAID_SQL = text(
+    f"""
+    UPDATE orders SET payment_status = 'PAID', status = 'completed'
+     WHERE id = :id
+    RETURNING {order_cache.state_columns()}
+    """
+)
+
+_VOID_SQL = text(
+    f"""
+    UPDATE orders SET payment_status = 'VOIDED', status = 'payment_voided'
+     WHERE external_id = :oid
+    RETURNING {order_cache.state_columns()}
+    """
+)
+
+
+def _cache_client():
+    return get_sync_client() if time.monotonic() >= _cache_down_until else None
+
+
+def _async_cache_client():
+    return get_async_client() if time.monotonic() >= _cache_down_until else None
+
+
+def _cache_failed(e: Exception):
+    global _cache_down_until
+    _cache_down_until = time.monotonic() + CACHE_RETRY_SECONDS
+    logger.warning(f"⚠️ Payment idempotency cache unavailable, using the ledger only: {e}")
+
+
+def _cached_result(key: str) -> Optional[Dict[str, Any]]:
+    client = _cache_client()
+    if client is None:
+        return None
+    try:
+        raw = client.get(IDEMPOTENCY_CACHE_KEY.format(key))
+        return json.loads(raw) if raw else None
+    except Exception as e:
+        _cache_failed(e)
+        return None
+
 
-def _find_order(db, order_identifier: Any) -> Optional[Order]:
-    """Find an order by numeric id or external_id."""
+def _cache_result(key: str, response: str):
+    client = _cache_client()
+    if client is None:
+        return
     try:
-        if isinstance(order_identifier, int) or (isinstance(order_identifier, str) and order_identifier.isdigit()):
-            order = db.query(Order).filter(Order.id == int(order_identifier)).one_or_none()
-            if order:
-                return order
-    except Exception:
-        pass
+        client.set(IDEMPOTENCY_CACHE_KEY.format(key), response, ex=IDEMPOTENCY_TTL_SECONDS)
+    except Exception as e:
+        _cache_failed(e)
+
 
+async def _cached_result_async(key: str) -> Optional[Dict[str, Any]]:
+    client = _async_cache_client()
+    if client is None:
+        return None
     try:
-        order = db.query(Order).filter(Order.external_id == str(order_identifier)).one_or_none()
-        return order
-    except Exception:
+        raw = await client.get(IDEMPOTENCY_CACHE_KEY.format(key))
+        return json.loads(raw) if raw else None
+    except Exception as e:
+        _cache_failed(e)
         return None
 
 
-def authorize_payment_sync(order_id: str, amount: int, payment_method: Dict[str, Any]) -> Dict[str, Any]:
-    """
-    Simulate payment authorization and update order in DB.
-    """
-    auth_code = "AUTH-" + uuid.uuid4().hex[:8].upper()
-    ts = datetime.datetime.utcnow().isoformat() + "Z"
+async def _cache_result_async(key: str, response: str):
+    client = _async_cache_client()
+    if client is None:
+        return
+    try:
+        await client.set(IDEMPOTENCY_CACHE_KEY.format(key), response, ex=IDEMPOTENCY_TTL_SECONDS)
+    except Exception as e:
+        _cache_failed(e)
+
 
-    result = {
+def _new_result(order_id: str, amount: int) -> Dict[str, Any]:
+    return {
         "status": "authorized",
-        "auth_code": auth_code,
+        "auth_code": "AUTH-" + uuid.uuid4().hex[:8].upper(),
         "amount": amount,
         "currency": "INR",
-        "timestamp": ts,
+        "timestamp": datetime.datetime.utcnow().isoformat() + "Z",
         "order_id": order_id,
     }
 
+
+def _payment_key(order_id: str, idempotency_key: Optional[str]) -> str:
+    # one key per order, not per amount: a re-planned call with another amount
+    # must hit the first result (and be refused), not authorize a second time
+    return idempotency_key or f"payment:{order_id}"
+
+
+def _replay(first: Dict[str, Any], amount: int, key: str) -> Dict[str, Any]:
+    if first.get("amount") != amount:
+        return {"status": "error", "order_id": first.get("order_id"),
+                "message": f"Idempotency key {key} was already used for amount {first.get('amount')}"}
+    logger.info(f"🔁 Payment replayed for {first.get('order_id')} (key {key})")
+    return {**first, "idempotent_replay": True}
+
+
+def authorize_payment_sync(order_id: str, amount: int, payment_method: Dict[str, Any],
+                           db: Optional[Session] = None, order: Optional[Order] = None,
+                           idempotency_key: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Simulate payment authorization and update order in DB.
+    Pass `db` (and optionally the already-loaded `order`) to join the caller's
+    transaction: nothing is committed, rolled back or closed here.
+
+    Idempotent per `idempotency_key` (default: one per order): the first
+    successful result is stored in `payment_ledger` (and cached in Redis), and
+    repeat calls return it without touching the order again; a repeat with a
+    different amount is refused.
+    """
+    key = _payment_key(order_id, idempotency_key)
+    cached = _cached_result(key)
+    if cached is not None:
+        return _replay(cached, amount, key)
+
+    result = _new_result(order_id, amount)
+
+    owns_session = db is None
+    if owns_session:
+        try:
+            db = SessionLocal()
+        except Exception as e:
+            logger.exception("Payment agent cannot acquire DB session: %s", e)
+            result.update({"db_update": "skipped_or_failed", "db_error": str(e)})
+            return result
+
     try:
-        db = SessionLocal()
+        # the order row is only read when the state cache misses
+        state = order_cache.state_of(order) if order is not None else order_cache.get_order_state(order_id, db=db)
+        if not state:
+            logger.warning("⚠️ Order not found: %s", order_id)
+            result.update({"db_update": "order_not_found"})
+            return result
+
+        result.update({"db_update": "success", "payment_status": "PAID", "status": "completed"})
+        response = json.dumps(result)
+
+        # ✅ Claim the key first; a concurrent duplicate waits here until the first one commits
+        claimed = db.execute(_CLAIM_SQL, {
+            "key": key, "order_id": state["external_id"] or str(order_id), "amount": amount,
+            "currency": result["currency"], "auth_code": result["auth_code"], "response": response,
+        }).first()
+        if claimed is None:
+            stored = db.execute(text("SELECT response FROM payment_ledger WHERE idempotency_key = :key"),
+                                {"key": key}).scalar_one()
+            _cache_result(key, stored)
+            return _replay(json.loads(stored), amount, key)
+
+        # ✅ Update order fields
+        if order is not None:
+            order.payment_status = "PAID"
+            order.status = "completed"
+            db.add(order)
+            paid = order
+        else:
+            paid = db.execute(_MARK_PAID_SQL, {"id": state["id"]}).first()
+            if paid is None:
+                order_cache.invalidate(state["external_id"])
+                raise RuntimeError(f"Order {order_id} disappeared before payment")
+        order_cache.stage(db, paid)
+        # ✅ Held stock becomes a permanent decrement in the same transaction; raises if
+        # a line is no longer held and can't be reserved again
+        confirm_order_stock(state["external_id"], session=db)
+        if owns_session:
+            db.commit()       # <— force actual DB commit
+            # only cache once the ledger row is durable; joined transactions fill the cache on first replay
+            _cache_result(key, response)
+
+        logger.info(f"✅ Payment recorded for order {state['external_id']}")
+        return result
+
     except Exception as e:
-        logger.exception("Payment agent cannot acquire DB session: %s", e)
-        result.update({"db_update": "skipped_or_failed", "db_error": str(e)})
+        if owns_session:
+            db.rollback()
+        logger.exception("Payment agent DB update failed: %s", e)
+        result.update({"db_update": "failed", "db_error": str(e)})
         return result
 
+    finally:
+        if owns_session:
+            db.close()
+
+
+async def authorize_payment_async(order_id: str, amount: int, payment_method: Dict[str, Any],
+                                  db=None, idempotency_key: Optional[str] = None) -> Dict[str, Any]:
+    """
+    authorize_payment_sync on the async engine (same idempotency and result shape).
+    Pass an AsyncSession as `db` to join the caller's transaction.
+    """
+    key = _payment_key(order_id, idempotency_key)
+    cached = await _cached_result_async(key)
+    if cached is not None:
+        return _replay(cached, amount, key)
+
+    result = _new_result(order_id, amount)
+    owns_session = db is None
+    if owns_session:
+        db = AsyncSessionLocal()
     try:
-        order = _find_order(db, order_id)
-        if not order:
+        state = await order_cache.get_order_state_async(order_id, db=db)
+        if not state:
             logger.warning("⚠️ Order not found: %s", order_id)
             result.update({"db_update": "order_not_found"})
             return result
 
-        # ✅ Update order fields
-        order.payment_status = "PAID"
-        order.status = "completed"
+        result.update({"db_update": "success", "payment_status": "PAID", "status": "completed"})
+        response = json.dumps(result)
 
-        db.add(order)
-        db.commit()       # <— force actual DB commit
-        db.refresh(order) # <— reload fresh data from DB
+        claimed = (await db.execute(_CLAIM_SQL, {
+            "key": key, "order_id": state["external_id"], "amount": amount,
+            "currency": result["currency"], "auth_code": result["auth_code"], "response": response,
+        })).first()
+        if claimed is None:
+            stored = (await db.execute(text("SELECT response FROM payment_ledger WHERE idempotency_key = :key"),
+                                       {"key": key})).scalar_one()
+            await _cache_result_async(key, stored)
+            return _replay(json.loads(stored), amount, key)
 
-        logger.info(f"✅ Payment recorded for order {order.external_id}")
+        paid = (await db.execute(_MARK_PAID_SQL, {"id": state["id"]})).first()
+        if paid is None:
+            order_cache.invalidate(state["external_id"])
+            raise RuntimeError(f"Order {order_id} disappeared before payment")
+        order_cache.stage(db, paid)
+        await db.run_sync(lambda s: confirm_order_stock(state["external_id"], session=s))
+        if owns_session:
+            await db.commit()
+            await _cache_result_async(key, response)
 
-        result.update({
-            "db_update": "success",
-            "payment_status": order.payment_status,
-            "status": order.status
-        })
+        logger.info(f"✅ Payment recorded for order {state['external_id']}")
         return result
 
     except Exception as e:
-        db.rollback()
+        if owns_session:
+            await db.rollback()
         logger.exception("Payment agent DB update failed: %s", e)
         result.update({"db_update": "failed", "db_error": str(e)})
         return result
 
     finally:
-        db.close()
+        if owns_session:
+            await db.close()
+
+
+def void_payment_sync(order_id: str, amount: int, idempotency_key: Optional[str] = None,
+                      db: Optional[Session] = None) -> Dict[str, Any]:
+    """
+    Compensation for authorize_payment_sync: void the order's payment, return its
+    stock and free the idempotency key so the order can be paid again.
+    """
+    key = _payment_key(order_id, idempotency_key)
+    owns_session = db is None
+    if owns_session:
+        db = SessionLocal()
+    try:
+        voided = db.execute(_VOID_SQL, {"oid": order_id}).first()
+        if voided is not None:
+            order_cache.stage(db, voided)
+        auth_code = db.execute(
+            text("DELETE FROM payment_ledger WHERE idempotency_key = :key RETURNING auth_code"),
+            {"key": key},
+        ).scalar()
+        restocked = release_reservations(order_id, session=db, include_confirmed=True)
+        if owns_session:
+            db.commit()
+    except Exception as e:
+        if owns_session:
+            db.rollback()
+        logger.exception("Payment void failed: %s", e)
+        return {"status": "error", "order_id": order_id, "message": str(e)}
+    finally:
+        if owns_session:
+            db.close()
+
+    client = _cache_client()
+    if client is not None:
+        try:
+            client.delete(IDEMPOTENCY_CACHE_KEY.format(key))
+        except Exception as e:
+            _cache_failed(e)
+
+    logger.info(f"↩️ Payment voided for order {order_id} (auth {auth_code})")
+    return {"status": "voided", "order_id": order_id, "auth_code": auth_code,
+            "order_found": voided is not None, "restocked_rows": restocked}
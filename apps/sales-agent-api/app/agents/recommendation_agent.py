@@ -1,9 +1,35 @@
 # app/agents/recommendation_agent.py
 from typing import Dict, Any
-from app.services.db import get_db_session
+from app.services.db import read_session, run_read
 from app.models.product import Product
 from sqlalchemy import select
 
+def _recommend_stmt(query: str, budget: int, limit: int):
+    return (
+        select(Product)
+        .where(
+            Product.price <= budget,
+            (Product.category.ilike(f"%{query}%")) | (Product.name.ilike(f"%{query}%"))
+        )
+        .limit(limit)
+    )
+
+
+def _recommendations(query: str, budget: int, rows) -> Dict[str, Any]:
+    items = [
+        {
+            "sku": p.sku,
+            "name": p.name,
+            "price": p.price,
+            "image_url": p.image_url,
+            "stock": p.stock
+        } for p in rows
+    ]
+
+    message = f"Found {len(items)} products for '{query}' under ₹{budget}"
+    return {"items": items, "message": message}
+
+
 def recommend_products_sync(query: str, budget: int, limit: int = 5) -> Dict[str, Any]:
     """
     Simple recommendation logic:
@@ -12,29 +38,13 @@ def recommend_products_sync(query: str, budget: int, limit: int = 5) -> Dict[str
       - order by price asc
     Returns: dict with "items" list and "message"
     """
-    db = get_db_session()
-    try:
-        stmt = (
-            select(Product)
-            .where(
-                Product.price <= budget,
-                (Product.category.ilike(f"%{query}%")) | (Product.name.ilike(f"%{query}%"))
-            )
-            .limit(limit)
-        )
-        rows = db.execute(stmt).scalars().all()
-
-        items = [
-            {
-                "sku": p.sku,
-                "name": p.name,
-                "price": p.price,
-                "image_url": p.image_url,
-                "stock": p.stock
-            } for p in rows
-        ]
-
-        message = f"Found {len(items)} products for '{query}' under ₹{budget}"
-        return {"items": items, "message": message}
-    finally:
-        db.close()
+    # read-only: served by a replica when one is configured and healthy
+    rows = run_read(lambda db: db.execute(_recommend_stmt(query, budget, limit)).scalars().all())
+    return _recommendations(query, budget, rows)
+
+
+async def recommend_products_async(query: str, budget: int, limit: int = 5) -> Dict[str, Any]:
+    """recommend_products_sync on the async engine (a replica when usable; the turn's shared session when there is one)."""
+    async with read_session() as db:
+        rows = (await db.execute(_recommend_stmt(query, budget, limit))).scalars().all()
+    return _recommendations(query, budget, rows)
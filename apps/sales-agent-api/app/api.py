@@ -1,9 +1,155 @@
 # app/api.py
 # future: router definitions
-from fastapi import APIRouter
+import io
+import os
+import asyncio
+import tempfile
+from fastapi import APIRouter, Header, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
+from pydantic import BaseModel
 
 router = APIRouter()
 
+
+class ProcessOrderRequest(BaseModel):
+    order_id: str
+    customer_id: int
+    total_amount: int
+    payment_method: dict = {}
+
+
+class ProfileRequest(BaseModel):
+    requests: int = 1
+
+
 @router.get("/v1/info")
 async def info():
     return {"service": "sales-agent", "status": "ready"}
+
+
+@router.post("/v1/inventory/ingest")
+async def ingest_inventory(request: Request, format: str = "csv", mode: str = "snapshot"):
+    """
+    Stream a warehouse stock feed (CSV or JSON/NDJSON body) into inventory.
+    The body is spooled to disk as it arrives, then COPY-staged and applied in one transaction.
+    """
+    from app.services import inventory_ingest
+
+    if format not in inventory_ingest.FORMATS or mode not in inventory_ingest.MODES:
+        raise HTTPException(status_code=400, detail=f"format must be one of {inventory_ingest.FORMATS}, "
+                                                    f"mode one of {inventory_ingest.MODES}")
+
+    spool = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+    try:
+        async for chunk in request.stream():
+            spool.write(chunk)
+        spool.seek(0)
+        feed = io.TextIOWrapper(spool, encoding="utf-8", newline="")
+        try:
+            return await asyncio.to_thread(inventory_ingest.ingest_inventory_feed, feed, format, mode)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        spool.close()
+
+
+@router.post("/v1/orders/process", status_code=202)
+async def process_order(req: ProcessOrderRequest, idempotency_key: str | None = Header(default=None)):
+    """
+    Queue the post-purchase workflow and return 202 immediately.
+    Retries with the same Idempotency-Key (default: the order id) return the original job,
+    until that job is dead-lettered: the key is freed then, so resubmitting queues a new job.
+    """
+    from app.services.order_queue import get_order_queue
+
+    queue = await get_order_queue()
+    job_id, created = await queue.enqueue(req.model_dump(), idempotency_key or f"process:{req.order_id}")
+    return JSONResponse(
+        status_code=202,
+        content={"job_id": job_id, "duplicate": not created, "status_url": f"/v1/orders/jobs/{job_id}"},
+    )
+
+
+@router.get("/v1/orders/jobs/{job_id}")
+async def order_job_status(job_id: str):
+    from app.services.order_queue import get_order_queue
+
+    job = await (await get_order_queue()).status(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+    return job
+
+
+@router.post("/v1/fulfillment/waves")
+async def run_fulfillment_wave(limit: int = 5000, carrier: str | None = None):
+    """Ship a wave of paid, unshipped orders; returns one manifest per carrier."""
+    from app.agents.fulfillment_agent import fulfill_wave_sync
+
+    if limit <= 0:
+        raise HTTPException(status_code=400, detail="limit must be positive")
+    result = await asyncio.to_thread(fulfill_wave_sync, limit, carrier)
+    if result.get("status") == "error":
+        raise HTTPException(status_code=500, detail=result["message"])
+    return result
+
+
+@router.get("/v1/metrics/db/pools")
+async def db_pool_metrics():
+    """Connection pool occupancy and checkout wait per engine (primary and replicas)."""
+    from app.services.db import pool_stats
+
+    return {"pools": pool_stats()}
+
+
+@router.get("/v1/metrics/telegram")
+async def telegram_metrics():
+    """
+    Outbound Telegram delivery (sent / retried / rate-limited / failed parts, queue depth,
+    delivery latency), duplicate updates dropped and, with TELEGRAM_INGEST=polling,
+    getUpdates ingest counters.
+    """
+    import sys
+    from app.services import telegram_bot
+    from app.services.telegram_dedup import get_deduplicator
+
+    poller = sys.modules.get("app.services.telegram_poller")
+    return {"outbox": telegram_bot.outbox_stats(), "dedup": get_deduplicator().stats(),
+            "poller": poller.poller_stats() if poller else None}
+
+
+def _require_admin(token: str | None):
+    from app.services import profiling
+
+    if not profiling.check_admin(token):
+        raise HTTPException(status_code=403, detail="X-Admin-Token must match PROFILE_SECRET (profiling is off without it)")
+
+
+@router.post("/v1/admin/profile")
+async def arm_profiling(req: ProfileRequest, x_admin_token: str | None = Header(default=None)):
+    """Profile the next `requests` /v1/chat requests (0 disarms); each writes a .folded file to PROFILE_DIR."""
+    from app.services import profiling
+
+    _require_admin(x_admin_token)
+    return {"armed": profiling.arm(req.requests), "profile_dir": profiling.PROFILE_DIR}
+
+
+@router.get("/v1/admin/profile")
+async def profiling_status(x_admin_token: str | None = Header(default=None)):
+    """Requests still armed and the most recent profiles."""
+    from app.services import profiling
+
+    _require_admin(x_admin_token)
+    names = sorted(os.listdir(profiling.PROFILE_DIR)) if os.path.isdir(profiling.PROFILE_DIR) else []
+    return {"armed": profiling.armed(), "profiles": names[-50:]}
+
+
+@router.get("/v1/admin/profile/{name}")
+async def download_profile(name: str, x_admin_token: str | None = Header(default=None)):
+    """A profile in collapsed-stack format (flamegraph.pl / speedscope input)."""
+    from app.services import profiling
+
+    _require_admin(x_admin_token)
+    if not name.endswith(".folded") or name not in (os.listdir(profiling.PROFILE_DIR) if os.path.isdir(profiling.PROFILE_DIR) else []):
+        raise HTTPException(status_code=404, detail=f"Unknown profile {name}")
+    with open(os.path.join(profiling.PROFILE_DIR, name), encoding="utf-8") as f:
+        return PlainTextResponse(f.read())
@@ -1,18 +1,16 @@
-import os, logging, asyncio
-from pathlib import Path
-from fastapi import FastAPI, Request
+import os, sys, time, logging, asyncio
+from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
-from dotenv import load_dotenv
-from app.services import telegram_bot
+from dotenv import find_dotenv, load_dotenv
 
-load_dotenv()
+# ✅ Load .env once: the nearest one above this file (repo root locally, /app in the image)
+load_dotenv(find_dotenv())
 
-from app.services.session_store import create_session_store
-
-# ✅ Load .env safely no matter where Uvicorn is launched from
-env_path = Path(__file__).resolve().parents[4] / ".env"
-load_dotenv(env_path)
+from app import api
+from app.services import profiling
+from app.services.tracing import setup_tracing, shutdown_tracing, span
 
 # ✅ Logging setup
 logger = logging.getLogger("sales_agent")
@@ -31,7 +29,7 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-app.include_router(telegram_bot.router)
+app.include_router(api.router)
 
 # ----- Models -----
 class ChatRequest(BaseModel):
@@ -46,12 +44,27 @@ class ChatResponse(BaseModel):
     actions: dict | None = None
 
 # ----- Global State -----
-session_store = None  # Global variable to store session store instance
+background_tasks = []  # Periodic maintenance jobs started at startup
+order_worker_pool = None  # In-process order pipeline workers (ORDER_WORKERS > 0)
+readiness = {"ready": False, "warmup_ms": None, "error": None}  # set by the startup warm-up
 
 # ----- Routes -----
 @app.get("/healthz")
 async def healthz():
     return {"status": "ok"}
+
+@app.get("/readyz")
+async def readyz():
+    """Ready once agents are imported and DB pools are open (503 until then)."""
+    if not readiness["ready"]:
+        return JSONResponse(status_code=503, content={"status": "warming_up", **readiness})
+    return {"status": "ready", **readiness}
+
+@app.post("/v1/telegram/webhook")
+async def telegram_webhook(request: Request):
+    # imported on the first update, not at startup
+    from app.services import telegram_bot
+    return await telegram_bot.telegram_webhook(request)
 @app.get("/v1/metrics/{tool_name}")
 async def get_tool_metrics(tool_name: str):
     """View performance metrics for a specific tool."""
@@ -62,67 +75,107 @@ async def get_tool_metrics(tool_name: str):
 
 
 @app.post("/v1/chat", response_model=ChatResponse)
-async def chat(req: ChatRequest, request: Request):
+async def chat(req: ChatRequest, request: Request, response: Response):
     """
-    Intelligent chat flow:
+    Intelligent chat flow (see chat_service.run_chat_turn):
     - Load session from Redis
     - Call Gemini planner (intent + tool_calls)
-    - Optionally call Worker Agents (mock for now)
+    - Run the tool calls through the orchestrator
     - Save context back to Redis
+    A signed X-Profile header (or POST /v1/admin/profile) profiles the request; see profiling.
     """
-    from app.services import llm_client, tool_router
-
-    global session_store
-
-    # Ensure session store is initialized before accessing it
-    if session_store is None:
-        session_store = await create_session_store()  # Ensure Redis connection is established
-
-    session_id = req.session_id or f"sid-{os.urandom(6).hex()}"
-    session = await session_store.get(session_id) or {"messages": [], "customer_id": req.customer_id}
-
-    # 1️⃣ Append user message
-    session["messages"].append({"role": "user", "text": req.text, "channel": req.channel})
-
-    # 2️⃣ Call Gemini planner
-    plan = await llm_client.plan(req.text, session)
-    logger.info(f"🧠 Gemini plan output: {plan}")
-
-    reply_text = plan.get("reply_text", "")
-    tool_calls = plan.get("tool_calls", [])
-
-    # 3️⃣ Execute tool calls via orchestrator
-    from app.services.orchestrator import execute_plan
-    orchestration_result = await execute_plan({"reply_text": reply_text, "tool_calls": tool_calls}, session_id, session)
-    results = orchestration_result.get("tool_results", [])
-    # optionally update reply_text from orchestrator.plan reply (same as we already have)
-    reply_text = orchestration_result.get("reply_text", reply_text)
-
-    # 4️⃣ Append assistant message
-    session["messages"].append({
-        "role": "assistant",
-        "text": reply_text,
-        "tools_used": tool_calls
-    })
-
-    # 5️⃣ Persist to Redis
-    await session_store.set(session_id, session)
-
-    # 6️⃣ Return structured response
-    return ChatResponse(
-        session_id=session_id,
-        reply=reply_text,
-        actions={"tool_results": results} if results else None
-    )
+    if profiling.requested(request.headers):
+        with profiling.profile_request("chat") as profile:
+            result = await _chat_turn(req)
+        response.headers["X-Profile-File"] = os.path.basename(profile.path)
+        return result
+    return await _chat_turn(req)
+
+async def _chat_turn(req: ChatRequest) -> ChatResponse:
+    from app.services.chat_service import run_chat_turn
+    with span("main.chat", channel=req.channel):
+        return ChatResponse(**await run_chat_turn(req.text, req.channel, req.customer_id, req.session_id))
 
 # ----- Lifecycle -----
+async def warm_up():
+    """
+    Import the agents and pre-open the DB pools, then mark the app ready.
+    Retries every WARMUP_RETRY_SECONDS while the database is unreachable.
+    """
+    from app.services import tool_router
+    started = time.perf_counter()
+    retry_every = float(os.getenv("WARMUP_RETRY_SECONDS", "5"))
+    while True:
+        try:
+            tool_router.load_tools()
+            if os.getenv("DATABASE_URL"):
+                from app.services import db
+                pools = await asyncio.to_thread(db.warm_up)
+                pools.update(await db.warm_up_async())
+                logger.info(f"🔥 DB pools warm: {pools} (ms)")
+            break
+        except Exception as e:
+            readiness["error"] = str(e)
+            logger.warning(f"⚠️ Warm-up failed, retrying in {retry_every}s: {e}")
+            await asyncio.sleep(retry_every)
+    readiness.update(ready=True, error=None, warmup_ms=round((time.perf_counter() - started) * 1000, 1))
+    logger.info(f"✅ Ready after {readiness['warmup_ms']}ms warm-up")
+
 @app.on_event("startup")
 async def startup_event():
-    global session_store
     logger.info("🚀 Starting Sales Agent API (connecting to Redis)...")
-    session_store = await create_session_store()  # Initialize session_store at startup
+    setup_tracing()  # TRACING_EXPORTER=file|otlp|console turns it on
+    from app.services.session_store import create_session_store
+    await create_session_store()  # Initialize the shared session store at startup
     logger.info("✅ Redis session store initialized successfully")
 
+    # 🔥 Warm up in the background: /healthz answers now, /readyz once pools are open (WARM_UP=0 skips)
+    if os.getenv("WARM_UP", "1") == "1":
+        background_tasks.append(asyncio.create_task(warm_up()))
+    else:
+        readiness["ready"] = True
+
+    # ♻️ Return expired stock holds to inventory (needs the database)
+    if os.getenv("DATABASE_URL"):
+        from app.services.background import start_periodic
+        from app.services import inventory_service
+        sweep_every = float(os.getenv("RESERVATION_SWEEP_SECONDS", "30"))
+        background_tasks.append(
+            start_periodic("reservation-sweeper", inventory_service.release_expired_reservations, sweep_every)
+        )
+        # 📒 Fold deferred loyalty accruals into balances (only LOYALTY_LEDGER_MODE=1 defers them)
+        from app.agents import loyalty_agent
+        if loyalty_agent.LEDGER_MODE:
+            fold_every = float(os.getenv("LOYALTY_FOLD_SECONDS", "5"))
+            background_tasks.append(start_periodic("loyalty-fold", loyalty_agent.fold_all_pending, fold_every))
+
+    # 👷 Optional in-process order workers (or run `python -m app.services.order_queue`)
+    order_workers = int(os.getenv("ORDER_WORKERS", "0"))
+    if order_workers > 0:
+        global order_worker_pool
+        from app.services.order_queue import OrderWorkerPool, get_order_queue
+        order_worker_pool = OrderWorkerPool(await get_order_queue(), concurrency=order_workers)
+        await order_worker_pool.start()
+
+    # 📥 Telegram without a public webhook URL: long-poll getUpdates instead
+    if os.getenv("TELEGRAM_INGEST", "webhook") == "polling":
+        from app.services.telegram_poller import start_poller
+        await start_poller()
+
 @app.on_event("shutdown")
 async def shutdown_event():
     logger.info("🛑 Sales Agent API shutting down")
+    for task in background_tasks:
+        task.cancel()
+    background_tasks.clear()
+    if order_worker_pool is not None:
+        await order_worker_pool.stop()
+    if "app.services.telegram_poller" in sys.modules:  # finish queued updates while the DB is still open
+        await sys.modules["app.services.telegram_poller"].stop_poller()
+    from app.services.db import dispose_async_engine
+    await dispose_async_engine()
+    if "app.services.telegram_bot" in sys.modules:  # only imported once an update arrived
+        await sys.modules["app.services.telegram_bot"].close()
+    if "app.services.llm_client" in sys.modules:
+        await sys.modules["app.services.llm_client"].close_client()
+    shutdown_tracing()
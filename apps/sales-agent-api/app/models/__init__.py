@@ -5,4 +5,7 @@ from app.models.inventory import Inventory
 from app.models.customer import Customer
 from app.models.order import Order
 from app.models.order_item import OrderItem
-from app.models.loyalty import LoyaltyAccount
+from app.models.loyalty import LoyaltyAccount, LoyaltyLedgerEntry
+from app.models.reservation import StockReservation
+from app.models.store import Store
+from app.models.payment import PaymentLedger
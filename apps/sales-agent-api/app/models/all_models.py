@@ -1,2 +1,2 @@
 # app/models/all_models.py
-from app.models import order, order_item, product, customer, fulfillment
+from app.models import order, order_item, product, customer, fulfillment, reservation, store, payment, loyalty
@@ -1,17 +1,23 @@
-# app/models/fulfillment.py
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, func
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Sequence, func, text
 from sqlalchemy.orm import relationship
 from app.services.db import Base
 
+# Tracking numbers come from a sequence, so concurrent fulfillment waves never collide
+tracking_seq = Sequence("fulfillment_tracking_seq", metadata=Base.metadata)
+TRACKING_ID_DEFAULT = text("'TRK-' || lpad(nextval('fulfillment_tracking_seq')::text, 10, '0')")
+
 class Fulfillment(Base):
     __tablename__ = "fulfillments"
 
     id = Column(Integer, primary_key=True)
-    order_id = Column(Integer, ForeignKey("orders.id"))
+    order_id = Column(Integer, ForeignKey("orders.id"), index=True)
     carrier = Column(String(50))
-    tracking_id = Column(String(50), unique=True)
+    tracking_id = Column(String(50), unique=True, server_default=TRACKING_ID_DEFAULT)
     status = Column(String(50), default="processing")
     estimated_delivery = Column(DateTime)
     created_at = Column(DateTime, default=func.now())
 
     order = relationship("Order", backref="fulfillments")
+
+    # ✅ Fetch the generated tracking_id in the INSERT's RETURNING
+    __mapper_args__ = {"eager_defaults": True}
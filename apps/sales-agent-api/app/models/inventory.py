@@ -1,5 +1,5 @@
 # app/models/inventory.py
-from sqlalchemy import Column, Integer, String, ForeignKey
+from sqlalchemy import Column, Integer, String, ForeignKey, CheckConstraint, UniqueConstraint
 from sqlalchemy.orm import relationship
 from app.services.db import Base
 
@@ -13,3 +13,9 @@ class Inventory(Base):
 
     # ✅ Match back_populates name in Product
     product = relationship("Product", back_populates="inventory_records")
+
+    __table_args__ = (
+        CheckConstraint("quantity >= 0", name="ck_inventory_quantity_non_negative"),
+        # ✅ One row per product per store — upsert target for bulk ingestion
+        UniqueConstraint("product_id", "location", name="uq_inventory_product_location"),
+    )
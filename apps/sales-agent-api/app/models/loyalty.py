@@ -1,5 +1,5 @@
 # app/models/loyalty.py
-from sqlalchemy import Column, Integer, ForeignKey
+from sqlalchemy import Column, Integer, BigInteger, String, ForeignKey, DateTime, Index, UniqueConstraint, func
 from app.services.db import Base
 
 class LoyaltyAccount(Base):
@@ -7,3 +7,22 @@ class LoyaltyAccount(Base):
     id = Column(Integer, primary_key=True)
     customer_id = Column(Integer, ForeignKey("customers.id", ondelete="CASCADE"), nullable=False)
     points = Column(Integer, nullable=False, default=0)
+
+    # ✅ One balance per customer — accruals upsert into it
+    __table_args__ = (UniqueConstraint("customer_id", name="uq_loyalty_accounts_customer_id"),)
+
+
+class LoyaltyLedgerEntry(Base):
+    """Append-only accrual; folded into loyalty_accounts in bulk by a background job."""
+    __tablename__ = "loyalty_ledger"
+    id = Column(BigInteger, primary_key=True)
+    customer_id = Column(Integer, ForeignKey("customers.id", ondelete="CASCADE"), nullable=False)
+    points = Column(Integer, nullable=False)
+    order_id = Column(String(50), nullable=True)  # orders.external_id
+    created_at = Column(DateTime, server_default=func.now())
+    folded_at = Column(DateTime, nullable=True)
+
+    # ✅ The fold job scans only unfolded entries
+    __table_args__ = (
+        Index("ix_loyalty_ledger_unfolded", "id", postgresql_where=(folded_at.is_(None))),
+    )
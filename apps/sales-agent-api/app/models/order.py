@@ -9,7 +9,7 @@ class Order(Base):
 
     id = Column(Integer, primary_key=True)
     external_id = Column(String(50), unique=True, index=True)
-    customer_id = Column(Integer, ForeignKey("customers.id"))
+    customer_id = Column(Integer, ForeignKey("customers.id"), index=True)
     total_amount = Column(Integer)
     status = Column(String(50))
     payment_status = Column(String(50))
@@ -0,0 +1,17 @@
+# app/models/payment.py
+from sqlalchemy import Column, Integer, String, Text, DateTime, func
+from app.services.db import Base
+
+
+class PaymentLedger(Base):
+    """One row per idempotency key: the first authorization result, replayed on retries."""
+    __tablename__ = "payment_ledger"
+
+    id = Column(Integer, primary_key=True)
+    idempotency_key = Column(String(200), nullable=False, unique=True)
+    order_id = Column(String(50), nullable=False, index=True)  # orders.external_id
+    amount = Column(Integer, nullable=False)
+    currency = Column(String(3), nullable=False, default="INR")
+    auth_code = Column(String(50), nullable=False)
+    response = Column(Text, nullable=False)  # JSON of the result returned to the first caller
+    created_at = Column(DateTime, server_default=func.now())
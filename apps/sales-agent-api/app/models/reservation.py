@@ -0,0 +1,22 @@
+# app/models/reservation.py
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Index, func
+from app.services.db import Base
+
+
+class StockReservation(Base):
+    """Units held against an order until payment confirms or the hold expires."""
+    __tablename__ = "stock_reservations"
+
+    id = Column(Integer, primary_key=True)
+    order_id = Column(String(50), nullable=False, index=True)  # orders.external_id
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), nullable=False)
+    location = Column(String(100), nullable=False)
+    quantity = Column(Integer, nullable=False)
+    status = Column(String(20), nullable=False, default="held")  # held | confirmed | released
+    expires_at = Column(DateTime, nullable=False)
+    created_at = Column(DateTime, server_default=func.now())
+
+    # ✅ Sweeper scans only live holds ordered by expiry
+    __table_args__ = (
+        Index("ix_stock_reservations_held_expiry", "expires_at", postgresql_where=(status == "held")),
+    )
@@ -0,0 +1,13 @@
+# app/models/store.py
+from sqlalchemy import Column, Integer, String, Float
+from app.services.db import Base
+
+
+class Store(Base):
+    __tablename__ = "stores"
+
+    id = Column(Integer, primary_key=True)
+    code = Column(String(100), unique=True, nullable=False)  # matches inventory.location, e.g. STORE-MYLAI
+    name = Column(String(200))
+    latitude = Column(Float, nullable=False)
+    longitude = Column(Float, nullable=False)
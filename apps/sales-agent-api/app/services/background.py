@@ -0,0 +1,24 @@
+# app/services/background.py
+import asyncio
+import logging
+from typing import Callable
+
+logger = logging.getLogger("background")
+
+
+async def _run_periodic(name: str, func: Callable[[], object], interval: float):
+    """Run a blocking maintenance job every `interval` seconds (thread offload)."""
+    while True:
+        try:
+            await asyncio.to_thread(func)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"❌ Background job '{name}' failed: {e}")
+        await asyncio.sleep(interval)
+
+
+def start_periodic(name: str, func: Callable[[], object], interval: float) -> asyncio.Task:
+    """Schedule a periodic job on the running loop; cancel the task to stop it."""
+    logger.info(f"⏱️ Starting background job '{name}' every {interval}s")
+    return asyncio.create_task(_run_periodic(name, func, interval), name=name)
@@ -0,0 +1,63 @@
+# app/services/chat_service.py
+"""
+One chat turn, shared by every channel: the /v1/chat route and the Telegram
+webhook both call run_chat_turn in-process.
+"""
+import os
+import logging
+from typing import Optional
+
+from app.services import llm_client, sql_metrics
+from app.services.db import request_session_scope
+from app.services.orchestrator import execute_plan
+from app.services.session_store import create_session_store
+from app.services.tracing import tag_turn
+
+logger = logging.getLogger("chat_service")
+
+
+async def run_chat_turn(text: str, channel: str, customer_id: Optional[str] = None,
+                        session_id: Optional[str] = None) -> dict:
+    """
+    Load the session, plan with Gemini, run the tool calls and save the session.
+    Returns {"session_id", "reply", "actions"} (the ChatResponse fields).
+    """
+    # returns the store opened at startup (or opens it on first use)
+    session_store = await create_session_store()
+
+    session_id = session_id or f"sid-{os.urandom(6).hex()}"
+    tag_turn(session_id, channel)
+    session = await session_store.get(session_id) or {"messages": [], "customer_id": customer_id}
+
+    # 1️⃣ Append user message
+    session["messages"].append({"role": "user", "text": text, "channel": channel})
+
+    # 2️⃣ Call Gemini planner
+    plan = await llm_client.plan(text, session)
+    logger.info(f"🧠 Gemini plan output: {plan}")
+
+    reply_text = plan.get("reply_text", "")
+    tool_calls = plan.get("tool_calls", [])
+
+    # 3️⃣ Execute tool calls via orchestrator (read-only tools share one DB connection for the turn)
+    with sql_metrics.turn(session_id):  # statement repeats across the turn's tools (N+1 detection)
+        async with request_session_scope():
+            orchestration_result = await execute_plan({"reply_text": reply_text, "tool_calls": tool_calls}, session_id, session)
+    results = orchestration_result.get("tool_results", [])
+    reply_text = orchestration_result.get("reply_text", reply_text)
+
+    # 4️⃣ Append assistant message
+    session["messages"].append({
+        "role": "assistant",
+        "text": reply_text,
+        "tools_used": tool_calls
+    })
+
+    # 5️⃣ Persist to Redis
+    await session_store.set(session_id, session)
+
+    return {
+        "session_id": session_id,
+        "reply": reply_text,
+        "actions": {"tool_results": results} if results else None,
+    }
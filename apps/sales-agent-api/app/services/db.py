@@ -1,23 +1,574 @@
 # app/services/db.py
 import os
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+import time
+import asyncio
+import logging
+import threading
+import itertools
+from contextvars import ContextVar
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Callable, Iterator, Optional, TypeVar
+from sqlalchemy import create_engine, event, exc, text
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.util import queue as sqla_queue
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
 from dotenv import load_dotenv
 
+from app.services import sql_metrics
+
 load_dotenv()
 
-# ✅ Database URL from environment
-DATABASE_URL = os.getenv("DATABASE_URL")
-if not DATABASE_URL:
-    raise ValueError("❌ DATABASE_URL missing in .env")
+logger = logging.getLogger("db")
+
+T = TypeVar("T")
+
+# Optional read replicas (comma-separated URLs); read-only tools use them when healthy
+DATABASE_REPLICA_URLS = [u.strip() for u in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if u.strip()]
+# A replica further behind than this (or failing) is skipped until the next check
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("DB_REPLICA_MAX_LAG_SECONDS", "5"))
+REPLICA_CHECK_SECONDS = float(os.getenv("DB_REPLICA_CHECK_SECONDS", "5"))
+
+_REPLICA_LAG_SQL = text(
+    """
+    SELECT CASE
+             WHEN NOT pg_is_in_recovery() THEN 0
+             WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+             ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+           END
+    """
+)
+
+
+def _env(prefix: str, name: str, default: str) -> str:
+    """DB_REPLICA_POOL_SIZE falls back to DB_POOL_SIZE, then to the default."""
+    return os.getenv(f"{prefix}{name}") or os.getenv(f"DB_{name}") or default
+
+
+class TimedQueuePool(QueuePool):
+    """
+    QueuePool that records how long each checkout took: time spent waiting for
+    a free connection, plus connect time when the pool had to open a new one.
+    """
+
+    def __init__(self, *args, **kw):
+        super().__init__(*args, **kw)
+        self.wait_stats = {"checkouts": 0, "waited": 0, "timeouts": 0, "wait_ms_total": 0.0, "wait_ms_max": 0.0}
+        self._stats_lock = threading.Lock()
+
+    def _do_get(self):
+        t0 = time.perf_counter()
+        timed_out = False
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            timed_out = True
+            raise
+        finally:
+            ms = (time.perf_counter() - t0) * 1000
+            with self._stats_lock:
+                s = self.wait_stats
+                s["checkouts"] += 1
+                s["timeouts"] += timed_out
+                s["waited"] += ms >= 1.0
+                s["wait_ms_total"] += ms
+                s["wait_ms_max"] = max(s["wait_ms_max"], ms)
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.wait_stats, pool._stats_lock = self.wait_stats, self._stats_lock
+        return pool
+
+
+class TimedAsyncQueuePool(TimedQueuePool):
+    """TimedQueuePool for AsyncEngine (same as SQLAlchemy's AsyncAdaptedQueuePool)."""
+
+    _is_asyncio = True
+    _queue_class = sqla_queue.AsyncAdaptedQueue
+
+
+def _pool_options(prefix: str) -> dict[str, Any]:
+    return {
+        "pool_size": int(_env(prefix, "POOL_SIZE", "5")),
+        "max_overflow": int(_env(prefix, "MAX_OVERFLOW", "10")),
+        "pool_timeout": float(_env(prefix, "POOL_TIMEOUT", "30")),
+        "pool_pre_ping": _env(prefix, "POOL_PRE_PING", "1") == "1",
+    }
+
+
+def build_engine(url: str, prefix: str = "DB_") -> Engine:
+    """
+    Engine with pool settings from the environment ({prefix}POOL_SIZE, MAX_OVERFLOW,
+    POOL_TIMEOUT, POOL_PRE_PING, STATEMENT_TIMEOUT_MS; replicas use prefix DB_REPLICA_).
+    """
+    options: dict[str, Any] = {"echo": False, "future": True, "poolclass": TimedQueuePool, **_pool_options(prefix)}
+    statement_timeout_ms = int(_env(prefix, "STATEMENT_TIMEOUT_MS", "0"))
+    if statement_timeout_ms and url.startswith("postgresql"):
+        options["connect_args"] = {"options": f"-c statement_timeout={statement_timeout_ms}"}
+    engine = create_engine(url, **options)
+    sql_metrics.instrument(engine)
+    return engine
+
+
+def async_url(url: str) -> str:
+    """postgresql[+psycopg2]://... → postgresql+asyncpg://... (same host, db and credentials)."""
+    u = make_url(url)
+    return u.set(drivername="postgresql+asyncpg").render_as_string(hide_password=False)
+
+
+def build_async_engine(url: str, prefix: str = "DB_ASYNC_"):
+    """AsyncEngine (asyncpg); pool settings as build_engine, DB_ASYNC_* falling back to DB_*."""
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    options: dict[str, Any] = {"echo": False, "poolclass": TimedAsyncQueuePool, **_pool_options(prefix)}
+    statement_timeout_ms = int(_env(prefix, "STATEMENT_TIMEOUT_MS", "0"))
+    if statement_timeout_ms:
+        options["connect_args"] = {"server_settings": {"statement_timeout": str(statement_timeout_ms)}}
+    engine = create_async_engine(async_url(url), **options)
+    sql_metrics.instrument(engine.sync_engine)
+    return engine
 
-# ✅ Engine and Session setup
-engine = create_engine(DATABASE_URL, echo=False, future=True)
-SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
 
 # ✅ Base for all SQLAlchemy models
 Base = declarative_base()
 
+
+# ----- Engine and Session setup, on first use -----
+# Importing this module (models, agents, the app) needs no database; the engine
+# is built by the first session or by warm_up() at startup.
+_engine: Optional[Engine] = None
+_sessions: Optional[sessionmaker] = None
+_init_lock = threading.Lock()
+
+
+def database_url() -> str:
+    url = os.getenv("DATABASE_URL")
+    if not url:
+        raise ValueError("❌ DATABASE_URL missing in .env")
+    return url
+
+
+def get_engine() -> Engine:
+    """The primary engine, built on first use."""
+    global _engine, _sessions
+    if _engine is None:
+        with _init_lock:
+            if _engine is None:
+                eng = build_engine(database_url())
+                _sessions = sessionmaker(bind=eng, autoflush=False, autocommit=False, future=True)
+                _engine = eng
+    return _engine
+
+
+def SessionLocal() -> Session:
+    """New Session on the primary."""
+    if _sessions is None:
+        get_engine()
+    return _sessions()
+
+
+def __getattr__(name: str):
+    # `from app.services.db import engine` keeps working, and builds the engine then
+    if name == "engine":
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# ----- Read replicas -----
+def _connection_failure(e: BaseException) -> bool:
+    orig = getattr(e, "orig", e)
+    return getattr(orig, "pgcode", None) is None and orig.__class__.__name__ in ("OperationalError", "InterfaceError")
+
+
+class Replica:
+    def __init__(self, name: str, url: str):
+        self.name = name
+        self.url = url
+        self.engine = build_engine(url, prefix="DB_REPLICA_")
+        self.sessions = sessionmaker(bind=self.engine, autoflush=False, autocommit=False, future=True)
+        self.healthy = True
+        self.lag_seconds: Optional[float] = None
+        self.checked_at = 0.0
+        self._lock = threading.Lock()
+        self._async_engine = None
+        self._async_loop = None
+        event.listen(self.engine, "handle_error", self._on_error)
+
+    def get_async_engine(self):
+        """This replica's AsyncEngine for the running loop, built on first use (like the primary's)."""
+        loop = asyncio.get_running_loop()
+        if self._async_engine is None or self._async_loop is not loop:
+            with _async_lock:
+                if self._async_engine is None or self._async_loop is not loop:
+                    if self._async_engine is not None:
+                        self._async_engine.sync_engine.dispose(close=False)
+                    eng = build_async_engine(self.url, prefix="DB_REPLICA_")
+                    event.listen(eng.sync_engine, "handle_error", self._on_error)
+                    self._async_engine, self._async_loop = eng, loop
+        return self._async_engine
+
+    def _on_error(self, context):
+        # connection-level failures carry no SQLSTATE; query errors (timeouts etc.) do
+        if context.is_disconnect or _connection_failure(context.original_exception):
+            self.mark_down(context.original_exception)
+
+    def mark_down(self, reason: Any):
+        if self.healthy:
+            logger.warning(f"⚠️ Replica {self.name} unavailable, reads go to the primary: {reason}")
+        self.healthy = False
+        self.checked_at = time.monotonic()
+
+    def usable(self) -> bool:
+        """Healthy and within REPLICA_MAX_LAG_SECONDS; re-checked at most every REPLICA_CHECK_SECONDS."""
+        if time.monotonic() - self.checked_at < REPLICA_CHECK_SECONDS:
+            return self.healthy
+        if not self._lock.acquire(blocking=False):
+            return self.healthy  # another thread is checking
+        try:
+            with self.engine.connect() as conn:
+                self._record_lag(conn.execute(_REPLICA_LAG_SQL).scalar())
+        except Exception as e:
+            self.mark_down(e)
+        finally:
+            self._lock.release()
+        return self.healthy
+
+    async def usable_async(self) -> bool:
+        """usable() for async callers: the lag check runs on the async engine, not blocking the loop."""
+        if time.monotonic() - self.checked_at < REPLICA_CHECK_SECONDS:
+            return self.healthy
+        if not self._lock.acquire(blocking=False):
+            return self.healthy
+        try:
+            async with self.get_async_engine().connect() as conn:
+                self._record_lag((await conn.execute(_REPLICA_LAG_SQL)).scalar())
+        except Exception as e:
+            self.mark_down(e)
+        finally:
+            self._lock.release()
+        return self.healthy
+
+    def _record_lag(self, lag: Optional[float]):
+        self.lag_seconds = float(lag or 0)
+        healthy = self.lag_seconds <= REPLICA_MAX_LAG_SECONDS
+        if not healthy:
+            logger.warning(f"⚠️ Replica {self.name} is {self.lag_seconds:.1f}s behind, reads go to the primary")
+        elif not self.healthy:
+            logger.info(f"✅ Replica {self.name} is back ({self.lag_seconds:.1f}s behind)")
+        self.healthy = healthy
+        self.checked_at = time.monotonic()
+
+
+replicas: Optional[list[Replica]] = None  # built on first read
+_next_replica = itertools.count()
+
+
+def get_replicas() -> list[Replica]:
+    global replicas
+    if replicas is None:
+        with _init_lock:
+            if replicas is None:
+                replicas = [Replica(f"replica-{i}", url) for i, url in enumerate(DATABASE_REPLICA_URLS)]
+    return replicas
+
+
+def _pick_replica() -> Optional[Replica]:
+    """Round-robin over usable replicas; None means use the primary."""
+    replicas = get_replicas()
+    if not replicas:
+        return None
+    start = next(_next_replica)
+    for i in range(len(replicas)):
+        replica = replicas[(start + i) % len(replicas)]
+        if replica.usable():
+            return replica
+    return None
+
+
+async def _pick_replica_async() -> Optional[Replica]:
+    """_pick_replica for async callers."""
+    replicas = get_replicas()
+    if not replicas:
+        return None
+    start = next(_next_replica)
+    for i in range(len(replicas)):
+        replica = replicas[(start + i) % len(replicas)]
+        if await replica.usable_async():
+            return replica
+    return None
+
+
+def get_read_session() -> Session:
+    """Session for read-only work: a usable replica if configured, else the primary. Caller closes it."""
+    replica = _pick_replica()
+    return replica.sessions() if replica else SessionLocal()
+
+
+def run_read(fn: Callable[[Session], T]) -> T:
+    """
+    Run a read-only `fn(session)` on a replica. If the replica can't serve it —
+    connection lost, or the query was cancelled by recovery (SQLSTATE 40001) —
+    `fn` is retried on the primary; a lost replica is also marked down.
+    A statement timeout is not retried.
+    """
+    replica = _pick_replica()
+    if replica is not None:
+        db = replica.sessions()
+        try:
+            return fn(db)
+        except (exc.OperationalError, exc.InterfaceError) as e:
+            pgcode = getattr(e.orig, "pgcode", None)
+            if pgcode is None:
+                replica.mark_down(e)
+            elif pgcode != "40001":
+                raise
+            logger.warning(f"⚠️ Read on {replica.name} failed, retrying on the primary: {e.orig}")
+        finally:
+            db.close()
+    db = SessionLocal()
+    try:
+        return fn(db)
+    finally:
+        db.close()
+
+
+# ----- Async engine (asyncpg), created on first use -----
+# asyncpg connections belong to one event loop: a new loop (scripts, tests) gets a new pool
+_async_engine = None
+_async_sessions = None
+_async_loop = None
+_async_lock = threading.Lock()
+
+
+def get_async_engine():
+    global _async_engine, _async_sessions, _async_loop
+    loop = asyncio.get_running_loop()
+    if _async_engine is None or _async_loop is not loop:
+        with _async_lock:
+            if _async_engine is None or _async_loop is not loop:
+                from sqlalchemy.ext.asyncio import async_sessionmaker
+                if _async_engine is not None:
+                    # the old loop owns those connections; just drop the references
+                    _async_engine.sync_engine.dispose(close=False)
+                _async_engine = build_async_engine(database_url())
+                _async_sessions = async_sessionmaker(_async_engine, autoflush=False, expire_on_commit=False)
+                _async_loop = loop
+    return _async_engine
+
+
+def AsyncSessionLocal():
+    """New AsyncSession on the primary (the async counterpart of SessionLocal())."""
+    get_async_engine()
+    return _async_sessions()
+
+
+@asynccontextmanager
+async def async_session_scope(session=None) -> AsyncIterator[Any]:
+    """Async session_scope: use the caller's AsyncSession (caller commits) or open, commit and close our own."""
+    if session is not None:
+        yield session
+        return
+    db = AsyncSessionLocal()
+    try:
+        yield db
+        await db.commit()
+    except BaseException:
+        await db.rollback()
+        raise
+    finally:
+        await db.close()
+
+
+def _bind(conn):
+    from sqlalchemy.ext.asyncio import AsyncSession
+    return AsyncSession(bind=conn, autoflush=False, expire_on_commit=False)
+
+
+async def _connect_replica():
+    """AsyncConnection to a usable replica, or None (none usable, or the connect failed: that one is marked down)."""
+    replica = await _pick_replica_async()
+    if replica is None:
+        return None
+    try:
+        return await replica.get_async_engine().connect()
+    except (exc.DBAPIError, OSError) as e:
+        replica.mark_down(e)
+        return None
+
+
+class _TurnSession:
+    """
+    Pooled connections (checked out on first use) with an AsyncSession bound to
+    each: one for the turn's reads (a replica when one is usable) and one on the
+    primary for reads that must not lag. Without a usable replica both are the
+    same primary connection.
+    """
+
+    def __init__(self):
+        self.read = None
+        self.primary = None
+        self.lock = asyncio.Lock()  # an AsyncSession can't run two statements at once
+
+    async def get(self, primary: bool = False):
+        if primary:
+            if self.primary is None:
+                self.primary = _bind(await get_async_engine().connect())
+            return self.primary
+        if self.read is None:
+            conn = await _connect_replica()
+            self.read = _bind(conn) if conn is not None else await self.get(primary=True)
+        return self.read
+
+    async def close(self):
+        for session in {id(s): s for s in (self.read, self.primary) if s is not None}.values():
+            await session.close()
+            await session.bind.close()
+
+
+_turn_session: ContextVar[Optional[_TurnSession]] = ContextVar("turn_session", default=None)
+
+
+@asynccontextmanager
+async def request_session_scope() -> AsyncIterator[None]:
+    """
+    Share one DB connection across every read-only tool call made inside this
+    block (a chat turn). The connection is checked out on the first read and
+    returned on exit; each read ends its own transaction, so no transaction
+    stays open between tool calls. Propagates through contextvars to tasks started
+    here; a nested scope joins the outer one.
+    """
+    if _turn_session.get() is not None:
+        yield
+        return
+    turn = _TurnSession()
+    token = _turn_session.set(turn)
+    try:
+        yield
+    finally:
+        _turn_session.reset(token)
+        await turn.close()
+
+
+@asynccontextmanager
+async def read_session(primary: bool = False) -> AsyncIterator[Any]:
+    """
+    AsyncSession for a read-only tool: the turn's shared one inside
+    request_session_scope, else a new one. Served by a usable replica (same lag
+    and health checks as run_read) unless `primary` — for reads whose result is
+    cached or acted on, which must not be behind the primary.
+    """
+    turn = _turn_session.get()
+    if turn is None:
+        conn = None if primary else await _connect_replica()
+        if conn is None:
+            async with AsyncSessionLocal() as db:
+                yield db
+            return
+        try:
+            async with _bind(conn) as db:
+                yield db
+        finally:
+            await conn.close()
+        return
+    async with turn.lock:
+        db = await turn.get(primary)
+        try:
+            yield db
+        finally:
+            # ends the read transaction and detaches loaded rows; the connection stays ours for the next tool
+            await db.close()
+
+
+async def dispose_async_engine():
+    """Close the async pool (shutdown, or before switching event loops in scripts/tests)."""
+    global _async_engine, _async_sessions, _async_loop
+    if _async_engine is not None:
+        eng, _async_engine, _async_sessions, _async_loop = _async_engine, None, None, None
+        await eng.dispose()
+    for r in replicas or []:
+        if r._async_engine is not None:
+            eng, r._async_engine, r._async_loop = r._async_engine, None, None
+            await eng.dispose()
+
+
+def pool_stats() -> list[dict]:
+    """Checkout wait and occupancy per engine (primary first)."""
+    def stats(name: str, eng: Engine) -> dict:
+        pool = eng.pool
+        out = {"engine": name, "url": eng.url.render_as_string(hide_password=True)}
+        if isinstance(pool, QueuePool):
+            out.update(size=pool.size(), checked_out=pool.checkedout(), overflow=pool.overflow())
+        waits = dict(getattr(pool, "wait_stats", {}))
+        if waits:
+            waits["wait_ms_avg"] = round(waits["wait_ms_total"] / waits["checkouts"], 3) if waits["checkouts"] else 0.0
+            waits["wait_ms_total"] = round(waits["wait_ms_total"], 3)
+            waits["wait_ms_max"] = round(waits["wait_ms_max"], 3)
+        out.update(waits)
+        return out
+
+    rows = [stats("primary", get_engine())]
+    if _async_engine is not None:
+        rows.append(stats("primary-async", _async_engine.sync_engine))
+    for r in get_replicas():
+        rows.append({**stats(r.name, r.engine), "healthy": r.healthy, "lag_seconds": r.lag_seconds})
+        if r._async_engine is not None:
+            rows.append(stats(f"{r.name}-async", r._async_engine.sync_engine))
+    return rows
+
+
+# ----- Warm-up (startup, before reporting ready) -----
+def _warm_connections(prefix: str) -> int:
+    """DB_WARM_CONNECTIONS (per pool, DB_ASYNC_/DB_REPLICA_ overrides); defaults to the pool size."""
+    return int(_env(prefix, "WARM_CONNECTIONS", _env(prefix, "POOL_SIZE", "5")))
+
+
+def _fill_pool(eng: Engine, n: int):
+    # hold n connections at once so the pool really opens n, then return them all
+    conns = []
+    try:
+        for _ in range(n):
+            conn = eng.connect()
+            conns.append(conn)
+            conn.execute(text("SELECT 1"))
+    finally:
+        for conn in conns:
+            conn.close()
+
+
+def warm_up() -> dict:
+    """
+    Build the primary and replica engines and pre-open their pools, so the first
+    requests after startup don't pay for connects. Raises if the primary is down;
+    an unreachable replica is only marked down. Returns per-engine timings (ms).
+    """
+    timings = {}
+    t0 = time.perf_counter()
+    _fill_pool(get_engine(), _warm_connections("DB_"))
+    timings["primary"] = round((time.perf_counter() - t0) * 1000, 1)
+    for r in get_replicas():
+        t0 = time.perf_counter()
+        try:
+            _fill_pool(r.engine, _warm_connections("DB_REPLICA_"))
+        except Exception as e:
+            r.mark_down(e)
+        timings[r.name] = round((time.perf_counter() - t0) * 1000, 1)
+    return timings
+
+
+async def warm_up_async() -> dict:
+    """warm_up for the async engine of the running loop."""
+    eng = get_async_engine()
+    t0 = time.perf_counter()
+    conns = [await eng.connect() for _ in range(_warm_connections("DB_ASYNC_"))]
+    try:
+        for conn in conns:
+            await conn.execute(text("SELECT 1"))
+    finally:
+        for conn in conns:
+            await conn.close()
+    return {"primary-async": round((time.perf_counter() - t0) * 1000, 1)}
+
+
 def get_db():
     """FastAPI dependency generator (for request-based DB sessions)."""
     db = SessionLocal()
@@ -26,13 +577,25 @@ def get_db():
     finally:
         db.close()
 
-def get_db_session():
-    """Helper for direct DB usage outside FastAPI routes."""
-    db = SessionLocal()
+def get_db_session() -> Session:
+    """Helper for direct DB usage outside FastAPI routes (caller closes it)."""
+    return SessionLocal()
+
+@contextmanager
+def session_scope(session: Optional[Session] = None) -> Iterator[Session]:
+    """Use the caller's session (caller commits) or open, commit and close our own."""
+    if session is not None:
+        yield session
+        return
+    db: Session = SessionLocal()
     try:
-        return db
+        yield db
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
     finally:
-        pass
+        db.close()
 
 # ✅ Lazy import to prevent circular imports with model files
 def import_all_models():
@@ -41,3 +604,7 @@ def import_all_models():
     import app.models.product
     import app.models.customer
     import app.models.fulfillment
+    import app.models.reservation
+    import app.models.store
+    import app.models.payment
+    import app.models.loyalty
@@ -0,0 +1,325 @@
+# app/services/inventory_ingest.py
+"""
+Bulk ingestion of warehouse stock feeds.
+
+Feeds are streamed row by row into a temp staging table with Postgres COPY,
+then applied to `inventory` with one set-based statement and `products.stock`
+totals are re-synced — all in a single transaction.
+
+Feed formats (columns / keys):
+  - csv:  header with sku, location (or store_id), quantity (or qty / delta)
+  - json: NDJSON (one object per line) or a JSON array of objects
+
+Modes:
+  - snapshot: quantity is the absolute stock level (last row per key wins)
+  - delta:    quantity is added to current stock (rows per key are summed)
+
+Usage:
+    python -m app.services.inventory_ingest feed.csv --format csv --mode delta
+"""
+import io
+import csv
+import json
+import time
+import logging
+import argparse
+from typing import Any, Dict, Iterable, Iterator, TextIO, Tuple
+
+from app.services.db import get_engine
+
+logger = logging.getLogger("inventory_ingest")
+
+FORMATS = ("csv", "json")
+MODES = ("snapshot", "delta")
+
+_LOCATION_KEYS = ("location", "store_id", "store")
+_QUANTITY_KEYS = ("quantity", "qty", "delta")
+
+Row = Tuple[str, str, int]
+
+
+# ----- Feed parsing (streaming) -----
+def _normalize(record: Dict[str, Any]) -> Row:
+    """Map a feed record onto (sku, location, quantity)."""
+    sku = record.get("sku")
+    location = next((record[k] for k in _LOCATION_KEYS if record.get(k) not in (None, "")), None)
+    quantity = next((record[k] for k in _QUANTITY_KEYS if record.get(k) not in (None, "")), None)
+    if not sku or location is None or quantity is None:
+        raise ValueError(f"Feed record needs sku, location and quantity: {record}")
+    return str(sku).strip(), str(location).strip(), int(quantity)
+
+
+def iter_csv_rows(stream: TextIO) -> Iterator[Row]:
+    for record in csv.DictReader(stream):
+        yield _normalize(record)
+
+
+def _iter_json_array(stream: TextIO, chunk_size: int = 1 << 16) -> Iterator[Dict[str, Any]]:
+    """Decode `[{...}, {...}]` one object at a time without loading the whole feed."""
+    decoder = json.JSONDecoder()
+    buf, pos, eof = "", 0, False
+    while True:
+        # skip separators between elements
+        while pos < len(buf) and buf[pos] in " \t\r\n,[]":
+            pos += 1
+        if pos >= len(buf):
+            if eof:
+                return
+            buf, pos = stream.read(chunk_size), 0
+            eof = not buf
+            continue
+        try:
+            obj, end = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            more = stream.read(chunk_size)
+            eof = not more
+            buf, pos = buf[pos:] + more, 0
+            continue
+        yield obj
+        pos = end
+
+
+def iter_json_rows(stream: TextIO) -> Iterator[Row]:
+    first = stream.read(1)
+    while first and first.isspace():
+        first = stream.read(1)
+    if not first:
+        return
+    if first == "[":
+        for record in _iter_json_array(stream):
+            yield _normalize(record)
+        return
+    # NDJSON: the first character belongs to the first line
+    head = first + stream.readline()
+    for line in _chain_lines(head, stream):
+        if line.strip():
+            yield _normalize(json.loads(line))
+
+
+def _chain_lines(head: str, stream: TextIO) -> Iterator[str]:
+    yield head
+    yield from stream
+
+
+def iter_feed_rows(stream: TextIO, fmt: str) -> Iterator[Row]:
+    if fmt == "csv":
+        return iter_csv_rows(stream)
+    if fmt == "json":
+        return iter_json_rows(stream)
+    raise ValueError(f"Unknown feed format: {fmt} (expected one of {FORMATS})")
+
+
+# ----- COPY plumbing -----
+def _copy_escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
+
+class _CopyStream(io.TextIOBase):
+    """File-like adapter that renders feed rows as COPY text lines on demand."""
+
+    def __init__(self, rows: Iterable[Row]):
+        self._rows = iter(rows)
+        self._buf = ""
+        self.count = 0
+        self.error: Exception | None = None  # feed error hidden behind the driver's COPY failure
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> str:
+        parts, have = [self._buf], len(self._buf)
+        while size < 0 or have < size:
+            try:
+                sku, location, quantity = next(self._rows)
+            except StopIteration:
+                break
+            except Exception as e:
+                self.error = e
+                raise
+            line = f"{_copy_escape(sku)}\t{_copy_escape(location)}\t{quantity}\n"
+            parts.append(line)
+            have += len(line)
+            self.count += 1
+        data = "".join(parts)
+        if size < 0:
+            self._buf = ""
+            return data
+        self._buf = data[size:]
+        return data[:size]
+
+    def readline(self, size: int = -1) -> str:
+        return self.read(size)
+
+
+def _copy_into(cursor, sql: str, stream: _CopyStream):
+    if hasattr(cursor, "copy_expert"):  # psycopg2
+        cursor.copy_expert(sql, stream, size=1 << 16)
+        return
+    with cursor.copy(sql) as copy:  # psycopg 3
+        while chunk := stream.read(1 << 16):
+            copy.write(chunk)
+
+
+# ----- Set-based apply -----
+_STAGE_SQL = """
+    CREATE TEMP TABLE inventory_feed (
+        seq BIGSERIAL,
+        sku TEXT NOT NULL,
+        location TEXT NOT NULL,
+        quantity INTEGER NOT NULL
+    ) ON COMMIT DROP;
+    CREATE TEMP TABLE inventory_touched (product_id INTEGER PRIMARY KEY) ON COMMIT DROP;
+"""
+
+_APPLY_SQL = {
+    # last row per key wins; untouched when the stored value already matches
+    "snapshot": """
+        WITH src AS (
+            SELECT DISTINCT ON (f.sku, f.location) p.id AS product_id, f.location, GREATEST(f.quantity, 0) AS qty
+              FROM inventory_feed f
+              JOIN products p ON p.sku = f.sku
+             ORDER BY f.sku, f.location, f.seq DESC
+        ),
+        changed AS (
+            INSERT INTO inventory AS i (product_id, location, quantity)
+            SELECT product_id, location, qty FROM src
+            ON CONFLICT (product_id, location) DO UPDATE
+               SET quantity = EXCLUDED.quantity
+             WHERE i.quantity IS DISTINCT FROM EXCLUDED.quantity
+            RETURNING i.product_id
+        )
+        INSERT INTO inventory_touched
+        SELECT DISTINCT product_id FROM changed
+        ON CONFLICT DO NOTHING
+    """,
+    # rows per key are summed; zero net change is skipped
+    "delta": """
+        WITH src AS (
+            SELECT p.id AS product_id, f.location, SUM(f.quantity) AS qty
+              FROM inventory_feed f
+              JOIN products p ON p.sku = f.sku
+             GROUP BY p.id, f.location
+            HAVING SUM(f.quantity) <> 0
+        ),
+        updated AS (
+            UPDATE inventory AS i
+               SET quantity = GREATEST(i.quantity + src.qty, 0)
+              FROM src
+             WHERE i.product_id = src.product_id AND i.location = src.location
+               AND GREATEST(i.quantity + src.qty, 0) <> i.quantity
+            RETURNING i.product_id
+        ),
+        inserted AS (
+            INSERT INTO inventory (product_id, location, quantity)
+            SELECT src.product_id, src.location, src.qty
+              FROM src
+             WHERE src.qty > 0
+               AND NOT EXISTS (
+                   SELECT 1 FROM inventory i
+                    WHERE i.product_id = src.product_id AND i.location = src.location
+               )
+            RETURNING product_id
+        )
+        INSERT INTO inventory_touched
+        SELECT product_id FROM updated
+        UNION
+        SELECT product_id FROM inserted
+        ON CONFLICT DO NOTHING
+    """,
+}
+
+_SYNC_TOTALS_SQL = """
+    UPDATE products p
+       SET stock = t.total
+      FROM (
+            SELECT i.product_id, SUM(i.quantity) AS total
+              FROM inventory i
+              JOIN inventory_touched t ON t.product_id = i.product_id
+             GROUP BY i.product_id
+           ) t
+     WHERE p.id = t.product_id
+       AND p.stock IS DISTINCT FROM t.total
+"""
+
+_UNKNOWN_SKUS_SQL = """
+    SELECT COUNT(DISTINCT f.sku)
+      FROM inventory_feed f
+     WHERE NOT EXISTS (SELECT 1 FROM products p WHERE p.sku = f.sku)
+"""
+
+
+def ingest_rows(rows: Iterable[Row], mode: str = "snapshot") -> Dict[str, Any]:
+    """Stage `rows` with COPY and apply them to inventory in one transaction."""
+    if mode not in MODES:
+        raise ValueError(f"Unknown ingest mode: {mode} (expected one of {MODES})")
+
+    start = time.perf_counter()
+    stream = _CopyStream(rows)
+    conn = get_engine().raw_connection()
+    try:
+        cur = conn.cursor()
+        # One ingest at a time: concurrent feeds would race on new (product, store) keys
+        cur.execute("SELECT pg_advisory_xact_lock(hashtext('inventory_ingest'))")
+        cur.execute(_STAGE_SQL)
+        _copy_into(cur, "COPY inventory_feed (sku, location, quantity) FROM STDIN", stream)
+        staged_at = time.perf_counter()
+
+        cur.execute(_APPLY_SQL[mode])
+        cur.execute("SELECT COUNT(*) FROM inventory_touched")
+        products_touched = cur.fetchone()[0]
+        cur.execute(_SYNC_TOTALS_SQL)
+        products_synced = cur.rowcount
+        cur.execute(_UNKNOWN_SKUS_SQL)
+        unknown_skus = cur.fetchone()[0]
+
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        if stream.error is not None:
+            raise stream.error from None
+        raise
+    finally:
+        conn.close()
+
+    elapsed = time.perf_counter() - start
+    stats = {
+        "mode": mode,
+        "rows_staged": stream.count,
+        "products_changed": products_touched,
+        "products_stock_synced": products_synced,
+        "unknown_skus": unknown_skus,
+        "copy_seconds": round(staged_at - start, 3),
+        "total_seconds": round(elapsed, 3),
+        "rows_per_sec": round(stream.count / elapsed) if elapsed > 0 else None,
+    }
+    logger.info(f"📦 Inventory feed applied: {stats}")
+    return stats
+
+
+def ingest_inventory_feed(stream: TextIO, fmt: str = "csv", mode: str = "snapshot") -> Dict[str, Any]:
+    """Parse a CSV/JSON feed from a text stream and ingest it (see module docstring)."""
+    return ingest_rows(iter_feed_rows(stream, fmt), mode=mode)
+
+
+def main(argv=None):
+    import sys
+    parser = argparse.ArgumentParser(description="Ingest a warehouse stock feed into inventory.")
+    parser.add_argument("path", help="feed file path, or '-' for stdin")
+    parser.add_argument("--format", choices=FORMATS, default=None, help="defaults to the file extension")
+    parser.add_argument("--mode", choices=MODES, default="snapshot")
+    args = parser.parse_args(argv)
+
+    fmt = args.format or ("json" if args.path.endswith((".json", ".ndjson", ".jsonl")) else "csv")
+    if args.path == "-":
+        stats = ingest_inventory_feed(sys.stdin, fmt, args.mode)
+    else:
+        with open(args.path, newline="", encoding="utf-8") as fh:
+            stats = ingest_inventory_feed(fh, fmt, args.mode)
+    print(json.dumps(stats, indent=2))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+    main()
@@ -1,27 +1,337 @@
 # app/services/inventory_service.py
+import os
+import logging
+import datetime
+from typing import Optional
+from sqlalchemy import text
 from sqlalchemy.orm import Session
-from app.services.db import SessionLocal
+from app.services.db import SessionLocal, session_scope
 from app.models.inventory import Inventory
 
+logger = logging.getLogger("inventory_service")
+
+# How long a hold survives without a successful payment
+RESERVATION_TTL_SECONDS = int(os.getenv("RESERVATION_TTL_SECONDS", "900"))
+
+
 def get_stock_by_sku(product_id: int):
     session: Session = SessionLocal()
     try:
         rows = session.query(Inventory).filter(Inventory.product_id == product_id).all()
-        return [{"store_id": r.store_id, "qty": r.quantity} for r in rows]
+        return [{"store_id": r.location, "qty": r.quantity} for r in rows]
     finally:
         session.close()
 
+
 def adjust_stock(product_id: int, store_id: str, delta: int) -> bool:
-    session: Session = SessionLocal()
-    try:
-        inv = session.query(Inventory).filter_by(product_id=product_id, store_id=store_id).first()
-        if not inv:
-            return False
-        inv.quantity += delta
-        session.commit()
-        return True
-    except Exception:
-        session.rollback()
-        raise
-    finally:
-        session.close()
+    """Atomically apply `delta` to one store's stock; refuses to go below zero."""
+    with session_scope(None) as session:
+        row = session.execute(
+            text(
+                """
+                UPDATE inventory
+                   SET quantity = quantity + :delta
+                 WHERE product_id = :pid AND location = :loc
+                   AND quantity + :delta >= 0
+                RETURNING quantity
+                """
+            ),
+            {"delta": delta, "pid": product_id, "loc": store_id},
+        ).first()
+        return row is not None
+
+
+# ----- Reservations -----
+class InsufficientStock(ValueError):
+    """An order's lines can't all be held; `missing` lists the ones short of stock."""
+
+    def __init__(self, order_id: str, missing: list[dict]):
+        super().__init__(f"Insufficient stock for order {order_id}: {missing}")
+        self.order_id = order_id
+        self.missing = missing
+
+
+def _merge_lines(lines: list[dict]) -> list[tuple[int, str, int]]:
+    """Collapse duplicate (product_id, location) lines and sort them so every
+    caller locks inventory rows in the same order."""
+    merged: dict[tuple[int, str], int] = {}
+    for line in lines:
+        qty = int(line["quantity"])
+        if qty <= 0:
+            raise ValueError(f"Reservation quantity must be positive: {line}")
+        key = (int(line["product_id"]), str(line["location"]))
+        merged[key] = merged.get(key, 0) + qty
+    return sorted((pid, loc, qty) for (pid, loc), qty in merged.items())
+
+
+def reserve_stock(order_id: str, lines: list[dict], ttl_seconds: Optional[int] = None,
+                  session: Optional[Session] = None) -> dict:
+    """
+    Reserve every line of an order in ONE statement:
+      - rows are locked in a fixed order, then decremented with
+        `UPDATE ... WHERE quantity >= n RETURNING`
+      - a held reservation row is inserted for each decremented line
+    All-or-nothing: if any line lacks stock the whole reservation is rolled back.
+
+    lines: list of {product_id, location, quantity}
+    """
+    merged = _merge_lines(lines)
+    if not merged:
+        return {"order_id": order_id, "status": "reserved", "lines": []}
+
+    values, params = [], {}
+    for i, (pid, loc, qty) in enumerate(merged):
+        values.append(f"(CAST(:p{i} AS INTEGER), CAST(:l{i} AS VARCHAR), CAST(:q{i} AS INTEGER))")
+        params.update({f"p{i}": pid, f"l{i}": loc, f"q{i}": qty})
+
+    ttl = RESERVATION_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+    params["order_id"] = order_id
+    params["expires_at"] = datetime.datetime.utcnow() + datetime.timedelta(seconds=ttl)
+
+    stmt = text(
+        f"""
+        WITH req(product_id, location, qty) AS (VALUES {", ".join(values)}),
+        locked AS (
+            SELECT i.id
+              FROM inventory i
+              JOIN req ON req.product_id = i.product_id AND req.location = i.location
+             ORDER BY i.id
+               FOR UPDATE OF i
+        ),
+        taken AS (
+            UPDATE inventory AS i
+               SET quantity = i.quantity - req.qty
+              FROM req
+             WHERE i.id IN (SELECT id FROM locked)
+               AND i.product_id = req.product_id AND i.location = req.location
+               AND i.quantity >= req.qty
+            RETURNING i.product_id, i.location, i.quantity AS remaining
+        ),
+        held AS (
+            INSERT INTO stock_reservations (order_id, product_id, location, quantity, status, expires_at)
+            SELECT :order_id, req.product_id, req.location, req.qty, 'held', :expires_at
+              FROM taken
+              JOIN req ON req.product_id = taken.product_id AND req.location = taken.location
+            RETURNING product_id, location, quantity
+        )
+        SELECT held.product_id, held.location, held.quantity, taken.remaining
+          FROM held
+          JOIN taken ON taken.product_id = held.product_id AND taken.location = held.location
+        """
+    )
+
+    with session_scope(session) as db:
+        # A caller-owned transaction must survive a rejected reservation
+        savepoint = db.begin_nested() if session is not None else None
+        rows = db.execute(stmt, params).all()
+        if len(rows) < len(merged):
+            # ❌ At least one line is short — undo the partial decrement
+            (savepoint or db).rollback()
+            got = {(r.product_id, r.location) for r in rows}
+            missing = [
+                {"product_id": pid, "location": loc, "quantity": qty}
+                for pid, loc, qty in merged if (pid, loc) not in got
+            ]
+            logger.info(f"⚠️ Reservation for {order_id} rejected, insufficient stock: {missing}")
+            return {"order_id": order_id, "status": "insufficient_stock", "missing": missing}
+        if savepoint is not None:
+            savepoint.commit()
+
+    return {
+        "order_id": order_id,
+        "status": "reserved",
+        "expires_at": params["expires_at"].isoformat() + "Z",
+        "lines": [
+            {"product_id": r.product_id, "location": r.location,
+             "quantity": r.quantity, "remaining": r.remaining}
+            for r in rows
+        ],
+    }
+
+
+_LOCK_STOCK_SQL = text(
+    """
+    SELECT product_id, location, quantity
+      FROM inventory
+     WHERE product_id = ANY(CAST(:pids AS INTEGER[]))
+     ORDER BY id
+       FOR UPDATE
+    """
+)
+
+_HOLD_MANY_SQL = text(
+    """
+    WITH req AS (
+        SELECT *
+          FROM unnest(CAST(:oid AS VARCHAR[]), CAST(:pid AS INTEGER[]), CAST(:loc AS VARCHAR[]),
+                      CAST(:qty AS INTEGER[])) AS r(order_id, product_id, location, qty)
+    ),
+    taken AS (
+        UPDATE inventory AS i
+           SET quantity = i.quantity - agg.qty
+          FROM (SELECT product_id, location, SUM(qty) AS qty FROM req GROUP BY product_id, location) agg
+         WHERE i.product_id = agg.product_id AND i.location = agg.location
+    )
+    INSERT INTO stock_reservations (order_id, product_id, location, quantity, status, expires_at)
+    SELECT order_id, product_id, location, qty, 'held', :expires_at
+      FROM req
+    """
+)
+
+
+def reserve_orders(orders: dict[str, list[tuple[int, int]]], session: Session,
+                   ttl_seconds: Optional[int] = None) -> dict[str, list[dict]]:
+    """
+    Hold stock for many orders at once, each line at the store with the most
+    units left: {order_id: [(product_id, quantity)]}. The inventory rows involved
+    are locked (in id order, like reserve_stock) for the rest of the caller's
+    transaction, so the holds are picked in Python and written in one statement.
+    All-or-nothing per order; returns {order_id: missing lines} for the orders
+    that were not held.
+    """
+    pids = sorted({pid for lines in orders.values() for pid, _ in lines})
+    if not pids:
+        return {}
+    stock: dict[int, dict[str, int]] = {}
+    for pid, loc, qty in session.execute(_LOCK_STOCK_SQL, {"pids": pids}):
+        stock.setdefault(pid, {})[loc] = qty
+
+    holds: dict[str, list] = {k: [] for k in ("oid", "pid", "loc", "qty")}
+    rejected = {}
+    for order_id, lines in orders.items():
+        picks, missing = [], []
+        for pid, qty in lines:
+            stores = stock.get(pid, {})
+            loc = max(stores, key=stores.get, default=None)
+            if loc is None or stores[loc] < qty:
+                missing.append({"product_id": pid, "location": loc, "quantity": qty})
+            else:
+                picks.append((pid, loc, qty))
+                stores[loc] -= qty
+        if missing:
+            for pid, loc, qty in picks:   # give this order's units back for the next ones
+                stock[pid][loc] += qty
+            logger.info(f"⚠️ Reservation for {order_id} rejected, insufficient stock: {missing}")
+            rejected[order_id] = missing
+            continue
+        for pid, loc, qty in picks:
+            holds["oid"].append(order_id)
+            holds["pid"].append(pid)
+            holds["loc"].append(loc)
+            holds["qty"].append(qty)
+
+    if holds["oid"]:
+        ttl = RESERVATION_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        expires_at = datetime.datetime.utcnow() + datetime.timedelta(seconds=ttl)
+        session.execute(_HOLD_MANY_SQL, {**holds, "expires_at": expires_at})
+    return rejected
+
+
+def confirm_reservations(order_id: str, session: Optional[Session] = None) -> int:
+    """Payment succeeded: turn the order's live holds into permanent decrements."""
+    with session_scope(session) as db:
+        result = db.execute(
+            text("UPDATE stock_reservations SET status = 'confirmed' WHERE order_id = :oid AND status = 'held'"),
+            {"oid": order_id},
+        )
+        return result.rowcount
+
+
+# Confirms the order's holds and, in the same statement, returns the catalogue
+# lines that confirmed holds don't cover (hold expired and swept, or never made)
+_CONFIRM_ORDER_SQL = text(
+    """
+    WITH confirmed AS (
+        UPDATE stock_reservations SET status = 'confirmed'
+         WHERE order_id = :oid AND status = 'held'
+        RETURNING product_id, quantity
+    ),
+    held AS (
+        SELECT product_id, SUM(quantity) AS qty
+          FROM (SELECT product_id, quantity FROM stock_reservations WHERE order_id = :oid AND status = 'confirmed'
+                UNION ALL
+                SELECT product_id, quantity FROM confirmed) r
+         GROUP BY product_id
+    ),
+    need AS (
+        SELECT oi.product_id, SUM(oi.quantity) AS qty
+          FROM order_items oi
+          JOIN orders o ON o.id = oi.order_id
+         WHERE o.external_id = :oid AND oi.product_id IS NOT NULL
+         GROUP BY oi.product_id
+    )
+    SELECT need.product_id, need.qty - COALESCE(held.qty, 0) AS short
+      FROM need
+      LEFT JOIN held ON held.product_id = need.product_id
+     WHERE need.qty > COALESCE(held.qty, 0)
+     ORDER BY need.product_id
+    """
+)
+
+
+def confirm_order_stock(order_id: str, session: Session) -> None:
+    """
+    Payment succeeded: confirm the order's holds, and check they cover every
+    catalogue line. A line left short (its hold expired and was returned to stock)
+    is reserved again and confirmed; raises InsufficientStock when that fails.
+    """
+    short = [(r.product_id, int(r.short)) for r in session.execute(_CONFIRM_ORDER_SQL, {"oid": order_id})]
+    if not short:
+        return
+    logger.info(f"⚠️ Order {order_id} paid with {len(short)} line(s) not held, reserving again")
+    missing = reserve_orders({order_id: short}, session).get(order_id)
+    if missing:
+        raise InsufficientStock(order_id, missing)
+    confirm_reservations(order_id, session=session)
+
+
+_RELEASE_SQL = """
+    WITH rel AS (
+        UPDATE stock_reservations
+           SET status = 'released'
+         WHERE id IN ({selector})
+        RETURNING product_id, location, quantity
+    ),
+    agg AS (
+        SELECT product_id, location, SUM(quantity) AS qty
+          FROM rel
+         GROUP BY product_id, location
+    )
+    UPDATE inventory AS i
+       SET quantity = i.quantity + agg.qty
+      FROM agg
+     WHERE i.product_id = agg.product_id AND i.location = agg.location
+    RETURNING i.product_id
+"""
+
+
+def release_reservations(order_id: str, session: Optional[Session] = None,
+                         include_confirmed: bool = False) -> int:
+    """Give an order's live holds back to stock (e.g. payment failed); with
+    `include_confirmed` also its paid-for units (payment voided).
+    Returns the number of inventory rows restocked."""
+    statuses = "('held', 'confirmed')" if include_confirmed else "('held')"
+    stmt = text(_RELEASE_SQL.format(
+        selector=f"SELECT id FROM stock_reservations WHERE order_id = :oid AND status IN {statuses} FOR UPDATE"
+    ))
+    with session_scope(session) as db:
+        return len(db.execute(stmt, {"oid": order_id}).all())
+
+
+def release_expired_reservations(batch_size: int = 1000) -> int:
+    """
+    Return expired holds to stock in bulk. Safe to run from several workers:
+    rows are claimed with SKIP LOCKED so two sweepers never release the same hold.
+    """
+    stmt = text(_RELEASE_SQL.format(
+        selector=(
+            "SELECT id FROM stock_reservations"
+            " WHERE status = 'held' AND expires_at < :now"
+            " ORDER BY expires_at LIMIT :batch FOR UPDATE SKIP LOCKED"
+        )
+    ))
+    with session_scope(None) as db:
+        restocked = len(db.execute(stmt, {"now": datetime.datetime.utcnow(), "batch": batch_size}).all())
+    if restocked:
+        logger.info(f"♻️ Expired holds returned to {restocked} inventory row(s)")
+    return restocked
@@ -0,0 +1,162 @@
+# app/services/llm_transport.py
+"""
+Record/replay transport under llm_client's httpx client, so perf runs and
+incident reproductions don't need live Gemini.
+
+LLM_TRANSPORT=record   forward to Gemini and append every exchange to
+                       LLM_CASSETTE_DIR/<key>.jsonl
+LLM_TRANSPORT=replay   answer from the cassettes without the network, after
+                       the recorded latency (LLM_REPLAY_LATENCY=original) or at
+                       once (=zero)
+
+`key` is a hash of the model path and the request body (the prompt and the
+generation config; the API key in the query string is left out), so a
+replay matches when the session history matches. LLM_REPLAY_MATCH=current
+also accepts a recording of the same current user message when the full
+prompt differs (e.g. product ids in the history changed since recording).
+Several recordings under one key are replayed in turn.
+A prompt with no recording raises ReplayMiss, which plan() reports like any
+other Gemini failure.
+"""
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+from collections import defaultdict
+from typing import Optional
+
+import httpx
+
+logger = logging.getLogger("llm_transport")
+
+CURRENT_MARKER = "[user] (current):"
+
+
+class ReplayMiss(LookupError):
+    pass
+
+
+def _digest(*parts: str) -> str:
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part.encode())
+        h.update(b"\0")
+    return h.hexdigest()[:32]
+
+
+def request_keys(request: httpx.Request) -> tuple[str, Optional[str]]:
+    """(key over the whole prompt, key over the current user message or None)."""
+    body = request.content.decode()
+    try:
+        parsed = json.loads(body)
+        body = json.dumps(parsed, sort_keys=True, ensure_ascii=False)
+        prompt = parsed["contents"][-1]["parts"][0]["text"]
+    except (ValueError, LookupError, TypeError):
+        prompt = ""
+    turn_key = None
+    if CURRENT_MARKER in prompt:
+        current = prompt.rsplit(CURRENT_MARKER, 1)[-1].split("\n", 1)[0].strip()
+        turn_key = _digest(request.url.path, current)
+    return _digest(request.url.path, body), turn_key
+
+
+class RecordingTransport(httpx.AsyncBaseTransport):
+    def __init__(self, inner: httpx.AsyncBaseTransport, directory: str):
+        self.inner = inner
+        self.directory = directory
+        self.recorded = 0
+        os.makedirs(directory, exist_ok=True)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        started = time.perf_counter()
+        response = await self.inner.handle_async_request(request)
+        content = await response.aread()
+        latency_ms = round((time.perf_counter() - started) * 1000, 1)
+
+        key, turn_key = request_keys(request)
+        entry = {
+            "key": key,
+            "turn_key": turn_key,
+            "path": request.url.path,
+            "request": request.content.decode(),
+            "status": response.status_code,
+            "content_type": response.headers.get("content-type", "application/json"),
+            "response": content.decode(),
+            "latency_ms": latency_ms,
+            "recorded_at": time.time(),
+        }
+        # one short append per exchange; O_APPEND keeps concurrent lines whole
+        with open(os.path.join(self.directory, f"{key}.jsonl"), "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self.recorded += 1
+        return httpx.Response(response.status_code, headers={"content-type": entry["content_type"]},
+                              content=content, request=request)
+
+    async def aclose(self) -> None:
+        await self.inner.aclose()
+
+
+class ReplayTransport(httpx.AsyncBaseTransport):
+    def __init__(self, directory: str, latency: str = "original", match: str = "exact"):
+        if latency not in ("original", "zero"):
+            raise ValueError(f"latency must be 'original' or 'zero', not {latency!r}")
+        if match not in ("exact", "current"):
+            raise ValueError(f"match must be 'exact' or 'current', not {match!r}")
+        self.latency = latency
+        self.match = match
+        self.by_key: dict[str, list[dict]] = defaultdict(list)
+        self.by_turn: dict[str, list[dict]] = defaultdict(list)
+        self._next: dict[str, int] = defaultdict(int)
+        self.counters = {"hits": 0, "current_message_hits": 0, "misses": 0}
+
+        for name in sorted(os.listdir(directory)):
+            if not name.endswith(".jsonl"):
+                continue
+            with open(os.path.join(directory, name), encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.by_key[entry["key"]].append(entry)
+                        if entry.get("turn_key"):
+                            self.by_turn[entry["turn_key"]].append(entry)
+        logger.info(f"📼 Replaying {sum(map(len, self.by_key.values()))} LLM exchanges from {directory}")
+
+    def _pick(self, index: dict, key: Optional[str]) -> Optional[dict]:
+        entries = index.get(key) if key else None
+        if not entries:
+            return None
+        n = self._next[key]
+        self._next[key] = n + 1
+        return entries[n % len(entries)]
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        key, turn_key = request_keys(request)
+        entry = self._pick(self.by_key, key)
+        if entry is not None:
+            self.counters["hits"] += 1
+        elif self.match == "current" and (entry := self._pick(self.by_turn, turn_key)) is not None:
+            self.counters["current_message_hits"] += 1
+        else:
+            self.counters["misses"] += 1
+            raise ReplayMiss(f"no recorded LLM exchange for key {key}")
+
+        if self.latency == "original" and entry["latency_ms"]:
+            await asyncio.sleep(entry["latency_ms"] / 1000)
+        return httpx.Response(entry["status"], headers={"content-type": entry["content_type"]},
+                              content=entry["response"].encode(), request=request)
+
+
+def transport_from_env(limits: httpx.Limits) -> Optional[httpx.AsyncBaseTransport]:
+    """The transport LLM_TRANSPORT asks for, or None for the default live transport."""
+    mode = os.getenv("LLM_TRANSPORT", "live")
+    directory = os.getenv("LLM_CASSETTE_DIR", "llm_cassettes")
+    if mode == "record":
+        return RecordingTransport(httpx.AsyncHTTPTransport(limits=limits), directory)
+    if mode == "replay":
+        return ReplayTransport(directory, latency=os.getenv("LLM_REPLAY_LATENCY", "original"),
+                               match=os.getenv("LLM_REPLAY_MATCH", "exact"))
+    if mode != "live":
+        raise ValueError(f"LLM_TRANSPORT must be live, record or replay, not {mode!r}")
+    return None
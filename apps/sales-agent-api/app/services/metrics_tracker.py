@@ -14,8 +14,8 @@ class MetricsTracker:
         if not self.redis:
             self.redis = await create_session_store()
 
-    async def update(self, tool_name: str, success: bool, exec_time: float):
-        """Update metrics for a specific tool."""
+    async def update(self, tool_name: str, success: bool, exec_time: float, db_stats=None):
+        """Update metrics for a specific tool (db_stats: the call's sql_metrics.DbStats, if any)."""
         await self.init()
         key = f"metrics:{tool_name}"
 
@@ -41,6 +41,11 @@ class MetricsTracker:
                 "error_count": 0,
                 "last_used": None
             }
+        # Metrics saved before DB timing existed
+        metrics.setdefault("avg_db_time", 0.0)
+        metrics.setdefault("avg_db_statements", 0.0)
+        metrics.setdefault("db_time_share", 0.0)
+        metrics.setdefault("n_plus_one_flags", 0)
 
         # Update counters
         metrics["calls"] += 1
@@ -52,6 +57,18 @@ class MetricsTracker:
         # Compute running average for execution time
         total_time = metrics["avg_exec_time"] * (metrics["calls"] - 1)
         metrics["avg_exec_time"] = round((total_time + exec_time) / metrics["calls"], 3)
+
+        # Database share of the tool's time (statements timed by sql_metrics)
+        db_time = db_stats.db_time if db_stats else 0.0
+        statements = db_stats.statements if db_stats else 0
+        total_db_time = metrics["avg_db_time"] * (metrics["calls"] - 1)
+        metrics["avg_db_time"] = round((total_db_time + db_time) / metrics["calls"], 4)
+        total_statements = metrics["avg_db_statements"] * (metrics["calls"] - 1)
+        metrics["avg_db_statements"] = round((total_statements + statements) / metrics["calls"], 2)
+        if metrics["avg_exec_time"]:
+            metrics["db_time_share"] = round(min(1.0, metrics["avg_db_time"] / metrics["avg_exec_time"]), 3)
+        if db_stats:
+            metrics["n_plus_one_flags"] += db_stats.n_plus_one
         metrics["last_used"] = datetime.now().isoformat()
 
         # ✅ Save as JSON string (this fixes your error!)
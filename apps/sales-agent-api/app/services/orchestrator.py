@@ -1,7 +1,9 @@
 # app/services/orchestrator.py
 
 import logging, time, traceback
-from app.services import tool_router
+from app.services import sql_metrics, tool_router
+from app.services.db import request_session_scope
+from app.services.tracing import span
 
 logger = logging.getLogger("orchestrator")
 
@@ -10,6 +12,11 @@ async def execute_plan(plan: dict, session_id: str, session: dict):
     Execute tool calls based on the plan generated by the LLM.
     Logs tool execution time and resolves tool dependencies.
     """
+    with span("orchestrator.execute_plan", **{"tool_count": len(plan.get("tool_calls", []))}):
+        async with request_session_scope():  # joins the caller's turn scope when the chat turn opened one
+            return await _execute_plan(plan, session_id, session)
+
+async def _execute_plan(plan: dict, session_id: str, session: dict):
     import re
     from app.services.metrics_tracker import metrics_tracker
     tool_calls = plan.get("tool_calls", [])
@@ -45,12 +52,14 @@ async def execute_plan(plan: dict, session_id: str, session: dict):
         start_time = time.time()
         logger.info(f"⚙️ Tool [{idx}] → {tool_name} | Args: {resolved_args}")
 
+        db_stats = None
         try:
-            result = await tool_router.execute(tool_name, resolved_args)
+            with sql_metrics.tool_call(tool_name) as db_stats:  # the tool's statements and DB time
+                result = await tool_router.execute(tool_name, resolved_args)
             elapsed = round(time.time() - start_time, 3)
             logger.info(f"✅ Tool [{tool_name}] succeeded in {elapsed}s | Result: {str(result)[:200]}")
 
-            await metrics_tracker.update(tool_name, success=True, exec_time=elapsed)
+            await metrics_tracker.update(tool_name, success=True, exec_time=elapsed, db_stats=db_stats)
 
             results.append({
                 "tool": tool_name,
@@ -70,7 +79,7 @@ async def execute_plan(plan: dict, session_id: str, session: dict):
             elapsed = round(time.time() - start_time, 3)
             logger.error(f"❌ Tool [{tool_name}] failed in {elapsed}s | Error: {e}")
 
-            await metrics_tracker.update(tool_name, success=False, exec_time=elapsed)
+            await metrics_tracker.update(tool_name, success=False, exec_time=elapsed, db_stats=db_stats)
 
             results.append({
                 "tool": tool_name,
@@ -0,0 +1,313 @@
+# app/services/order_cache.py
+"""
+Order-state cache shared by the agents, the workflows and chat.
+
+An entry is the order row minus its line items (see STATE_FIELDS) and can be
+found by external_id or numeric id. Two tiers: a small per-process dict with a
+short TTL (so writes from other processes show up quickly) in front of Redis.
+
+Writers never publish uncommitted state: `stage(db, row)` parks the new state
+on the session and it is written through after the transaction commits; if the
+transaction rolls back instead, staged entries are dropped and the cache keeps
+the last committed state. `get_order_state` is the one read accessor.
+"""
+import os
+import json
+import time
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, Optional
+
+from sqlalchemy import event, or_, select
+from sqlalchemy.orm import Session
+
+from app.services.db import SessionLocal, read_session
+from app.services.session_store import get_async_client, get_sync_client
+from app.models.order import Order
+
+logger = logging.getLogger("order_cache")
+
+STATE_FIELDS = ("id", "external_id", "customer_id", "total_amount", "status", "payment_status")
+
+ORDER_CACHE_TTL_SECONDS = int(os.getenv("ORDER_CACHE_TTL_SECONDS", str(24 * 3600)))
+LOCAL_TTL_SECONDS = float(os.getenv("ORDER_CACHE_LOCAL_TTL_SECONDS", "2"))
+LOCAL_MAX_ENTRIES = int(os.getenv("ORDER_CACHE_LOCAL_MAX_ENTRIES", "10000"))
+STATE_KEY = "orders:state:{}"
+ID_KEY = "orders:id:{}"
+# After a Redis error, use the local tier and Postgres only for this long
+CACHE_RETRY_SECONDS = 30.0
+_cache_down_until = 0.0
+
+_PENDING = "order_cache_pending"
+
+# Every Redis write goes through this one thread, in the order put()/invalidate()
+# were called (commit order): a slow write can't land after a later transition
+# and leave the older status cached for ORDER_CACHE_TTL_SECONDS.
+_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="order-cache-writer")
+
+_lock = threading.Lock()
+_local: "OrderedDict[str, tuple[float, Dict[str, Any]]]" = OrderedDict()
+_ids: Dict[int, str] = {}
+
+
+def state_columns(prefix: str = "") -> str:
+    """RETURNING / SELECT list for a cache entry, e.g. state_columns("o.")."""
+    return ", ".join(prefix + f for f in STATE_FIELDS)
+
+
+def state_of(row) -> Dict[str, Any]:
+    """Cache entry from an Order, a Row with STATE_FIELDS, or a mapping."""
+    if isinstance(row, dict):
+        return {f: row.get(f) for f in STATE_FIELDS}
+    return {f: getattr(row, f) for f in STATE_FIELDS}
+
+
+def _load_stmt(ref: Any):
+    cond = Order.external_id == str(ref)
+    if isinstance(ref, int) or (isinstance(ref, str) and ref.isdigit()):
+        cond = or_(Order.id == int(ref), cond)
+    # an id match wins over an external_id that happens to look numeric
+    return select(Order).where(cond).order_by((Order.external_id == str(ref)).asc()).limit(1)
+
+
+def load_order(db: Session, ref: Any) -> Optional[Order]:
+    """Find an order by numeric id or external_id — one query, both sides indexed."""
+    try:
+        return db.execute(_load_stmt(ref)).scalars().first()
+    except Exception:
+        return None
+
+
+# ----- Redis tier -----
+
+def _cache_client():
+    return get_sync_client() if time.monotonic() >= _cache_down_until else None
+
+
+def _async_cache_client():
+    return get_async_client() if time.monotonic() >= _cache_down_until else None
+
+
+def _cache_failed(e: Exception):
+    global _cache_down_until
+    _cache_down_until = time.monotonic() + CACHE_RETRY_SECONDS
+    logger.warning(f"⚠️ Order cache Redis unavailable, serving local entries and Postgres: {e}")
+
+
+def _redis_get(ref: Any) -> Optional[Dict[str, Any]]:
+    client = _cache_client()
+    if client is None:
+        return None
+    try:
+        ext = str(ref)
+        raw = client.get(STATE_KEY.format(ext))
+        if raw is None and ext.isdigit():
+            ext = client.get(ID_KEY.format(ext))
+            raw = client.get(STATE_KEY.format(ext)) if ext else None
+        return json.loads(raw) if raw else None
+    except Exception as e:
+        _cache_failed(e)
+        return None
+
+
+async def _redis_get_async(ref: Any) -> Optional[Dict[str, Any]]:
+    client = _async_cache_client()
+    if client is None:
+        return None
+    try:
+        ext = str(ref)
+        raw = await client.get(STATE_KEY.format(ext))
+        if raw is None and ext.isdigit():
+            ext = await client.get(ID_KEY.format(ext))
+            raw = await client.get(STATE_KEY.format(ext)) if ext else None
+        return json.loads(raw) if raw else None
+    except Exception as e:
+        _cache_failed(e)
+        return None
+
+
+def _write(fn, *args):
+    """
+    Queue a Redis write on the writer thread. Outside the event loop, wait for it
+    (and everything queued before it); on the loop (committed from an AsyncSession)
+    don't block on Redis, the local tier already has the new state.
+    """
+    future = _writer.submit(fn, *args)
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        future.result()
+
+
+def _redis_put(states: list[Dict[str, Any]]):
+    client = _cache_client()
+    if client is None:
+        return
+    try:
+        pipe = client.pipeline(transaction=False)
+        for s in states:
+            pipe.set(STATE_KEY.format(s["external_id"]), json.dumps(s), ex=ORDER_CACHE_TTL_SECONDS)
+            pipe.set(ID_KEY.format(s["id"]), s["external_id"], ex=ORDER_CACHE_TTL_SECONDS)
+        pipe.execute()
+    except Exception as e:
+        _cache_failed(e)
+
+
+def _redis_delete(external_ids: tuple):
+    client = _cache_client()
+    if client is None:
+        return
+    try:
+        client.delete(*(STATE_KEY.format(ext) for ext in external_ids))
+    except Exception as e:
+        _cache_failed(e)
+
+
+# ----- Local tier -----
+
+def _local_get(ref: Any) -> Optional[Dict[str, Any]]:
+    now = time.monotonic()
+    with _lock:
+        ext = str(ref)
+        if ext not in _local and ext.isdigit():
+            ext = _ids.get(int(ext), ext)
+        hit = _local.get(ext)
+        if hit is None:
+            return None
+        expires_at, state = hit
+        if expires_at < now:
+            del _local[ext]
+            return None
+        _local.move_to_end(ext)
+        return dict(state)
+
+
+def _local_put(states: Iterable[Dict[str, Any]]):
+    expires_at = time.monotonic() + LOCAL_TTL_SECONDS
+    with _lock:
+        for s in states:
+            _local[s["external_id"]] = (expires_at, s)
+            _local.move_to_end(s["external_id"])
+            _ids[s["id"]] = s["external_id"]
+        while len(_local) > LOCAL_MAX_ENTRIES:
+            _, (_, old) = _local.popitem(last=False)
+            _ids.pop(old["id"], None)
+
+
+# ----- Public API -----
+
+def put(*states: Dict[str, Any]):
+    """Write committed states through both tiers."""
+    states = [state_of(s) for s in states]
+    if not states:
+        return
+    _local_put(states)
+    _write(_redis_put, states)
+
+
+def invalidate(*external_ids: str):
+    with _lock:
+        for ext in external_ids:
+            hit = _local.pop(ext, None)
+            if hit is not None:
+                _ids.pop(hit[1]["id"], None)
+    if external_ids:
+        _write(_redis_delete, external_ids)
+
+
+def flush():
+    """Wait until the queued Redis writes are done."""
+    _writer.submit(lambda: None).result()
+
+
+def clear_local():
+    with _lock:
+        _local.clear()
+        _ids.clear()
+
+
+def stage(db: Session, *rows):
+    """Record new order states on `db` (Session or AsyncSession); they reach the cache when its transaction commits."""
+    pending = db.info.setdefault(_PENDING, {})
+    for row in rows:
+        s = state_of(row)
+        pending[s["external_id"]] = s
+
+
+def get_order_state(ref: Any, db: Optional[Session] = None) -> Optional[Dict[str, Any]]:
+    """
+    Order state by external_id or numeric id: local tier, then Redis, then one
+    indexed SELECT (which fills both tiers). Returns a copy, or None if the order
+    doesn't exist. With `db`, a Postgres load joins that session and the entry is
+    only cached once it commits.
+    """
+    state = _local_get(ref)
+    if state is not None:
+        return state
+    state = _redis_get(ref)
+    if state is not None:
+        _local_put([state])
+        return dict(state)
+
+    owns_session = db is None
+    session = SessionLocal() if owns_session else db
+    try:
+        order = load_order(session, ref)
+        if order is None:
+            return None
+        state = state_of(order)
+    finally:
+        if owns_session:
+            session.close()
+
+    if owns_session:
+        put(state)
+    else:
+        stage(db, state)
+    return dict(state)
+
+
+async def get_order_state_async(ref: Any, db=None) -> Optional[Dict[str, Any]]:
+    """get_order_state for async callers (`db` is an AsyncSession); same tiers, no thread hops."""
+    state = _local_get(ref)
+    if state is not None:
+        return state
+    state = await _redis_get_async(ref)
+    if state is not None:
+        _local_put([state])
+        return dict(state)
+
+    if db is None:
+        # committed data (the read session never writes): safe to publish now; the primary,
+        # since a lagging replica's state would be cached
+        async with read_session(primary=True) as session:
+            order = (await session.execute(_load_stmt(ref))).scalars().first()
+            if order is None:
+                return None
+            state = state_of(order)
+        put(state)
+        return dict(state)
+
+    order = (await db.execute(_load_stmt(ref))).scalars().first()
+    if order is None:
+        return None
+    state = state_of(order)
+    stage(db, state)
+    return dict(state)
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_staged(session: Session):
+    pending = session.info.pop(_PENDING, None)
+    if pending:
+        put(*pending.values())
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _drop_staged(session: Session, transaction):
+    # after a commit the entries were already published; otherwise they never happened
+    if transaction.parent is None:
+        session.info.pop(_PENDING, None)
@@ -0,0 +1,326 @@
+# app/services/order_queue.py
+"""
+Durable order-processing queue on Redis Streams.
+
+- `OrderQueue.enqueue` records a job (status hash) and appends it to the
+  `orders:jobs` stream; an idempotency key maps repeat submissions to the
+  first job.
+- `OrderWorkerPool` consumes the stream through a consumer group with N async
+  workers per process; run more processes to scale out. Failed jobs are retried
+  with exponential backoff (a sorted set pumps them back into the stream when
+  due) and moved to the `orders:dead` stream after `max_attempts`, which also
+  frees their idempotency key so the order can be resubmitted. Entries left
+  pending by a crashed worker are reclaimed with XAUTOCLAIM; a worker re-claims
+  the entry it is running (XCLAIM) every claim_idle_ms/3, so a slow job is
+  never taken over while its worker is alive.
+
+Standalone workers:
+    python -m app.services.order_queue --concurrency 8
+"""
+import os
+import json
+import time
+import uuid
+import socket
+import asyncio
+import logging
+import argparse
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger("order_queue")
+
+STREAM = "orders:jobs"
+GROUP = "order-workers"
+DEAD_LETTER_STREAM = "orders:dead"
+RETRY_ZSET = "orders:retry"
+JOB_KEY = "orders:job:{}"
+IDEMPOTENCY_KEY = "orders:idem:{}"
+
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("ORDER_IDEMPOTENCY_TTL_SECONDS", str(24 * 3600)))
+JOB_TTL_SECONDS = int(os.getenv("ORDER_JOB_TTL_SECONDS", str(7 * 24 * 3600)))
+
+Handler = Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]
+
+
+def _now() -> str:
+    return datetime.utcnow().isoformat() + "Z"
+
+
+class OrderQueue:
+    """Producer side + job status, over any redis.asyncio-compatible client."""
+
+    def __init__(self, redis):
+        self.redis = redis
+
+    async def ensure_group(self):
+        try:
+            await self.redis.xgroup_create(STREAM, GROUP, id="0", mkstream=True)
+        except Exception as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    async def enqueue(self, payload: Dict[str, Any], idempotency_key: Optional[str] = None) -> Tuple[str, bool]:
+        """
+        Returns (job_id, created). A repeated idempotency key returns the first job with created=False.
+        The key, the job hash and the stream entry are written in one MULTI (the key WATCHed), so a
+        failed enqueue leaves no key pointing at a job that was never queued.
+        """
+        from redis.exceptions import WatchError
+
+        job_id = uuid.uuid4().hex
+        key = JOB_KEY.format(job_id)
+        idem = IDEMPOTENCY_KEY.format(idempotency_key) if idempotency_key else None
+        while True:
+            async with self.redis.pipeline(transaction=True) as pipe:
+                try:
+                    if idem:
+                        await pipe.watch(idem)
+                        existing = await pipe.get(idem)
+                        if existing:
+                            return existing, False
+                    pipe.multi()
+                    if idem:
+                        pipe.set(idem, job_id, ex=IDEMPOTENCY_TTL_SECONDS)
+                    pipe.hset(key, mapping={
+                        "state": "queued",
+                        "attempts": 0,
+                        "payload": json.dumps(payload),
+                        "idempotency_key": idempotency_key or "",
+                        "created_at": _now(),
+                        "updated_at": _now(),
+                    })
+                    pipe.expire(key, JOB_TTL_SECONDS)
+                    pipe.xadd(STREAM, {"job_id": job_id})
+                    await pipe.execute()
+                    return job_id, True
+                except WatchError:
+                    continue  # a concurrent submission claimed the key first: return its job
+
+    async def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        data = await self.redis.hgetall(JOB_KEY.format(job_id))
+        if not data:
+            return None
+        out = {"job_id": job_id, **data}
+        out["attempts"] = int(out.get("attempts", 0))
+        for field in ("payload", "result"):
+            if out.get(field):
+                out[field] = json.loads(out[field])
+        return out
+
+    async def _update(self, job_id: str, **fields):
+        fields["updated_at"] = _now()
+        await self.redis.hset(JOB_KEY.format(job_id), mapping=fields)
+
+
+async def run_order_workflow(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Default handler: the async post-purchase workflow (parallel steps with compensation)."""
+    from app.workflows.order_workflow import process_order_async
+    return await process_order_async(**payload)
+
+
+class OrderWorkerPool:
+    def __init__(self, queue: OrderQueue, handler: Handler = run_order_workflow, concurrency: int = 4,
+                 consumer: Optional[str] = None, max_attempts: int = 5, backoff_base: float = 1.0,
+                 backoff_max: float = 60.0, claim_idle_ms: int = 120_000, block_ms: Optional[int] = 1000,
+                 poll_interval: float = 0.05):
+        self.queue = queue
+        self.redis = queue.redis
+        self.handler = handler
+        self.concurrency = concurrency
+        self.consumer = consumer or f"{socket.gethostname()}-{os.getpid()}"
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        # above the workflow's worst case (3 sequential 30s step timeouts), so only a dead worker's entries go idle
+        self.claim_idle_ms = claim_idle_ms
+        # block_ms=None polls without BLOCK (for in-process Redis stand-ins that
+        # implement blocking reads by stalling the event loop)
+        self.block_ms = block_ms
+        self.poll_interval = poll_interval
+        self._tasks: list[asyncio.Task] = []
+        self._stopping = False
+
+    def backoff(self, attempt: int) -> float:
+        return min(self.backoff_max, self.backoff_base * (2 ** (attempt - 1)))
+
+    async def start(self):
+        self._stopping = False
+        await self.queue.ensure_group()
+        for i in range(self.concurrency):
+            self._tasks.append(asyncio.create_task(self._consume_loop(f"{self.consumer}-{i}")))
+        self._tasks.append(asyncio.create_task(self._retry_pump()))
+        self._tasks.append(asyncio.create_task(self._reclaim_loop()))
+        logger.info(f"👷 Order worker pool '{self.consumer}' started with {self.concurrency} worker(s)")
+
+    async def stop(self):
+        # the flag also ends loops whose cancellation a client library swallowed mid-command
+        self._stopping = True
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    async def _consume_loop(self, consumer: str):
+        while not self._stopping:
+            try:
+                batches = await self.redis.xreadgroup(GROUP, consumer, {STREAM: ">"}, count=1, block=self.block_ms)
+                if not batches and self.block_ms is None:
+                    await asyncio.sleep(self.poll_interval)
+                for _stream, messages in batches or []:
+                    for msg_id, fields in messages:
+                        await self._handle(msg_id, fields, consumer)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Order worker {consumer} loop error: {e}")
+                await asyncio.sleep(1)
+
+    async def _heartbeat(self, msg_id: str, consumer: str):
+        """Keep a running entry ours: XCLAIM by its owner resets the idle time XAUTOCLAIM looks at."""
+        while True:
+            await asyncio.sleep(self.claim_idle_ms / 3000)
+            try:
+                await self.redis.xclaim(STREAM, GROUP, consumer, min_idle_time=0, message_ids=[msg_id], justid=True)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"⚠️ Order job heartbeat for {msg_id} failed: {e}")
+
+    async def _handle(self, msg_id: str, fields: Dict[str, str], consumer: str):
+        job_id = fields.get("job_id")
+        job = await self.queue.status(job_id) if job_id else None
+        if job is None or job.get("state") in ("succeeded", "dead", "retry_scheduled"):
+            # unknown/expired job, a redelivery of a finished one, or one whose worker died after
+            # scheduling its retry (the retry pump runs it again; running it here too would double it)
+            await self.redis.xack(STREAM, GROUP, msg_id)
+            return
+
+        attempt = job["attempts"] + 1
+        await self.queue._update(job_id, state="running", attempts=attempt)
+        started = time.perf_counter()
+        heartbeat = asyncio.create_task(self._heartbeat(msg_id, consumer))
+        try:
+            result = await self.handler(job["payload"])
+            error = result.get("message", "workflow failed") if result.get("status") == "error" else None
+        except Exception as e:
+            result, error = None, str(e)
+        finally:
+            heartbeat.cancel()
+        elapsed = round(time.perf_counter() - started, 3)
+
+        if error is None:
+            await self.queue._update(job_id, state="succeeded", result=json.dumps(result, default=str),
+                                     last_error="", duration=elapsed)
+            logger.info(f"✅ Order job {job_id} succeeded in {elapsed}s (attempt {attempt})")
+        elif attempt < self.max_attempts:
+            delay = self.backoff(attempt)
+            # one MULTI, so a job in state retry_scheduled is always in the retry set
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.hset(JOB_KEY.format(job_id), mapping={"state": "retry_scheduled", "last_error": error,
+                                                           "duration": elapsed, "updated_at": _now()})
+                pipe.zadd(RETRY_ZSET, {job_id: time.time() + delay})
+                await pipe.execute()
+            logger.warning(f"⚠️ Order job {job_id} failed (attempt {attempt}), retrying in {delay}s: {error}")
+        else:
+            await self._dead_letter(job, error, attempt, elapsed)
+            logger.error(f"💀 Order job {job_id} dead-lettered after {attempt} attempt(s): {error}")
+
+        await self.redis.xack(STREAM, GROUP, msg_id)
+
+    async def _dead_letter(self, job: Dict[str, Any], error: str, attempt: int, elapsed: float):
+        """
+        Mark the job dead, add it to the dead-letter stream and free its idempotency key
+        (if it still names this job) in one MULTI, so the order can be resubmitted.
+        """
+        from redis.exceptions import WatchError
+
+        job_id = job["job_id"]
+        idem = IDEMPOTENCY_KEY.format(job["idempotency_key"]) if job.get("idempotency_key") else None
+        while True:
+            async with self.redis.pipeline(transaction=True) as pipe:
+                try:
+                    owned = False
+                    if idem:
+                        await pipe.watch(idem)
+                        owned = await pipe.get(idem) == job_id
+                    pipe.multi()
+                    pipe.hset(JOB_KEY.format(job_id), mapping={"state": "dead", "last_error": error,
+                                                               "duration": elapsed, "updated_at": _now()})
+                    pipe.xadd(DEAD_LETTER_STREAM, {"job_id": job_id, "error": error[:500], "attempts": attempt})
+                    if owned:
+                        pipe.delete(idem)
+                    await pipe.execute()
+                    return
+                except WatchError:
+                    continue
+
+    async def _retry_pump(self, interval: float = 0.25):
+        """Move due retries back onto the stream. ZREM decides which process wins a job."""
+        while not self._stopping:
+            try:
+                due = await self.redis.zrangebyscore(RETRY_ZSET, "-inf", time.time(), start=0, num=100)
+                for job_id in due:
+                    if await self.redis.zrem(RETRY_ZSET, job_id):
+                        await self.queue._update(job_id, state="queued")
+                        await self.redis.xadd(STREAM, {"job_id": job_id})
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Order retry pump error: {e}")
+            await asyncio.sleep(interval)
+
+    async def _reclaim_loop(self):
+        """Take over entries a crashed worker read but never acknowledged."""
+        while not self._stopping:
+            await asyncio.sleep(max(1.0, self.claim_idle_ms / 2000))
+            consumer = f"{self.consumer}-reclaim"
+            try:
+                claimed = await self.redis.xautoclaim(STREAM, GROUP, consumer,
+                                                      min_idle_time=self.claim_idle_ms, start_id="0-0", count=50)
+                for msg_id, fields in claimed[1]:
+                    if fields:
+                        await self._handle(msg_id, fields, consumer)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Order reclaim error: {e}")
+
+
+# ----- Shared queue for the API process -----
+_queue: Optional[OrderQueue] = None
+
+
+async def get_order_queue() -> OrderQueue:
+    global _queue
+    if _queue is None:
+        from app.services.session_store import redis_client
+        if redis_client is None:
+            raise RuntimeError("No redis client available. Install 'redis' or 'aioredis'.")
+        url = os.getenv("REDIS_URL") or os.getenv("REDIS", "redis://localhost:6379/0")
+        _queue = OrderQueue(redis_client.from_url(url, decode_responses=True))
+        await _queue.ensure_group()
+    return _queue
+
+
+def set_order_queue(queue: Optional[OrderQueue]):
+    """Install a queue (e.g. over a local Redis stand-in) or None to reconnect lazily."""
+    global _queue
+    _queue = queue
+
+
+async def _serve(concurrency: int):
+    pool = OrderWorkerPool(await get_order_queue(), concurrency=concurrency)
+    await pool.start()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await pool.stop()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+    parser = argparse.ArgumentParser(description="Run order pipeline workers.")
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv("ORDER_WORKERS", "4")))
+    args = parser.parse_args()
+    asyncio.run(_serve(args.concurrency))
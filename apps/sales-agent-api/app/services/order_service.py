@@ -1,26 +1,200 @@
 # app/services/order_service.py
-from sqlalchemy.orm import Session
+import logging
 from uuid import uuid4
-from app.services.db import SessionLocal
-from app.models.order import Order
-from app.models.order_item import OrderItem
-
-def create_order(customer_id: int | None, items: list[dict], total_amount: int) -> dict:
-    """
-    items: list of {sku, product_id, quantity, unit_price}
-    """
-    session: Session = SessionLocal()
-    try:
-        order = Order(order_ref=f"ORD-{uuid4().hex[:8]}", customer_id=customer_id, status="created", total_amount=total_amount)
-        session.add(order)
-        session.flush()  # get order.id
-        for it in items:
-            oi = OrderItem(order_id=order.id, product_id=it.get("product_id"), sku=it["sku"], quantity=it["quantity"], unit_price=it["unit_price"])
-            session.add(oi)
-        session.commit()
-        return {"order_id": order.id, "order_ref": order.order_ref}
-    except Exception:
-        session.rollback()
-        raise
-    finally:
-        session.close()
+from typing import Optional
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from app.services import order_cache
+from app.services.db import session_scope
+from app.services.inventory_service import InsufficientStock, reserve_orders
+
+logger = logging.getLogger("order_service")
+
+# Orders per statement for bulk imports (keeps each round trip a few MB at most)
+BULK_CHUNK_SIZE = 1000
+
+# One statement per chunk: orders and line items arrive as parallel arrays, the
+# orders are inserted, and their items are inserted from the RETURNING ids.
+# Unit prices and product ids default to the catalogue row for the SKU; a
+# string customer reference (e.g. "CUST-001") is resolved via customers.customer_id.
+_CREATE_ORDERS_SQL = text(
+    """
+    WITH o AS (
+        SELECT *
+          FROM unnest(CAST(:o_ord AS INTEGER[]), CAST(:o_ext AS VARCHAR[]), CAST(:o_cust AS INTEGER[]),
+                      CAST(:o_cust_ref AS VARCHAR[]), CAST(:o_total AS INTEGER[]))
+               AS o(ord, external_id, customer_id, customer_ref, total_amount)
+    ),
+    li AS (
+        SELECT li.ord, li.line_no, li.sku,
+               COALESCE(li.product_id, p.id) AS product_id,
+               li.quantity,
+               COALESCE(li.unit_price, p.price) AS unit_price
+          FROM unnest(CAST(:i_ord AS INTEGER[]), CAST(:i_line AS INTEGER[]), CAST(:i_sku AS VARCHAR[]),
+                      CAST(:i_pid AS INTEGER[]), CAST(:i_qty AS INTEGER[]), CAST(:i_price AS INTEGER[]))
+               AS li(ord, line_no, sku, product_id, quantity, unit_price)
+          LEFT JOIN products p ON p.sku = li.sku
+    ),
+    li_totals AS (
+        SELECT ord, SUM(quantity * unit_price) AS total FROM li GROUP BY ord
+    ),
+    new_orders AS (
+        INSERT INTO orders (external_id, customer_id, total_amount, status, created_at)
+        SELECT o.external_id,
+               COALESCE(o.customer_id, c.id),
+               COALESCE(o.total_amount, t.total, 0),
+               'created', now()
+          FROM o
+          LEFT JOIN li_totals t ON t.ord = o.ord
+          LEFT JOIN customers c ON c.customer_id = o.customer_ref
+         ORDER BY o.ord
+        ON CONFLICT (external_id) DO NOTHING
+        RETURNING id, external_id, customer_id, total_amount, status, payment_status
+    ),
+    new_items AS (
+        INSERT INTO order_items (order_id, product_id, sku, quantity, unit_price)
+        SELECT n.id, li.product_id, li.sku, li.quantity, li.unit_price
+          FROM li
+          JOIN o ON o.ord = li.ord
+          JOIN new_orders n ON n.external_id = o.external_id
+         ORDER BY li.ord, li.line_no
+        RETURNING order_id
+    )
+    SELECT n.id, n.external_id, n.customer_id, n.total_amount, n.status, n.payment_status
+      FROM new_orders n
+     ORDER BY n.id
+    """
+)
+
+
+# Catalogue lines of the orders just inserted, to hold their stock
+_ORDER_LINES_SQL = text(
+    """
+    SELECT o.external_id, oi.product_id, SUM(oi.quantity) AS quantity
+      FROM order_items oi
+      JOIN orders o ON o.id = oi.order_id
+     WHERE oi.order_id = ANY(CAST(:ids AS INTEGER[])) AND oi.product_id IS NOT NULL
+     GROUP BY o.id, o.external_id, oi.product_id
+     ORDER BY o.id, oi.product_id
+    """
+)
+
+
+def _new_external_id() -> str:
+    return f"ORD-{uuid4().hex[:8].upper()}"
+
+
+def _customer_params(customer_id) -> tuple[Optional[int], Optional[str]]:
+    """Integer (or digit string) → customers.id; anything else → customers.customer_id."""
+    if customer_id is None or customer_id == "":
+        return None, None
+    if isinstance(customer_id, int) or str(customer_id).isdigit():
+        return int(customer_id), None
+    return None, str(customer_id)
+
+
+def _chunk_params(orders: list[dict]) -> dict:
+    params = {k: [] for k in ("o_ord", "o_ext", "o_cust", "o_cust_ref", "o_total",
+                              "i_ord", "i_line", "i_sku", "i_pid", "i_qty", "i_price")}
+    for ord_no, order in enumerate(orders):
+        items = order.get("items") or []
+        if not items:
+            raise ValueError(f"Order {order.get('external_id') or ord_no} has no items")
+        cust, cust_ref = _customer_params(order.get("customer_id"))
+        total = order.get("total_amount")
+        params["o_ord"].append(ord_no)
+        params["o_ext"].append(order["external_id"])
+        params["o_cust"].append(cust)
+        params["o_cust_ref"].append(cust_ref)
+        params["o_total"].append(int(total) if total is not None else None)
+        for line_no, it in enumerate(items):
+            qty = int(it.get("quantity", 1))
+            if qty <= 0:
+                raise ValueError(f"Item quantity must be positive: {it}")
+            price = it.get("unit_price")
+            pid = it.get("product_id")
+            params["i_ord"].append(ord_no)
+            params["i_line"].append(line_no)
+            params["i_sku"].append(it["sku"])
+            params["i_pid"].append(int(pid) if pid is not None else None)
+            params["i_qty"].append(qty)
+            params["i_price"].append(int(price) if price is not None else None)
+    return params
+
+
+def _reserve_new_orders(db: Session, rows) -> dict[str, list]:
+    """Hold stock for every catalogue line of the new orders; returns {external_id: missing} for those that can't be."""
+    lines: dict[str, list[tuple[int, int]]] = {}
+    for ext, pid, qty in db.execute(_ORDER_LINES_SQL, {"ids": [r.id for r in rows]}):
+        lines.setdefault(ext, []).append((pid, int(qty)))
+    return reserve_orders(lines, db) if lines else {}
+
+
+def create_orders_bulk(orders: list[dict], session: Optional[Session] = None,
+                       chunk_size: int = BULK_CHUNK_SIZE) -> dict:
+    """
+    Create many orders with their line items — one statement per `chunk_size` orders.
+
+    orders: list of {external_id?, customer_id, items: [{sku, quantity, product_id?, unit_price?}], total_amount?}
+      - external_id defaults to a generated ORD-xxxxxxxx
+      - total_amount defaults to sum(quantity * unit_price)
+    Orders whose external_id already exists are skipped, so an import can be re-run.
+    Stock for catalogue items is held in the same transaction (see inventory_service);
+    an order that can't be fully held is not created and is listed under "rejected".
+
+    Returns {"created": [{order_id, db_id, customer_id, total_amount, item_count}], "skipped": [external_id],
+             "rejected": [{order_id, missing}]}.
+    """
+    orders = [{**o, "external_id": o.get("external_id") or _new_external_id()} for o in orders]
+    seen = set()
+    for o in orders:
+        if o["external_id"] in seen:
+            raise ValueError(f"Duplicate external_id in batch: {o['external_id']}")
+        seen.add(o["external_id"])
+
+    # every item of an inserted order is inserted with it
+    item_counts = {o["external_id"]: len(o.get("items") or []) for o in orders}
+    created, rejected = [], {}
+    with session_scope(session) as db:
+        for start in range(0, len(orders), chunk_size):
+            rows = db.execute(_CREATE_ORDERS_SQL, _chunk_params(orders[start:start + chunk_size])).all()
+            short = _reserve_new_orders(db, rows) if rows else {}
+            if short:
+                db.execute(text("DELETE FROM orders WHERE external_id = ANY(CAST(:ext AS VARCHAR[]))"),
+                           {"ext": list(short)})
+                rows = [r for r in rows if r.external_id not in short]
+                rejected.update(short)
+            order_cache.stage(db, *rows)
+            created.extend(
+                {"order_id": r.external_id, "db_id": r.id, "customer_id": r.customer_id,
+                 "total_amount": r.total_amount, "item_count": item_counts[r.external_id]}
+                for r in rows
+            )
+
+    created_ids = {c["order_id"] for c in created}
+    skipped = [o["external_id"] for o in orders
+               if o["external_id"] not in created_ids and o["external_id"] not in rejected]
+    if skipped:
+        logger.info(f"⚠️ Skipped {len(skipped)} order(s) that already exist")
+    if rejected:
+        logger.info(f"⚠️ Rejected {len(rejected)} order(s) for insufficient stock")
+    return {"created": created, "skipped": skipped,
+            "rejected": [{"order_id": ext, "missing": missing} for ext, missing in rejected.items()]}
+
+
+def create_order(customer_id, items: list[dict], total_amount: Optional[int] = None,
+                 external_id: Optional[str] = None, session: Optional[Session] = None) -> dict:
+    """
+    Insert one order and all of its items in a single round trip, holding their stock.
+    items: list of {sku, quantity, product_id?, unit_price?}
+    Raises InsufficientStock if a catalogue item can't be held (nothing is created).
+    """
+    result = create_orders_bulk(
+        [{"external_id": external_id, "customer_id": customer_id, "items": items, "total_amount": total_amount}],
+        session=session,
+    )
+    if result["rejected"]:
+        raise InsufficientStock(result["rejected"][0]["order_id"], result["rejected"][0]["missing"])
+    if not result["created"]:
+        raise ValueError(f"Order {result['skipped'][0]} already exists")
+    return result["created"][0]
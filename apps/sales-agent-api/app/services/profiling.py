@@ -0,0 +1,245 @@
+# app/services/profiling.py
+"""
+On-demand wall-clock profiling of single /v1/chat requests.
+
+A request is profiled when it carries a valid signed header
+    X-Profile: <expires_unix>.<hex HMAC-SHA256(PROFILE_SECRET, "profile:<expires_unix>")>
+(`python -m app.services.profiling sign --ttl 600` prints one), or when
+POST /v1/admin/profile armed the next N /v1/chat requests. Without
+PROFILE_SECRET both are off. Other requests only pay the header lookup.
+
+While a profiled request runs, a sampler thread looks at it every
+PROFILE_INTERVAL_MS (5):
+- its task running on the event loop: the loop thread's real stack;
+- its task suspended: the coroutine chain it is awaiting in, ending in an
+  "[await ...]" frame, so time spent waiting on Gemini/Redis/Postgres shows;
+- work it handed to executor threads (wrapped with follow(), as tool_router
+  does): that thread's stack, under the await chain that is waiting for it.
+Samples go to PROFILE_DIR/<time>-<label>.folded in the collapsed-stack format
+("frame;frame;frame count") read by flamegraph.pl, inferno and speedscope.
+"""
+import os
+import sys
+import time
+import hmac
+import asyncio
+import hashlib
+import functools
+import logging
+import argparse
+import threading
+import contextlib
+import contextvars
+from collections import Counter
+from typing import Optional
+
+logger = logging.getLogger("profiling")
+
+HEADER = "x-profile"
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+INTERVAL_SECONDS = float(os.getenv("PROFILE_INTERVAL_MS", "5")) / 1000
+
+_armed = 0  # /v1/chat requests left to profile (admin endpoint)
+_active: contextvars.ContextVar[Optional["RequestProfile"]] = contextvars.ContextVar("profile", default=None)
+_profiles: set = set()
+_lock = threading.Lock()
+_sampler: Optional[threading.Thread] = None
+
+
+def _secret() -> Optional[bytes]:
+    secret = os.getenv("PROFILE_SECRET")
+    return secret.encode() if secret else None
+
+
+def sign(expires: int, secret: Optional[bytes] = None) -> str:
+    secret = secret or _secret()
+    if not secret:
+        raise RuntimeError("PROFILE_SECRET is not set")
+    return f"{expires}.{hmac.new(secret, f'profile:{expires}'.encode(), hashlib.sha256).hexdigest()}"
+
+
+def verify(token: str) -> bool:
+    secret = _secret()
+    if not secret or "." not in token:
+        return False
+    expires, _ = token.split(".", 1)
+    if not expires.isdigit() or int(expires) < time.time():
+        return False
+    return hmac.compare_digest(sign(int(expires), secret), token)
+
+
+def check_admin(token: Optional[str]) -> bool:
+    secret = _secret()
+    return bool(secret and token and hmac.compare_digest(secret, token.encode()))
+
+
+def arm(requests: int) -> int:
+    global _armed
+    _armed = max(0, requests)
+    return _armed
+
+
+def armed() -> int:
+    return _armed
+
+
+def requested(headers) -> bool:
+    """Should this request be profiled? Consumes one armed request."""
+    global _armed
+    if _armed:
+        _armed -= 1
+        return True
+    token = headers.get(HEADER)
+    return token is not None and verify(token)
+
+
+# ----- Sampling -----
+def _label(code) -> str:
+    path = code.co_filename.replace("\\", "/").rsplit("/", 2)
+    return f"{code.co_name} ({'/'.join(path[-2:])}:{code.co_firstlineno})"
+
+
+def _thread_stack(frame) -> list:
+    """A thread's frames, outermost first."""
+    stack = []
+    while frame is not None:
+        stack.append(frame)
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+def _await_chain(coro) -> tuple[list, Optional[str]]:
+    """Frames of a suspended coroutine chain (outermost first) and what the innermost one awaits."""
+    frames, awaited = [], None
+    while coro is not None:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None)
+        if frame is None:
+            break
+        frames.append(frame)
+        nxt = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None)
+        if nxt is not None and not (hasattr(nxt, "cr_frame") or hasattr(nxt, "gi_frame")):
+            awaited = type(nxt).__name__.replace("FutureIter", "Future")  # the C Future's __await__ iterator
+            break
+        coro = nxt
+    return frames, awaited
+
+
+class RequestProfile:
+    def __init__(self, label: str, task: asyncio.Task, root_code=None):
+        self.label = label
+        self.task = task
+        # stacks start at this function (the route), not at the server/middleware frames under it
+        self.root = _label(root_code) if root_code is not None else None
+        self.loop = task.get_loop()
+        self.loop_thread = threading.get_ident()
+        self.threads: set = set()  # executor threads working for this request
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.started = time.perf_counter()
+        self.path: Optional[str] = None
+
+    def sample(self, frames: dict):
+        if self.task.done():
+            return
+        if asyncio.current_task(self.loop) is self.task and self.loop_thread in frames:
+            self._add([_label(f.f_code) for f in _thread_stack(frames[self.loop_thread])])
+            return
+
+        chain, awaited = _await_chain(self.task.get_coro())
+        prefix = [_label(f.f_code) for f in chain]
+        workers = [t for t in list(self.threads) if t in frames]
+        if workers:
+            for t in workers:
+                self._add(prefix + ["[thread]"] + [_label(f.f_code) for f in _thread_stack(frames[t])
+                                                   if f.f_code is not _run_followed.__code__])
+        else:
+            self._add(prefix + [f"[await {awaited or '?'}]"])
+
+    def _add(self, stack: list):
+        if self.root in stack:
+            stack = stack[stack.index(self.root):]
+        self.samples += 1
+        self.stacks[";".join(s.replace(";", ":") for s in stack)] += 1
+
+    def write(self) -> str:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{self.label}-{os.urandom(3).hex()}.folded"
+        self.path = os.path.join(PROFILE_DIR, name)
+        with open(self.path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        return self.path
+
+
+def _sample_loop():
+    global _sampler
+    while True:
+        with _lock:
+            if not _profiles:
+                _sampler = None
+                return
+            profiles = list(_profiles)
+        frames = sys._current_frames()
+        for profile in profiles:
+            try:
+                profile.sample(frames)
+            except Exception as e:  # a frame vanished mid-walk; skip the tick
+                logger.debug(f"Profile sample skipped: {e}")
+        del frames
+        time.sleep(INTERVAL_SECONDS)
+
+
+@contextlib.contextmanager
+def profile_request(label: str):
+    """Sample the current task (and the threads it hands work to) until the block exits; yields the profile."""
+    global _sampler
+    caller = sys._getframe(1)
+    while caller is not None and caller.f_code.co_filename == contextlib.__file__:
+        caller = caller.f_back
+    profile = RequestProfile(label, asyncio.current_task(), caller.f_code if caller is not None else None)
+    token = _active.set(profile)
+    with _lock:
+        _profiles.add(profile)
+        if _sampler is None:
+            _sampler = threading.Thread(target=_sample_loop, name="request-profiler", daemon=True)
+            _sampler.start()
+    try:
+        yield profile
+    finally:
+        _active.reset(token)
+        with _lock:
+            _profiles.discard(profile)
+        elapsed_ms = (time.perf_counter() - profile.started) * 1000
+        path = profile.write()
+        logger.info(f"🔬 Profiled {label} ({elapsed_ms:.0f}ms, {profile.samples} samples) → {path}")
+
+
+def _run_followed(profile: RequestProfile, func, *args, **kwargs):
+    ident = threading.get_ident()
+    profile.threads.add(ident)
+    try:
+        return func(*args, **kwargs)
+    finally:
+        profile.threads.discard(ident)
+
+
+def follow(func):
+    """func, or when the current request is profiled, func sampled on the executor thread it runs on."""
+    profile = _active.get()
+    if profile is None:
+        return func
+    return functools.partial(_run_followed, profile, func)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sign an X-Profile header value (needs PROFILE_SECRET).")
+    sub = parser.add_subparsers(dest="command", required=True)
+    signer = sub.add_parser("sign")
+    signer.add_argument("--ttl", type=int, default=600, help="seconds the header stays valid")
+    args = parser.parse_args()
+    print(sign(int(time.time()) + args.ttl))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,11 @@
 # app/services/recommend_service.py
 from sqlalchemy.orm import Session
 from app.models.product import Product
-from app.services.db import get_db_session
+from app.services.db import get_read_session
 
 def recommend_products(query: str, budget: int):
     """Fetch matching products based on query and budget."""
-    session: Session = get_db_session()
+    session: Session = get_read_session()
     
     try:
         results = (
@@ -1,9 +1,9 @@
 # app/services/seed_data.py
 from app.models.product import Product
-from app.services.db import Base, engine, SessionLocal
+from app.services.db import Base, get_engine, SessionLocal
 
 def seed_products():
-    Base.metadata.create_all(bind=engine)
+    Base.metadata.create_all(bind=get_engine())
     db = SessionLocal()
 
     if db.query(Product).count() > 0:
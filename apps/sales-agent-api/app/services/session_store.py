@@ -129,3 +129,52 @@ def get_session_store() -> Optional[SessionStore]:
     May return None if create_session_store hasn't been run yet.
     """
     return session_store
+
+# ----- Blocking client for sync agents running in worker threads -----
+_sync_client = None
+
+def get_sync_client():
+    """
+    Shared redis-py blocking client (lazy). Returns None when redis-py isn't installed.
+    Short socket timeouts keep a Redis outage from stalling the caller; treat it as a cache.
+    """
+    global _sync_client
+    if _sync_client is None:
+        try:
+            import redis
+        except Exception:
+            return None
+        url = os.getenv("REDIS_URL") or os.getenv("REDIS", "redis://localhost:6379/0")
+        _sync_client = redis.Redis.from_url(url, decode_responses=True,
+                                            socket_timeout=0.25, socket_connect_timeout=0.25)
+    return _sync_client
+
+def set_sync_client(client) -> None:
+    """Install a blocking client (e.g. a local Redis stand-in) or None to reconnect lazily."""
+    global _sync_client
+    _sync_client = client
+
+# ----- Non-blocking client for async agents -----
+_async_client = None
+_async_client_loop = None
+
+def get_async_client():
+    """
+    Shared redis.asyncio client for the running event loop (lazy, same short timeouts
+    as get_sync_client). Returns None when redis.asyncio isn't available.
+    """
+    global _async_client, _async_client_loop
+    loop = asyncio.get_running_loop()
+    if _async_client is None or (_async_client_loop is not None and _async_client_loop is not loop):
+        if REDIS_CLIENT_NAME != "redis.asyncio":
+            return None
+        url = os.getenv("REDIS_URL") or os.getenv("REDIS", "redis://localhost:6379/0")
+        _async_client = redis_client.Redis.from_url(url, decode_responses=True,
+                                                    socket_timeout=0.25, socket_connect_timeout=0.25)
+        _async_client_loop = loop
+    return _async_client
+
+def set_async_client(client) -> None:
+    """Install an async client (e.g. a local Redis stand-in, used from any loop) or None to reconnect lazily."""
+    global _async_client, _async_client_loop
+    _async_client, _async_client_loop = client, None
@@ -0,0 +1,139 @@
+# app/services/sql_metrics.py
+"""
+Per-statement SQL timing, attributed to the chat turn and tool running it.
+
+Every engine built by db.build_engine / build_async_engine is instrumented
+(SQL_METRICS=0 turns it off). For each statement:
+- the time is added to the current tool call's DbStats (orchestrator opens
+  tool_call() around each tool; metrics_tracker keeps the per-tool averages);
+- over SLOW_QUERY_MS it is logged to the "slow_sql" logger with its parameters
+  redacted to their types;
+- the same statement text run N_PLUS_ONE_THRESHOLD times in one turn (turn())
+  is logged once as a suspected N+1 and counted on the tool call.
+Attribution rides on contextvars, so it follows the turn into worker threads
+(asyncio.to_thread) and the async engine's greenlets.
+"""
+import os
+import time
+import logging
+import contextvars
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Optional
+
+logger = logging.getLogger("sql_metrics")
+slow_logger = logging.getLogger("slow_sql")
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "5"))
+
+
+class DbStats:
+    """Statements and DB time of one tool call."""
+
+    __slots__ = ("tool", "statements", "db_time", "n_plus_one")
+
+    def __init__(self, tool: Optional[str] = None):
+        self.tool = tool
+        self.statements = 0
+        self.db_time = 0.0
+        self.n_plus_one = 0
+
+
+class TurnStats:
+    """Statement repeats across one chat turn (N+1 detection)."""
+
+    def __init__(self, session_id: Optional[str] = None):
+        self.session_id = session_id
+        self.repeats: Counter = Counter()
+        self.flagged: set = set()
+
+
+_turn: contextvars.ContextVar[Optional[TurnStats]] = contextvars.ContextVar("sql_turn", default=None)
+_call: contextvars.ContextVar[Optional[DbStats]] = contextvars.ContextVar("sql_tool_call", default=None)
+
+
+@contextmanager
+def turn(session_id: Optional[str] = None):
+    token = _turn.set(TurnStats(session_id))
+    try:
+        yield
+    finally:
+        _turn.reset(token)
+
+
+@contextmanager
+def tool_call(tool: str):
+    """Collect the statements of one tool call; yields its DbStats."""
+    stats = DbStats(tool)
+    token = _call.set(stats)
+    try:
+        yield stats
+    finally:
+        _call.reset(token)
+
+
+def redact(parameters: Any) -> Any:
+    """Parameters with every value replaced by its type name (same shape)."""
+    if isinstance(parameters, dict):
+        return {k: redact(v) for k, v in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        if parameters and all(isinstance(p, (dict, list, tuple)) for p in parameters):
+            return [redact(p) for p in parameters[:3]] + ([f"... {len(parameters) - 3} more"] if len(parameters) > 3 else [])
+        return [redact(v) for v in parameters]
+    return None if parameters is None else f"<{type(parameters).__name__}>"
+
+
+def _compact(statement: str) -> str:
+    return " ".join(statement.split())
+
+
+def _before(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("sql_started", []).append(time.perf_counter())
+
+
+def _after(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get("sql_started")
+    if not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    call, current = _call.get(), _turn.get()
+    if call is not None:
+        call.statements += 1
+        call.db_time += elapsed
+
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        slow_logger.warning(
+            f"🐢 Slow query {elapsed * 1000:.1f}ms [tool={call.tool if call else None} "
+            f"session={current.session_id if current else None}]: {_compact(statement)[:2000]} "
+            f"params={redact(parameters)}"
+        )
+
+    if current is not None:
+        key = (call.tool if call else None, statement)
+        current.repeats[key] += 1
+        if current.repeats[key] >= N_PLUS_ONE_THRESHOLD and key not in current.flagged:
+            current.flagged.add(key)
+            if call is not None:
+                call.n_plus_one += 1
+            logger.warning(
+                f"🔁 Possible N+1 [tool={key[0]} session={current.session_id}]: statement ran "
+                f"{current.repeats[key]}x this turn: {_compact(statement)[:500]}"
+            )
+
+
+def _error(exception_context):
+    conn = exception_context.connection
+    started = conn.info.get("sql_started") if conn is not None else None
+    if started:
+        started.pop()
+
+
+def instrument(engine) -> None:
+    """Time every statement on this (sync) engine; for an AsyncEngine pass engine.sync_engine."""
+    if os.getenv("SQL_METRICS", "1") != "1":
+        return
+    from sqlalchemy import event
+    event.listen(engine, "before_cursor_execute", _before)
+    event.listen(engine, "after_cursor_execute", _after)
+    event.listen(engine, "handle_error", _error)
@@ -0,0 +1,270 @@
+# app/services/store_locator.py
+"""
+Nearest-in-stock-store lookups for shipping ETAs.
+
+Store coordinates are loaded once into an in-memory KD-tree (points on the unit
+sphere, so straight-line distance orders stores exactly like great-circle
+distance). A query only visits the branches that can still beat the current
+best, instead of scanning every store.
+"""
+import os
+import math
+import time
+import heapq
+import asyncio
+import logging
+import threading
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+logger = logging.getLogger("store_locator")
+
+EARTH_RADIUS_KM = 6371.0
+# ETA model: handling time + one day per KM_PER_DAY travelled (rounded up)
+HANDLING_DAYS = int(os.getenv("SHIP_HANDLING_DAYS", "1"))
+KM_PER_DAY = float(os.getenv("SHIP_KM_PER_DAY", "400"))
+DEFAULT_ETA_DAYS = int(os.getenv("SHIP_DEFAULT_ETA_DAYS", "2"))
+STORE_INDEX_TTL_SECONDS = float(os.getenv("STORE_INDEX_TTL_SECONDS", "300"))
+
+# Below this many candidate stores a direct distance check beats walking the tree
+_BRUTE_FORCE_MAX = 48
+
+Point = Tuple[float, float, float]
+
+
+def _to_unit(lat: float, lon: float) -> Point:
+    la, lo = math.radians(lat), math.radians(lon)
+    c = math.cos(la)
+    return (c * math.cos(lo), c * math.sin(lo), math.sin(la))
+
+
+def _chord2_to_km(chord2: float) -> float:
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(chord2) / 2))
+
+
+def eta_days_for_distance(distance_km: float) -> int:
+    return HANDLING_DAYS + math.ceil(distance_km / KM_PER_DAY)
+
+
+class StoreIndex:
+    """Static KD-tree over store locations."""
+
+    def __init__(self, stores: Iterable[Tuple[str, float, float]]):
+        self.codes: List[str] = []
+        self.points: List[Point] = []
+        self.coords: Dict[str, Tuple[float, float]] = {}
+        for code, lat, lon in stores:
+            self.codes.append(code)
+            self.points.append(_to_unit(lat, lon))
+            self.coords[code] = (lat, lon)
+        self._slot = {code: i for i, code in enumerate(self.codes)}
+        # node = (point index, split axis, left, right)
+        self._root = self._build(list(range(len(self.points))))
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def _build(self, idxs: List[int]):
+        if not idxs:
+            return None
+        pts = self.points
+        spreads = [max(pts[i][a] for i in idxs) - min(pts[i][a] for i in idxs) for a in range(3)]
+        axis = spreads.index(max(spreads))
+        idxs.sort(key=lambda i: pts[i][axis])
+        mid = len(idxs) // 2
+        return (idxs[mid], axis, self._build(idxs[:mid]), self._build(idxs[mid + 1:]))
+
+    def nearest(self, lat: float, lon: float, k: int = 1,
+                allowed: Optional[Set[str]] = None) -> List[Tuple[float, str]]:
+        """k nearest stores as [(distance_km, code)], optionally restricted to `allowed` codes."""
+        q = _to_unit(lat, lon)
+        if allowed is not None and len(allowed) <= _BRUTE_FORCE_MAX:
+            scored = []
+            for code in allowed:
+                i = self._slot.get(code)
+                if i is not None:
+                    p = self.points[i]
+                    scored.append(((p[0] - q[0]) ** 2 + (p[1] - q[1]) ** 2 + (p[2] - q[2]) ** 2, code))
+            return [(_chord2_to_km(d2), code) for d2, code in heapq.nsmallest(k, scored)]
+
+        best: List[Tuple[float, int]] = []  # max-heap of (-dist2, idx)
+        pts, codes = self.points, self.codes
+
+        def visit(node):
+            if node is None:
+                return
+            i, axis, left, right = node
+            p = pts[i]
+            if allowed is None or codes[i] in allowed:
+                d2 = (p[0] - q[0]) ** 2 + (p[1] - q[1]) ** 2 + (p[2] - q[2]) ** 2
+                if len(best) < k:
+                    heapq.heappush(best, (-d2, i))
+                elif d2 < -best[0][0]:
+                    heapq.heapreplace(best, (-d2, i))
+            diff = q[axis] - p[axis]
+            near, far = (left, right) if diff < 0 else (right, left)
+            visit(near)
+            if len(best) < k or diff * diff < -best[0][0]:
+                visit(far)
+
+        visit(self._root)
+        return [(_chord2_to_km(-nd2), codes[i]) for nd2, i in sorted(best, reverse=True)]
+
+
+# ----- Shared index (loaded lazily from the stores table) -----
+_index: Optional[StoreIndex] = None
+_index_loaded_at = 0.0
+_index_lock = threading.Lock()
+
+
+def load_store_index() -> StoreIndex:
+    from sqlalchemy import text
+    from app.services.db import run_read
+    rows = run_read(lambda db: db.execute(text("SELECT code, latitude, longitude FROM stores")).all())
+    return StoreIndex((r.code, r.latitude, r.longitude) for r in rows)
+
+
+def get_store_index() -> StoreIndex:
+    """Process-wide index, rebuilt at most every STORE_INDEX_TTL_SECONDS."""
+    global _index, _index_loaded_at
+    if _index is not None and time.monotonic() - _index_loaded_at < STORE_INDEX_TTL_SECONDS:
+        return _index
+    with _index_lock:
+        if _index is None or time.monotonic() - _index_loaded_at >= STORE_INDEX_TTL_SECONDS:
+            started = time.perf_counter()
+            _index = load_store_index()
+            _index_loaded_at = time.monotonic()
+            logger.info(f"📍 Store index built: {len(_index)} stores in {time.perf_counter() - started:.3f}s")
+    return _index
+
+
+async def get_store_index_async() -> StoreIndex:
+    """get_store_index for async callers: a (re)build runs in a worker thread, the cached index doesn't."""
+    if _index is not None and time.monotonic() - _index_loaded_at < STORE_INDEX_TTL_SECONDS:
+        return _index
+    return await asyncio.to_thread(get_store_index)
+
+
+def set_store_index(index: Optional[StoreIndex]):
+    """Install a prebuilt index (tests/benchmarks) or None to force a reload."""
+    global _index, _index_loaded_at
+    _index, _index_loaded_at = index, time.monotonic()
+
+
+def resolve_location(location: Optional[str], index: StoreIndex) -> Optional[Tuple[float, float]]:
+    """Accept "lat,lon" or a store code; None when the location can't be placed."""
+    if not location:
+        return None
+    if location in index.coords:
+        return index.coords[location]
+    try:
+        lat_s, lon_s = location.split(",")
+        lat, lon = float(lat_s), float(lon_s)
+    except ValueError:
+        return None
+    if -90 <= lat <= 90 and -180 <= lon <= 180:
+        return lat, lon
+    return None
+
+
+def estimate_eta(stock_by_sku: Dict[str, Dict[str, int]], needed: Dict[str, int],
+                 origin: Tuple[float, float], index: StoreIndex) -> Optional[dict]:
+    """
+    stock_by_sku: {sku: {store_code: qty}}, needed: {sku: qty}.
+    Prefer the nearest store that can ship the whole basket; otherwise ship each SKU
+    from its own nearest stocked store and quote the slowest leg.
+    """
+    lat, lon = origin
+    candidates: Dict[str, Set[str]] = {
+        sku: {code for code, qty in stock_by_sku.get(sku, {}).items() if qty >= n}
+        for sku, n in needed.items()
+    }
+    if any(not stores for stores in candidates.values()):
+        return None
+
+    whole_basket = set.intersection(*candidates.values()) if candidates else set()
+    if whole_basket:
+        hit = index.nearest(lat, lon, allowed=whole_basket)
+        if hit:
+            km, code = hit[0]
+            return {"ship_eta_days": eta_days_for_distance(km), "split_shipment": False,
+                    "ship_from": [{"store_id": code, "distance_km": round(km, 1), "skus": sorted(needed)}]}
+
+    legs = []
+    for sku, stores in candidates.items():
+        hit = index.nearest(lat, lon, allowed=stores)
+        if not hit:
+            return None
+        km, code = hit[0]
+        legs.append({"store_id": code, "distance_km": round(km, 1), "skus": [sku]})
+    slowest = max(leg["distance_km"] for leg in legs)
+    return {"ship_eta_days": eta_days_for_distance(slowest), "split_shipment": len({l["store_id"] for l in legs}) > 1,
+            "ship_from": legs}
+
+
+def _store_stock_stmt():
+    from sqlalchemy import text, bindparam
+    return text(
+        """
+        SELECT p.sku, i.location, i.quantity
+          FROM inventory i
+          JOIN products p ON p.id = i.product_id
+         WHERE p.sku IN :skus AND i.quantity > 0
+        """
+    ).bindparams(bindparam("skus", expanding=True))
+
+
+def _group_stock(rows) -> Dict[str, Dict[str, int]]:
+    stock: Dict[str, Dict[str, int]] = {}
+    for r in rows:
+        stock.setdefault(r.sku, {})[r.location] = r.quantity
+    return stock
+
+
+def fetch_store_stock(db, skus: Sequence[str]) -> Dict[str, Dict[str, int]]:
+    """Per-store on-hand quantities for the given SKUs, in one query."""
+    return _group_stock(db.execute(_store_stock_stmt(), {"skus": list(skus)}))
+
+
+async def fetch_store_stock_async(db, skus: Sequence[str]) -> Dict[str, Dict[str, int]]:
+    """fetch_store_stock on an AsyncSession."""
+    return _group_stock(await db.execute(_store_stock_stmt(), {"skus": list(skus)}))
+
+
+def basket_eta_sync(skus: List[str], location: Optional[str] = None) -> dict:
+    """Ship ETA for a multi-SKU basket (each SKU counts as one unit unless repeated)."""
+    from app.services.db import run_read
+    needed: Dict[str, int] = {}
+    for sku in skus:
+        needed[sku] = needed.get(sku, 0) + 1
+
+    index = get_store_index()
+    origin = resolve_location(location, index)
+    if origin is None or not len(index):
+        return {"skus": sorted(needed), "ship_eta_days": DEFAULT_ETA_DAYS, "eta_source": "default"}
+
+    stock = run_read(lambda db: fetch_store_stock(db, list(needed)))
+    return _basket_result(stock, needed, origin, index)
+
+
+async def basket_eta_async(skus: List[str], location: Optional[str] = None) -> dict:
+    """basket_eta_sync on the async engine (the turn's shared session when there is one)."""
+    from app.services.db import read_session
+    needed: Dict[str, int] = {}
+    for sku in skus:
+        needed[sku] = needed.get(sku, 0) + 1
+
+    index = await get_store_index_async()
+    origin = resolve_location(location, index)
+    if origin is None or not len(index):
+        return {"skus": sorted(needed), "ship_eta_days": DEFAULT_ETA_DAYS, "eta_source": "default"}
+
+    async with read_session() as db:
+        stock = await fetch_store_stock_async(db, list(needed))
+    return _basket_result(stock, needed, origin, index)
+
+
+def _basket_result(stock, needed: Dict[str, int], origin, index: StoreIndex) -> dict:
+    est = estimate_eta(stock, needed, origin, index)
+    if est is None:
+        return {"skus": sorted(needed), "ship_eta_days": None, "eta_source": "out_of_stock"}
+    return {"skus": sorted(needed), **est, "eta_source": "nearest_store"}
@@ -1,98 +1,168 @@
 # apps/sales-agent-api/app/services/telegram_bot.py
 
+import os
+import asyncio
 import logging
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 import httpx
-from fastapi import APIRouter, Request, BackgroundTasks
+from fastapi import APIRouter, Request
+from app.services.chat_service import run_chat_turn
+from app.services.telegram_dedup import get_deduplicator
+from app.services.telegram_outbox import TelegramOutbox, outbox_from_env
+from app.services.tracing import span
 
 logger = logging.getLogger("telegram_bot")
 router = APIRouter()
 
-# --- Hardcoded bot token (remove before pushing to GitHub) ---
-TELEGRAM_BOT_TOKEN = "8594984778:AAHLlVKiwOVwxHJPZaMXvA_gjl7ueO8Q3kU"
-TELEGRAM_API_BASE = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}"
+# --- Bot token: TELEGRAM_BOT_TOKEN from the environment only; without it nothing is sent or polled ---
+TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
+# TELEGRAM_API_URL points the bot at a local Telegram stand-in
+TELEGRAM_API_BASE: Optional[str] = (
+    f"{os.getenv('TELEGRAM_API_URL', 'https://api.telegram.org')}/bot{TELEGRAM_BOT_TOKEN}"
+    if TELEGRAM_BOT_TOKEN else None
+)
 
+# ----- Pooled client for the Bot API -----
+_client: Optional[httpx.AsyncClient] = None
+_client_loop = None
 
-async def _send_message(chat_id: int, text: str) -> Dict[str, Any]:
-    """Send a text message to telegram (async)."""
-    url = f"{TELEGRAM_API_BASE}/sendMessage"
-    payload = {"chat_id": chat_id, "text": text, "parse_mode": "HTML"}
-    async with httpx.AsyncClient(timeout=10.0) as client:
-        resp = await client.post(url, json=payload)
-        try:
-            return resp.json()
-        except Exception:
-            return {"ok": False, "status_code": resp.status_code, "text": resp.text}
 
+def get_client() -> httpx.AsyncClient:
+    """Shared keep-alive client for the running event loop (lazy), so replies reuse connections."""
+    global _client, _client_loop
+    loop = asyncio.get_running_loop()
+    if _client is None or (_client_loop is not None and _client_loop is not loop):
+        size = int(os.getenv("TELEGRAM_MAX_CONNECTIONS", "20"))
+        _client = httpx.AsyncClient(timeout=10.0, limits=httpx.Limits(max_connections=size,
+                                                                     max_keepalive_connections=size))
+        _client_loop = loop
+    return _client
 
-@router.post("/v1/telegram/webhook")
-async def telegram_webhook(request: Request, background: BackgroundTasks):
-    """
-    Telegram webhook endpoint. Telegram will POST updates here.
-    We extract message.text and chat.id then forward to internal /v1/chat endpoint.
-    Finally we send the assistant reply back to the Telegram chat asynchronously (BackgroundTasks).
-    """
-    body = await request.json()
-    logger.debug("Telegram update: %s", body)
 
-    # Telegram sends either "message" or "edited_message"
-    message = body.get("message") or body.get("edited_message")
-    if not message:
-        return {"ok": True}
+def set_client(client: Optional[httpx.AsyncClient]) -> None:
+    """Install a client (e.g. one wired to a local Telegram stand-in) or None to reconnect lazily."""
+    global _client, _client_loop
+    _client, _client_loop = client, None
 
-    chat = message.get("chat", {})
-    chat_id = chat.get("id")
-    text = message.get("text", "") or message.get("caption", "")
-    if not text or chat_id is None:
-        return {"ok": True}
 
-    # Build payload for internal chat endpoint
-    internal_payload = {
-        "channel": "telegram",
-        "text": text,
-        "customer_id": f"tg-{chat_id}",
-    }
+# ----- Rate-limited outbound queue -----
+_outbox: Optional[TelegramOutbox] = None
+_outbox_loop = None
 
-    # Call internal orchestrator endpoint
-    try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            resp = await client.post("http://localhost:8000/v1/chat", json=internal_payload)
-            resp.raise_for_status()
-            data = resp.json()
-    except Exception as e:
-        logger.exception("Error calling internal /v1/chat: %s", e)
-        background.add_task(_send_message, chat_id, "⚠️ Sorry, something went wrong on the server.")
-        return {"ok": False}
+
+async def get_outbox() -> TelegramOutbox:
+    """The running loop's outbox, started on first use (settings from TELEGRAM_* env vars)."""
+    global _outbox, _outbox_loop
+    loop = asyncio.get_running_loop()
+    if _outbox is None or _outbox_loop is not loop:
+        _outbox = outbox_from_env(TELEGRAM_API_BASE, get_client)
+        _outbox_loop = loop
+        await _outbox.start()
+    return _outbox
+
+
+async def _send_message(chat_id: int, text: str) -> int:
+    """Queue a text message to telegram; returns the number of parts it was split into (0 without a bot token)."""
+    if TELEGRAM_API_BASE is None:
+        logger.warning(f"⚠️ TELEGRAM_BOT_TOKEN is not set; not sending the reply to chat {chat_id}")
+        return 0
+    return (await get_outbox()).send(chat_id, text, parse_mode="HTML")
+
+
+def outbox_stats() -> Optional[dict]:
+    """Delivery counters of the outbox (None until the first reply was queued)."""
+    return _outbox.stats() if _outbox is not None else None
+
+
+async def close() -> None:
+    """Deliver what's queued, then close the outbox and the shared client (app shutdown)."""
+    global _client, _client_loop, _outbox, _outbox_loop
+    if _outbox is not None and _outbox_loop is asyncio.get_running_loop():
+        await _outbox.stop()
+    _outbox, _outbox_loop = None, None
+    if _client is not None:
+        await _client.aclose()
+    _client, _client_loop = None, None
+
+
+def format_reply(data: Dict[str, Any]) -> str:
+    """Telegram message (HTML) for a chat turn result: the reply plus tool results and product details."""
+    actions = data.get("actions") or {}
 
     # --- Smarter reply handling ---
-    reply = data.get("actions", {}).get("reply") or data.get("reply_text")
-    if not reply or reply.strip().lower() in ["", "sorry, i didn't understand that.", "sorry, i couldn't process that."]:
+    reply = data.get("reply") or ""
+    if reply.strip().lower() in ["", "sorry, i didn't understand that.", "sorry, i couldn't process that."]:
         reply = ""
 
     # --- Handle tool results & product details ---
-    tool_results = data.get("actions", {}).get("tool_results") or []
+    tool_results = actions.get("tool_results") or []
     extra_lines = []
 
-    if tool_results:
-        for t in tool_results:
-            if t.get("result") and t["result"].get("message"):
-                extra_lines.append(f"🛠 {t['tool']}: {t['result']['message']}")
+    for t in tool_results:
+        if t.get("result") and t["result"].get("message"):
+            extra_lines.append(f"🛠 {t['tool']}: {t['result']['message']}")
 
-                # If tool returns product items, show their details neatly
-                items = t["result"].get("items", [])
-                if items:
-                    for item in items[:3]:  # Show max 3 products
-                        extra_lines.append(f"🛍️ <b>{item['name']}</b> — ₹{item['price']}")
-            elif t.get("error"):
-                extra_lines.append(f"⚠️ {t['tool']} failed: {t['error']}")
+            # If tool returns product items, show their details neatly
+            items = t["result"].get("items", [])
+            for item in items[:3]:  # Show max 3 products
+                extra_lines.append(f"🛍️ <b>{item['name']}</b> — ₹{item['price']}")
+        elif t.get("error"):
+            extra_lines.append(f"⚠️ {t['tool']} failed: {t['error']}")
 
     # --- Final message assembly ---
     if not reply:
-        reply = "\n".join(extra_lines)
-    elif extra_lines:
-        reply = f"{reply}\n\n" + "\n".join(extra_lines)
+        return "\n".join(extra_lines)
+    if extra_lines:
+        return f"{reply}\n\n" + "\n".join(extra_lines)
+    return reply
+
+
+def chat_id_of(update: Dict[str, Any]) -> Optional[int]:
+    """The chat an update belongs to (None for updates without a message)."""
+    # Telegram sends either "message" or "edited_message"
+    message = update.get("message") or update.get("edited_message") or {}
+    return message.get("chat", {}).get("id")
+
+
+async def handle_update(update: Dict[str, Any]) -> bool:
+    """
+    The chat pipeline for one Telegram update, shared by the webhook and the
+    getUpdates poller: run the chat turn in-process, then queue the reply on the
+    outbox (which paces delivery to Telegram's rate limits). False if the turn failed.
+    Redeliveries of an update_id already seen are dropped before any work.
+    """
+    with span("telegram.update", **{"telegram.update_id": update.get("update_id", -1)}):
+        return await _handle_update(update)
+
+
+async def _handle_update(update: Dict[str, Any]) -> bool:
+    logger.debug("Telegram update: %s", update)
+    if not await get_deduplicator().first_seen(update.get("update_id")):
+        logger.info(f"🔁 Dropped duplicate Telegram update {update.get('update_id')}")
+        return True
+
+    message = update.get("message") or update.get("edited_message")
+    if not message:
+        return True
+
+    chat_id = chat_id_of(update)
+    text = message.get("text", "") or message.get("caption", "")
+    if not text or chat_id is None:
+        return True
+
+    try:
+        data = await run_chat_turn(text, channel="telegram", customer_id=f"tg-{chat_id}")
+    except Exception as e:
+        logger.exception("Chat turn failed for Telegram chat %s: %s", chat_id, e)
+        await _send_message(chat_id, "⚠️ Sorry, something went wrong on the server.")
+        return False
 
     # --- Send reply back to Telegram ---
-    background.add_task(_send_message, chat_id, reply)
+    await _send_message(chat_id, format_reply(data))
+    return True
 
-    return {"ok": True}
+
+@router.post("/v1/telegram/webhook")
+async def telegram_webhook(request: Request):
+    """Telegram webhook endpoint. Telegram will POST updates here (see handle_update)."""
+    return {"ok": await handle_update(await request.json())}
@@ -0,0 +1,95 @@
+# app/services/telegram_dedup.py
+"""
+Drop Telegram updates we already started on. Telegram redelivers an update
+when the webhook answers slowly or fails, and each copy would otherwise run a
+full LLM turn and its tools (payments included).
+
+`UpdateDeduplicator.first_seen(update_id)` is checked before any work:
+- a small in-process LRU window answers repeats without a round trip;
+- otherwise SADD into a Redis set per block of BUCKET_SIZE consecutive ids
+  (`telegram:seen:<update_id // BUCKET_SIZE>`), refreshed to the TTL on every
+  add. Small integer sets stay in Redis' compact intset encoding (~4-8 bytes
+  per id), and SADD's return value makes check-and-mark atomic across processes.
+If Redis is unreachable the local window still catches redeliveries to this process.
+"""
+import os
+import logging
+from collections import OrderedDict
+from typing import Optional
+
+logger = logging.getLogger("telegram_dedup")
+
+KEY = "telegram:seen:{}"
+BUCKET_SIZE = 256  # ids per set, under Redis' default set-max-intset-entries (512)
+
+
+class UpdateDeduplicator:
+    def __init__(self, redis=None, ttl_seconds: int = 24 * 3600, local_window: int = 10_000):
+        # redis: an async client, or None to use session_store.get_async_client() per call
+        self.redis = redis
+        self.ttl_seconds = ttl_seconds
+        self.local_window = local_window
+        self._recent: OrderedDict = OrderedDict()
+        self.counters = {"checked": 0, "duplicates_dropped": 0, "redis_errors": 0}
+
+    def _client(self):
+        if self.redis is not None:
+            return self.redis
+        from app.services.session_store import get_async_client
+        return get_async_client()
+
+    def _remember(self, update_id: int):
+        self._recent[update_id] = None
+        if len(self._recent) > self.local_window:
+            self._recent.popitem(last=False)
+
+    async def first_seen(self, update_id: Optional[int]) -> bool:
+        """True the first time an update_id is seen (and marks it seen), False for a redelivery."""
+        if update_id is None:
+            return True
+        self.counters["checked"] += 1
+        if update_id in self._recent:
+            self._recent.move_to_end(update_id)
+            self.counters["duplicates_dropped"] += 1
+            return False
+        # marked locally before the await, so a concurrent copy in this process sees it
+        self._remember(update_id)
+
+        new = True
+        client = self._client()
+        if client is not None:
+            key = KEY.format(update_id // BUCKET_SIZE)
+            try:
+                pipe = client.pipeline(transaction=False)
+                pipe.sadd(key, update_id)
+                pipe.expire(key, self.ttl_seconds)
+                added, _ = await pipe.execute()
+                new = bool(added)
+            except Exception as e:
+                self.counters["redis_errors"] += 1
+                logger.warning(f"⚠️ Update dedup falling back to the local window (Redis: {e})")
+        if not new:
+            self.counters["duplicates_dropped"] += 1
+        return new
+
+    def stats(self) -> dict:
+        return {**self.counters, "local_window": len(self._recent)}
+
+
+_dedup: Optional[UpdateDeduplicator] = None
+
+
+def get_deduplicator() -> UpdateDeduplicator:
+    global _dedup
+    if _dedup is None:
+        _dedup = UpdateDeduplicator(
+            ttl_seconds=int(os.getenv("TELEGRAM_DEDUP_TTL_SECONDS", str(24 * 3600))),
+            local_window=int(os.getenv("TELEGRAM_DEDUP_LOCAL_WINDOW", "10000")),
+        )
+    return _dedup
+
+
+def set_deduplicator(dedup: Optional[UpdateDeduplicator]):
+    """Install a deduplicator (e.g. over a local Redis stand-in) or None to rebuild it from the env."""
+    global _dedup
+    _dedup = dedup
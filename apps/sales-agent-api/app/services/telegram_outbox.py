@@ -0,0 +1,262 @@
+# app/services/telegram_outbox.py
+"""
+Outbound Telegram messages, paced to the Bot API limits.
+
+- `TelegramOutbox.send` splits a reply into <= 4096-character parts and queues
+  them; it never blocks the webhook.
+- Workers deliver through a global token bucket (~30 msg/s per bot) and a
+  bucket per chat (~1 msg/s sustained, small bursts). A chat waiting on its own
+  bucket doesn't hold a worker, and parts of one chat go out strictly in order.
+- 429s are retried after the `retry_after` Telegram returns; network errors and
+  5xx are retried with exponential backoff up to `max_attempts`; other 4xx are
+  dropped (they would fail again).
+- `stats()` returns the delivery counters (served at /v1/metrics/telegram).
+"""
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional
+
+import httpx
+
+logger = logging.getLogger("telegram_outbox")
+
+MAX_MESSAGE_LENGTH = 4096
+PRUNE_BUCKETS_OVER = 10_000  # per-chat buckets kept before idle (full) ones are dropped
+
+
+class TokenBucket:
+    """`rate` tokens per second, holding at most `capacity`."""
+
+    def __init__(self, rate: float, capacity: float, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.tokens = capacity
+        self.updated = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_take(self) -> float:
+        """Take a token and return 0, or return the seconds until one is available (nothing taken)."""
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    async def take(self):
+        while (wait := self.try_take()) > 0:
+            await asyncio.sleep(wait)
+
+    @property
+    def full(self) -> bool:
+        self._refill()
+        return self.tokens >= self.capacity
+
+
+def split_message(text: str, limit: int = MAX_MESSAGE_LENGTH) -> list[str]:
+    """Split on the last line break (else space) before `limit`; hard-cut only a single overlong word."""
+    parts = []
+    while len(text) > limit:
+        cut = text.rfind("\n", 0, limit + 1)
+        if cut <= 0:
+            cut = text.rfind(" ", 0, limit + 1)
+        if cut <= 0:
+            cut = limit
+        parts.append(text[:cut])
+        text = text[cut:].lstrip("\n ")
+    if text or not parts:
+        parts.append(text)
+    return parts
+
+
+class TelegramOutbox:
+    def __init__(self, api_base: str, get_client: Callable[[], httpx.AsyncClient], concurrency: int = 8,
+                 global_rate: float = 30.0, global_burst: float = 30.0, chat_rate: float = 1.0,
+                 chat_burst: float = 3.0, max_attempts: int = 5, backoff_base: float = 0.5,
+                 backoff_max: float = 30.0):
+        self.api_base = api_base
+        self.get_client = get_client
+        self.concurrency = concurrency
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._global = TokenBucket(global_rate, global_burst)
+        self._chat_buckets: Dict[Any, TokenBucket] = {}
+        self._pending: Dict[Any, Deque[dict]] = {}  # chat_id -> its queued parts, oldest first
+        self._ready: asyncio.Queue = asyncio.Queue()  # chat_ids with a part due; a chat is here at most once
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._tasks: list[asyncio.Task] = []
+        self._counters = {"queued": 0, "sent": 0, "split": 0, "retried": 0, "rate_limited": 0, "failed": 0}
+        self._latency_total = 0.0
+        self._latency_max = 0.0
+
+    # ----- lifecycle -----
+    async def start(self):
+        for i in range(self.concurrency):
+            self._tasks.append(asyncio.create_task(self._worker(), name=f"telegram-outbox-{i}"))
+        logger.info(f"📤 Telegram outbox started with {self.concurrency} worker(s)")
+
+    async def drain(self, timeout: Optional[float] = None) -> bool:
+        """Wait until everything queued was sent or given up on. False on timeout."""
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def stop(self, drain_timeout: float = 5.0):
+        if not await self.drain(drain_timeout):
+            logger.warning(f"⚠️ Telegram outbox stopped with {self.queue_depth()} undelivered part(s)")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    # ----- producer side -----
+    def send(self, chat_id: Any, text: str, **params) -> int:
+        """Queue a reply (split if too long). Extra sendMessage params, e.g. parse_mode, apply to every part."""
+        parts = split_message(text)
+        queue = self._pending.get(chat_id)
+        if queue is None:
+            queue = self._pending[chat_id] = deque()
+            self._ready.put_nowait(chat_id)
+        now = time.monotonic()
+        for part in parts:
+            queue.append({"chat_id": chat_id, "text": part, **params,
+                          "_attempts": 0, "_not_before": 0.0, "_queued_at": now})
+        self._idle.clear()
+        self._counters["queued"] += len(parts)
+        self._counters["split"] += len(parts) - 1
+        return len(parts)
+
+    def queue_depth(self) -> int:
+        return sum(len(q) for q in self._pending.values())
+
+    def stats(self) -> dict:
+        sent = self._counters["sent"]
+        return {
+            **self._counters,
+            "queue_depth": self.queue_depth(),
+            "chats_waiting": len(self._pending),
+            "delivery_ms_avg": round(self._latency_total / sent * 1000, 1) if sent else 0.0,
+            "delivery_ms_max": round(self._latency_max * 1000, 1),
+        }
+
+    # ----- workers -----
+    def _chat_bucket(self, chat_id: Any) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self._chat_buckets) > PRUNE_BUCKETS_OVER:
+                # a full bucket is the same as a new one
+                self._chat_buckets = {c: b for c, b in self._chat_buckets.items() if not b.full or c in self._pending}
+            bucket = self._chat_buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    def _ready_later(self, chat_id: Any, delay: float):
+        asyncio.get_running_loop().call_later(delay, self._ready.put_nowait, chat_id)
+
+    async def _worker(self):
+        while True:
+            chat_id = await self._ready.get()
+            try:
+                queue = self._pending[chat_id]
+                msg = queue[0]
+                wait = msg["_not_before"] - time.monotonic()
+                if wait <= 0:
+                    wait = self._chat_bucket(chat_id).try_take()
+                if wait > 0:
+                    # park the chat, not the worker
+                    self._ready_later(chat_id, wait)
+                    continue
+
+                await self._global.take()
+                if await self._deliver(msg):
+                    queue.popleft()
+                if queue:
+                    self._ready.put_nowait(chat_id)
+                else:
+                    del self._pending[chat_id]
+                    if not self._pending:
+                        self._idle.set()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # never lose the chat: drop the part that broke the worker and carry on
+                logger.exception(f"❌ Telegram outbox worker error for chat {chat_id}: {e}")
+                queue = self._pending.get(chat_id)
+                if queue:
+                    queue.popleft()
+                    self._counters["failed"] += 1
+                if queue:
+                    self._ready.put_nowait(chat_id)
+                elif chat_id in self._pending:
+                    del self._pending[chat_id]
+                    if not self._pending:
+                        self._idle.set()
+
+    async def _deliver(self, msg: dict) -> bool:
+        """One sendMessage attempt. True when the part is done (sent or given up), False to retry it."""
+        msg["_attempts"] += 1
+        payload = {k: v for k, v in msg.items() if not k.startswith("_")}
+        retry_after = None
+        try:
+            resp = await self.get_client().post(f"{self.api_base}/sendMessage", json=payload)
+            status, error = resp.status_code, None
+            if status == 429:
+                try:
+                    retry_after = float(resp.json().get("parameters", {}).get("retry_after", 1))
+                except Exception:
+                    retry_after = 1.0
+            elif status >= 400:
+                error = resp.text[:200]
+        except httpx.HTTPError as e:
+            status, error = None, f"{type(e).__name__}: {e}"
+
+        if status is not None and status < 400:
+            latency = time.monotonic() - msg["_queued_at"]
+            self._counters["sent"] += 1
+            self._latency_total += latency
+            self._latency_max = max(self._latency_max, latency)
+            return True
+
+        if status is not None and 400 <= status < 500 and status != 429:
+            self._counters["failed"] += 1
+            logger.error(f"❌ Telegram rejected a message for chat {msg['chat_id']} ({status}): {error}")
+            return True
+        if msg["_attempts"] >= self.max_attempts:
+            self._counters["failed"] += 1
+            logger.error(f"💀 Giving up on a message for chat {msg['chat_id']} after {msg['_attempts']} "
+                         f"attempt(s): {error or 'rate limited'}")
+            return True
+
+        if retry_after is not None:
+            self._counters["rate_limited"] += 1
+            delay = retry_after
+        else:
+            delay = min(self.backoff_max, self.backoff_base * (2 ** (msg["_attempts"] - 1)))
+        self._counters["retried"] += 1
+        msg["_not_before"] = time.monotonic() + delay
+        logger.warning(f"⚠️ sendMessage to chat {msg['chat_id']} failed ({status or error}), retrying in {delay}s")
+        return False
+
+
+def outbox_from_env(api_base: str, get_client: Callable[[], httpx.AsyncClient]) -> TelegramOutbox:
+    return TelegramOutbox(
+        api_base, get_client,
+        concurrency=int(os.getenv("TELEGRAM_SEND_WORKERS", "8")),
+        global_rate=float(os.getenv("TELEGRAM_GLOBAL_RATE", "30")),
+        global_burst=float(os.getenv("TELEGRAM_GLOBAL_BURST", "30")),
+        chat_rate=float(os.getenv("TELEGRAM_CHAT_RATE", "1")),
+        chat_burst=float(os.getenv("TELEGRAM_CHAT_BURST", "3")),
+        max_attempts=int(os.getenv("TELEGRAM_SEND_MAX_ATTEMPTS", "5")),
+    )
@@ -0,0 +1,244 @@
+# app/services/telegram_poller.py
+"""
+Long-polling ingest for Telegram (getUpdates), for deployments without a
+public webhook URL. Runs the same pipeline as /v1/telegram/webhook
+(telegram_bot.handle_update).
+
+- One loop long-polls getUpdates and hands each update to a `KeyedWorkerPool`:
+  N async workers, updates of one chat strictly in arrival order, different
+  chats concurrently. The pool is bounded, so polling pauses while it is full.
+- The next offset is persisted in Redis (`telegram:updates:offset`) once a batch
+  is handed to the pool, so a restart resumes where polling stopped. Telegram
+  drops updates below the offset we poll with, so updates still queued when the
+  process dies are not redelivered.
+- getUpdates fails while a webhook is set; `start()` removes it first.
+
+In the API process: TELEGRAM_INGEST=polling. Standalone:
+    python -m app.services.telegram_poller --concurrency 8
+"""
+import os
+import asyncio
+import logging
+import argparse
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+
+import httpx
+
+from app.services import telegram_bot
+
+logger = logging.getLogger("telegram_poller")
+
+OFFSET_KEY = "telegram:updates:offset"
+
+Handler = Callable[[Dict[str, Any]], Awaitable[Any]]
+
+
+class KeyedWorkerPool:
+    """N workers; items with the same key run one at a time in submit order, at most `max_pending` queued."""
+
+    def __init__(self, handler: Handler, concurrency: int = 8, max_pending: int = 1000):
+        self.handler = handler
+        self.concurrency = concurrency
+        self._slots = asyncio.Semaphore(max_pending)
+        self._pending: Dict[Any, Deque] = {}  # key -> its queued items, oldest first
+        self._ready: asyncio.Queue = asyncio.Queue()  # keys with work; a key is here at most once
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._tasks: list[asyncio.Task] = []
+        self.processed = 0
+        self.failed = 0
+
+    async def start(self):
+        for i in range(self.concurrency):
+            self._tasks.append(asyncio.create_task(self._worker(), name=f"telegram-poller-worker-{i}"))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    async def submit(self, key: Any, item: Any):
+        """Queue an item, waiting while `max_pending` items are already queued."""
+        await self._slots.acquire()
+        queue = self._pending.get(key)
+        if queue is None:
+            queue = self._pending[key] = deque()
+            self._ready.put_nowait(key)
+        queue.append(item)
+        self._idle.clear()
+
+    async def drain(self):
+        await self._idle.wait()
+
+    def depth(self) -> int:
+        return sum(len(q) for q in self._pending.values())
+
+    async def _worker(self):
+        while True:
+            key = await self._ready.get()
+            queue = self._pending[key]
+            item = queue[0]
+            try:
+                await self.handler(item)
+                self.processed += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failed += 1
+                logger.exception(f"❌ Telegram update handler failed for chat {key}: {e}")
+            queue.popleft()
+            self._slots.release()
+            if queue:
+                self._ready.put_nowait(key)  # to the back: other chats get a turn
+            else:
+                del self._pending[key]
+                if not self._pending:
+                    self._idle.set()
+
+
+class TelegramPoller:
+    def __init__(self, api_base: str, get_client: Callable[[], httpx.AsyncClient], redis=None,
+                 handler: Optional[Handler] = None, concurrency: int = 8, max_pending: int = 1000,
+                 poll_timeout: int = 30, batch_limit: int = 100, error_backoff: float = 1.0):
+        self.api_base = api_base
+        self.get_client = get_client
+        self.redis = redis
+        self.pool = KeyedWorkerPool(handler or telegram_bot.handle_update, concurrency, max_pending)
+        self.poll_timeout = poll_timeout
+        self.batch_limit = batch_limit
+        self.error_backoff = error_backoff
+        self.offset: Optional[int] = None
+        self.received = 0
+        self._task: Optional[asyncio.Task] = None
+
+    async def _load_offset(self) -> Optional[int]:
+        if self.redis is None:
+            return None
+        try:
+            raw = await self.redis.get(OFFSET_KEY)
+            return int(raw) if raw else None
+        except Exception as e:
+            logger.warning(f"⚠️ Could not read the Telegram offset from Redis, starting from pending updates: {e}")
+            return None
+
+    async def _save_offset(self):
+        if self.redis is None:
+            return
+        try:
+            await self.redis.set(OFFSET_KEY, str(self.offset))
+        except Exception as e:
+            logger.warning(f"⚠️ Could not persist the Telegram offset: {e}")
+
+    async def _call(self, method: str, params: Optional[dict] = None, http_timeout: float = 10.0) -> Any:
+        resp = await self.get_client().post(f"{self.api_base}/{method}", json=params or {}, timeout=http_timeout)
+        body = resp.json()
+        if not body.get("ok"):
+            raise RuntimeError(f"{method} failed ({resp.status_code}): {body.get('description')}")
+        return body["result"]
+
+    async def start(self):
+        self.offset = await self._load_offset()
+        try:
+            await self._call("deleteWebhook")
+        except Exception as e:
+            # getUpdates reports it too (409) and the poll loop keeps retrying
+            logger.warning(f"⚠️ deleteWebhook failed: {e}")
+        await self.pool.start()
+        self._task = asyncio.create_task(self._poll_loop(), name="telegram-poller")
+        logger.info(f"📥 Telegram long-polling with {self.pool.concurrency} worker(s), offset {self.offset}")
+
+    async def stop(self, drain: bool = True):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if drain:
+            await self.pool.drain()
+        await self.pool.stop()
+
+    async def poll_once(self) -> int:
+        """One getUpdates round trip; queues the updates and advances the offset. Returns the update count."""
+        params = {"timeout": self.poll_timeout, "limit": self.batch_limit,
+                  "allowed_updates": ["message", "edited_message"]}
+        if self.offset is not None:
+            params["offset"] = self.offset
+        updates = await self._call("getUpdates", params, http_timeout=self.poll_timeout + 10)
+        for update in updates:
+            key = telegram_bot.chat_id_of(update)
+            await self.pool.submit(key if key is not None else f"update-{update['update_id']}", update)
+            self.offset = update["update_id"] + 1
+        if updates:
+            self.received += len(updates)
+            await self._save_offset()
+        return len(updates)
+
+    async def _poll_loop(self):
+        while True:
+            try:
+                await self.poll_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ getUpdates failed, retrying in {self.error_backoff}s: {e}")
+                await asyncio.sleep(self.error_backoff)
+
+    def stats(self) -> dict:
+        return {"received": self.received, "processed": self.pool.processed, "failed": self.pool.failed,
+                "queued": self.pool.depth(), "offset": self.offset}
+
+
+def poller_from_env(concurrency: Optional[int] = None) -> TelegramPoller:
+    from app.services.session_store import get_async_client
+    return TelegramPoller(
+        telegram_bot.TELEGRAM_API_BASE, telegram_bot.get_client, redis=get_async_client(),
+        concurrency=concurrency or int(os.getenv("TELEGRAM_POLL_WORKERS", "8")),
+        max_pending=int(os.getenv("TELEGRAM_POLL_MAX_PENDING", "1000")),
+        poll_timeout=int(os.getenv("TELEGRAM_POLL_TIMEOUT", "30")),
+    )
+
+
+# ----- Poller of the API process (TELEGRAM_INGEST=polling) -----
+_poller: Optional[TelegramPoller] = None
+
+
+async def start_poller(concurrency: Optional[int] = None) -> Optional[TelegramPoller]:
+    """Start the process's poller; None (and nothing polled) when TELEGRAM_BOT_TOKEN is not set."""
+    global _poller
+    if telegram_bot.TELEGRAM_API_BASE is None:
+        logger.error("❌ TELEGRAM_BOT_TOKEN is not set; not polling Telegram")
+        return None
+    if _poller is None:
+        _poller = poller_from_env(concurrency)
+        await _poller.start()
+    return _poller
+
+
+async def stop_poller():
+    global _poller
+    if _poller is not None:
+        await _poller.stop()
+    _poller = None
+
+
+def poller_stats() -> Optional[dict]:
+    return _poller.stats() if _poller is not None else None
+
+
+async def _serve(concurrency: int):
+    if await start_poller(concurrency) is None:
+        return
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await stop_poller()
+        await telegram_bot.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+    parser = argparse.ArgumentParser(description="Ingest Telegram updates by long polling (getUpdates).")
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv("TELEGRAM_POLL_WORKERS", "8")))
+    args = parser.parse_args()
+    asyncio.run(_serve(args.concurrency))
@@ -1,17 +1,37 @@
 # app/services/tool_router.py
 
+import inspect
 import logging
-from app.agents import recommendation_agent, inventory_agent, payment_agent
+import importlib
+
+from app.services import profiling, tracing
 
 logger = logging.getLogger("tool_router")
 
-# Define mapping of tool name → function
+# Define mapping of tool name → function ("module:function", imported on first use)
+# Coroutine tools run on the event loop (async engine); plain functions go to a worker thread
 TOOL_MAP = {
-    "recommend": recommendation_agent.recommend_products_sync,
-    "check_stock": inventory_agent.check_stock_sync,
-    "authorize_payment": payment_agent.authorize_payment_sync
+    "recommend": "app.agents.recommendation_agent:recommend_products_async",
+    "check_stock": "app.agents.inventory_agent:check_stock_async",
+    "authorize_payment": "app.agents.payment_agent:authorize_payment_async",
+    "order_status": "app.agents.order_agent:get_order_status_async",
+    "ship_eta": "app.services.store_locator:basket_eta_async"
 }
 
+def resolve(tool_name: str):
+    """The tool's function, importing its agent module the first time."""
+    tool = TOOL_MAP[tool_name]
+    if isinstance(tool, str):
+        module, attr = tool.split(":")
+        tool = getattr(importlib.import_module(module), attr)
+        TOOL_MAP[tool_name] = tool
+    return tool
+
+def load_tools():
+    """Import every agent now (startup warm-up) instead of on its first call."""
+    for tool_name in list(TOOL_MAP):
+        resolve(tool_name)
+
 async def execute(tool_name: str, args: dict):
     """
     Executes a given tool asynchronously.
@@ -20,22 +40,33 @@ async def execute(tool_name: str, args: dict):
         logger.warning(f"⚠️ Unknown tool requested: {tool_name}")
         raise ValueError(f"Unknown tool: {tool_name}")
 
-    tool_func = TOOL_MAP[tool_name]
+    tool_func = resolve(tool_name)
     logger.info(f"🔧 Executing tool '{tool_name}' with args: {args}")
 
-    try:
-        # Run tool (even if it’s sync)
-        result = await _run_async(tool_func, **args)
-        logger.info(f"✅ Tool '{tool_name}' completed successfully")
-        return result
-    except Exception as e:
-        logger.error(f"❌ Tool '{tool_name}' failed: {e}")
-        raise
+    with tracing.span("tool_router.execute", **{"tool.name": tool_name}):
+        try:
+            if inspect.iscoroutinefunction(tool_func):
+                result = await tool_func(**args)
+            else:
+                result = await _run_async(tool_func, **args)
+            logger.info(f"✅ Tool '{tool_name}' completed successfully")
+            return result
+        except Exception as e:
+            logger.error(f"❌ Tool '{tool_name}' failed: {e}")
+            raise
 
 async def _run_async(func, **kwargs):
     """
-    Helper to run sync functions asynchronously (thread offload).
+    Helper to run sync functions asynchronously (thread offload, keeping the turn's contextvars).
     """
     import asyncio
-    loop = asyncio.get_event_loop()
-    return await loop.run_in_executor(None, lambda: func(**kwargs))
+    func = profiling.follow(func)  # sampled on its worker thread when the request is being profiled
+    if not tracing.enabled():
+        return await asyncio.to_thread(func, **kwargs)
+
+    started = tracing.queue_wait_marker()  # time spent waiting for a free executor thread
+
+    def run():
+        started()
+        return func(**kwargs)
+    return await asyncio.to_thread(run)
@@ -0,0 +1,318 @@
+# app/services/tracing.py
+"""
+Trace spans across a chat turn (OpenTelemetry), off unless TRACING_EXPORTER is set.
+
+    main.chat / telegram.update
+      llm_client.plan                  llm.prompt_bytes, llm.response_bytes
+      orchestrator.execute_plan
+        tool_router.execute            tool.name, executor.queue_wait_ms (thread tools)
+          sql SELECT ...               db.statement (no parameters)
+          redis GET / redis PIPELINE
+      redis GET / SET                  session store
+
+Every span started during a turn carries session_id and channel (tag_turn).
+SQL statements and Redis commands only get spans inside a sampled turn, so
+background jobs don't start traces of their own.
+
+TRACING_EXPORTER      none (default) | file | otlp | console
+TRACING_FILE          file exporter output, one JSON span per line (traces.jsonl)
+TRACING_SAMPLE_RATE   share of turns traced (0.1); a turn's spans are kept or dropped together
+OTEL_EXPORTER_OTLP_ENDPOINT and friends configure the otlp exporter
+(needs opentelemetry-exporter-otlp-proto-http or -grpc).
+
+With tracing off, span() returns a shared no-op context and no SQL/Redis
+hooks are installed; opentelemetry isn't even imported.
+"""
+import os
+import time
+import logging
+import contextlib
+import contextvars
+from typing import Any, Optional
+
+logger = logging.getLogger("tracing")
+
+SERVICE_NAME = "sales-agent-api"
+
+_tracer = None
+_provider = None
+_turn: contextvars.ContextVar[dict] = contextvars.ContextVar("trace_turn", default={})
+_unhooks: list = []
+
+
+class _NoopSpan:
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def set_attributes(self, attributes: dict) -> None:
+        pass
+
+    def record_exception(self, exception: BaseException, **kwargs) -> None:
+        pass
+
+    def is_recording(self) -> bool:
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+_NOOP = contextlib.nullcontext(_NOOP_SPAN)
+
+
+def enabled() -> bool:
+    return _tracer is not None
+
+
+def span(name: str, **attributes):
+    """Context manager for a child span of the current one; yields the span (a no-op one when tracing is off)."""
+    if _tracer is None:
+        return _NOOP
+    return _tracer.start_as_current_span(name, attributes=attributes or None)
+
+
+def current_span():
+    if _tracer is None:
+        return _NOOP_SPAN
+    from opentelemetry import trace
+    return trace.get_current_span()
+
+
+def tag_turn(session_id: str, channel: str):
+    """Tag the current span and every span started after it in this turn (threads included)."""
+    if _tracer is None:
+        return
+    attributes = {"session_id": session_id, "channel": channel}
+    _turn.set(attributes)
+    current_span().set_attributes(attributes)
+
+
+# ----- Setup -----
+def _exporter_from_env(kind: str):
+    if kind == "file":
+        return JsonLinesExporter(os.getenv("TRACING_FILE", "traces.jsonl"))
+    if kind == "console":
+        from opentelemetry.sdk.trace.export import ConsoleSpanExporter
+        return ConsoleSpanExporter()
+    if kind == "otlp":
+        try:
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        except ImportError:
+            try:
+                from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+            except ImportError:
+                raise RuntimeError("TRACING_EXPORTER=otlp needs opentelemetry-exporter-otlp-proto-http (or -grpc)")
+        return OTLPSpanExporter()
+    raise ValueError(f"TRACING_EXPORTER must be none, file, otlp or console, not {kind!r}")
+
+
+def setup_tracing(exporter=None, sample_rate: Optional[float] = None) -> bool:
+    """
+    Start tracing with `exporter` (or the one TRACING_EXPORTER names) and install
+    the SQL/Redis hooks. Returns False, doing nothing, when tracing is off.
+    """
+    global _tracer, _provider
+    kind = os.getenv("TRACING_EXPORTER", "none")
+    if exporter is None and kind == "none":
+        return False
+    if _tracer is not None:
+        shutdown_tracing()
+
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor, SimpleSpanProcessor
+    from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+
+    if sample_rate is None:
+        sample_rate = float(os.getenv("TRACING_SAMPLE_RATE", "0.1"))
+    _provider = TracerProvider(resource=Resource.create({"service.name": SERVICE_NAME}),
+                               sampler=ParentBased(TraceIdRatioBased(sample_rate)))
+    _provider.add_span_processor(_TurnAttributes())
+    if exporter is not None:  # given directly (tests, tools): export as spans end
+        _provider.add_span_processor(SimpleSpanProcessor(exporter))
+    else:
+        _provider.add_span_processor(BatchSpanProcessor(_exporter_from_env(kind)))
+    # a tracer of our own rather than the global provider: setup can run again (tests) and stays private
+    _tracer = _provider.get_tracer("app")
+    _install_sql_hooks()
+    _install_redis_hooks()
+    logger.info(f"🔭 Tracing on ({kind if exporter is None else type(exporter).__name__}, sample rate {sample_rate})")
+    return True
+
+
+def shutdown_tracing():
+    """Flush pending spans and remove the hooks (app shutdown)."""
+    global _tracer, _provider
+    while _unhooks:
+        _unhooks.pop()()
+    if _provider is not None:
+        _provider.shutdown()
+    _tracer, _provider = None, None
+
+
+class _TurnAttributes:
+    """Copies the turn's session_id/channel onto each span as it starts."""
+
+    def on_start(self, span, parent_context=None):
+        attributes = _turn.get()
+        if attributes:
+            span.set_attributes(attributes)
+
+    def on_end(self, span):
+        pass
+
+    def shutdown(self):
+        pass
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        return True
+
+
+class JsonLinesExporter:
+    """Appends finished spans to a file, one JSON object per line."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def export(self, spans):
+        from opentelemetry.sdk.trace.export import SpanExportResult
+        with open(self.path, "a", encoding="utf-8") as f:
+            for s in spans:
+                f.write(s.to_json(indent=None) + "\n")
+        return SpanExportResult.SUCCESS
+
+    def shutdown(self):
+        pass
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        return True
+
+
+# ----- SQL / Redis hooks (installed only while tracing is on) -----
+def _child_span(name: str, attributes: dict):
+    """A span under the current one when that one is being recorded, else None."""
+    from opentelemetry import trace
+    if not trace.get_current_span().is_recording():
+        return None
+    return _tracer.start_span(name, attributes=attributes)
+
+
+def _end(span, error: Optional[BaseException] = None):
+    if error is not None:
+        from opentelemetry.trace import Status, StatusCode
+        span.record_exception(error)
+        span.set_status(Status(StatusCode.ERROR, str(error)))
+    span.end()
+
+
+def _install_sql_hooks():
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    def before(conn, cursor, statement, parameters, context, executemany):
+        operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "SQL"
+        s = _child_span(f"sql {operation}", {"db.system": conn.dialect.name, "db.operation": operation,
+                                             "db.statement": statement[:2000], "db.executemany": executemany})
+        conn.info.setdefault("trace_spans", []).append(s)
+
+    def after(conn, cursor, statement, parameters, context, executemany):
+        spans = conn.info.get("trace_spans")
+        s = spans.pop() if spans else None
+        if s is not None:
+            if cursor is not None and cursor.rowcount is not None and cursor.rowcount >= 0:
+                s.set_attribute("db.rowcount", cursor.rowcount)
+            _end(s)
+
+    def error(exception_context):
+        conn = exception_context.connection
+        spans = conn.info.get("trace_spans") if conn is not None else None
+        s = spans.pop() if spans else None
+        if s is not None:
+            _end(s, exception_context.original_exception)
+
+    # every engine, the async engines' sync cores included
+    for name, fn in (("before_cursor_execute", before), ("after_cursor_execute", after), ("handle_error", error)):
+        event.listen(Engine, name, fn)
+        _unhooks.append(lambda name=name, fn=fn: event.remove(Engine, name, fn))
+
+
+def _redis_command_span(args) -> Optional[Any]:
+    command = str(args[0]).upper() if args else "?"
+    return _child_span(f"redis {command}", {"db.system": "redis", "db.operation": command})
+
+
+def _redis_pipeline_span(pipeline) -> Optional[Any]:
+    commands = [str(c[0][0]).upper() for c in getattr(pipeline, "command_stack", [])]
+    return _child_span("redis PIPELINE", {"db.system": "redis", "db.operation": "PIPELINE",
+                                          "db.redis.commands": " ".join(commands)[:500],
+                                          "db.redis.command_count": len(commands)})
+
+
+def _patch(cls, name: str, wrapper):
+    original = cls.__dict__[name]
+    setattr(cls, name, wrapper(original))
+    _unhooks.append(lambda: setattr(cls, name, original))
+
+
+def _install_redis_hooks():
+    try:
+        import redis
+        import redis.asyncio
+    except ImportError:
+        return
+
+    def sync_command(original):
+        def execute_command(self, *args, **options):
+            s = _redis_command_span(args)
+            if s is None:
+                return original(self, *args, **options)
+            try:
+                result = original(self, *args, **options)
+            except BaseException as e:
+                _end(s, e)
+                raise
+            _end(s)
+            return result
+        return execute_command
+
+    def async_command(original, span_for):
+        async def wrapper(self, *args, **options):
+            s = span_for(self, args)
+            if s is None:
+                return await original(self, *args, **options)
+            try:
+                result = await original(self, *args, **options)
+            except BaseException as e:
+                _end(s, e)
+                raise
+            _end(s)
+            return result
+        return wrapper
+
+    def sync_pipeline(original):
+        def execute(self, *args, **kwargs):
+            s = _redis_pipeline_span(self)
+            if s is None:
+                return original(self, *args, **kwargs)
+            try:
+                result = original(self, *args, **kwargs)
+            except BaseException as e:
+                _end(s, e)
+                raise
+            _end(s)
+            return result
+        return execute
+
+    _patch(redis.Redis, "execute_command", sync_command)
+    _patch(redis.client.Pipeline, "execute", sync_pipeline)
+    _patch(redis.asyncio.Redis, "execute_command",
+           lambda original: async_command(original, lambda self, args: _redis_command_span(args)))
+    _patch(redis.asyncio.client.Pipeline, "execute",
+           lambda original: async_command(original, lambda self, args: _redis_pipeline_span(self)))
+
+
+def queue_wait_marker():
+    """For thread-offloaded tools: call the result in the worker thread to record how long the call queued."""
+    submitted = time.perf_counter()
+
+    def started():
+        current_span().set_attribute("executor.queue_wait_ms", round((time.perf_counter() - submitted) * 1000, 3))
+    return started
@@ -0,0 +1,146 @@
+# app/tests/conftest.py
+"""
+Shared test scaffolding.
+
+- `pytest.mark.postgres` (usually as `pytestmark`): skipped unless DATABASE_URL is a Postgres URL.
+- `make_customer` / `customer` / `make_order`: throwaway rows, removed afterwards together with
+  what the test created for them (orders, payment ledger rows, stock holds, shipments).
+- `no_redis`: payments and the order cache without Redis (ledger / local tier only).
+- `record_sql`: the SQL statements the sync engine runs.
+"""
+import os
+import uuid
+
+import pytest
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "postgres: needs a Postgres DATABASE_URL (skipped otherwise)")
+
+
+def pytest_collection_modifyitems(config, items):
+    if os.getenv("DATABASE_URL", "").startswith("postgresql"):
+        return
+    skip = pytest.mark.skip(reason="needs a Postgres DATABASE_URL")
+    for item in items:
+        if "postgres" in item.keywords:
+            item.add_marker(skip)
+
+
+def _delete_orders(db, where: str, params: dict):
+    """Delete the orders matching `where` (on orders o) and the rows that reference them."""
+    from sqlalchemy import text
+
+    orders = f"SELECT o.id FROM orders o WHERE {where}"
+    refs = f"SELECT o.external_id FROM orders o WHERE {where}"
+    db.execute(text(f"DELETE FROM fulfillments WHERE order_id IN ({orders})"), params)
+    db.execute(text(f"DELETE FROM payment_ledger WHERE order_id IN ({refs})"), params)
+    db.execute(text(f"DELETE FROM stock_reservations WHERE order_id IN ({refs})"), params)
+    db.execute(text(f"DELETE FROM orders o WHERE {where}"), params)
+
+
+@pytest.fixture
+def make_customer():
+    """make_customer(name) -> (id, customer_id): a fresh customer (tier standard) and, afterwards, none of its orders."""
+    from sqlalchemy import text
+    from app.services.db import SessionLocal
+
+    created = []
+
+    def make(name: str = "Test"):
+        ref = f"CUST-T-{uuid.uuid4().hex[:8].upper()}"
+        db = SessionLocal()
+        try:
+            cid = db.execute(
+                text("INSERT INTO customers (customer_id, name, loyalty_tier) VALUES (:c, :n, 'standard') RETURNING id"),
+                {"c": ref, "n": name},
+            ).scalar_one()
+            db.commit()
+        finally:
+            db.close()
+        created.append(cid)
+        return cid, ref
+
+    yield make
+
+    if created:
+        db = SessionLocal()
+        _delete_orders(db, "o.customer_id = ANY(:ids)", {"ids": created})
+        # loyalty accounts and ledger entries go with the customer (ON DELETE CASCADE)
+        db.execute(text("DELETE FROM customers WHERE id = ANY(:ids)"), {"ids": created})
+        db.commit()
+        db.close()
+
+
+@pytest.fixture
+def customer(make_customer) -> int:
+    return make_customer()[0]
+
+
+@pytest.fixture
+def make_order():
+    """make_order(total_amount, customer_id=None) -> (external_id, id): a fresh order in status 'created'."""
+    from sqlalchemy import text
+    from app.services.db import SessionLocal
+
+    created = []
+
+    def make(total_amount: int, customer_id=None):
+        ext = f"ORD-T-{uuid.uuid4().hex[:8].upper()}"
+        db = SessionLocal()
+        try:
+            oid = db.execute(
+                text("INSERT INTO orders (external_id, customer_id, total_amount, status) "
+                     "VALUES (:e, :c, :t, 'created') RETURNING id"),
+                {"e": ext, "c": customer_id, "t": total_amount},
+            ).scalar_one()
+            db.commit()
+        finally:
+            db.close()
+        created.append(oid)
+        return ext, oid
+
+    yield make
+
+    if created:
+        db = SessionLocal()
+        _delete_orders(db, "o.id = ANY(:ids)", {"ids": created})
+        db.commit()
+        db.close()
+
+
+@pytest.fixture
+def no_redis(monkeypatch):
+    """Payments and the order cache without Redis."""
+    from app.services import order_cache
+    import app.agents.payment_agent as payment_agent
+
+    for module in (payment_agent, order_cache):
+        monkeypatch.setattr(module, "get_sync_client", lambda: None)
+        monkeypatch.setattr(module, "get_async_client", lambda: None)
+
+
+@pytest.fixture
+def record_sql():
+    """record_sql() -> (statements, stop): records the sync engine's SQL until stop() or the end of the test."""
+    from sqlalchemy import event
+    from app.services.db import engine
+
+    listeners = []
+
+    def start():
+        seen = []
+        listener = lambda *args: seen.append(args[2])  # noqa: E731
+        event.listen(engine, "before_cursor_execute", listener)
+        listeners.append(listener)
+
+        def stop():
+            if event.contains(engine, "before_cursor_execute", listener):
+                event.remove(engine, "before_cursor_execute", listener)
+
+        return seen, stop
+
+    yield start
+    for listener in listeners:
+        if event.contains(engine, "before_cursor_execute", listener):
+            event.remove(engine, "before_cursor_execute", listener)
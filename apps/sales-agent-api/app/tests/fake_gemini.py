@@ -0,0 +1,51 @@
+# app/tests/fake_gemini.py
+"""
+Local stand-in for Gemini's generateContent, for tests and load runs.
+
+Answers with a canned plan in the shape llm_client.plan parses (fenced JSON
+in candidates[0].content.parts[0].text). The plan is picked by the first
+`plans` key found in the current user message ("[user] (current): ..."), else
+`default_plan`. `latency_ms` (+ uniform `jitter_ms`) simulates model time and
+`error_rate` answers that share of calls with a 503.
+"""
+import json
+import random
+import asyncio
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+DEFAULT_PLAN = {"reply_text": "Happy to help! What are you shopping for today?", "tool_calls": []}
+
+
+class FakeGemini:
+    def __init__(self, plans: dict | None = None, default_plan: dict | None = None, latency_ms: float = 0.0,
+                 jitter_ms: float = 0.0, error_rate: float = 0.0, seed: int | None = None):
+        self.plans = plans or {}
+        self.default_plan = default_plan or DEFAULT_PLAN
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.calls = 0
+        self.errors = 0
+        self.app = FastAPI()
+        self.app.add_api_route("/v1beta/models/{model}:generateContent", self.generate_content, methods=["POST"])
+
+    def plan_for(self, prompt: str) -> dict:
+        current = prompt.rsplit("[user] (current):", 1)[-1].split("\n", 1)[0]
+        return next((plan for key, plan in self.plans.items() if key in current), self.default_plan)
+
+    async def generate_content(self, model: str, request: Request):
+        body = await request.json()
+        self.calls += 1
+        delay = self.latency_ms + self.random.uniform(0, self.jitter_ms)
+        if delay:
+            await asyncio.sleep(delay / 1000)
+        if self.error_rate and self.random.random() < self.error_rate:
+            self.errors += 1
+            return JSONResponse(status_code=503, content={"error": {"code": 503, "status": "UNAVAILABLE"}})
+
+        prompt = body["contents"][-1]["parts"][0]["text"]
+        text = "```json\n" + json.dumps(self.plan_for(prompt), ensure_ascii=False) + "\n```"
+        return {"candidates": [{"content": {"role": "model", "parts": [{"text": text}]}, "finishReason": "STOP"}]}
@@ -0,0 +1,92 @@
+# app/tests/fake_telegram.py
+"""
+Local stand-in for the Telegram Bot API (sendMessage, getUpdates, deleteWebhook),
+for tests and benchmarks.
+
+Mount it in-process with httpx.ASGITransport(app=fake.app) or serve it with
+uvicorn. Like the real API it rejects texts over 4096 characters and answers
+429 + parameters.retry_after when a chat or the bot sends too fast (sliding
+one-second windows); `inject` queues status codes to answer next (e.g. 429, 500).
+`push_message` queues an incoming update for getUpdates, which long-polls and
+forgets updates below the requested offset (confirmed), as Telegram does.
+"""
+import time
+import asyncio
+from collections import defaultdict, deque
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+
+class FakeTelegram:
+    def __init__(self, chat_limit: int | None = None, global_limit: int | None = None, retry_after: float = 1.0):
+        self.chat_limit = chat_limit
+        self.global_limit = global_limit
+        self.retry_after = retry_after
+        self.messages: list[tuple[float, int, str]] = []  # (monotonic time, chat_id, text), delivered only
+        self.rejected: list[tuple[int, int]] = []  # (status, chat_id)
+        self.inject: deque = deque()
+        self._recent = deque()  # monotonic times of delivered messages, last second
+        self._recent_by_chat = defaultdict(deque)
+        self.updates: list[dict] = []  # not yet confirmed, oldest first
+        self.next_update_id = 1
+        self.get_updates_calls: list[dict] = []
+        self.app = FastAPI()
+        self.app.add_api_route("/bot{token}/sendMessage", self.send_message, methods=["POST"])
+        self.app.add_api_route("/bot{token}/getUpdates", self.get_updates, methods=["POST"])
+        self.app.add_api_route("/bot{token}/deleteWebhook", self.delete_webhook, methods=["POST"])
+
+    def push_message(self, chat_id: int, text: str) -> int:
+        update_id = self.next_update_id
+        self.next_update_id += 1
+        self.updates.append({"update_id": update_id,
+                             "message": {"message_id": update_id, "chat": {"id": chat_id}, "text": text}})
+        return update_id
+
+    def texts(self, chat_id: int) -> list[str]:
+        return [text for _, c, text in self.messages if c == chat_id]
+
+    def _error(self, status: int, chat_id: int, description: str, **parameters) -> JSONResponse:
+        self.rejected.append((status, chat_id))
+        body = {"ok": False, "error_code": status, "description": description}
+        if parameters:
+            body["parameters"] = parameters
+        return JSONResponse(status_code=status, content=body)
+
+    async def send_message(self, token: str, request: Request):
+        body = await request.json()
+        chat_id, text = body["chat_id"], body.get("text", "")
+        now = time.monotonic()
+
+        if self.inject:
+            status = self.inject.popleft()
+            if status == 429:
+                return self._error(429, chat_id, "Too Many Requests", retry_after=self.retry_after)
+            return self._error(status, chat_id, "Injected error")
+        if not text or len(text) > 4096:
+            return self._error(400, chat_id, "Bad Request: message is too long" if text else "Bad Request: message text is empty")
+
+        for window, limit in ((self._recent_by_chat[chat_id], self.chat_limit), (self._recent, self.global_limit)):
+            while window and now - window[0] >= 1.0:
+                window.popleft()
+            if limit is not None and len(window) >= limit:
+                return self._error(429, chat_id, "Too Many Requests", retry_after=self.retry_after)
+
+        self._recent.append(now)
+        self._recent_by_chat[chat_id].append(now)
+        self.messages.append((now, chat_id, text))
+        return {"ok": True, "result": {"message_id": len(self.messages), "chat": {"id": chat_id}, "text": text}}
+
+    async def get_updates(self, token: str, request: Request):
+        params = await request.json()
+        self.get_updates_calls.append(params)
+        offset, limit = params.get("offset"), params.get("limit", 100)
+        if offset is not None:
+            self.updates = [u for u in self.updates if u["update_id"] >= offset]
+        deadline = time.monotonic() + params.get("timeout", 0)
+        while not self.updates and time.monotonic() < deadline:
+            await asyncio.sleep(0.01)
+        return {"ok": True, "result": self.updates[:limit]}
+
+    async def delete_webhook(self, token: str):
+        return {"ok": True, "result": True}
@@ -0,0 +1,129 @@
+# app/tests/test_async_agents.py
+import uuid
+import asyncio
+
+import pytest
+
+pytestmark = pytest.mark.postgres
+
+
+def _run(coro):
+    """asyncio.run, closing the loop's asyncpg pool before the loop goes away."""
+    from app.services.db import dispose_async_engine
+
+    async def main():
+        try:
+            return await coro
+        finally:
+            await dispose_async_engine()
+
+    return asyncio.run(main())
+
+
+@pytest.fixture
+def shop(no_redis, customer, make_order):
+    """A product, a customer and a created order for it (no Redis); all removed afterwards."""
+    from sqlalchemy import text
+    from app.services.db import SessionLocal
+    from app.services import order_cache
+
+    tag = uuid.uuid4().hex[:8].upper()
+    db = SessionLocal()
+    pid = db.execute(
+        text("INSERT INTO products (sku, name, category, price, stock) "
+             "VALUES (:s, 'Async Tee', :c, 499, 7) RETURNING id"),
+        {"s": f"SKU-AS-{tag}", "c": f"async-{tag.lower()}"},
+    ).scalar_one()
+    db.commit()
+    db.close()
+    ext, oid = make_order(6000, customer)
+
+    yield {"tag": tag, "sku": f"SKU-AS-{tag}", "category": f"async-{tag.lower()}",
+           "customer": customer, "order": ext, "order_pk": oid}
+
+    db = SessionLocal()
+    db.execute(text("DELETE FROM products WHERE id = :p"), {"p": pid})
+    db.commit()
+    db.close()
+    order_cache.clear_local()
+
+
+def test_read_tools_match_their_sync_versions(shop):
+    from app.agents.recommendation_agent import recommend_products_sync, recommend_products_async
+    from app.agents.inventory_agent import check_stock_sync, check_stock_async
+
+    async def both():
+        return await asyncio.gather(recommend_products_async(shop["category"], 1000),
+                                    check_stock_async(shop["sku"]), check_stock_async("SKU-NOPE"))
+
+    rec, stock, missing = _run(both())
+    assert rec == recommend_products_sync(shop["category"], 1000)
+    assert [i["sku"] for i in rec["items"]] == [shop["sku"]]
+    assert stock == check_stock_sync(shop["sku"]) and stock["total_stock"] == 7
+    assert missing["found"] is False
+
+
+def test_concurrent_async_payments_authorize_once(shop):
+    from app.agents.payment_agent import authorize_payment_async
+
+    async def pay_many():
+        return await asyncio.gather(*(authorize_payment_async(shop["order"], 6000, {"type": "card"})
+                                      for _ in range(20)))
+
+    results = _run(pay_many())
+    assert all(r["db_update"] == "success" for r in results)
+    assert len({r["auth_code"] for r in results}) == 1
+    assert sum(1 for r in results if not r.get("idempotent_replay")) == 1
+
+
+def test_async_fulfillment_and_loyalty_commit(shop):
+    from sqlalchemy import text
+    from app.services.db import SessionLocal
+    from app.agents.fulfillment_agent import fulfill_order_async
+    from app.agents.loyalty_agent import add_loyalty_points_async
+
+    async def post_payment():
+        return await asyncio.gather(fulfill_order_async(shop["order"]),
+                                    add_loyalty_points_async(shop["customer"], 6000, deferred=False))
+
+    shipped, loyalty = _run(post_payment())
+    assert shipped["carrier"] == "BlueDart" and shipped["tracking_id"].startswith("TRK-")
+    assert (loyalty["points_added"], loyalty["total_points"]) == (60, 60)
+
+    db = SessionLocal()
+    try:
+        status, tracking = db.execute(
+            text("SELECT o.status, f.tracking_id FROM orders o JOIN fulfillments f ON f.order_id = o.id "
+                 "WHERE o.id = :o"), {"o": shop["order_pk"]}).one()
+    finally:
+        db.close()
+    assert (status, tracking) == ("shipped", shipped["tracking_id"])
+
+
+def test_tool_router_awaits_coroutine_tools_without_a_thread(shop, monkeypatch):
+    from app.services import tool_router
+
+    async def no_executor(*args, **kwargs):
+        raise AssertionError("coroutine tool was sent to the executor")
+
+    monkeypatch.setattr(tool_router, "_run_async", no_executor)
+    result = _run(tool_router.execute("check_stock", {"sku": shop["sku"]}))
+    assert result["found"] is True
+
+
+def test_read_tools_in_a_turn_share_one_connection(shop):
+    from app.services import db, tool_router
+
+    async def turn():
+        checkouts = lambda: db.get_async_engine().pool.wait_stats["checkouts"]  # noqa: E731
+        before = checkouts()
+        async with db.request_session_scope():
+            rec = await tool_router.execute("recommend", {"query": shop["category"], "budget": 1000})
+            stock = await tool_router.execute("check_stock", {"sku": rec["items"][0]["sku"]})
+            status = await tool_router.execute("order_status", {"order_id": shop["order"]})
+            during = checkouts() - before
+        return stock, status, during, checkouts() - before
+
+    stock, status, during, after = _run(turn())
+    assert stock["total_stock"] == 7 and status["order_status"] == "created"
+    assert during == after == 1
@@ -0,0 +1,150 @@
+# app/tests/test_db_routing.py
+import os
+import threading
+
+import pytest
+
+pytestmark = pytest.mark.postgres
+
+
+def _bad_url() -> str:
+    # same server, a database that doesn't exist: connecting fails fast
+    from sqlalchemy.engine import make_url
+    return make_url(os.environ["DATABASE_URL"]).set(database="no_such_replica_db").render_as_string(False)
+
+
+@pytest.fixture
+def routing(monkeypatch):
+    """Returns a helper that installs replicas (by URL) for the test."""
+    from app.services import db
+
+    created = []
+
+    def install(*urls):
+        replicas = [db.Replica(f"replica-{i}", url) for i, url in enumerate(urls)]
+        created.extend(replicas)
+        monkeypatch.setattr(db, "replicas", replicas)
+        return replicas
+
+    yield install
+    for r in created:
+        r.engine.dispose()
+
+
+def _served_by(db_module):
+    return db_module.run_read(lambda s: (s.get_bind(), s.execute(db_module.text("SELECT 1")).scalar()))
+
+
+def test_reads_go_to_a_healthy_replica(routing):
+    from app.services import db
+
+    replica, = routing(os.environ["DATABASE_URL"])   # the primary standing in as a replica
+    bind, one = _served_by(db)
+    assert bind is replica.engine and one == 1
+    assert replica.healthy and replica.lag_seconds == 0
+
+
+def test_failed_or_lagging_replica_falls_back_to_primary(routing, monkeypatch):
+    from app.services import db
+
+    down, = routing(_bad_url())
+    assert _served_by(db)[0] is db.engine
+    assert not down.healthy
+
+    lagging, = routing(os.environ["DATABASE_URL"])
+    monkeypatch.setattr(db, "REPLICA_MAX_LAG_SECONDS", -1.0)
+    assert _served_by(db)[0] is db.engine
+    assert not lagging.healthy
+
+
+def test_replica_lost_mid_read_is_retried_on_primary(routing):
+    from sqlalchemy import exc
+    from app.services import db
+
+    replica, = routing(os.environ["DATABASE_URL"])
+    calls = []
+
+    def flaky(session):
+        calls.append(session.get_bind())
+        if session.get_bind() is replica.engine:
+            raise exc.OperationalError("SELECT 1", {}, Exception("server closed the connection unexpectedly"))
+        return "ok"
+
+    assert db.run_read(flaky) == "ok"
+    assert calls == [replica.engine, db.engine] and not replica.healthy
+
+
+def test_chat_path_read_tools_use_the_replica_and_fall_back_when_it_lags(routing, monkeypatch):
+    import asyncio
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+    from test_telegram_webhook import MemoryStore
+    from app.services import db
+    from app.services.metrics_tracker import metrics_tracker
+    from app.services.orchestrator import execute_plan
+
+    monkeypatch.setattr(metrics_tracker, "redis", MemoryStore())
+    replica, = routing(os.environ["DATABASE_URL"])
+    served = []
+
+    def record(conn, cursor, statement, *args):
+        if "FROM products" in statement:
+            on_replica = replica._async_engine is not None and conn.engine is replica._async_engine.sync_engine
+            served.append("replica" if on_replica else "primary")
+
+    def turn():
+        async def main():
+            try:
+                plan = {"tool_calls": [{"tool": "check_stock", "args": {"sku": "SKU-NOPE"}}]}
+                return await execute_plan(plan, "sid-replica", {"messages": []})
+            finally:
+                await db.dispose_async_engine()
+        result = asyncio.run(main())["tool_results"][0]["result"]
+        assert result["found"] is False
+
+    event.listen(Engine, "before_cursor_execute", record)
+    try:
+        turn()
+        assert served == ["replica"] and replica.healthy
+
+        monkeypatch.setattr(db, "REPLICA_MAX_LAG_SECONDS", -1.0)
+        replica.checked_at = 0.0  # due for a lag check
+        served.clear()
+        turn()
+        assert served == ["primary"] and not replica.healthy
+    finally:
+        event.remove(Engine, "before_cursor_execute", record)
+
+
+def test_pool_settings_timeout_and_checkout_wait(monkeypatch):
+    from sqlalchemy import exc, text
+    from app.services.db import build_engine, pool_stats
+
+    for name, value in {"POOL_SIZE": "1", "MAX_OVERFLOW": "0", "POOL_TIMEOUT": "0.2",
+                        "STATEMENT_TIMEOUT_MS": "50"}.items():
+        monkeypatch.setenv(f"DB_TEST_{name}", value)
+    eng = build_engine(os.environ["DATABASE_URL"], prefix="DB_TEST_")
+    try:
+        assert (eng.pool.size(), eng.pool._max_overflow) == (1, 0)
+        with eng.connect() as conn:
+            with pytest.raises(exc.OperationalError, match="statement timeout"):
+                conn.execute(text("SELECT pg_sleep(1)"))
+
+        held = eng.connect()
+        releaser = threading.Timer(0.05, held.close)
+        releaser.start()
+        with eng.connect():          # waits for the held connection
+            pass
+        held2 = eng.connect()
+        with pytest.raises(exc.TimeoutError):
+            eng.connect()            # nothing comes back within POOL_TIMEOUT
+        held2.close()
+
+        stats = eng.pool.wait_stats
+        assert stats["waited"] >= 2 and stats["timeouts"] == 1
+        assert stats["wait_ms_max"] >= 150
+    finally:
+        eng.dispose()
+
+    primary = pool_stats()[0]
+    assert primary["engine"] == "primary" and {"checkouts", "wait_ms_avg", "checked_out"} <= set(primary)
@@ -0,0 +1,162 @@
+# app/tests/test_inventory_ingest.py
+import io
+import json
+import uuid
+
+import pytest
+
+from app.services import inventory_ingest
+from app.services.inventory_ingest import _copy_escape, ingest_inventory_feed, ingest_rows, iter_feed_rows
+
+
+def test_csv_ndjson_and_json_array_feeds_parse_to_the_same_rows():
+    expected = [("SKU-1", "STORE-A", 5), ("SKU-2", "STORE-B", -2)]
+    csv_feed = "sku,store_id,qty\nSKU-1,STORE-A,5\n SKU-2 , STORE-B ,-2\n"
+    ndjson = '{"sku": "SKU-1", "location": "STORE-A", "quantity": 5}\n\n{"sku": "SKU-2", "store": "STORE-B", "delta": -2}\n'
+    array = json.dumps([{"sku": "SKU-1", "location": "STORE-A", "quantity": 5},
+                        {"sku": "SKU-2", "location": "STORE-B", "qty": "-2"}], indent=2)
+
+    assert list(iter_feed_rows(io.StringIO(csv_feed), "csv")) == expected
+    assert list(iter_feed_rows(io.StringIO(ndjson), "json")) == expected
+    assert list(iter_feed_rows(io.StringIO("  \n" + array), "json")) == expected
+    assert list(iter_feed_rows(io.StringIO(""), "json")) == []
+
+
+def test_json_array_objects_split_across_read_chunks():
+    records = [{"sku": f"SKU-{i}", "location": "STORE-A", "quantity": i} for i in range(50)]
+    stream = io.StringIO(json.dumps(records)[1:])  # iter_json_rows has consumed the "["
+    assert list(inventory_ingest._iter_json_array(stream, chunk_size=7)) == records
+
+
+def test_malformed_rows_are_rejected():
+    with pytest.raises(ValueError, match="needs sku, location and quantity"):
+        list(iter_feed_rows(io.StringIO("sku,location,quantity\nSKU-1,STORE-A,\n"), "csv"))
+    with pytest.raises(ValueError):
+        list(iter_feed_rows(io.StringIO('{"sku": "SKU-1", "location": "A", "quantity": "lots"}\n'), "json"))
+    with pytest.raises(ValueError, match="Unknown feed format"):
+        iter_feed_rows(io.StringIO(""), "xml")
+
+
+def test_copy_escape_handles_tabs_backslashes_and_newlines():
+    assert _copy_escape("a\tb") == "a\\tb"
+    assert _copy_escape("C:\\store") == "C:\\\\store"
+    assert _copy_escape("line1\nline2\r") == "line1\\nline2\\r"
+    # the backslash is escaped first, so an escaped tab doesn't become "\\\\t"
+    assert _copy_escape("\\\t") == "\\\\\\t"
+
+
+@pytest.fixture
+def catalogue():
+    """Two throwaway products (stock 0); removes them and their inventory afterwards."""
+    from sqlalchemy import text
+    from app.services.db import SessionLocal
+
+    tag = uuid.uuid4().hex[:8].upper()
+    skus = [f"SKU-ING-{tag}-{i}" for i in range(2)]
+    db = SessionLocal()
+    ids = [db.execute(text("INSERT INTO products (sku, name, category, price, stock) "
+                           "VALUES (:s, 'Feed Tee', 'feed', 100, 0) RETURNING id"), {"s": s}).scalar_one()
+           for s in skus]
+    db.commit()
+    db.close()
+
+    yield {"tag": tag, "skus": skus, "ids": ids, "store": f"STORE-ING-{tag}"}
+
+    db = SessionLocal()
+    db.execute(text("DELETE FROM inventory WHERE product_id = ANY(:ids)"), {"ids": ids})
+    db.execute(text("DELETE FROM products WHERE id = ANY(:ids)"), {"ids": ids})
+    db.commit()
+    db.close()
+
+
+def _inventory(catalogue) -> tuple[dict, dict]:
+    """{(sku, location): (quantity, xmin)} and {sku: products.stock}."""
+    from sqlalchemy import text
+    from app.services.db import SessionLocal
+
+    db = SessionLocal()
+    try:
+        rows = db.execute(text("SELECT p.sku, i.location, i.quantity, i.xmin::text FROM inventory i "
+                               "JOIN products p ON p.id = i.product_id WHERE p.id = ANY(:ids)"),
+                          {"ids": catalogue["ids"]}).all()
+        stock = dict(db.execute(text("SELECT sku, stock FROM products WHERE id = ANY(:ids)"),
+                                {"ids": catalogue["ids"]}).all())
+    finally:
+        db.close()
+    return {(sku, loc): (qty, xmin) for sku, loc, qty, xmin in rows}, stock
+
+
+@pytest.mark.postgres
+def test_snapshot_then_delta_and_products_stock_sync(catalogue):
+    a, b = catalogue["skus"]
+    store, other = catalogue["store"], catalogue["store"] + "-2"
+
+    stats = ingest_rows([(a, store, 3), (a, store, 7), (a, other, 4), (b, store, -5)], mode="snapshot")
+    levels, stock = _inventory(catalogue)
+    # last row per key wins; a negative snapshot is stored as 0
+    assert {k: v[0] for k, v in levels.items()} == {(a, store): 7, (a, other): 4, (b, store): 0}
+    assert stock == {a: 11, b: 0}
+    assert stats["rows_staged"] == 4 and stats["products_changed"] == 2 and stats["products_stock_synced"] == 1
+
+    stats = ingest_rows([(a, store, 2), (a, store, 3), (a, other, -10), (b, store, 1), (b, other, -1)], mode="delta")
+    levels, stock = _inventory(catalogue)
+    # deltas per key are summed; stock never goes below 0; a negative delta creates no row
+    assert {k: v[0] for k, v in levels.items()} == {(a, store): 12, (a, other): 0, (b, store): 1}
+    assert stock == {a: 12, b: 1}
+    assert stats["products_changed"] == 2
+
+
+@pytest.mark.postgres
+def test_unchanged_keys_are_not_rewritten(catalogue):
+    a, b = catalogue["skus"]
+    store = catalogue["store"]
+    ingest_rows([(a, store, 5), (b, store, 9)], mode="snapshot")
+    before, _ = _inventory(catalogue)
+
+    stats = ingest_rows([(a, store, 5), (b, store, 8)], mode="snapshot")
+    after, stock = _inventory(catalogue)
+    assert after[(a, store)] == before[(a, store)]          # same row version: not updated
+    assert after[(b, store)][1] != before[(b, store)][1] and after[(b, store)][0] == 8
+    assert stats["products_changed"] == 1 and stock[b] == 8
+
+    stats = ingest_rows([(a, store, 2), (a, store, -2)], mode="delta")   # nets to zero
+    assert stats["products_changed"] == 0 and _inventory(catalogue)[0][(a, store)] == before[(a, store)]
+
+
+@pytest.mark.postgres
+def test_unknown_skus_are_counted_not_inserted(catalogue):
+    from sqlalchemy import text
+    from app.services.db import SessionLocal
+
+    a, _ = catalogue["skus"]
+    store = catalogue["store"]
+    feed = f"sku,location,quantity\n{a},{store},4\nSKU-NOT-IN-CATALOGUE-{catalogue['tag']},{store},9\n"
+    stats = ingest_inventory_feed(io.StringIO(feed), "csv")
+
+    assert stats["unknown_skus"] == 1 and stats["products_changed"] == 1
+    db = SessionLocal()
+    try:
+        assert db.execute(text("SELECT COUNT(*) FROM inventory WHERE location = :l"), {"l": store}).scalar() == 1
+    finally:
+        db.close()
+
+
+@pytest.mark.postgres
+def test_locations_with_copy_special_characters_round_trip(catalogue):
+    a, _ = catalogue["skus"]
+    odd = f"{catalogue['store']}\tback\\slash\nnew line"
+    ingest_inventory_feed(io.StringIO(json.dumps([{"sku": a, "location": odd, "quantity": 6}])), "json")
+    levels, _ = _inventory(catalogue)
+    assert {k: v[0] for k, v in levels.items()} == {(a, odd): 6}
+
+
+@pytest.mark.postgres
+def test_malformed_row_aborts_the_whole_feed(catalogue):
+    a, b = catalogue["skus"]
+    store = catalogue["store"]
+    feed = f"sku,location,quantity\n{a},{store},4\n{b},{store},four\n"
+
+    with pytest.raises(ValueError):
+        ingest_inventory_feed(io.StringIO(feed), "csv")
+    levels, stock = _inventory(catalogue)
+    assert levels == {} and stock == {a: 0, b: 0}
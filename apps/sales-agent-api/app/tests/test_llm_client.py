@@ -0,0 +1,52 @@
+# app/tests/test_llm_client.py
+import asyncio
+
+import httpx
+
+from fake_gemini import FakeGemini
+from app.services import llm_client
+
+BROWSE = {"reply_text": "Here are some shirts.",
+          "tool_calls": [{"tool": "recommend", "args": {"query": "shirt", "budget": 1500}}, {"tool": "bogus"}]}
+
+
+def _plan(gemini: FakeGemini, text: str, session: dict | None = None) -> dict:
+    async def main():
+        llm_client.set_client(httpx.AsyncClient(transport=httpx.ASGITransport(app=gemini.app),
+                                                base_url="http://gemini.test"))
+        try:
+            return await llm_client.plan(text, session or {"messages": []})
+        finally:
+            await llm_client.close_client()
+
+    return asyncio.run(main())
+
+
+def test_plan_parses_the_fenced_json_and_drops_malformed_tool_calls(monkeypatch):
+    monkeypatch.setattr(llm_client, "GEMINI_API_URL", "http://gemini.test")
+    monkeypatch.setenv("GEMINI_API_KEY", "test-key")
+    gemini = FakeGemini(plans={"shirt": BROWSE})
+    # only the current message picks the plan, not the history
+    plan = _plan(gemini, "any shirts under 1500?", {"messages": [{"role": "user", "text": "hello"}]})
+    assert plan == {"reply_text": "Here are some shirts.",
+                    "tool_calls": [{"tool": "recommend", "args": {"query": "shirt", "budget": 1500}}]}
+    assert _plan(gemini, "hello", {"messages": [{"role": "user", "text": "shirt"}]})["tool_calls"] == []
+    assert gemini.calls == 2
+
+
+def test_gemini_errors_fall_back_to_an_apology(monkeypatch):
+    monkeypatch.setattr(llm_client, "GEMINI_API_URL", "http://gemini.test")
+    monkeypatch.setenv("GEMINI_API_KEY", "test-key")
+    gemini = FakeGemini(error_rate=1.0)
+    plan = _plan(gemini, "any shirts?")
+    assert plan["tool_calls"] == [] and "unable to reach" in plan["reply_text"]
+    assert gemini.errors == 1
+
+
+def test_missing_api_key_never_calls_gemini(monkeypatch):
+    monkeypatch.setattr(llm_client, "GEMINI_API_URL", "http://gemini.test")
+    monkeypatch.delenv("GEMINI_API_KEY", raising=False)
+    gemini = FakeGemini(plans={"shirt": BROWSE})
+    plan = _plan(gemini, "any shirts under 1500?")
+    assert plan["tool_calls"] == [] and "unable to reach" in plan["reply_text"]
+    assert gemini.calls == 0
@@ -0,0 +1,79 @@
+# app/tests/test_llm_transport.py
+import time
+import asyncio
+
+import httpx
+import pytest
+
+from fake_gemini import FakeGemini
+from app.services import llm_client
+from app.services.llm_transport import RecordingTransport, ReplayTransport
+
+BROWSE = {"reply_text": "Here are some shirts.",
+          "tool_calls": [{"tool": "recommend", "args": {"query": "shirt", "budget": 1500}}]}
+
+
+@pytest.fixture(autouse=True)
+def gemini_url(monkeypatch):
+    monkeypatch.setattr(llm_client, "GEMINI_API_URL", "http://gemini.test")
+    monkeypatch.setenv("GEMINI_API_KEY", "test-key")
+
+
+def _plans(transport: httpx.AsyncBaseTransport, turns: list[tuple[str, dict]]) -> list[dict]:
+    async def main():
+        llm_client.set_client(httpx.AsyncClient(transport=transport, base_url="http://gemini.test"))
+        try:
+            return [await llm_client.plan(text, session) for text, session in turns]
+        finally:
+            await llm_client.close_client()
+
+    return asyncio.run(main())
+
+
+def _record(gemini: FakeGemini, directory, turns) -> list[dict]:
+    return _plans(RecordingTransport(httpx.ASGITransport(app=gemini.app), str(directory)), turns)
+
+
+TURNS = [("any shirts under 1500?", {"messages": []}),
+         ("hello", {"messages": [{"role": "user", "text": "hi"}]})]
+
+
+def test_replay_answers_recorded_prompts_without_gemini(tmp_path):
+    gemini = FakeGemini(plans={"shirt": BROWSE}, latency_ms=150)
+    recorded = _record(gemini, tmp_path, TURNS)
+    assert recorded[0] == BROWSE and gemini.calls == 2
+    # nothing secret on disk
+    assert "key=" not in "".join(p.read_text() for p in tmp_path.iterdir())
+
+    replay = ReplayTransport(str(tmp_path), latency="zero")
+    started = time.perf_counter()
+    assert _plans(replay, TURNS) == recorded
+    assert time.perf_counter() - started < 0.1
+    assert gemini.calls == 2 and replay.counters == {"hits": 2, "current_message_hits": 0, "misses": 0}
+
+    started = time.perf_counter()
+    _plans(ReplayTransport(str(tmp_path), latency="original"), TURNS)
+    assert time.perf_counter() - started >= 0.3
+
+
+def test_unrecorded_prompts_miss_unless_matching_on_the_current_message(tmp_path):
+    _record(FakeGemini(plans={"shirt": BROWSE}), tmp_path, TURNS[:1])
+    drifted = [("any shirts under 1500?", {"messages": [{"role": "tool", "text": "product 42"}]})]
+
+    strict = ReplayTransport(str(tmp_path), latency="zero")
+    [plan] = _plans(strict, drifted)
+    assert plan["tool_calls"] == [] and strict.counters["misses"] == 1
+
+    loose = ReplayTransport(str(tmp_path), latency="zero", match="current")
+    assert _plans(loose, drifted) == [BROWSE]
+    assert loose.counters["current_message_hits"] == 1
+
+
+def test_repeated_prompts_replay_their_recordings_in_turn(tmp_path):
+    gemini = FakeGemini(plans={"shirt": BROWSE})
+    _record(gemini, tmp_path, TURNS[:1])
+    gemini.plans = {"shirt": {"reply_text": "Sold out, sorry.", "tool_calls": []}}
+    _record(gemini, tmp_path, TURNS[:1])
+
+    replies = [p["reply_text"] for p in _plans(ReplayTransport(str(tmp_path), latency="zero"), TURNS[:1] * 3)]
+    assert replies == ["Here are some shirts.", "Sold out, sorry.", "Here are some shirts."]
@@ -0,0 +1,51 @@
+# app/tests/test_loyalty.py
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+pytestmark = pytest.mark.postgres
+
+
+def _state(cid: int):
+    from sqlalchemy import text
+    from app.services.db import SessionLocal
+
+    db = SessionLocal()
+    try:
+        return db.execute(
+            text("SELECT COUNT(a.id) AS accounts, COALESCE(SUM(a.points), 0) AS points, c.loyalty_tier "
+                 "FROM customers c LEFT JOIN loyalty_accounts a ON a.customer_id = c.id "
+                 "WHERE c.id = :c GROUP BY c.loyalty_tier"),
+            {"c": cid},
+        ).one()
+    finally:
+        db.close()
+
+
+def test_concurrent_accruals_keep_one_account(customer):
+    from app.agents.loyalty_agent import add_loyalty_points_sync
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        results = list(pool.map(lambda _: add_loyalty_points_sync(customer, 1000, deferred=False), range(64)))
+
+    assert all(r["db_update"] == "success" for r in results)
+    state = _state(customer)
+    assert (state.accounts, state.points) == (1, 640)
+    assert state.loyalty_tier == "silver"
+    # exactly one accrual crossed the silver threshold
+    assert [r.get("loyalty_tier") for r in results].count("silver") == 1
+
+
+def test_ledger_fold_applies_in_bulk(customer):
+    from app.agents.loyalty_agent import add_loyalty_points_sync, fold_loyalty_ledger, fold_all_pending
+
+    pending = [add_loyalty_points_sync(customer, 10_000, deferred=True) for _ in range(25)]
+    assert all(r["pending"] and r["total_points"] is None for r in pending)
+    assert _state(customer).accounts == 0
+
+    first = fold_loyalty_ledger(batch_size=10)
+    assert first["entries"] == 10 and first["accounts"] == 1
+    assert fold_all_pending(batch_size=10) >= 15
+
+    state = _state(customer)
+    assert (state.accounts, state.points, state.loyalty_tier) == (1, 2500, "gold")
@@ -0,0 +1,111 @@
+# app/tests/test_order_cache.py
+import pytest
+
+pytestmark = pytest.mark.postgres
+
+
+@pytest.fixture
+def cache(monkeypatch, no_redis):
+    """Local tier only (no Redis), emptied before and after."""
+    from app.services import order_cache
+
+    monkeypatch.setattr(order_cache, "LOCAL_TTL_SECONDS", 60.0)
+    monkeypatch.setattr(order_cache, "_cache_down_until", 0.0)  # an earlier test may have tripped the Redis backoff
+    order_cache.clear_local()
+    yield order_cache
+    order_cache.clear_local()
+
+
+def _new_order(customer: int) -> dict:
+    from app.services.order_service import create_order
+    return create_order(customer, [{"sku": "SKU-OC", "quantity": 2, "unit_price": 400}])
+
+
+def test_transitions_write_through_and_status_reads_skip_postgres(cache, customer, record_sql):
+    from app.agents.order_agent import get_order_status_sync
+    from app.agents.payment_agent import authorize_payment_sync
+
+    created = _new_order(customer)
+    ext = created["order_id"]
+
+    seen, stop = record_sql()
+    try:
+        assert get_order_status_sync(ext)["order_status"] == "created"
+        assert cache.get_order_state(created["db_id"])["external_id"] == ext
+        assert authorize_payment_sync(ext, 800, {"type": "card"})["db_update"] == "success"
+        status = get_order_status_sync(ext)
+    finally:
+        stop()
+
+    assert (status["order_status"], status["payment_status"], status["total_amount"]) == ("completed", "PAID", 800)
+    # the payment wrote (ledger claim, order update, reservations) but never re-read the order
+    assert not any("FROM orders" in s and s.lstrip().upper().startswith("SELECT") for s in seen)
+
+
+def test_rolled_back_transition_is_not_published(cache, customer):
+    from sqlalchemy import text
+    from app.services.db import SessionLocal
+
+    ext = _new_order(customer)["order_id"]
+    db = SessionLocal()
+    try:
+        row = db.execute(text(f"UPDATE orders SET status = 'shipped' WHERE external_id = :e "
+                              f"RETURNING {cache.state_columns()}"), {"e": ext}).one()
+        cache.stage(db, row)
+        db.rollback()
+        assert cache.get_order_state(ext)["status"] == "created"
+
+        row = db.execute(text(f"UPDATE orders SET status = 'shipped' WHERE external_id = :e "
+                              f"RETURNING {cache.state_columns()}"), {"e": ext}).one()
+        cache.stage(db, row)
+        assert cache.get_order_state(ext)["status"] == "created"
+        db.commit()
+    finally:
+        db.close()
+    assert cache.get_order_state(ext)["status"] == "shipped"
+
+
+def test_cold_miss_loads_once_then_redis_serves_other_processes(cache, customer, record_sql, monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    from app.agents.order_agent import get_order_status_sync
+
+    ext = _new_order(customer)["order_id"]
+    cache.clear_local()
+    monkeypatch.setattr(cache, "get_sync_client", lambda r=fakeredis.FakeRedis(decode_responses=True): r)
+
+    assert get_order_status_sync(ext)["order_status"] == "created"   # loaded from Postgres
+    cache.clear_local()                                              # as seen by another process
+    seen, stop = record_sql()
+    try:
+        assert get_order_status_sync(ext)["order_status"] == "created"
+    finally:
+        stop()
+    assert seen == []
+    assert get_order_status_sync("ORD-DOES-NOT-EXIST")["status"] == "error"
+
+
+def test_async_writes_reach_redis_in_commit_order(cache, customer, monkeypatch):
+    import time
+    import asyncio
+    fakeredis = pytest.importorskip("fakeredis")
+
+    state = cache.get_order_state(_new_order(customer)["order_id"])
+    redis = fakeredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(cache, "get_sync_client", lambda: redis)
+    original = cache._redis_put
+
+    def slow_shipped(states):
+        if states[0]["status"] == "shipped":
+            time.sleep(0.1)   # this write is slow; the next transition must still win
+        original(states)
+
+    monkeypatch.setattr(cache, "_redis_put", slow_shipped)
+
+    async def transitions():
+        cache.put({**state, "status": "shipped"})
+        cache.put({**state, "status": "completed"})
+
+    asyncio.run(transitions())
+    cache.flush()
+    cache.clear_local()
+    assert cache.get_order_state(state["external_id"])["status"] == "completed"
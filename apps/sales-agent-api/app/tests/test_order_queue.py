@@ -0,0 +1,213 @@
+# app/tests/test_order_queue.py
+import time
+import asyncio
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from app.services.order_queue import OrderQueue, OrderWorkerPool, DEAD_LETTER_STREAM  # noqa: E402
+
+
+async def _wait_for_state(queue: OrderQueue, job_id: str, state: str, timeout: float = 5.0) -> dict:
+    deadline = asyncio.get_running_loop().time() + timeout
+    while asyncio.get_running_loop().time() < deadline:
+        job = await queue.status(job_id)
+        if job and job["state"] == state:
+            return job
+        await asyncio.sleep(0.02)
+    raise AssertionError(f"job {job_id} never reached {state}: {await queue.status(job_id)}")
+
+
+def test_idempotent_enqueue_and_successful_run():
+    async def scenario():
+        queue = OrderQueue(fakeredis.FakeAsyncRedis(decode_responses=True))
+        runs = []
+
+        async def handler(payload):
+            runs.append(payload["order_id"])
+            return {"workflow_status": "success", "order_id": payload["order_id"]}
+
+        job_id, created = await queue.enqueue({"order_id": "ORD-1"}, idempotency_key="process:ORD-1")
+        again, created_again = await queue.enqueue({"order_id": "ORD-1"}, idempotency_key="process:ORD-1")
+        assert created and not created_again and again == job_id
+
+        pool = OrderWorkerPool(queue, handler, concurrency=3, block_ms=None)
+        await pool.start()
+        try:
+            job = await _wait_for_state(queue, job_id, "succeeded")
+        finally:
+            await pool.stop()
+        assert runs == ["ORD-1"]
+        assert job["result"]["order_id"] == "ORD-1"
+
+    asyncio.run(scenario())
+
+
+def test_failed_enqueue_leaves_no_dead_idempotency_key(monkeypatch):
+    from redis.asyncio.client import Pipeline
+    from redis.exceptions import ConnectionError
+
+    execute, failures = Pipeline.execute, []
+
+    async def flaky_execute(self, *args, **kwargs):
+        if not failures:
+            failures.append(True)
+            raise ConnectionError("connection reset")
+        return await execute(self, *args, **kwargs)
+
+    async def scenario():
+        queue = OrderQueue(fakeredis.FakeAsyncRedis(decode_responses=True))
+        with pytest.raises(ConnectionError):
+            await queue.enqueue({"order_id": "ORD-2"}, idempotency_key="process:ORD-2")
+        job_id, created = await queue.enqueue({"order_id": "ORD-2"}, idempotency_key="process:ORD-2")
+        assert created and (await queue.status(job_id))["state"] == "queued"
+        assert await queue.enqueue({"order_id": "ORD-2"}, idempotency_key="process:ORD-2") == (job_id, False)
+
+    monkeypatch.setattr(Pipeline, "execute", flaky_execute)
+    asyncio.run(scenario())
+
+
+def test_retries_with_backoff_then_dead_letters():
+    async def scenario():
+        redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+        queue = OrderQueue(redis)
+        attempts = {"flaky": 0, "broken": 0}
+
+        async def handler(payload):
+            attempts[payload["order_id"]] += 1
+            if payload["order_id"] == "flaky" and attempts["flaky"] >= 2:
+                return {"workflow_status": "success"}
+            return {"status": "error", "message": "payment gateway timeout"}
+
+        flaky, _ = await queue.enqueue({"order_id": "flaky"})
+        broken, _ = await queue.enqueue({"order_id": "broken"})
+        pool = OrderWorkerPool(queue, handler, concurrency=2, max_attempts=3, backoff_base=0.05, block_ms=None)
+        await pool.start()
+        try:
+            assert (await _wait_for_state(queue, flaky, "succeeded"))["attempts"] == 2
+            dead = await _wait_for_state(queue, broken, "dead")
+        finally:
+            await pool.stop()
+
+        assert dead["attempts"] == 3 and "timeout" in dead["last_error"]
+        dlq = await redis.xrange(DEAD_LETTER_STREAM)
+        assert [fields["job_id"] for _, fields in dlq] == [broken]
+
+    asyncio.run(scenario())
+
+
+def test_slow_job_is_not_reclaimed_while_its_worker_runs_it():
+    async def scenario():
+        redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+        queue = OrderQueue(redis)
+        runs = []
+
+        async def slow(payload):
+            runs.append(payload["order_id"])
+            await asyncio.sleep(2.5)   # well past claim_idle_ms
+            return {"workflow_status": "success"}
+
+        job_id, _ = await queue.enqueue({"order_id": "ORD-SLOW"})
+        pools = [OrderWorkerPool(queue, slow, concurrency=1, consumer=name, claim_idle_ms=300, block_ms=None)
+                 for name in ("a", "b")]
+        for pool in pools:
+            await pool.start()
+        try:
+            await _wait_for_state(queue, job_id, "succeeded")
+        finally:
+            for pool in pools:
+                await pool.stop()
+        assert runs == ["ORD-SLOW"]
+
+    asyncio.run(scenario())
+
+
+def test_job_whose_worker_died_after_scheduling_its_retry_runs_once():
+    from app.services.order_queue import GROUP, RETRY_ZSET, STREAM
+
+    async def scenario():
+        redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+        queue = OrderQueue(redis)
+        runs = []
+
+        async def handler(payload):
+            runs.append(payload["order_id"])
+            return {"workflow_status": "success"}
+
+        job_id, _ = await queue.enqueue({"order_id": "ORD-RETRY"})
+        await queue.ensure_group()
+        # a worker read the entry, failed, scheduled the retry and died before XACK
+        await redis.xreadgroup(GROUP, "crashed", {STREAM: ">"}, count=1)
+        await queue._update(job_id, state="retry_scheduled", attempts=1, last_error="boom")
+        await redis.zadd(RETRY_ZSET, {job_id: time.time() + 1.5})
+
+        pool = OrderWorkerPool(queue, handler, concurrency=1, claim_idle_ms=300, block_ms=None)
+        await pool.start()
+        try:
+            await _wait_for_state(queue, job_id, "succeeded")
+            await asyncio.sleep(1.0)   # give a duplicate run time to show up
+        finally:
+            await pool.stop()
+        assert runs == ["ORD-RETRY"]
+        assert (await redis.xpending(STREAM, GROUP))["pending"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_process_endpoint_returns_202_and_status():
+    import httpx
+    from fastapi import FastAPI
+    from app import api
+    from app.services import order_queue
+
+    async def scenario():
+        queue = OrderQueue(fakeredis.FakeAsyncRedis(decode_responses=True))
+        order_queue.set_order_queue(queue)
+        app = FastAPI()
+        app.include_router(api.router)
+        body = {"order_id": "ORD-9", "customer_id": 1, "total_amount": 1299, "payment_method": {"type": "upi"}}
+        try:
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+                first = await client.post("/v1/orders/process", json=body)
+                second = await client.post("/v1/orders/process", json=body)
+                status = await client.get(first.json()["status_url"])
+        finally:
+            order_queue.set_order_queue(None)
+
+        assert first.status_code == 202 and second.status_code == 202
+        assert second.json() == {**first.json(), "duplicate": True}
+        assert status.json()["state"] == "queued"
+
+    asyncio.run(scenario())
+
+
+def test_dead_lettered_order_can_be_resubmitted():
+    import httpx
+    from fastapi import FastAPI
+    from app import api
+    from app.services import order_queue
+
+    async def failing(payload):
+        return {"status": "error", "message": "card declined"}
+
+    async def scenario():
+        queue = OrderQueue(fakeredis.FakeAsyncRedis(decode_responses=True))
+        order_queue.set_order_queue(queue)
+        app = FastAPI()
+        app.include_router(api.router)
+        body = {"order_id": "ORD-DEAD", "customer_id": 1, "total_amount": 1299}
+        pool = OrderWorkerPool(queue, failing, concurrency=1, max_attempts=1, block_ms=None)
+        await pool.start()
+        try:
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+                first = (await client.post("/v1/orders/process", json=body)).json()
+                await _wait_for_state(queue, first["job_id"], "dead")
+                again = (await client.post("/v1/orders/process", json=body)).json()
+        finally:
+            await pool.stop()
+            order_queue.set_order_queue(None)
+
+        assert not again["duplicate"] and again["job_id"] != first["job_id"]
+
+    asyncio.run(scenario())
@@ -0,0 +1,82 @@
+# app/tests/test_order_saga.py
+import asyncio
+
+import pytest
+
+pytestmark = pytest.mark.postgres
+
+
+@pytest.fixture
+def order_ref(no_redis, customer, make_order):
+    """A fresh customer and created order (ledger-only payments); both removed with their side effects afterwards."""
+    ext, oid = make_order(2500)
+    return ext, oid, customer
+
+
+def _state(oid: int, cid: int):
+    from sqlalchemy import text
+    from app.services.db import SessionLocal
+
+    db = SessionLocal()
+    try:
+        return db.execute(
+            text("SELECT o.status, o.payment_status, "
+                 "(SELECT COUNT(*) FROM payment_ledger l WHERE l.order_id = o.external_id) AS ledger_rows, "
+                 "(SELECT string_agg(f.status, ',') FROM fulfillments f WHERE f.order_id = o.id) AS shipments, "
+                 "(SELECT COALESCE(SUM(a.points), 0) FROM loyalty_accounts a WHERE a.customer_id = :c) AS points "
+                 "FROM orders o WHERE o.id = :o"),
+            {"o": oid, "c": cid},
+        ).one()
+    finally:
+        db.close()
+
+
+def test_async_workflow_completes_order(order_ref):
+    from app.workflows.order_workflow import process_order_async
+
+    ext, oid, cid = order_ref
+    result = asyncio.run(process_order_async(ext, cid, 2500, {"type": "card"}))
+
+    assert result["workflow_status"] == "success"
+    assert set(result["timings"]) == {"payment", "fulfillment", "loyalty", "complete"}
+    state = _state(oid, cid)
+    assert (state.status, state.payment_status, state.ledger_rows) == ("completed", "PAID", 1)
+    assert (state.shipments, state.points) == ("shipped", 25)
+
+
+def test_failed_step_is_compensated(order_ref, monkeypatch):
+    import app.workflows.order_workflow as order_workflow
+
+    async def carrier_down(order_id):
+        return {"status": "error", "message": "carrier down"}
+
+    monkeypatch.setattr(order_workflow, "fulfill_order_async", carrier_down)
+    ext, oid, cid = order_ref
+    result = asyncio.run(order_workflow.process_order_async(ext, cid, 2500, {"type": "card"}))
+
+    assert result["status"] == "error" and result["failed_step"] == "fulfillment"
+    assert result["compensated"] == {"loyalty": "compensated", "payment": "compensated"}
+    state = _state(oid, cid)
+    assert (state.status, state.payment_status, state.ledger_rows) == ("payment_voided", "VOIDED", 0)
+    assert (state.shipments, state.points) == (None, 0)
+
+
+def test_failed_void_is_reported_not_marked_compensated(order_ref, monkeypatch):
+    import app.workflows.order_workflow as order_workflow
+
+    async def carrier_down(order_id):
+        return {"status": "error", "message": "carrier down"}
+
+    def void_down(order_id, amount):
+        return {"status": "error", "order_id": order_id, "message": "ledger unavailable"}
+
+    monkeypatch.setattr(order_workflow, "fulfill_order_async", carrier_down)
+    monkeypatch.setattr(order_workflow, "void_payment_sync", void_down)
+    ext, oid, cid = order_ref
+    result = asyncio.run(order_workflow.process_order_async(ext, cid, 2500, {"type": "card"}))
+
+    assert result["failed_step"] == "fulfillment"
+    payment = result["compensated"]["payment"]
+    assert payment.startswith("failed") and "ledger unavailable" in payment
+    assert result["compensated"]["loyalty"] == "compensated"
+    assert _state(oid, cid).payment_status == "PAID"   # left for manual follow-up, not silently "compensated"
@@ -0,0 +1,118 @@
+# app/tests/test_order_service.py
+import uuid
+
+import pytest
+
+pytestmark = pytest.mark.postgres
+
+
+@pytest.fixture
+def catalogue(make_customer):
+    """A throwaway customer and product; cleans up every order created for the customer."""
+    from sqlalchemy import text
+    from app.services.db import SessionLocal
+
+    tag = uuid.uuid4().hex[:8].upper()
+    customer_pk, customer_ref = make_customer()
+    db = SessionLocal()
+    product_id = db.execute(
+        text("INSERT INTO products (sku, name, category, price, stock) VALUES (:sku, 'Test Tee', 'tshirts', 250, 10) "
+             "RETURNING id"),
+        {"sku": f"SKU-ORD-{tag}"},
+    ).scalar_one()
+    db.execute(text("INSERT INTO inventory (product_id, location, quantity) VALUES (:p, :l, 200)"),
+               {"p": product_id, "l": f"STORE-{tag}"})
+    db.commit()
+    db.close()
+
+    yield {"tag": tag, "sku": f"SKU-ORD-{tag}", "product_id": product_id, "location": f"STORE-{tag}",
+           "customer_ref": customer_ref, "customer_pk": customer_pk}
+
+    db = SessionLocal()
+    db.execute(text("DELETE FROM stock_reservations WHERE product_id = :p"), {"p": product_id})
+    db.execute(text("DELETE FROM inventory WHERE product_id = :p"), {"p": product_id})
+    db.execute(text("DELETE FROM products WHERE id = :p"), {"p": product_id})
+    db.commit()
+    db.close()
+
+
+def _items(db_id: int):
+    from sqlalchemy import text
+    from app.services.db import SessionLocal
+
+    db = SessionLocal()
+    try:
+        return db.execute(
+            text("SELECT sku, product_id, quantity, unit_price FROM order_items WHERE order_id = :o ORDER BY id"),
+            {"o": db_id},
+        ).all()
+    finally:
+        db.close()
+
+
+def _held(catalogue) -> dict:
+    from sqlalchemy import text
+    from app.services.db import SessionLocal
+
+    db = SessionLocal()
+    try:
+        return dict(db.execute(
+            text("SELECT order_id, SUM(quantity) FROM stock_reservations WHERE product_id = :p AND status = 'held' "
+                 "GROUP BY order_id"),
+            {"p": catalogue["product_id"]},
+        ).all())
+    finally:
+        db.close()
+
+
+def test_create_order_inserts_items_with_catalogue_defaults(catalogue):
+    from app.agents.order_agent import create_order_sync
+
+    info = create_order_sync(
+        catalogue["customer_ref"],
+        [{"sku": catalogue["sku"], "quantity": 2}, {"sku": "SKU-OFF-CATALOGUE", "quantity": 1, "unit_price": 99}],
+    )
+
+    assert "db_error" not in info
+    assert info["item_count"] == 2 and info["total_amount"] == 2 * 250 + 99
+    assert _items(info["db_id"]) == [
+        (catalogue["sku"], catalogue["product_id"], 2, 250),
+        ("SKU-OFF-CATALOGUE", None, 1, 99),
+    ]
+    assert _held(catalogue) == {info["order_id"]: 2}   # off-catalogue lines hold nothing
+
+
+def test_bulk_create_is_rerunnable(catalogue):
+    from app.services.order_service import create_orders_bulk
+
+    orders = [
+        {"external_id": f"IMP-{catalogue['tag']}-{i}", "customer_id": catalogue["customer_pk"],
+         "items": [{"sku": catalogue["sku"], "quantity": 1 + i % 3}] * 2}
+        for i in range(25)
+    ]
+    first = create_orders_bulk(orders, chunk_size=10)
+    assert [c["order_id"] for c in first["created"]] == [o["external_id"] for o in orders]
+    assert all(c["item_count"] == 2 for c in first["created"])
+
+    again = create_orders_bulk(orders[:5] + [{**orders[0], "external_id": f"IMP-{catalogue['tag']}-new"}])
+    assert again["skipped"] == [o["external_id"] for o in orders[:5]]
+    assert [c["order_id"] for c in again["created"]] == [f"IMP-{catalogue['tag']}-new"]
+    assert sum(_held(catalogue).values()) == sum(2 * (1 + i % 3) for i in range(25)) + 2
+
+
+def test_orders_without_stock_are_rejected(catalogue):
+    from app.agents.order_agent import create_order_sync
+    from app.services.order_service import create_orders_bulk
+
+    info = create_order_sync(catalogue["customer_ref"], [{"sku": catalogue["sku"], "quantity": 201}])
+    assert info["status"] == "insufficient_stock" and "db_id" not in info
+    assert info["missing"] == [{"product_id": catalogue["product_id"], "location": catalogue["location"],
+                                "quantity": 201}]
+
+    orders = [{"external_id": f"BIG-{catalogue['tag']}-{i}", "customer_id": catalogue["customer_pk"],
+               "items": [{"sku": catalogue["sku"], "quantity": 80}]} for i in range(3)]
+    result = create_orders_bulk(orders)
+    assert [c["order_id"] for c in result["created"]] == [o["external_id"] for o in orders[:2]]
+    assert [r["order_id"] for r in result["rejected"]] == [orders[2]["external_id"]] and result["skipped"] == []
+    assert _held(catalogue) == {o["external_id"]: 80 for o in orders[:2]}
+    assert create_orders_bulk(orders[2:])["rejected"]   # nothing was left behind to skip
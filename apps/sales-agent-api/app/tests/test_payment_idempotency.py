@@ -0,0 +1,82 @@
+# app/tests/test_payment_idempotency.py
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+pytestmark = pytest.mark.postgres
+
+
+@pytest.fixture
+def order_ref(make_order):
+    """A fresh created order; removed with its ledger rows afterwards."""
+    return make_order(1999)
+
+
+def test_load_order_by_id_or_external_id(order_ref):
+    from app.services.db import SessionLocal
+    from app.services.order_cache import load_order
+
+    ext, db_id = order_ref
+    db = SessionLocal()
+    try:
+        assert load_order(db, ext).id == db_id
+        assert load_order(db, str(db_id)).external_id == ext
+        assert load_order(db, "ORD-DOES-NOT-EXIST") is None
+    finally:
+        db.close()
+
+
+def test_concurrent_retries_authorize_once(order_ref, no_redis):
+    from app.agents.payment_agent import authorize_payment_sync
+
+    ext, _ = order_ref
+    with ThreadPoolExecutor(max_workers=10) as pool:
+        results = list(pool.map(lambda _: authorize_payment_sync(ext, 1999, {"type": "card"}), range(20)))
+
+    assert all(r["db_update"] == "success" for r in results)
+    assert len({r["auth_code"] for r in results}) == 1
+    assert sum(1 for r in results if not r.get("idempotent_replay")) == 1
+
+    # a different amount under the same explicit key is refused
+    clash = authorize_payment_sync(ext, 10, {"type": "card"}, idempotency_key=f"payment:{ext}")
+    assert clash["status"] == "error"
+
+
+def test_replan_with_another_amount_is_refused_not_reauthorized(order_ref, no_redis):
+    from sqlalchemy import text
+    from app.services.db import SessionLocal
+    from app.agents.payment_agent import authorize_payment_sync
+
+    ext, _ = order_ref
+    first = authorize_payment_sync(ext, 1999, {"type": "card"})
+    replanned = authorize_payment_sync(ext, 1500, {"type": "card"})
+
+    assert first["db_update"] == "success"
+    assert replanned["status"] == "error" and "1999" in replanned["message"]
+    db = SessionLocal()
+    try:
+        ledger = db.execute(text("SELECT amount FROM payment_ledger WHERE order_id = :e"), {"e": ext}).scalars().all()
+    finally:
+        db.close()
+    assert ledger == [1999]
+
+
+def test_cached_replay_skips_the_database(order_ref, record_sql):
+    fakeredis = pytest.importorskip("fakeredis")
+    from app.services import session_store
+    from app.agents.payment_agent import authorize_payment_sync
+
+    ext, _ = order_ref
+    session_store.set_sync_client(fakeredis.FakeRedis(decode_responses=True))
+    try:
+        first = authorize_payment_sync(ext, 1999, {"type": "upi"})
+        seen, stop = record_sql()
+        try:
+            again = authorize_payment_sync(ext, 1999, {"type": "upi"})
+        finally:
+            stop()
+    finally:
+        session_store.set_sync_client(None)
+
+    assert again["idempotent_replay"] and again["auth_code"] == first["auth_code"]
+    assert seen == []
@@ -0,0 +1,95 @@
+# app/tests/test_profiling.py
+import time
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+from test_telegram_webhook import MemoryStore
+from app.services import profiling
+
+SECRET = "s3cret"
+
+
+@pytest.fixture
+def chat(monkeypatch, tmp_path):
+    """The app with a stubbed planner and two tools: CPU work on an executor thread, then an async wait."""
+    from app.main import app
+    from app.services import llm_client, session_store, tool_router
+    from app.services.metrics_tracker import metrics_tracker
+
+    store = MemoryStore()
+    monkeypatch.setattr(session_store, "session_store", store)
+    monkeypatch.setattr(metrics_tracker, "redis", store)
+
+    async def plan(text, session):
+        return {"reply_text": "ok", "tool_calls": [{"tool": "crunch", "args": {}}, {"tool": "wait", "args": {}}]}
+
+    def crunch_numbers():
+        deadline = time.perf_counter() + 0.15
+        while time.perf_counter() < deadline:
+            sum(range(1000))
+        return {"ok": True}
+
+    async def wait_for_backend():
+        await asyncio.sleep(0.15)
+        return {"ok": True}
+
+    monkeypatch.setattr(llm_client, "plan", plan)
+    monkeypatch.setitem(tool_router.TOOL_MAP, "crunch", crunch_numbers)
+    monkeypatch.setitem(tool_router.TOOL_MAP, "wait", wait_for_backend)
+    monkeypatch.setenv("WARM_UP", "0")
+    monkeypatch.delenv("DATABASE_URL", raising=False)
+    monkeypatch.setenv("PROFILE_SECRET", SECRET)
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path))
+    yield TestClient(app), tmp_path
+    profiling.arm(0)
+
+
+def _post(client, headers=None):
+    resp = client.post("/v1/chat", json={"channel": "web", "text": "hi"}, headers=headers or {})
+    assert resp.status_code == 200
+    return resp
+
+
+def test_signed_header_profiles_the_request_across_the_loop_and_executor_threads(chat):
+    client, profile_dir = chat
+    _post(client)
+    assert list(profile_dir.iterdir()) == []  # no header: nothing sampled
+
+    resp = _post(client, {"X-Profile": profiling.sign(int(time.time()) + 60, SECRET.encode())})
+    stacks = dict(line.rsplit(" ", 1) for line in (profile_dir / resp.headers["X-Profile-File"]).read_text().splitlines())
+    samples = {stack: int(n) for stack, n in stacks.items()}
+
+    def share(frame: str) -> float:
+        return sum(n for s, n in samples.items() if frame in s) / sum(samples.values())
+
+    # the thread tool's frames hang under the await chain of the request that waits for it
+    thread_stacks = [s for s in samples if "crunch_numbers" in s]
+    assert thread_stacks and all("chat (app/main.py" in s.split(";")[0] and "[thread]" in s for s in thread_stacks)
+    assert all("execute (services/tool_router.py" in s for s in thread_stacks)
+    assert any("wait_for_backend" in s and s.endswith("[await Future]") for s in samples)
+    assert share("crunch_numbers") > 0.25 and share("wait_for_backend") > 0.25
+
+
+def test_bad_or_expired_signatures_are_ignored(chat):
+    client, profile_dir = chat
+    expired = profiling.sign(int(time.time()) - 1, SECRET.encode())
+    forged = profiling.sign(int(time.time()) + 60, b"guess")
+    for token in (expired, forged, "junk"):
+        assert "X-Profile-File" not in _post(client, {"X-Profile": token}).headers
+    assert list(profile_dir.iterdir()) == []
+
+
+def test_admin_endpoint_arms_the_next_requests(chat):
+    client, profile_dir = chat
+    assert client.post("/v1/admin/profile", json={"requests": 2}, headers={"X-Admin-Token": "nope"}).status_code == 403
+    admin = {"X-Admin-Token": SECRET}
+    assert client.post("/v1/admin/profile", json={"requests": 2}, headers=admin).json()["armed"] == 2
+
+    names = [_post(client).headers.get("X-Profile-File") for _ in range(3)]
+    assert names[0] and names[1] and names[2] is None
+    status = client.get("/v1/admin/profile", headers=admin).json()
+    assert status["armed"] == 0 and sorted(status["profiles"]) == sorted(names[:2])
+    assert "wait_for_backend" in client.get(f"/v1/admin/profile/{names[0]}", headers=admin).text
+    assert client.get("/v1/admin/profile/..%2F..%2Fetc%2Fpasswd", headers=admin).status_code == 404
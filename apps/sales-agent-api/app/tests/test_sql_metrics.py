@@ -0,0 +1,83 @@
+# app/tests/test_sql_metrics.py
+import asyncio
+import logging
+
+import pytest
+from fastapi.testclient import TestClient
+
+from test_telegram_webhook import MemoryStore
+from app.services import sql_metrics
+
+pytestmark = pytest.mark.postgres
+
+
+@pytest.fixture
+def tools(monkeypatch):
+    """Two tools: one fetching rows one at a time on the async engine (N+1), one sync query in a thread."""
+    from sqlalchemy import text
+    from app.services import tool_router
+    from app.services.db import AsyncSessionLocal, SessionLocal
+    from app.services.metrics_tracker import metrics_tracker
+
+    async def one_by_one(skus):
+        async with AsyncSessionLocal() as db:
+            return [(await db.execute(text("SELECT :sku AS sku, pg_sleep(0.005)"), {"sku": s})).scalar() for s in skus]
+
+    def card_lookup(card):
+        db = SessionLocal()
+        try:
+            return db.execute(text("SELECT length(:card)"), {"card": card}).scalar()
+        finally:
+            db.close()
+
+    monkeypatch.setitem(tool_router.TOOL_MAP, "one_by_one", one_by_one)
+    monkeypatch.setitem(tool_router.TOOL_MAP, "card_lookup", card_lookup)
+    monkeypatch.setattr(metrics_tracker, "redis", MemoryStore())
+
+
+def _run(plan: dict, session_id: str = "sid-sql"):
+    from app.services.orchestrator import execute_plan
+
+    async def main():
+        with sql_metrics.turn(session_id):
+            return await execute_plan(plan, session_id, {"messages": []})
+
+    return asyncio.run(main())
+
+
+def test_tool_metrics_show_db_time_and_flag_n_plus_one(tools, caplog):
+    from app.main import app
+
+    skus = [f"SKU-{i}" for i in range(8)]
+    with caplog.at_level(logging.WARNING, logger="sql_metrics"):
+        for _ in range(2):
+            result = _run({"tool_calls": [{"tool": "one_by_one", "args": {"skus": skus}}]})
+            assert result["tool_results"][0]["result"] == skus
+
+    metrics = TestClient(app).get("/v1/metrics/one_by_one").json()
+    assert metrics["calls"] == 2 and metrics["avg_db_statements"] == 8
+    assert 0.04 <= metrics["avg_db_time"] <= metrics["avg_exec_time"]
+    assert 0.5 <= metrics["db_time_share"] <= 1.0
+    assert metrics["n_plus_one_flags"] == 2  # once per turn
+    flagged = [r.getMessage() for r in caplog.records if "N+1" in r.getMessage()]
+    assert len(flagged) == 2 and "tool=one_by_one session=sid-sql" in flagged[0]
+
+
+def test_slow_queries_are_logged_with_redacted_parameters(tools, caplog, monkeypatch):
+    from app.services.metrics_tracker import metrics_tracker
+
+    monkeypatch.setattr(sql_metrics, "SLOW_QUERY_MS", 0.0)
+    with caplog.at_level(logging.WARNING, logger="slow_sql"):
+        _run({"tool_calls": [{"tool": "card_lookup", "args": {"card": "4111111111111111"}}]})
+
+    [slow] = [r.getMessage() for r in caplog.records if r.name == "slow_sql"]
+    assert "tool=card_lookup session=sid-sql" in slow and "SELECT length(" in slow
+    assert "4111111111111111" not in slow and "'card': '<str>'" in slow
+    metrics = asyncio.run(metrics_tracker.get_metrics("card_lookup"))
+    assert metrics["avg_db_statements"] == 1 and metrics["n_plus_one_flags"] == 0
+
+
+def test_redact_keeps_the_shape():
+    assert sql_metrics.redact({"a": 1, "b": None, "c": "x"}) == {"a": "<int>", "b": None, "c": "<str>"}
+    assert sql_metrics.redact([{"a": 1}] * 5) == [{"a": "<int>"}] * 3 + ["... 2 more"]
+    assert sql_metrics.redact((1, "x")) == ["<int>", "<str>"]
@@ -0,0 +1,42 @@
+# app/tests/test_startup.py
+import os
+import sys
+import subprocess
+
+APP_ROOT = os.path.join(os.path.dirname(__file__), "..", "..")
+
+
+def _run(code: str) -> subprocess.CompletedProcess:
+    # empty rather than unset, so a local .env can't fill them back in
+    env = dict(os.environ, DATABASE_URL="", DATABASE_REPLICA_URLS="")
+    # a fresh interpreter so nothing imported by other tests hides an eager import
+    return subprocess.run([sys.executable, "-c", code], cwd=APP_ROOT, env=env, capture_output=True, text=True)
+
+
+def test_app_imports_without_a_database():
+    proc = _run(
+        "import sys, app.main\n"
+        "from app.services import db\n"
+        "assert db._engine is None and db.replicas is None, 'engine built at import'\n"
+        "eager = [m for m in ('app.services.telegram_bot', 'app.agents.payment_agent', 'sqlalchemy.ext.asyncio')"
+        " if m in sys.modules]\n"
+        "assert not eager, eager\n"
+    )
+    assert proc.returncode == 0, proc.stderr
+
+
+def test_tools_resolve_on_first_use_and_session_needs_database_url():
+    proc = _run(
+        "import sys\n"
+        "from app.services import tool_router, db\n"
+        "assert 'app.agents.inventory_agent' not in sys.modules\n"
+        "from app.agents.inventory_agent import check_stock_async\n"
+        "assert tool_router.resolve('check_stock') is check_stock_async\n"
+        "try:\n"
+        "    db.SessionLocal()\n"
+        "except ValueError as e:\n"
+        "    assert 'DATABASE_URL' in str(e)\n"
+        "else:\n"
+        "    raise AssertionError('SessionLocal() without DATABASE_URL')\n"
+    )
+    assert proc.returncode == 0, proc.stderr
@@ -0,0 +1,139 @@
+# app/tests/test_stock_reservations.py
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+pytestmark = pytest.mark.postgres
+
+BUYERS = 500
+STOCK = 100
+
+
+@pytest.fixture
+def stocked_sku():
+    """One product with STOCK units at a single throwaway store."""
+    from sqlalchemy import text
+    from app.services.db import Base, engine, SessionLocal, import_all_models
+    from app.models.product import Product
+    from app.models.inventory import Inventory
+
+    import_all_models()
+    Base.metadata.create_all(bind=engine)
+
+    tag = uuid.uuid4().hex[:8].upper()
+    db = SessionLocal()
+    product = Product(sku=f"SKU-STRESS-{tag}", name="Stress Tee", category="tshirts", price=499, stock=STOCK)
+    db.add(product)
+    db.flush()
+    db.add(Inventory(product_id=product.id, location=f"STORE-{tag}", quantity=STOCK))
+    db.commit()
+    ids = (product.id, f"STORE-{tag}")
+    db.close()
+
+    yield ids
+
+    db = SessionLocal()
+    db.execute(text("DELETE FROM stock_reservations WHERE product_id = :pid"), {"pid": ids[0]})
+    db.execute(text("DELETE FROM inventory WHERE product_id = :pid"), {"pid": ids[0]})
+    db.execute(text("DELETE FROM products WHERE id = :pid"), {"pid": ids[0]})
+    db.commit()
+    db.close()
+
+
+def _quantity(product_id: int, location: str) -> int:
+    from sqlalchemy import text
+    from app.services.db import SessionLocal
+    db = SessionLocal()
+    try:
+        return db.execute(
+            text("SELECT quantity FROM inventory WHERE product_id = :pid AND location = :loc"),
+            {"pid": product_id, "loc": location},
+        ).scalar_one()
+    finally:
+        db.close()
+
+
+def test_no_oversell_with_parallel_buyers(stocked_sku):
+    from app.services.inventory_service import reserve_stock
+    product_id, location = stocked_sku
+
+    def buy(i: int) -> str:
+        res = reserve_stock(f"ORD-STRESS-{i}", [{"product_id": product_id, "location": location, "quantity": 1}])
+        return res["status"]
+
+    with ThreadPoolExecutor(max_workers=BUYERS) as pool:
+        outcomes = list(pool.map(buy, range(BUYERS)))
+
+    assert outcomes.count("reserved") == STOCK
+    assert outcomes.count("insufficient_stock") == BUYERS - STOCK
+    assert _quantity(product_id, location) == 0
+
+
+def test_multi_line_reservation_is_all_or_nothing(stocked_sku):
+    from app.services.inventory_service import reserve_stock
+    product_id, location = stocked_sku
+
+    res = reserve_stock("ORD-MULTI", [
+        {"product_id": product_id, "location": location, "quantity": 2},
+        {"product_id": product_id, "location": "STORE-DOES-NOT-EXIST", "quantity": 1},
+    ])
+
+    assert res["status"] == "insufficient_stock"
+    assert _quantity(product_id, location) == STOCK
+
+
+def test_expired_holds_are_released(stocked_sku):
+    from app.services.inventory_service import reserve_stock, release_expired_reservations
+    product_id, location = stocked_sku
+
+    res = reserve_stock("ORD-EXPIRE", [{"product_id": product_id, "location": location, "quantity": 7}], ttl_seconds=-1)
+    assert res["status"] == "reserved"
+    assert _quantity(product_id, location) == STOCK - 7
+
+    release_expired_reservations()
+    assert _quantity(product_id, location) == STOCK
+
+
+def test_payment_re_reserves_a_swept_hold_or_fails(stocked_sku, monkeypatch):
+    from sqlalchemy import text
+    from app.services.db import SessionLocal
+    from app.services import order_cache
+    from app.services.order_service import create_order
+    from app.services.inventory_service import release_expired_reservations
+    import app.agents.payment_agent as payment_agent
+    product_id, location = stocked_sku
+
+    for module in (payment_agent, order_cache):
+        monkeypatch.setattr(module, "get_sync_client", lambda: None)
+    db = SessionLocal()
+    sku = db.execute(text("SELECT sku FROM products WHERE id = :p"), {"p": product_id}).scalar_one()
+    db.close()
+
+    def order_with_swept_hold(qty: int) -> str:
+        ext = create_order(None, [{"sku": sku, "quantity": qty, "unit_price": 100}])["order_id"]
+        db = SessionLocal()
+        db.execute(text("UPDATE stock_reservations SET expires_at = now() - interval '1 hour' WHERE order_id = :o"),
+                   {"o": ext})
+        db.commit()
+        db.close()
+        release_expired_reservations()
+        return ext
+
+    paid, unpaid = order_with_swept_hold(3), order_with_swept_hold(STOCK)
+    try:
+        assert _quantity(product_id, location) == STOCK
+        assert payment_agent.authorize_payment_sync(paid, 300, {"type": "card"})["db_update"] == "success"
+        assert _quantity(product_id, location) == STOCK - 3
+
+        result = payment_agent.authorize_payment_sync(unpaid, STOCK * 100, {"type": "card"})
+        assert result["db_update"] == "failed" and "Insufficient stock" in result["db_error"]
+        assert _quantity(product_id, location) == STOCK - 3
+        assert order_cache.get_order_state(unpaid)["status"] == "created"
+    finally:
+        db = SessionLocal()
+        db.execute(text("DELETE FROM payment_ledger WHERE order_id IN (:a, :b)"), {"a": paid, "b": unpaid})
+        db.execute(text("DELETE FROM orders WHERE external_id IN (:a, :b)"), {"a": paid, "b": unpaid})
+        db.commit()
+        db.close()
+        order_cache.clear_local()
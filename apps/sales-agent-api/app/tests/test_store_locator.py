@@ -0,0 +1,49 @@
+# app/tests/test_store_locator.py
+import random
+
+from app.services.store_locator import StoreIndex, estimate_eta, eta_days_for_distance, _to_unit, _chord2_to_km
+
+
+def _brute_nearest(stores, lat, lon, allowed=None):
+    q = _to_unit(lat, lon)
+    best = min(
+        (sum((a - b) ** 2 for a, b in zip(_to_unit(s_lat, s_lon), q)), code)
+        for code, s_lat, s_lon in stores
+        if allowed is None or code in allowed
+    )
+    return _chord2_to_km(best[0]), best[1]
+
+
+def test_kdtree_matches_linear_scan():
+    rng = random.Random(7)
+    stores = [(f"S{i}", rng.uniform(8, 35), rng.uniform(68, 97)) for i in range(3000)]
+    index = StoreIndex(stores)
+    codes = [c for c, _, _ in stores]
+
+    for _ in range(200):
+        lat, lon = rng.uniform(8, 35), rng.uniform(68, 97)
+        assert index.nearest(lat, lon)[0][1] == _brute_nearest(stores, lat, lon)[1]
+
+        # large filter walks the tree, small filter takes the direct path
+        for size in (1500, 10):
+            allowed = set(rng.sample(codes, size))
+            assert index.nearest(lat, lon, allowed=allowed)[0][1] == _brute_nearest(stores, lat, lon, allowed)[1]
+
+
+def test_basket_prefers_single_store_then_splits():
+    # Chennai, Bengaluru, Delhi
+    index = StoreIndex([("MAA", 13.08, 80.27), ("BLR", 12.97, 77.59), ("DEL", 28.61, 77.21)])
+    origin = (13.0, 80.2)
+
+    stock = {"SKU-1": {"MAA": 3, "DEL": 5}, "SKU-2": {"BLR": 1, "DEL": 2}}
+    whole = estimate_eta(stock, {"SKU-1": 1, "SKU-2": 1}, origin, index)
+    assert whole["split_shipment"] is False
+    assert whole["ship_from"][0]["store_id"] == "DEL"
+
+    stock["SKU-1"].pop("DEL")
+    split = estimate_eta(stock, {"SKU-1": 1, "SKU-2": 1}, origin, index)
+    assert split["split_shipment"] is True
+    assert {leg["store_id"] for leg in split["ship_from"]} == {"MAA", "BLR"}
+    assert split["ship_eta_days"] == eta_days_for_distance(max(leg["distance_km"] for leg in split["ship_from"]))
+
+    assert estimate_eta(stock, {"SKU-3": 1}, origin, index) is None
@@ -0,0 +1,139 @@
+# app/tests/test_telegram_dedup.py
+import random
+import asyncio
+from collections import defaultdict
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.services.telegram_dedup import BUCKET_SIZE, UpdateDeduplicator, set_deduplicator
+
+
+class MemoryRedis:
+    """The few Redis commands the Telegram services use (strings, sets, pipelines); `down` fails every call."""
+
+    def __init__(self):
+        self.data = {}
+        self.sets = defaultdict(set)
+        self.ttls = {}
+        self.down = False
+
+    def _check(self):
+        if self.down:
+            raise ConnectionError("redis down")
+
+    async def get(self, key):
+        self._check()
+        return self.data.get(key)
+
+    async def set(self, key, value, ex=None):
+        self._check()
+        self.data[key] = value if isinstance(value, str) else str(value)
+        return True
+
+    def pipeline(self, transaction=True):
+        return _Pipeline(self)
+
+
+class _Pipeline:
+    def __init__(self, redis: MemoryRedis):
+        self.redis, self.commands = redis, []
+
+    def sadd(self, key, *members):
+        self.commands.append(("sadd", key, members))
+
+    def expire(self, key, seconds):
+        self.commands.append(("expire", key, seconds))
+
+    async def execute(self):
+        await asyncio.sleep(0)  # a round trip: lets concurrent callers interleave
+        self.redis._check()
+        results = []
+        for op, key, arg in self.commands:
+            if op == "sadd":
+                before = len(self.redis.sets[key])
+                self.redis.sets[key].update(arg)
+                results.append(len(self.redis.sets[key]) - before)
+            else:
+                self.redis.ttls[key] = arg
+                results.append(True)
+        return results
+
+
+@pytest.fixture
+def turns(monkeypatch):
+    """handle_update with the chat turn counted instead of run, replies queued on a stub outbox."""
+    from app.services import telegram_bot
+
+    ran, sent = [], []
+
+    async def run_chat_turn(text, channel, customer_id=None, session_id=None):
+        await asyncio.sleep(random.uniform(0, 0.01))  # slow turns: redeliveries arrive mid-turn
+        ran.append(text)
+        return {"session_id": "s", "reply": f"re: {text}", "actions": None}
+
+    async def send_message(chat_id, text):
+        sent.append((chat_id, text))
+
+    monkeypatch.setattr(telegram_bot, "run_chat_turn", run_chat_turn)
+    monkeypatch.setattr(telegram_bot, "_send_message", send_message)
+    yield ran, sent
+    set_deduplicator(None)
+
+
+def _update(update_id: int, chat_id: int = 1) -> dict:
+    return {"update_id": update_id, "message": {"chat": {"id": chat_id}, "text": f"update {update_id}"}}
+
+
+def _replay_bursts(updates: int, copies: int, processes: int, redis: MemoryRedis) -> list[UpdateDeduplicator]:
+    """Every update delivered `copies` times, concurrently and shuffled, spread over `processes` deduplicators."""
+    from app.services import telegram_bot
+
+    dedups = [UpdateDeduplicator(redis=redis, ttl_seconds=60) for _ in range(processes)]
+    deliveries = [(random.randrange(processes), _update(u)) for u in range(1000, 1000 + updates) for _ in range(copies)]
+    random.shuffle(deliveries)
+
+    async def deliver(process, update):
+        # handle_update reads the module's deduplicator before its first await
+        set_deduplicator(dedups[process])
+        return await telegram_bot.handle_update(update)
+
+    async def main():
+        return await asyncio.gather(*(deliver(process, update) for process, update in deliveries))
+
+    assert all(asyncio.run(main()))
+    return dedups
+
+
+def test_duplicate_bursts_run_each_update_once(turns):
+    ran, sent = turns
+    redis = MemoryRedis()
+    dedups = _replay_bursts(updates=200, copies=10, processes=3, redis=redis)
+
+    assert sorted(ran) == sorted(f"update {u}" for u in range(1000, 1200))
+    assert len(sent) == 200
+    assert sum(d.counters["duplicates_dropped"] for d in dedups) == 200 * 9
+    assert sum(d.counters["checked"] for d in dedups) == 200 * 10
+    # compact: one set per block of ids, each with the TTL
+    assert set(redis.sets) == {f"telegram:seen:{b}" for b in range(1000 // BUCKET_SIZE, 1199 // BUCKET_SIZE + 1)}
+    assert set(redis.ttls.values()) == {60}
+
+
+def test_redis_outage_falls_back_to_the_local_window(turns):
+    ran, _ = turns
+    redis = MemoryRedis()
+    redis.down = True
+    [dedup] = _replay_bursts(updates=50, copies=5, processes=1, redis=redis)
+    assert len(ran) == 50
+    assert dedup.counters["duplicates_dropped"] == 200 and dedup.counters["redis_errors"] == 50
+
+
+def test_webhook_acknowledges_duplicates_and_reports_them(turns):
+    from app.main import app
+    ran, _ = turns
+    set_deduplicator(UpdateDeduplicator(redis=MemoryRedis()))
+    client = TestClient(app)
+    for _ in range(3):
+        assert client.post("/v1/telegram/webhook", json=_update(77)).json() == {"ok": True}
+    assert ran == ["update 77"]
+    assert client.get("/v1/metrics/telegram").json()["dedup"]["duplicates_dropped"] == 2
@@ -0,0 +1,91 @@
+# app/tests/test_telegram_outbox.py
+import time
+import asyncio
+
+import httpx
+
+from fake_telegram import FakeTelegram
+from app.services.telegram_outbox import TelegramOutbox, TokenBucket, split_message
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+async def _deliver(telegram: FakeTelegram, sends, **settings) -> TelegramOutbox:
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=telegram.app))
+    outbox = TelegramOutbox("http://telegram.test/botTEST", lambda: client, **settings)
+    await outbox.start()
+    try:
+        for chat_id, text in sends:
+            outbox.send(chat_id, text)
+        assert await outbox.drain(timeout=10)
+    finally:
+        await outbox.stop()
+        await client.aclose()
+    return outbox
+
+
+def test_split_message_prefers_line_breaks():
+    text = "\n".join(f"{i:03d} " + "y" * 40 for i in range(300))
+    parts = split_message(text, limit=1000)
+    assert all(len(p) <= 1000 for p in parts)
+    assert "\n".join(parts) == text
+    assert split_message("z" * 2500, limit=1000) == ["z" * 1000, "z" * 1000, "z" * 500]
+    assert split_message("short") == ["short"]
+
+
+def test_token_bucket_bursts_then_paces():
+    now = [0.0]
+    bucket = TokenBucket(rate=2, capacity=3, clock=lambda: now[0])
+    assert [bucket.try_take() for _ in range(3)] == [0, 0, 0]
+    assert bucket.try_take() == 0.5
+    now[0] = 0.5
+    assert bucket.try_take() == 0
+
+
+def test_chats_are_paced_without_holding_up_other_chats():
+    telegram = FakeTelegram(chat_limit=6)  # rejects a 7th message to a chat within one second
+    sends = [(1, f"burst {i}") for i in range(7)] + [(2, "other chat")]
+    outbox = _run(_deliver(telegram, sends, chat_rate=3, chat_burst=3))  # at most 3 + 3 in any second
+
+    assert telegram.texts(1) == [f"burst {i}" for i in range(7)]  # in order
+    assert not telegram.rejected and outbox.stats()["rate_limited"] == 0
+    times = [t for t, c, _ in telegram.messages if c == 1]
+    assert times[-1] - times[0] >= 1.2  # 3 at once, then 3/s
+    other = next(t for t, c, _ in telegram.messages if c == 2)
+    assert other < times[-1]
+
+
+def test_429_is_retried_after_retry_after():
+    telegram = FakeTelegram(retry_after=0.3)
+    telegram.inject.extend([429])
+    started = time.monotonic()
+    outbox = _run(_deliver(telegram, [(5, "hello")]))
+
+    [(delivered, _, text)] = telegram.messages
+    assert text == "hello" and delivered - started >= 0.3
+    stats = outbox.stats()
+    assert (stats["sent"], stats["rate_limited"], stats["retried"], stats["failed"]) == (1, 1, 1, 0)
+
+
+def test_server_errors_back_off_and_bad_requests_are_dropped():
+    telegram = FakeTelegram()
+    telegram.inject.extend([500, 502])
+    outbox = _run(_deliver(telegram, [(6, "after two 5xx")], backoff_base=0.01))
+    assert telegram.texts(6) == ["after two 5xx"] and outbox.stats()["retried"] == 2
+
+    telegram = FakeTelegram()
+    telegram.inject.extend([400])
+    outbox = _run(_deliver(telegram, [(7, "rejected"), (7, "next one")]))
+    assert telegram.texts(7) == ["next one"]
+    stats = outbox.stats()
+    assert (stats["sent"], stats["failed"], stats["retried"], stats["queue_depth"]) == (1, 1, 0, 0)
+
+
+def test_gives_up_after_max_attempts():
+    telegram = FakeTelegram(retry_after=0.01)
+    telegram.inject.extend([429] * 10)
+    outbox = _run(_deliver(telegram, [(8, "never")], max_attempts=3))
+    assert not telegram.messages and len(telegram.rejected) == 3
+    assert outbox.stats()["failed"] == 1
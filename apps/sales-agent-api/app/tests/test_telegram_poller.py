@@ -0,0 +1,107 @@
+# app/tests/test_telegram_poller.py
+import random
+import asyncio
+
+import httpx
+import pytest
+
+from fake_telegram import FakeTelegram
+from test_telegram_dedup import MemoryRedis
+from app.services.telegram_dedup import UpdateDeduplicator, set_deduplicator
+from app.services.telegram_poller import OFFSET_KEY, KeyedWorkerPool, TelegramPoller
+
+
+def test_keyed_pool_keeps_order_per_key_and_runs_keys_concurrently():
+    done, active = [], set()
+
+    async def handler(item):
+        key, seq = item
+        assert key not in active, f"two items of {key} at once"
+        active.add(key)
+        await asyncio.sleep(random.uniform(0.001, 0.01))
+        active.discard(key)
+        done.append(item)
+
+    async def main():
+        pool = KeyedWorkerPool(handler, concurrency=4, max_pending=8)  # fewer slots than items: submit waits
+        await pool.start()
+        started = asyncio.get_running_loop().time()
+        for seq in range(10):
+            for key in "abcd":
+                await pool.submit(key, (key, seq))
+        await pool.drain()
+        elapsed = asyncio.get_running_loop().time() - started
+        await pool.stop()
+        return elapsed
+
+    elapsed = asyncio.run(main())
+    for key in "abcd":
+        assert [seq for k, seq in done if k == key] == list(range(10))
+    assert elapsed < 40 * 0.0055  # well under running the 40 items one by one
+
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    from app.services import llm_client, session_store, telegram_bot
+    from test_telegram_webhook import MemoryStore
+
+    async def plan(text, session):
+        await asyncio.sleep(random.uniform(0, 0.005))
+        return {"reply_text": f"re: {text}", "tool_calls": []}
+
+    monkeypatch.setattr(llm_client, "plan", plan)
+    monkeypatch.setattr(session_store, "session_store", MemoryStore())
+    monkeypatch.setenv("TELEGRAM_CHAT_RATE", "1000")
+    telegram = FakeTelegram()
+    set_deduplicator(UpdateDeduplicator(redis=MemoryRedis()))
+    monkeypatch.setattr(telegram_bot, "TELEGRAM_API_BASE", "http://telegram.test/botTEST")
+    yield telegram
+    telegram_bot.set_client(None)
+    set_deduplicator(None)
+
+
+def _poll(telegram: FakeTelegram, redis: MemoryRedis, replies: int) -> TelegramPoller:
+    from app.services import telegram_bot
+
+    async def main():
+        # close() below ends the run like app shutdown: outbox drained, client closed
+        telegram_bot.set_client(httpx.AsyncClient(transport=httpx.ASGITransport(app=telegram.app)))
+        poller = TelegramPoller(telegram_bot.TELEGRAM_API_BASE, telegram_bot.get_client, redis=redis,
+                                concurrency=4, poll_timeout=1, batch_limit=7)
+        await poller.start()
+        while len(telegram.messages) < replies:
+            await asyncio.sleep(0.01)
+        await poller.stop()
+        await telegram_bot.close()
+        return poller
+
+    return asyncio.run(asyncio.wait_for(main(), 20))
+
+
+def test_polling_runs_the_chat_pipeline_in_order_per_chat_and_persists_the_offset(pipeline):
+    telegram, redis = pipeline, MemoryRedis()
+    for i in range(6):
+        for chat_id in (11, 12, 13):
+            telegram.push_message(chat_id, f"msg {i}")
+
+    poller = _poll(telegram, redis, replies=18)
+    for chat_id in (11, 12, 13):
+        assert telegram.texts(chat_id) == [f"re: msg {i}" for i in range(6)]
+    assert redis.data[OFFSET_KEY] == "19"
+    assert poller.stats()["processed"] == 18 and poller.stats()["failed"] == 0
+
+    # a restarted poller resumes from the stored offset: only the new update runs
+    telegram.messages.clear()
+    telegram.push_message(11, "after restart")
+    _poll(telegram, redis, replies=1)
+    assert telegram.texts(11) == ["re: after restart"]
+    assert telegram.get_updates_calls[-1]["offset"] >= 19
+    assert redis.data[OFFSET_KEY] == "20"
+
+
+def test_no_poller_without_a_bot_token(monkeypatch):
+    from app.services import telegram_bot, telegram_poller
+
+    monkeypatch.setattr(telegram_bot, "TELEGRAM_API_BASE", None)
+    assert asyncio.run(telegram_poller.start_poller()) is None
+    assert telegram_poller.poller_stats() is None
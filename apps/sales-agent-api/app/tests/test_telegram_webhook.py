@@ -0,0 +1,126 @@
+# app/tests/test_telegram_webhook.py
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from fake_telegram import FakeTelegram
+from test_telegram_dedup import MemoryRedis
+from app.services.telegram_dedup import UpdateDeduplicator, set_deduplicator
+
+
+class MemoryStore:
+    """Session store stand-in (get/set of JSON-able dicts)."""
+
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.data[key] = value
+        return True
+
+
+@pytest.fixture
+def bot(monkeypatch):
+    from app.main import app
+    from app.services import llm_client, session_store, telegram_bot, tool_router
+    from app.services.metrics_tracker import metrics_tracker
+
+    store = MemoryStore()
+    monkeypatch.setattr(session_store, "session_store", store)
+    monkeypatch.setattr(metrics_tracker, "redis", store)
+
+    async def plan(text, session):
+        return {"reply_text": f"Here you go: {text}",
+                "tool_calls": [{"tool": "recommend", "args": {"query": text}}]}
+
+    async def recommend(query):
+        return {"message": "2 matches", "items": [{"name": "Linen Shirt", "price": 1299},
+                                                  {"name": "Oxford Shirt", "price": 1499}]}
+
+    monkeypatch.setattr(llm_client, "plan", plan)
+    monkeypatch.setitem(tool_router.TOOL_MAP, "recommend", recommend)
+
+    # one event loop for the whole test (the outbox delivers after the webhook returns); shutdown drains it
+    monkeypatch.setenv("WARM_UP", "0")
+    monkeypatch.delenv("DATABASE_URL", raising=False)
+    telegram = FakeTelegram()
+    set_deduplicator(UpdateDeduplicator(redis=MemoryRedis()))
+    monkeypatch.setattr(telegram_bot, "TELEGRAM_API_BASE", "http://telegram.test/botTEST")
+    telegram_bot.set_client(httpx.AsyncClient(transport=httpx.ASGITransport(app=telegram.app)))
+    yield TestClient(app), telegram, store
+    telegram_bot.set_client(None)
+    set_deduplicator(None)
+
+
+def test_webhook_runs_the_turn_in_process_and_replies(bot, monkeypatch):
+    client, telegram, store = bot
+
+    # any request that isn't to the Telegram stand-in (e.g. a loopback to /v1/chat) fails the test
+    def no_loopback(*args, **kwargs):
+        raise AssertionError("webhook made an outbound HTTP request")
+
+    monkeypatch.setattr(httpx.AsyncClient, "__init__", no_loopback)
+    with client:
+        resp = client.post("/v1/telegram/webhook",
+                           json={"update_id": 1, "message": {"chat": {"id": 42}, "text": "shirts"}})
+        assert resp.json() == {"ok": True}
+
+    [reply] = telegram.texts(42)
+    assert reply.splitlines() == [
+        "Here you go: shirts", "", "🛠 recommend: 2 matches",
+        "🛍️ <b>Linen Shirt</b> — ₹1299", "🛍️ <b>Oxford Shirt</b> — ₹1499",
+    ]
+    [session] = [v for k, v in store.data.items() if k.startswith("sid-")]
+    assert session["customer_id"] == "tg-42" and [m["role"] for m in session["messages"]] == ["user", "tool", "assistant"]
+
+
+def test_chat_route_and_webhook_share_the_turn(bot):
+    client, telegram, _ = bot
+    with client:
+        body = client.post("/v1/chat", json={"channel": "web", "text": "shirts", "session_id": "s1"}).json()
+    assert body["session_id"] == "s1" and body["reply"] == "Here you go: shirts"
+    assert body["actions"]["tool_results"][0]["result"]["message"] == "2 matches"
+    assert not telegram.messages
+
+
+def test_messages_without_text_are_ignored(bot):
+    client, telegram, _ = bot
+    with client:
+        assert client.post("/v1/telegram/webhook",
+                           json={"update_id": 2, "message": {"chat": {"id": 1}}}).json() == {"ok": True}
+        assert client.post("/v1/telegram/webhook", json={"update_id": 3, "callback_query": {}}).json() == {"ok": True}
+    assert not telegram.messages
+
+
+def test_long_replies_arrive_in_order_in_parts(bot, monkeypatch):
+    from app.services import llm_client
+    client, telegram, _ = bot
+    lines = [f"line {i:04d} " + "x" * 90 for i in range(120)]  # ~12k characters
+
+    async def plan(text, session):
+        return {"reply_text": "\n".join(lines), "tool_calls": []}
+
+    monkeypatch.setattr(llm_client, "plan", plan)
+    with client:
+        client.post("/v1/telegram/webhook", json={"update_id": 4, "message": {"chat": {"id": 7}, "text": "hi"}})
+        metrics = client.get("/v1/metrics/telegram").json()
+
+    parts = telegram.texts(7)
+    assert len(parts) == 3 and all(len(p) <= 4096 for p in parts)
+    assert "\n".join(parts).splitlines() == lines
+    assert metrics["outbox"]["queued"] == 3 and metrics["outbox"]["split"] == 2
+
+
+def test_without_a_bot_token_replies_are_not_sent(bot, monkeypatch, caplog):
+    from app.services import telegram_bot
+    client, telegram, _ = bot
+    monkeypatch.setattr(telegram_bot, "TELEGRAM_API_BASE", None)
+    with client:
+        resp = client.post("/v1/telegram/webhook",
+                           json={"update_id": 5, "message": {"chat": {"id": 9}, "text": "shirts"}})
+        assert resp.json() == {"ok": True}
+    assert not telegram.messages
+    assert "TELEGRAM_BOT_TOKEN is not set" in caplog.text
@@ -0,0 +1,155 @@
+# app/tests/test_tracing.py
+import json
+import time
+import asyncio
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+
+from fake_gemini import FakeGemini
+from app.services import tracing
+
+fakeredis = pytest.importorskip("fakeredis")
+
+PLAN = {"reply_text": "Checking.", "tool_calls": [{"tool": "lookup", "args": {"sku": "SKU-1"}},
+                                                  {"tool": "remember", "args": {"sku": "SKU-1"}}]}
+
+
+@pytest.fixture
+def spans():
+    exporter = InMemorySpanExporter()
+    tracing.setup_tracing(exporter, sample_rate=1.0)
+    yield exporter
+    tracing.shutdown_tracing()
+
+
+@pytest.fixture
+def chat(monkeypatch):
+    """The app with Gemini and Redis stand-ins and two tools: a thread one using sync Redis, an async one."""
+    from app.main import app
+    from app.services import llm_client, session_store, tool_router
+    from app.services.metrics_tracker import metrics_tracker
+
+    server = fakeredis.FakeServer()
+    store = session_store.SessionStore("redis://fakeredis")
+    store._client = fakeredis.aioredis.FakeRedis(server=server, decode_responses=True)
+    sync_redis = fakeredis.FakeRedis(server=server, decode_responses=True)
+    monkeypatch.setattr(session_store, "session_store", store)
+    monkeypatch.setattr(metrics_tracker, "redis", store)
+
+    def lookup(sku):
+        time.sleep(0.01)
+        return {"sku": sku, "cached": sync_redis.get(f"stock:{sku}")}
+
+    async def remember(sku):
+        pipe = store._client.pipeline()
+        pipe.set(f"seen:{sku}", 1)
+        pipe.expire(f"seen:{sku}", 60)
+        await pipe.execute()
+        return {"ok": True}
+
+    monkeypatch.setitem(tool_router.TOOL_MAP, "lookup", lookup)
+    monkeypatch.setitem(tool_router.TOOL_MAP, "remember", remember)
+    monkeypatch.setattr(llm_client, "GEMINI_API_URL", "http://gemini.test")
+    monkeypatch.setenv("GEMINI_API_KEY", "test-key")
+    monkeypatch.setenv("WARM_UP", "0")
+    monkeypatch.delenv("DATABASE_URL", raising=False)
+    gemini = FakeGemini(plans={"stock": PLAN})
+    llm_client.set_client(httpx.AsyncClient(transport=httpx.ASGITransport(app=gemini.app)))
+    yield TestClient(app)
+    llm_client.set_client(None)
+
+
+def _edges(finished) -> set:
+    """(span, parent span) name pairs."""
+    by_id = {s.context.span_id: s for s in finished}
+    return {(s.name, by_id[s.parent.span_id].name if s.parent else None) for s in finished}
+
+
+def test_chat_turn_spans_cover_llm_tools_and_redis(spans, chat):
+    resp = chat.post("/v1/chat", json={"channel": "web", "text": "is SKU-1 in stock?", "session_id": "sid-trace"})
+    assert resp.status_code == 200
+    finished = spans.get_finished_spans()
+
+    assert _edges(finished) >= {
+        ("main.chat", None),
+        ("llm_client.plan", "main.chat"), ("orchestrator.execute_plan", "main.chat"),
+        ("redis GET", "main.chat"), ("redis SET", "main.chat"),   # session store
+        ("tool_router.execute", "orchestrator.execute_plan"),
+        ("redis GET", "tool_router.execute"), ("redis PIPELINE", "tool_router.execute"),
+    }
+    assert len({s.context.trace_id for s in finished}) == 1
+    assert all(s.attributes["session_id"] == "sid-trace" and s.attributes["channel"] == "web" for s in finished)
+
+    [llm] = [s for s in finished if s.name == "llm_client.plan"]
+    assert llm.attributes["llm.prompt_bytes"] > 1000 and llm.attributes["llm.response_bytes"] > 100
+    assert llm.attributes["llm.tool_calls"] == 2
+
+    tools = {s.attributes["tool.name"]: s for s in finished if s.name == "tool_router.execute"}
+    assert tools["lookup"].attributes["executor.queue_wait_ms"] >= 0
+    assert "executor.queue_wait_ms" not in tools["remember"].attributes
+    # the thread tool's sync Redis call is still inside its tool's span
+    [sync_get] = [s for s in finished if s.name == "redis GET" and s.parent.span_id == tools["lookup"].context.span_id]
+    assert sync_get.attributes["db.system"] == "redis"
+
+
+def test_unsampled_turns_and_disabled_tracing_record_nothing(chat):
+    import redis.asyncio
+
+    original = redis.asyncio.Redis.execute_command
+    assert tracing.span("x") is tracing.span("y")  # off: one shared no-op
+    chat.post("/v1/chat", json={"channel": "web", "text": "hello"})
+
+    exporter = InMemorySpanExporter()
+    tracing.setup_tracing(exporter, sample_rate=0.0)
+    try:
+        assert redis.asyncio.Redis.execute_command is not original
+        chat.post("/v1/chat", json={"channel": "web", "text": "is SKU-1 in stock?"})
+        assert exporter.get_finished_spans() == ()
+    finally:
+        tracing.shutdown_tracing()
+    assert redis.asyncio.Redis.execute_command is original
+
+
+def test_file_exporter_writes_json_lines(tmp_path, monkeypatch):
+    path = tmp_path / "traces.jsonl"
+    monkeypatch.setenv("TRACING_EXPORTER", "file")
+    monkeypatch.setenv("TRACING_FILE", str(path))
+    monkeypatch.setenv("TRACING_SAMPLE_RATE", "1")
+    assert tracing.setup_tracing()
+    with tracing.span("main.chat"):
+        tracing.tag_turn("sid-file", "telegram")
+        with tracing.span("llm_client.plan"):
+            pass
+    tracing.shutdown_tracing()  # flushes the batch
+
+    lines = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [s["name"] for s in lines] == ["llm_client.plan", "main.chat"]
+    assert all(s["attributes"]["session_id"] == "sid-file" for s in lines)
+
+
+@pytest.mark.postgres
+def test_sql_statements_from_both_engines_are_spans(spans):
+    from sqlalchemy import text
+    from app.services.db import AsyncSessionLocal, SessionLocal
+
+    def sync_query():
+        db = SessionLocal()
+        try:
+            return db.execute(text("SELECT 1")).scalar()
+        finally:
+            db.close()
+
+    async def main():
+        with tracing.span("tool_router.execute"):
+            await asyncio.to_thread(sync_query)
+            async with AsyncSessionLocal() as db:
+                await db.execute(text("SELECT 2"))
+        await asyncio.to_thread(sync_query)  # outside a traced turn: no span
+
+    asyncio.run(main())
+    sql = [s for s in spans.get_finished_spans() if s.name.startswith("sql ")]
+    assert [s.attributes["db.statement"] for s in sql] == ["SELECT 1", "SELECT 2"]
+    assert {parent for name, parent in _edges(spans.get_finished_spans()) if name == "sql SELECT"} == {"tool_router.execute"}
@@ -0,0 +1,94 @@
+# app/tests/test_workflow_engine.py
+import asyncio
+
+import pytest
+
+from app.workflows.engine import Step, StepFailed, Workflow
+
+
+def _recorder():
+    log = []
+
+    def step(name, delay=0.0, fail=False):
+        async def action(ctx):
+            log.append(f"start:{name}")
+            await asyncio.sleep(delay)
+            if fail:
+                raise StepFailed(f"{name} broke")
+            log.append(f"done:{name}")
+            return name.upper()
+
+        async def undo(ctx):
+            log.append(f"undo:{name}")
+
+        return action, undo
+
+    return log, step
+
+
+def test_independent_steps_run_concurrently():
+    log, step = _recorder()
+    a, _ = step("a")
+    b, _ = step("b", delay=0.2)
+    c, _ = step("c", delay=0.2)
+    d, _ = step("d")
+    wf = Workflow("diamond", [
+        Step("a", a),
+        Step("b", b, depends_on=("a",)),
+        Step("c", c, depends_on=("a",)),
+        Step("d", d, depends_on=("b", "c")),
+    ])
+
+    result = asyncio.run(wf.run({}))
+
+    assert result["status"] == "success"
+    assert result["results"] == {"a": "A", "b": "B", "c": "C", "d": "D"}
+    assert log[0] == "done:a" or log[:2] == ["start:a", "done:a"]
+    assert log[-2:] == ["start:d", "done:d"]
+    # b and c overlap, so the run takes ~one delay, not two
+    assert result["total_ms"] < 350
+    assert abs(result["timings"]["b"]["start_ms"] - result["timings"]["c"]["start_ms"]) < 50
+    assert all(t["status"] == "succeeded" for t in result["timings"].values())
+
+
+def test_failure_compensates_completed_steps_in_reverse():
+    log, step = _recorder()
+    pay, void = step("pay")
+    ship, cancel = step("ship", delay=0.05, fail=True)
+    points, unpoints = step("points")
+    done, _ = step("done")
+    wf = Workflow("saga", [
+        Step("pay", pay, compensate=void),
+        Step("ship", ship, depends_on=("pay",), compensate=cancel),
+        Step("points", points, depends_on=("pay",), compensate=unpoints),
+        Step("done", done, depends_on=("ship", "points")),
+    ])
+
+    result = asyncio.run(wf.run({}))
+
+    assert result["status"] == "failed" and result["failed_step"] == "ship"
+    assert result["error"] == "ship broke" and result["skipped"] == ["done"]
+    assert list(result["compensated"]) == ["points", "pay"]
+    assert log[-2:] == ["undo:points", "undo:pay"]
+    assert "undo:ship" not in log and "start:done" not in log
+
+
+def test_timeout_fails_the_step():
+    log, step = _recorder()
+    slow, undo_slow = step("slow", delay=1.0)
+    wf = Workflow("slow", [Step("slow", slow, compensate=undo_slow, timeout=0.05)])
+
+    result = asyncio.run(wf.run({}))
+
+    assert result["status"] == "failed" and result["timings"]["slow"]["status"] == "timed_out"
+    assert result["compensated"] == {"slow": "compensated"}
+
+
+def test_rejects_cycles_and_unknown_dependencies():
+    async def noop(ctx):
+        return None
+
+    with pytest.raises(ValueError, match="cycle"):
+        Workflow("loop", [Step("a", noop, depends_on=("b",)), Step("b", noop, depends_on=("a",))])
+    with pytest.raises(ValueError, match="unknown"):
+        Workflow("dangling", [Step("a", noop, depends_on=("missing",))])
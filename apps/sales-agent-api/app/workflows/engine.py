@@ -0,0 +1,147 @@
+# app/workflows/engine.py
+"""
+Small in-process async workflow engine.
+
+A workflow is a set of `Step`s. Each step names the steps it depends on; a step
+starts as soon as all of its dependencies have succeeded, so independent steps
+run concurrently. If any step fails (raises or times out), no new steps are
+started, running ones are allowed to finish, and the compensating actions of
+every step that completed run in reverse completion order.
+
+Actions and compensations are `async def fn(ctx)`; `ctx` is the workflow input
+plus `ctx["results"][step_name]` for each finished step. Blocking agents can be
+wrapped with `asyncio.to_thread`.
+"""
+import time
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional, Sequence
+
+logger = logging.getLogger("workflow_engine")
+
+StepFn = Callable[[Dict[str, Any]], Awaitable[Any]]
+
+
+@dataclass(frozen=True)
+class Step:
+    name: str
+    action: StepFn
+    depends_on: Sequence[str] = ()
+    compensate: Optional[StepFn] = None
+    timeout: Optional[float] = None
+
+
+class StepFailed(Exception):
+    """Raise from an action to fail its step with a readable message."""
+
+
+class Workflow:
+    def __init__(self, name: str, steps: Sequence[Step]):
+        self.name = name
+        self.steps = {s.name: s for s in steps}
+        if len(self.steps) != len(steps):
+            raise ValueError(f"Workflow {name}: duplicate step names")
+        for s in steps:
+            unknown = set(s.depends_on) - set(self.steps)
+            if unknown:
+                raise ValueError(f"Workflow {name}: step {s.name} depends on unknown {sorted(unknown)}")
+        self._check_acyclic()
+
+    def _check_acyclic(self):
+        state: Dict[str, int] = {}  # 1 = visiting, 2 = done
+
+        def visit(name: str):
+            if state.get(name) == 2:
+                return
+            if state.get(name) == 1:
+                raise ValueError(f"Workflow {self.name}: dependency cycle through {name}")
+            state[name] = 1
+            for dep in self.steps[name].depends_on:
+                visit(dep)
+            state[name] = 2
+
+        for name in self.steps:
+            visit(name)
+
+    async def _run_step(self, step: Step, ctx: Dict[str, Any]) -> Any:
+        if step.timeout is not None:
+            return await asyncio.wait_for(step.action(ctx), step.timeout)
+        return await step.action(ctx)
+
+    async def run(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Returns {"workflow", "status": "success" | "failed", "results", "timings",
+        and on failure "failed_step", "error", "compensated"}.
+        Timings are per step: {"start_ms", "duration_ms", "status"} relative to workflow start.
+        """
+        ctx = {**inputs, "results": {}}
+        timings: Dict[str, Dict[str, Any]] = {}
+        completed: list[str] = []
+        pending = dict(self.steps)
+        running: Dict[asyncio.Task, str] = {}
+        failure: Optional[tuple[str, BaseException]] = None
+        t0 = time.perf_counter()
+
+        def launch_ready():
+            for name, step in list(pending.items()):
+                if all(dep in ctx["results"] for dep in step.depends_on):
+                    del pending[name]
+                    timings[name] = {"start_ms": round((time.perf_counter() - t0) * 1000, 2)}
+                    running[asyncio.create_task(self._run_step(step, ctx), name=f"{self.name}:{name}")] = name
+
+        launch_ready()
+        while running:
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                name = running.pop(task)
+                timing = timings[name]
+                timing["duration_ms"] = round((time.perf_counter() - t0) * 1000 - timing["start_ms"], 2)
+                exc = task.exception()
+                if exc is None:
+                    ctx["results"][name] = task.result()
+                    completed.append(name)
+                    timing["status"] = "succeeded"
+                else:
+                    timing["status"] = "timed_out" if isinstance(exc, asyncio.TimeoutError) else "failed"
+                    if failure is None:
+                        failure = (name, exc)
+                    logger.error(f"❌ Workflow {self.name}: step {name} {timing['status']}: {exc!r}")
+            if failure is None:
+                launch_ready()
+
+        result: Dict[str, Any] = {
+            "workflow": self.name,
+            "status": "success" if failure is None else "failed",
+            "results": ctx["results"],
+            "timings": timings,
+            "total_ms": round((time.perf_counter() - t0) * 1000, 2),
+        }
+        if failure is not None:
+            failed_step, exc = failure
+            # a timed-out step may still have had side effects, so compensate it too
+            to_undo = completed + [n for n, t in timings.items() if t.get("status") == "timed_out"]
+            result.update({
+                "failed_step": failed_step,
+                "error": str(exc) or exc.__class__.__name__,
+                "skipped": sorted(pending),
+                "compensated": await self._compensate(to_undo, ctx),
+            })
+        else:
+            logger.info(f"✅ Workflow {self.name} finished in {result['total_ms']}ms")
+        return result
+
+    async def _compensate(self, names: list[str], ctx: Dict[str, Any]) -> Dict[str, str]:
+        outcome: Dict[str, str] = {}
+        for name in reversed(names):
+            step = self.steps[name]
+            if step.compensate is None:
+                continue
+            try:
+                await step.compensate(ctx)
+                outcome[name] = "compensated"
+            except Exception as e:
+                # keep unwinding; a failed compensation needs manual follow-up
+                outcome[name] = f"failed: {e}"
+                logger.exception(f"❌ Workflow {self.name}: compensation for {name} failed: {e}")
+        return outcome
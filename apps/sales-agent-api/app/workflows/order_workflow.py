@@ -1,12 +1,18 @@
 # app/workflows/order_workflow.py
 from datetime import datetime
+import asyncio
 import logging
+
 from sqlalchemy import text
 
-from app.agents.payment_agent import authorize_payment_sync
-from app.agents.fulfillment_agent import fulfill_order_sync
-from app.agents.loyalty_agent import add_loyalty_points_sync
-from app.services.db import get_db_session
+from app.agents.payment_agent import authorize_payment_sync, authorize_payment_async, void_payment_sync
+from app.agents.fulfillment_agent import fulfill_order_sync, fulfill_order_async, cancel_fulfillment_sync
+from app.agents.loyalty_agent import add_loyalty_points_sync, add_loyalty_points_async, reverse_loyalty_points_sync
+from app.models.order import Order
+from app.services import order_cache
+from app.services.db import SessionLocal, async_session_scope
+from app.services.inventory_service import release_reservations
+from app.workflows.engine import Step, StepFailed, Workflow
 
 logger = logging.getLogger(__name__)
 
@@ -19,42 +25,46 @@ def process_order_sync(order_id: str, customer_id: int, total_amount: int, payme
       3. Award loyalty points
       4. Mark order completed in DB
 
+    All steps share ONE session and ONE transaction (a single connection and a
+    single commit per order). The order row is loaded once and handed to each
+    agent; any failure rolls the whole order back.
+
     Returns a dict with details or {"status": "error", "message": "..."} on failure.
     """
-    db = get_db_session()
+    db = SessionLocal()
     try:
         logger.info(f"🚀 Starting full workflow for order {order_id}")
 
+        order = db.query(Order).filter(Order.external_id == order_id).one_or_none()
+        if order is None:
+            raise RuntimeError(f"Order {order_id} not found")
+
         # 1️⃣ Payment
-        payment = authorize_payment_sync(order_id=order_id, amount=total_amount, payment_method=payment_method)
+        payment = authorize_payment_sync(order_id=order_id, amount=total_amount, payment_method=payment_method,
+                                         db=db, order=order)
         logger.info(f"payment result: {payment}")
-        if payment.get("status") not in ("authorized", "completed"):
+        if payment.get("status") not in ("authorized", "completed") or payment.get("db_update") != "success":
             raise RuntimeError(f"Payment not successful: {payment}")
 
         # 2️⃣ Fulfillment
-        fulfillment = fulfill_order_sync(order_id=order_id)
+        fulfillment = fulfill_order_sync(order_id=order_id, db=db, order=order)
         logger.info(f"fulfillment result: {fulfillment}")
         if fulfillment.get("db_update") != "success":
             raise RuntimeError(f"Fulfillment failed: {fulfillment}")
 
         # 3️⃣ Loyalty
-        loyalty = add_loyalty_points_sync(customer_id=customer_id, order_total=total_amount)
+        loyalty = add_loyalty_points_sync(customer_id=customer_id, order_total=total_amount, db=db,
+                                          order_id=order_id)
         logger.info(f"loyalty result: {loyalty}")
         if loyalty.get("db_update") != "success":
             raise RuntimeError(f"Loyalty update failed: {loyalty}")
 
-        # 4️⃣ Update order status in DB
-        # NOTE: remove trailing commas — Postgres errors if SET list ends with a comma.
-        update_sql = text(
-            """
-            UPDATE orders
-               SET status = :status,
-                   payment_status = :payment_status,
-                   created_at = COALESCE(created_at, NOW())
-             WHERE external_id = :external_id
-            """
-        )
-        db.execute(update_sql, {"status": "completed", "payment_status": "PAID", "external_id": order_id})
+        # 4️⃣ Final order status — same row object, flushed with everything else
+        order.status = "completed"
+        order.payment_status = "PAID"
+        if order.created_at is None:
+            order.created_at = datetime.utcnow()
+        order_cache.stage(db, order)
         db.commit()
 
         logger.info(f"✅ Workflow completed successfully for {order_id}")
@@ -74,6 +84,12 @@ def process_order_sync(order_id: str, customer_id: int, total_amount: int, payme
         except Exception:
             logger.exception("Rollback failed")
         logger.error(f"❌ Workflow failed for {order_id}: {e}")
+        try:
+            # Payment confirmation was rolled back too, so any hold is still live — return it
+            release_reservations(order_id, session=db)
+            db.commit()
+        except Exception:
+            logger.exception("Releasing stock reservations failed")
         return {"status": "error", "message": str(e)}
 
     finally:
@@ -81,3 +97,105 @@ def process_order_sync(order_id: str, customer_id: int, total_amount: int, payme
             db.close()
         except Exception:
             logger.exception("Failed to close DB session")
+
+
+# ----- Async saga version -----
+# Each step commits on its own AsyncSession; fulfillment and loyalty only depend
+# on payment, so they run concurrently. A failure compensates the completed steps
+# (compensations are the rare path and reuse the sync agents in a worker thread;
+# an agent reporting an error fails the compensation so it gets manual follow-up).
+
+async def _payment(ctx):
+    payment = await authorize_payment_async(ctx["order_id"], ctx["total_amount"], ctx["payment_method"])
+    if payment.get("status") not in ("authorized", "completed") or payment.get("db_update") != "success":
+        # nothing to void, but any stock hold is still live — return it
+        await asyncio.to_thread(release_reservations, ctx["order_id"])
+        raise StepFailed(f"Payment not successful: {payment}")
+    return payment
+
+
+async def _void_payment(ctx):
+    voided = await asyncio.to_thread(void_payment_sync, ctx["order_id"], ctx["total_amount"])
+    if voided.get("status") != "voided":
+        raise StepFailed(f"Payment void failed: {voided}")
+
+
+async def _fulfillment(ctx):
+    fulfillment = await fulfill_order_async(ctx["order_id"])
+    if fulfillment.get("db_update") != "success":
+        raise StepFailed(f"Fulfillment failed: {fulfillment}")
+    return fulfillment
+
+
+async def _cancel_fulfillment(ctx):
+    cancelled = await asyncio.to_thread(cancel_fulfillment_sync, ctx["order_id"])
+    if cancelled.get("status") != "cancelled":
+        raise StepFailed(f"Fulfillment cancel failed: {cancelled}")
+
+
+async def _loyalty(ctx):
+    loyalty = await add_loyalty_points_async(ctx["customer_id"], ctx["total_amount"], order_id=ctx["order_id"])
+    if loyalty.get("db_update") != "success":
+        raise StepFailed(f"Loyalty update failed: {loyalty}")
+    return loyalty
+
+
+async def _reverse_loyalty(ctx):
+    reversed_ = await asyncio.to_thread(reverse_loyalty_points_sync, ctx["customer_id"], ctx["total_amount"],
+                                        None, ctx["order_id"])
+    if reversed_.get("db_update") != "success":
+        raise StepFailed(f"Loyalty reversal failed: {reversed_}")
+
+
+_COMPLETE_SQL = text(
+    "UPDATE orders SET status = 'completed', payment_status = 'PAID', "
+    "created_at = COALESCE(created_at, now()) WHERE external_id = :oid "
+    f"RETURNING {order_cache.state_columns()}"
+)
+
+
+async def _complete(ctx):
+    order_id = ctx["order_id"]
+    async with async_session_scope() as db:
+        row = (await db.execute(_COMPLETE_SQL, {"oid": order_id})).first()
+        if row is not None:
+            order_cache.stage(db, row)
+    if row is None:
+        raise StepFailed(f"Order {order_id} not found")
+    return {"order_id": order_id, "status": "completed"}
+
+
+ORDER_WORKFLOW = Workflow("post-purchase", [
+    Step("payment", _payment, compensate=_void_payment, timeout=30),
+    Step("fulfillment", _fulfillment, depends_on=("payment",), compensate=_cancel_fulfillment, timeout=30),
+    Step("loyalty", _loyalty, depends_on=("payment",), compensate=_reverse_loyalty, timeout=30),
+    Step("complete", _complete, depends_on=("fulfillment", "loyalty"), timeout=30),
+])
+
+
+async def process_order_async(order_id: str, customer_id: int, total_amount: int, payment_method: dict):
+    """
+    Post-purchase workflow on the async engine: payment, then fulfillment and
+    loyalty in parallel, then the order is marked completed. If a step fails,
+    completed steps are compensated (payment voided, shipment cancelled,
+    points reversed). Same result shape as process_order_sync, plus per-step timings.
+    """
+    logger.info(f"🚀 Starting async workflow for order {order_id}")
+    run = await ORDER_WORKFLOW.run({
+        "order_id": order_id,
+        "customer_id": customer_id,
+        "total_amount": total_amount,
+        "payment_method": payment_method,
+    })
+    if run["status"] != "success":
+        logger.error(f"❌ Workflow failed for {order_id} at {run['failed_step']}: {run['error']}")
+        return {"status": "error", "message": run["error"], "failed_step": run["failed_step"],
+                "compensated": run["compensated"], "timings": run["timings"]}
+
+    return {
+        "order_id": order_id,
+        **{name: run["results"][name] for name in ("payment", "fulfillment", "loyalty")},
+        "timestamp": datetime.utcnow().isoformat() + "Z",
+        "workflow_status": "success",
+        "timings": run["timings"],
+    }
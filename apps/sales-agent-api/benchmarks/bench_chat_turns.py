@@ -0,0 +1,131 @@
+# benchmarks/bench_chat_turns.py
+"""
+Chat-turn throughput: sync tools in the default thread pool vs coroutine tools
+on the async engine, under N concurrent turns. The "turn" mode also wraps each
+turn in request_session_scope, so its read-only tools share one connection.
+
+A turn runs the tool plan a typical shopping chat produces, through
+tool_router.execute: recommend → check_stock → authorize_payment (each turn pays
+for its own seeded order). Both modes use the same pool settings (DB_POOL_SIZE /
+DB_MAX_OVERFLOW); pool checkouts per turn and checkout wait per engine are
+printed from pool_stats().
+
+Needs DATABASE_URL. Usage:
+    python benchmarks/bench_chat_turns.py --turns 500
+"""
+import os
+import sys
+import time
+import uuid
+import asyncio
+import argparse
+import threading
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import text  # noqa: E402
+from app.services.db import SessionLocal, dispose_async_engine, pool_stats, request_session_scope  # noqa: E402
+from app.services import tool_router  # noqa: E402
+from app.agents import recommendation_agent, inventory_agent, payment_agent  # noqa: E402
+
+SYNC_TOOLS = {
+    "recommend": recommendation_agent.recommend_products_sync,
+    "check_stock": inventory_agent.check_stock_sync,
+    "authorize_payment": payment_agent.authorize_payment_sync,
+}
+ASYNC_TOOLS = {
+    "recommend": recommendation_agent.recommend_products_async,
+    "check_stock": inventory_agent.check_stock_async,
+    "authorize_payment": payment_agent.authorize_payment_async,
+}
+
+
+def _seed(tag: str, n_orders: int):
+    db = SessionLocal()
+    try:
+        db.execute(
+            text("INSERT INTO products (sku, name, category, price, stock) VALUES (:s, 'Bench Tee', :c, 499, 100)"),
+            {"s": f"BENCH-{tag}", "c": f"bench-{tag.lower()}"},
+        )
+        db.execute(
+            text("INSERT INTO orders (external_id, total_amount, status) VALUES (:e, 499, 'created')"),
+            [{"e": f"BENCH-{tag}-{i}"} for i in range(n_orders)],
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def _cleanup(tag: str):
+    db = SessionLocal()
+    try:
+        db.execute(text("DELETE FROM payment_ledger WHERE order_id LIKE :p"), {"p": f"BENCH-{tag}-%"})
+        db.execute(text("DELETE FROM orders WHERE external_id LIKE :p"), {"p": f"BENCH-{tag}-%"})
+        db.execute(text("DELETE FROM products WHERE sku = :s"), {"s": f"BENCH-{tag}"})
+        db.commit()
+    finally:
+        db.close()
+
+
+async def _turn(tag: str, order_id: str, turn_scope: bool = False) -> float:
+    if turn_scope:
+        async with request_session_scope():
+            return await _turn(tag, order_id)
+    started = time.perf_counter()
+    await tool_router.execute("recommend", {"query": f"bench-{tag.lower()}", "budget": 1000})
+    await tool_router.execute("check_stock", {"sku": f"BENCH-{tag}"})
+    paid = await tool_router.execute("authorize_payment",
+                                     {"order_id": order_id, "amount": 499, "payment_method": {"type": "card"}})
+    if paid.get("db_update") != "success":
+        raise RuntimeError(f"payment failed: {paid}")
+    return time.perf_counter() - started
+
+
+def _checkouts() -> int:
+    return sum(s.get("checkouts", 0) for s in pool_stats())
+
+
+async def _run(label: str, tools: dict, tag: str, order_ids: list[str], turn_scope: bool = False):
+    tool_router.TOOL_MAP.update(tools)
+    await _turn(tag, order_ids[0], turn_scope)  # warm-up: pools, store index, cache-down checks
+    peak_threads = threading.active_count()
+
+    checkouts = _checkouts()
+    started = time.perf_counter()
+    pending = [asyncio.ensure_future(_turn(tag, oid, turn_scope)) for oid in order_ids[1:]]
+    while not all(t.done() for t in pending):
+        peak_threads = max(peak_threads, threading.active_count())
+        await asyncio.sleep(0.005)
+    latencies = sorted(t.result() for t in pending)
+    elapsed = time.perf_counter() - started
+    checkouts = _checkouts() - checkouts
+
+    n = len(latencies)
+    p = lambda q: latencies[min(n - 1, int(q * n))] * 1000  # noqa: E731
+    waits = {s["engine"]: s.get("wait_ms_avg", 0.0) for s in pool_stats()}
+    print(f"{label:<8} {n} turns  {n / elapsed:8.1f} turns/sec  p50 {p(0.5):7.1f}ms  p95 {p(0.95):7.1f}ms  "
+          f"threads {peak_threads:3d}  checkouts/turn {checkouts / n:4.2f}  avg checkout wait {waits}")
+    await dispose_async_engine()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, default=500)
+    args = parser.parse_args()
+
+    tag = uuid.uuid4().hex[:6].upper()
+    per_mode = args.turns + 1
+    order_ids = [f"BENCH-{tag}-{i}" for i in range(3 * per_mode)]
+    _seed(tag, len(order_ids))
+    original = dict(tool_router.TOOL_MAP)
+    try:
+        asyncio.run(_run("threads", SYNC_TOOLS, tag, order_ids[:per_mode]))
+        asyncio.run(_run("async", ASYNC_TOOLS, tag, order_ids[per_mode:2 * per_mode]))
+        asyncio.run(_run("turn", ASYNC_TOOLS, tag, order_ids[2 * per_mode:], turn_scope=True))
+    finally:
+        tool_router.TOOL_MAP.update(original)
+        _cleanup(tag)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+# benchmarks/bench_fulfillment_wave.py
+"""
+Orders shipped/sec: one fulfill_order_sync call per order vs fulfill_wave_sync.
+
+Seeds N paid, unshipped BENCH orders twice (one set per approach) and ships
+them. Any other paid, unshipped orders in the database get shipped by the
+wave run too.
+
+Needs DATABASE_URL. Usage:
+    python benchmarks/bench_fulfillment_wave.py --orders 5000 --wave 5000
+"""
+import os
+import sys
+import time
+import uuid
+import argparse
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import text  # noqa: E402
+from app.services.db import SessionLocal, import_all_models  # noqa: E402
+from app.agents.fulfillment_agent import fulfill_order_sync, fulfill_wave_sync  # noqa: E402
+
+import_all_models()
+
+
+def _seed(prefix: str, n: int) -> list[str]:
+    ids = [f"{prefix}-{i}" for i in range(n)]
+    db = SessionLocal()
+    try:
+        db.execute(
+            text("INSERT INTO orders (external_id, total_amount, status, payment_status) "
+                 "VALUES (:e, :t, 'completed', 'PAID')"),
+            [{"e": oid, "t": 9999 if i % 4 == 0 else 799} for i, oid in enumerate(ids)],
+        )
+        db.commit()
+        return ids
+    finally:
+        db.close()
+
+
+def _cleanup(tag: str):
+    db = SessionLocal()
+    try:
+        pattern = f"BENCH-{tag}-%"
+        db.execute(text("DELETE FROM fulfillments WHERE order_id IN (SELECT id FROM orders WHERE external_id LIKE :p)"),
+                   {"p": pattern})
+        db.execute(text("DELETE FROM orders WHERE external_id LIKE :p"), {"p": pattern})
+        db.commit()
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--orders", type=int, default=5000)
+    parser.add_argument("--wave", type=int, default=5000)
+    args = parser.parse_args()
+
+    tag = uuid.uuid4().hex[:6].upper()
+    try:
+        ids = _seed(f"BENCH-{tag}-single", args.orders)
+        started = time.perf_counter()
+        for oid in ids:
+            fulfill_order_sync(oid)
+        single = time.perf_counter() - started
+
+        _seed(f"BENCH-{tag}-wave", args.orders)
+        started = time.perf_counter()
+        shipped, waves, carriers = 0, 0, {}
+        while True:
+            result = fulfill_wave_sync(limit=args.wave)
+            if not result["shipped"]:
+                break
+            shipped += result["shipped"]
+            waves += 1
+            for m in result["manifests"]:
+                carriers[m["carrier"]] = carriers.get(m["carrier"], 0) + m["count"]
+        wave = time.perf_counter() - started
+
+        print(f"per-order calls  {args.orders:>7} orders  {args.orders / single:>10,.0f} orders/sec")
+        print(f"waves of {args.wave:<6}  {shipped:>7} orders  {shipped / wave:>10,.0f} orders/sec  "
+              f"({waves} wave(s), {carriers})")
+    finally:
+        _cleanup(tag)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+# benchmarks/bench_inventory_ingest.py
+"""
+Throughput of bulk inventory ingestion (rows/sec).
+
+Seeds BENCH-* products, then streams synthetic feeds through the COPY path:
+  1. initial snapshot  (every key is new → inserts)
+  2. repeat snapshot   (nothing changed → no writes)
+  3. partial snapshot  (~10% of keys changed)
+  4. delta feed        (same size, every key nudged)
+
+Needs DATABASE_URL. Usage:
+    python benchmarks/bench_inventory_ingest.py --skus 5000 --stores 10
+"""
+import os
+import sys
+import random
+import argparse
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import text  # noqa: E402
+from app.services.db import SessionLocal  # noqa: E402
+from app.services.inventory_ingest import ingest_rows  # noqa: E402
+
+
+def _seed_products(n_skus: int):
+    db = SessionLocal()
+    try:
+        db.execute(
+            text("INSERT INTO products (sku, name, category, price, stock) VALUES (:sku, :name, 'bench', 100, 0) "
+                 "ON CONFLICT DO NOTHING"),
+            [{"sku": f"BENCH-{i:06d}", "name": f"Bench item {i}"} for i in range(n_skus)],
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def _cleanup():
+    db = SessionLocal()
+    try:
+        db.execute(text("DELETE FROM inventory WHERE product_id IN (SELECT id FROM products WHERE sku LIKE 'BENCH-%')"))
+        db.execute(text("DELETE FROM products WHERE sku LIKE 'BENCH-%'"))
+        db.commit()
+    finally:
+        db.close()
+
+
+def _feed(n_skus: int, n_stores: int, qty):
+    for i in range(n_skus):
+        for s in range(n_stores):
+            yield f"BENCH-{i:06d}", f"STORE-{s:03d}", qty(i, s)
+
+
+def _report(label: str, stats: dict):
+    print(f"{label:<20} rows={stats['rows_staged']:>8}  changed_products={stats['products_changed']:>6}  "
+          f"copy={stats['copy_seconds']:>6.3f}s  total={stats['total_seconds']:>6.3f}s  "
+          f"→ {stats['rows_per_sec']:>9,} rows/sec")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--skus", type=int, default=5000)
+    parser.add_argument("--stores", type=int, default=10)
+    parser.add_argument("--keep", action="store_true", help="leave BENCH-* rows in place")
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    base = {(i, s): rng.randint(0, 50) for i in range(args.skus) for s in range(args.stores)}
+    changed = {k: v + 1 for k, v in base.items() if rng.random() < 0.10}
+
+    _cleanup()
+    _seed_products(args.skus)
+    try:
+        _report("initial snapshot", ingest_rows(_feed(args.skus, args.stores, lambda i, s: base[(i, s)])))
+        _report("unchanged snapshot", ingest_rows(_feed(args.skus, args.stores, lambda i, s: base[(i, s)])))
+        _report("10% changed", ingest_rows(_feed(args.skus, args.stores, lambda i, s: changed.get((i, s), base[(i, s)]))))
+        _report("delta", ingest_rows(_feed(args.skus, args.stores, lambda i, s: 1), mode="delta"))
+    finally:
+        if not args.keep:
+            _cleanup()
+
+
+if __name__ == "__main__":
+    main()
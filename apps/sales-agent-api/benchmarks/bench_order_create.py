@@ -0,0 +1,120 @@
+# benchmarks/bench_order_create.py
+"""
+Order inserts/sec for batches of 1, 100 and 10k orders (3 line items each).
+
+Compares the old shape — ORM Order + flush + one OrderItem add per line, one
+commit per order — with order_service.create_orders_bulk (one statement per
+1000 orders, items inserted from the RETURNING ids).
+
+Needs DATABASE_URL. Usage:
+    python benchmarks/bench_order_create.py --sizes 1 100 10000 --items 3
+"""
+import os
+import sys
+import time
+import uuid
+import argparse
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import text  # noqa: E402
+from app.services.db import SessionLocal, import_all_models  # noqa: E402
+from app.services.order_service import create_orders_bulk  # noqa: E402
+from app.models.order import Order  # noqa: E402
+from app.models.order_item import OrderItem  # noqa: E402
+
+import_all_models()
+
+N_SKUS = 50
+
+
+def _seed(tag: str) -> int:
+    db = SessionLocal()
+    try:
+        db.execute(
+            text("INSERT INTO products (sku, name, category, price, stock) VALUES (:sku, 'Bench', 'bench', 100, 0) "
+                 "ON CONFLICT DO NOTHING"),
+            [{"sku": f"BENCH-ORD-{i:03d}"} for i in range(N_SKUS)],
+        )
+        # plenty of stock, so every bulk order gets its hold
+        db.execute(
+            text("INSERT INTO inventory (product_id, location, quantity) "
+                 "SELECT id, 'BENCH-STORE', 100000000 FROM products WHERE sku LIKE 'BENCH-ORD-%' "
+                 "ON CONFLICT (product_id, location) DO NOTHING")
+        )
+        customer_id = db.execute(
+            text("INSERT INTO customers (customer_id, name) VALUES (:cid, 'Bench') RETURNING id"),
+            {"cid": f"BENCH-{tag}"},
+        ).scalar_one()
+        db.commit()
+        return customer_id
+    finally:
+        db.close()
+
+
+def _cleanup(tag: str):
+    db = SessionLocal()
+    try:
+        db.execute(text("DELETE FROM stock_reservations WHERE order_id LIKE :p"), {"p": f"BENCH-{tag}-%"})
+        db.execute(text("DELETE FROM orders WHERE external_id LIKE :p"), {"p": f"BENCH-{tag}-%"})
+        db.execute(text("DELETE FROM customers WHERE customer_id = :c"), {"c": f"BENCH-{tag}"})
+        db.execute(text("DELETE FROM products WHERE sku LIKE 'BENCH-ORD-%'"))
+        db.commit()
+    finally:
+        db.close()
+
+
+def _orders(tag: str, label: str, n: int, n_items: int, customer_id: int) -> list[dict]:
+    return [
+        {
+            "external_id": f"BENCH-{tag}-{label}-{i}",
+            "customer_id": customer_id,
+            "items": [{"sku": f"BENCH-ORD-{(i + j) % N_SKUS:03d}", "quantity": 1 + j, "unit_price": 100}
+                      for j in range(n_items)],
+        }
+        for i in range(n)
+    ]
+
+
+def _orm_one_by_one(orders: list[dict]):
+    db = SessionLocal()
+    try:
+        for o in orders:
+            order = Order(external_id=o["external_id"], customer_id=o["customer_id"], status="created",
+                          total_amount=sum(it["quantity"] * it["unit_price"] for it in o["items"]))
+            db.add(order)
+            db.flush()
+            for it in o["items"]:
+                db.add(OrderItem(order_id=order.id, sku=it["sku"], quantity=it["quantity"],
+                                 unit_price=it["unit_price"]))
+            db.commit()
+    finally:
+        db.close()
+
+
+def _time(func, orders) -> float:
+    started = time.perf_counter()
+    func(orders)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 100, 10_000])
+    parser.add_argument("--items", type=int, default=3)
+    args = parser.parse_args()
+
+    tag = uuid.uuid4().hex[:6].upper()
+    customer_id = _seed(tag)
+    try:
+        print(f"{'orders':>8}  {'row-at-a-time':>22}  {'bulk':>22}  speedup")
+        for n in args.sizes:
+            legacy = _time(_orm_one_by_one, _orders(tag, f"orm{n}", n, args.items, customer_id))
+            bulk = _time(create_orders_bulk, _orders(tag, f"bulk{n}", n, args.items, customer_id))
+            print(f"{n:>8}  {n / legacy:>12,.0f} orders/sec  {n / bulk:>12,.0f} orders/sec  {legacy / bulk:6.1f}x")
+    finally:
+        _cleanup(tag)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+# benchmarks/bench_order_workflow.py
+"""
+Orders/sec through process_order_sync, plus commits and pool checkouts per order.
+
+Seeds one BENCH customer and N created orders, runs the full workflow for each
+(sequentially, then with a thread pool), and counts Session commits and
+connection checkouts via SQLAlchemy events.
+
+Needs DATABASE_URL. Usage:
+    python benchmarks/bench_order_workflow.py --orders 500 --threads 8
+"""
+import os
+import sys
+import time
+import uuid
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import event, text  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+from app.services.db import SessionLocal, engine  # noqa: E402
+from app.workflows.order_workflow import process_order_sync  # noqa: E402
+
+_counts = {"commits": 0, "checkouts": 0}
+_lock = threading.Lock()
+
+
+def _bump(key):
+    with _lock:
+        _counts[key] += 1
+
+
+event.listen(Session, "after_commit", lambda session: _bump("commits"))
+event.listen(engine, "checkout", lambda *args: _bump("checkouts"))
+
+
+def _seed(n_orders: int, tag: str) -> tuple[int, list[str]]:
+    db = SessionLocal()
+    try:
+        customer_id = db.execute(
+            text("INSERT INTO customers (customer_id, name) VALUES (:cid, 'Bench') RETURNING id"),
+            {"cid": f"BENCH-{tag}"},
+        ).scalar_one()
+        order_ids = [f"BENCH-{tag}-{i}" for i in range(n_orders)]
+        db.execute(
+            text("INSERT INTO orders (external_id, customer_id, total_amount, status) VALUES (:oid, :cid, 1999, 'created')"),
+            [{"oid": oid, "cid": customer_id} for oid in order_ids],
+        )
+        db.commit()
+        return customer_id, order_ids
+    finally:
+        db.close()
+
+
+def _cleanup(tag: str):
+    db = SessionLocal()
+    try:
+        db.execute(text("DELETE FROM fulfillments WHERE order_id IN (SELECT id FROM orders WHERE external_id LIKE :p)"),
+                   {"p": f"BENCH-{tag}-%"})
+        db.execute(text("DELETE FROM orders WHERE external_id LIKE :p"), {"p": f"BENCH-{tag}-%"})
+        db.execute(text("DELETE FROM loyalty_accounts WHERE customer_id IN (SELECT id FROM customers WHERE customer_id = :c)"),
+                   {"c": f"BENCH-{tag}"})
+        db.execute(text("DELETE FROM customers WHERE customer_id = :c"), {"c": f"BENCH-{tag}"})
+        db.commit()
+    finally:
+        db.close()
+
+
+def _run(label: str, order_ids: list[str], customer_id: int, threads: int):
+    _counts.update(commits=0, checkouts=0)
+    run = lambda oid: process_order_sync(oid, customer_id, 1999, {"type": "card"})  # noqa: E731
+    started = time.perf_counter()
+    if threads <= 1:
+        results = [run(oid) for oid in order_ids]
+    else:
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            results = list(pool.map(run, order_ids))
+    elapsed = time.perf_counter() - started
+    ok = sum(1 for r in results if r.get("workflow_status") == "success")
+    n = len(order_ids)
+    print(f"{label:<14} {ok}/{n} ok  {n / elapsed:8.1f} orders/sec  "
+          f"{_counts['commits'] / n:.2f} commits/order  {_counts['checkouts'] / n:.2f} checkouts/order")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--orders", type=int, default=500)
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+
+    tag = uuid.uuid4().hex[:6].upper()
+    customer_id, order_ids = _seed(args.orders * 2, tag)
+    try:
+        _run("sequential", order_ids[: args.orders], customer_id, 1)
+        _run(f"{args.threads} threads", order_ids[args.orders:], customer_id, args.threads)
+    finally:
+        _cleanup(tag)
+
+
+if __name__ == "__main__":
+    main()
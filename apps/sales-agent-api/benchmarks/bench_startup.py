@@ -0,0 +1,116 @@
+# benchmarks/bench_startup.py
+"""
+Cold-start cost of the API: `import app.main` in fresh interpreters, with an
+import-time breakdown (python -X importtime) by top-level package and by module.
+
+The import runs without DATABASE_URL, so it also checks that the app can be
+imported with no database. With DATABASE_URL set, --warm-up also times what the
+startup warm-up does before /readyz turns ready (agent imports + pool pre-connect).
+
+For CI: --json writes the numbers to a file, --max-import-ms fails the run
+(exit 1) when the median import time goes over budget.
+
+Usage:
+    python benchmarks/bench_startup.py --runs 10 --top 15
+    python benchmarks/bench_startup.py --json startup.json --max-import-ms 800
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+from collections import defaultdict
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+_IMPORT_APP = "import time; t0 = time.perf_counter(); import app.main; print((time.perf_counter() - t0) * 1000)"
+_WARM_UP = (
+    "import time; t0 = time.perf_counter(); import app.main; from app.services import db, tool_router; "
+    "tool_router.load_tools(); t1 = time.perf_counter(); db.warm_up(); "
+    "print((t1 - t0) * 1000, (time.perf_counter() - t1) * 1000)"
+)
+
+
+def _python(code: str, *flags: str, db: bool = False) -> subprocess.CompletedProcess:
+    env = dict(os.environ)
+    if not db:
+        env.pop("DATABASE_URL", None)
+        env.pop("DATABASE_REPLICA_URLS", None)
+    proc = subprocess.run([sys.executable, *flags, "-c", code], cwd=ROOT, env=env,
+                          capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"startup run failed:\n{proc.stderr[-2000:]}")
+    return proc
+
+
+def import_breakdown(top: int) -> dict:
+    """Parse `-X importtime` output: self time per top-level package and the slowest modules (cumulative)."""
+    stderr = _python("import app.main", "-X", "importtime").stderr
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        # "import time:   self_us |   cumulative_us |   <indent>module"
+        self_us, cumulative_us, name = line.split(":", 1)[1].split("|")
+        modules.append((name.strip(), int(self_us), int(cumulative_us)))
+
+    by_package = defaultdict(float)
+    for name, self_us, _ in modules:
+        by_package[name.split(".")[0]] += self_us / 1000
+    slowest = sorted(modules, key=lambda m: m[2], reverse=True)[:top]
+    return {
+        "total_ms": round(sum(m[1] for m in modules) / 1000, 1),
+        "packages": {k: round(v, 1) for k, v in sorted(by_package.items(), key=lambda kv: -kv[1])[:top]},
+        "modules": [{"module": n, "self_ms": round(s / 1000, 1), "cumulative_ms": round(c / 1000, 1)}
+                    for n, s, c in slowest],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--warm-up", action="store_true", help="also time agent imports + pool warm-up (needs DATABASE_URL)")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--max-import-ms", type=float, help="exit 1 if the median import time exceeds this")
+    args = parser.parse_args()
+
+    _python("import app.main")  # compile .pyc once so every timed run is a warm-cache cold start
+    import_ms = sorted(float(_python(_IMPORT_APP).stdout.split()[-1]) for _ in range(args.runs))
+    result = {
+        "runs": args.runs,
+        "import_ms_median": round(statistics.median(import_ms), 1),
+        "import_ms_min": round(import_ms[0], 1),
+        "import_ms_max": round(import_ms[-1], 1),
+        "breakdown": import_breakdown(args.top),
+    }
+
+    if args.warm_up:
+        if not os.getenv("DATABASE_URL"):
+            parser.error("--warm-up needs DATABASE_URL")
+        agents_ms, pools_ms = (float(x) for x in _python(_WARM_UP, db=True).stdout.split()[-2:])
+        result["warm_up"] = {"import_and_agents_ms": round(agents_ms, 1), "pools_ms": round(pools_ms, 1)}
+
+    print(f"import app.main  median {result['import_ms_median']}ms  "
+          f"(min {result['import_ms_min']}ms, max {result['import_ms_max']}ms, {args.runs} runs)")
+    print(f"\nby package (self time, -X importtime total {result['breakdown']['total_ms']}ms):")
+    for package, ms in result["breakdown"]["packages"].items():
+        print(f"  {package:<28} {ms:8.1f}ms")
+    print("\nslowest modules (cumulative):")
+    for m in result["breakdown"]["modules"]:
+        print(f"  {m['module']:<48} {m['cumulative_ms']:8.1f}ms  (self {m['self_ms']}ms)")
+    if "warm_up" in result:
+        w = result["warm_up"]
+        print(f"\nwarm-up: import + agents {w['import_and_agents_ms']}ms, pool pre-connect {w['pools_ms']}ms")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+    if args.max_import_ms is not None and result["import_ms_median"] > args.max_import_ms:
+        print(f"\n❌ median import {result['import_ms_median']}ms is over the {args.max_import_ms}ms budget")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+# benchmarks/bench_store_index.py
+"""
+Per-request cost of nearest-in-stock-store lookups (no database needed).
+
+Compares the KD-tree index against a linear scan over all stores, for
+unfiltered queries, a SKU stocked in ~10% of stores, and a rare SKU.
+
+Usage:
+    python benchmarks/bench_store_index.py --stores 5000 --queries 20000
+"""
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from app.services.store_locator import StoreIndex, _to_unit  # noqa: E402
+
+
+def _linear(points, codes, q, allowed):
+    best, best_code = float("inf"), None
+    for p, code in zip(points, codes):
+        if allowed is not None and code not in allowed:
+            continue
+        d2 = (p[0] - q[0]) ** 2 + (p[1] - q[1]) ** 2 + (p[2] - q[2]) ** 2
+        if d2 < best:
+            best, best_code = d2, code
+    return best_code
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--stores", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=20000)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    stores = [(f"STORE-{i:05d}", rng.uniform(8, 35), rng.uniform(68, 97)) for i in range(args.stores)]
+    started = time.perf_counter()
+    index = StoreIndex(stores)
+    print(f"build: {args.stores} stores in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    codes = [c for c, _, _ in stores]
+    queries = [(rng.uniform(8, 35), rng.uniform(68, 97)) for _ in range(args.queries)]
+    cases = {
+        "any store": None,
+        "10% stocked": set(rng.sample(codes, max(1, args.stores // 10))),
+        "rare (20 stores)": set(rng.sample(codes, 20)),
+    }
+    for label, allowed in cases.items():
+        t0 = time.perf_counter()
+        for lat, lon in queries:
+            index.nearest(lat, lon, allowed=allowed)
+        kd_us = (time.perf_counter() - t0) / len(queries) * 1e6
+
+        sample = queries[: max(1, len(queries) // 20)]
+        t0 = time.perf_counter()
+        for lat, lon in sample:
+            _linear(index.points, index.codes, _to_unit(lat, lon), allowed)
+        scan_us = (time.perf_counter() - t0) / len(sample) * 1e6
+        print(f"{label:<18} kd-tree {kd_us:8.1f} µs/query   linear scan {scan_us:9.1f} µs/query")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+# benchmarks/bench_telegram_polling.py
+"""
+getUpdates ingest throughput (TELEGRAM_INGEST=polling) by worker count.
+
+A local Telegram stand-in (app/tests/fake_telegram.py under uvicorn) is loaded
+with --updates messages spread over --chats chats; the poller drains it through
+the real pipeline (telegram_bot.handle_update → run_chat_turn → outbox) until
+every reply has arrived. The planner is a stub that sleeps --llm-ms, sessions
+and the offset live in memory, and the outbox rate limits are lifted, so the
+numbers are the ingest path itself. Each run also checks that every chat got
+its replies in order.
+
+No database or Redis needed. Usage:
+    python benchmarks/bench_telegram_polling.py --updates 2000 --chats 200 --workers 1,8,32,128
+"""
+import os
+import sys
+import time
+import socket
+import asyncio
+import logging
+import argparse
+import threading
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+import uvicorn  # noqa: E402
+
+from app.services import llm_client, session_store, telegram_bot  # noqa: E402
+from app.services.telegram_poller import TelegramPoller  # noqa: E402
+from app.tests.fake_telegram import FakeTelegram  # noqa: E402
+
+
+class MemoryStore:
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.data[key] = value
+        return True
+
+
+def _serve(asgi_app) -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(asgi_app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return port
+
+
+async def _run(telegram: FakeTelegram, workers: int, updates: int, chats: int):
+    poller = TelegramPoller(telegram_bot.TELEGRAM_API_BASE, telegram_bot.get_client, redis=MemoryStore(),
+                            concurrency=workers, poll_timeout=1)
+    started = time.monotonic()
+    await poller.start()
+    while len(telegram.messages) < updates:
+        await asyncio.sleep(0.005)
+    elapsed = time.monotonic() - started
+    await poller.stop()
+    await telegram_bot.close()
+
+    in_order = all(
+        telegram.texts(chat) == sorted(telegram.texts(chat), key=lambda t: int(t.rsplit(" ", 1)[1]))
+        for chat in range(1, chats + 1)
+    )
+    print(f"workers {workers:4d}  {updates} updates  {updates / elapsed:8.1f} updates/sec  "
+          f"{elapsed:6.2f}s  per-chat order {'ok' if in_order else 'BROKEN'}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--updates", type=int, default=2000)
+    parser.add_argument("--chats", type=int, default=200)
+    parser.add_argument("--workers", default="1,8,32,128")
+    parser.add_argument("--llm-ms", type=float, default=50.0, help="simulated planner latency per turn")
+    args = parser.parse_args()
+
+    async def plan(text, session):
+        await asyncio.sleep(args.llm_ms / 1000)
+        return {"reply_text": f"re: {text}", "tool_calls": []}
+
+    os.environ["TELEGRAM_GLOBAL_RATE"] = os.environ["TELEGRAM_GLOBAL_BURST"] = "1000000"
+    os.environ["TELEGRAM_CHAT_RATE"] = os.environ["TELEGRAM_CHAT_BURST"] = "1000000"
+    logging.disable(logging.INFO)
+    llm_client.plan = plan
+    session_store.session_store = MemoryStore()
+
+    telegram = FakeTelegram()
+    telegram_bot.TELEGRAM_API_BASE = f"http://127.0.0.1:{_serve(telegram.app)}/botBENCH"
+    for workers in (int(w) for w in args.workers.split(",")):
+        telegram.messages.clear()
+        for i in range(args.updates):
+            telegram.push_message(1 + i % args.chats, f"msg {i}")
+        asyncio.run(_run(telegram, workers, args.updates, args.chats))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+# benchmarks/bench_telegram_webhook.py
+"""
+Webhook-to-reply latency of the Telegram bot: from POSTing an update to the
+webhook until the reply's sendMessage reaches a local Telegram stand-in.
+
+The API runs under uvicorn on a free port, with the Gemini planner replaced by a
+fixed plan (--llm-ms of simulated model time, no tool calls) and an in-memory
+session store, so the numbers are the webhook's own overhead. Replies go to
+app/tests/fake_telegram.py; the outbox's global rate limit is lifted (it would
+cap the run at 30 replies/s). Modes:
+  inprocess  the webhook calls chat_service.run_chat_turn and replies through
+             the outbox and the pooled client (current code)
+  loopback   the previous path: POST the update to /v1/chat over HTTP and send
+             the reply with a fresh httpx.AsyncClient each time
+
+No database or Redis needed. Usage:
+    python benchmarks/bench_telegram_webhook.py --updates 2000 --concurrency 50
+"""
+import os
+import sys
+import time
+import socket
+import logging
+import asyncio
+import argparse
+import threading
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+import httpx  # noqa: E402
+import uvicorn  # noqa: E402
+
+from app.main import app  # noqa: E402
+from app.services import llm_client, session_store, telegram_bot  # noqa: E402
+from app.tests.fake_telegram import FakeTelegram  # noqa: E402
+
+telegram = FakeTelegram()
+
+
+class MemoryStore:
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.data[key] = value
+        return True
+
+
+def _serve(asgi_app) -> int:
+    """Run an ASGI app under uvicorn in a daemon thread; returns its port."""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(asgi_app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return port
+
+
+def _use_loopback(api_port: int):
+    """Put back the HTTP loopback the webhook used before run_chat_turn was called in-process."""
+    async def run_chat_turn(text, channel, customer_id=None, session_id=None):
+        async with httpx.AsyncClient(timeout=30.0) as client:
+            resp = await client.post(f"http://127.0.0.1:{api_port}/v1/chat",
+                                     json={"channel": channel, "text": text, "customer_id": customer_id})
+            resp.raise_for_status()
+            return resp.json()
+
+    async def send_message(chat_id, text):
+        async with httpx.AsyncClient(timeout=10.0) as client:
+            resp = await client.post(f"{telegram_bot.TELEGRAM_API_BASE}/sendMessage",
+                                     json={"chat_id": chat_id, "text": text, "parse_mode": "HTML"})
+            return resp.json()
+
+    telegram_bot.run_chat_turn = run_chat_turn
+    telegram_bot._send_message = send_message
+
+
+async def _run(label: str, api_port: int, updates: int, concurrency: int, first_chat_id: int):
+    telegram.messages.clear()
+    started: dict[int, float] = {}
+    limit = asyncio.Semaphore(concurrency)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{api_port}", timeout=60.0,
+                                 limits=httpx.Limits(max_connections=concurrency)) as client:
+        async def update(chat_id: int):
+            async with limit:
+                started[chat_id] = time.monotonic()
+                resp = await client.post("/v1/telegram/webhook", json={
+                    "update_id": chat_id, "message": {"chat": {"id": chat_id}, "text": "linen shirts under 1500"}})
+                resp.raise_for_status()
+
+        t0 = time.monotonic()
+        await asyncio.gather(*(update(first_chat_id + i) for i in range(updates)))
+        while len(telegram.messages) < updates:
+            await asyncio.sleep(0.005)
+        elapsed = time.monotonic() - t0
+
+    replies = {chat_id: t for t, chat_id, _ in telegram.messages}
+    latencies = sorted(replies[c] - started[c] for c in started)
+    n = len(latencies)
+    p = lambda q: latencies[min(n - 1, int(q * n))] * 1000  # noqa: E731
+    print(f"{label:<10} {n} updates  {n / elapsed:8.1f} updates/sec  p50 {p(0.5):7.1f}ms  "
+          f"p95 {p(0.95):7.1f}ms  p99 {p(0.99):7.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--updates", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--llm-ms", type=float, default=0.0, help="simulated planner latency per turn")
+    args = parser.parse_args()
+
+    async def plan(text, session):
+        if args.llm_ms:
+            await asyncio.sleep(args.llm_ms / 1000)
+        return {"reply_text": f"Here are some options for '{text}'", "tool_calls": []}
+
+    os.environ["TELEGRAM_GLOBAL_RATE"] = os.environ["TELEGRAM_GLOBAL_BURST"] = "1000000"
+    logging.disable(logging.INFO)  # per-turn log lines would dominate the timings
+    llm_client.plan = plan
+    session_store.session_store = MemoryStore()
+
+    telegram_port = _serve(telegram.app)
+    telegram_bot.TELEGRAM_API_BASE = f"http://127.0.0.1:{telegram_port}/botBENCH"
+    api_port = _serve(app)
+
+    asyncio.run(_run("inprocess", api_port, args.updates, args.concurrency, first_chat_id=1))
+    _use_loopback(api_port)
+    asyncio.run(_run("loopback", api_port, args.updates, args.concurrency, first_chat_id=args.updates + 1))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,392 @@
+# benchmarks/loadtest.py
+"""
+End-to-end load test: /v1/chat and the Telegram webhook at a configurable
+concurrency, against local stand-ins instead of the real services.
+
+The API runs in-process under uvicorn. The stand-ins:
+  Gemini    app/tests/fake_gemini.py under uvicorn, answering the canned PLANS
+            below after --llm-ms (+ --llm-jitter-ms), failing --llm-error-rate
+  Telegram  app/tests/fake_telegram.py under uvicorn (outbox rate limits lifted)
+  Redis     fakeredis (dev requirement) behind the session store, caches and
+            update dedup; --redis-url uses a real server instead
+  Postgres  DATABASE_URL, a local throwaway database at alembic head. A small
+            catalog (category TAG) is seeded and removed again; without
+            DATABASE_URL the plans call no tools
+
+--record-llm DIR keeps the run's Gemini exchanges as cassettes and
+--replay-llm DIR answers from them instead of the stand-in (see
+app/services/llm_transport.py), e.g. cassettes recorded from live Gemini with
+--gemini-url, or --replay-latency zero to time everything but the model.
+
+Each virtual user sends --turns-per-session turns in one session (the prompt
+grows with the history), then starts a new one; --telegram-share of the users
+talk through the webhook. Stages (ms):
+  http          request -> response, per route
+  reply         webhook POST -> reply at the Telegram stand-in
+  llm / tools   llm_client.plan / the orchestrator, inside the API
+  session_get / session_set   session store round trips
+Errors: non-2xx, tool results with an error, failed plan() calls, replies that never arrived.
+
+--json writes the report. --save-baseline stores it as the baseline and
+--baseline compares against one: exit 1 when throughput drops, a stage's
+p50/p95 rises by more than --tolerance (and --min-delta-ms), or the error rate
+rises by more than 1 point. Without a path both use the baseline of the LLM
+mode (baselines/loadtest-<stand-in|record|replay|replay-zero>.json); a baseline
+recorded with another config is refused, not compared.
+
+Usage:
+    python benchmarks/loadtest.py --concurrency 50 --requests 2000 --llm-ms 300
+    python benchmarks/loadtest.py --baseline
+    python benchmarks/loadtest.py --record-llm /tmp/cassettes
+    python benchmarks/loadtest.py --replay-llm /tmp/cassettes --replay-latency zero
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import socket
+import asyncio
+import logging
+import argparse
+import threading
+from collections import defaultdict
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+import httpx  # noqa: E402
+import uvicorn  # noqa: E402
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines")
+
+
+def default_baseline(config: dict) -> str:
+    return os.path.join(BASELINE_DIR, f"loadtest-{config['llm']}.json")
+
+
+def _llm_mode(args) -> str:
+    if args.record_llm:
+        return "record"
+    if args.replay_llm:
+        return "replay-zero" if args.replay_latency == "zero" else "replay"
+    return "stand-in"
+
+# message -> canned plan; "{tag}" is the seeded catalog's category
+MESSAGES = {
+    "browse": "show me {tag} tees under 1000",
+    "stock": "is the first {tag} tee in stock?",
+    "chat": "hi there, what can you do?",
+}
+PLANS = {
+    "tees under": {"reply_text": "Here are some tees in your budget.",
+                   "tool_calls": [{"tool": "recommend", "args": {"query": "{tag}", "budget": 1000}}]},
+    "in stock": {"reply_text": "Let me check that for you.",
+                 "tool_calls": [{"tool": "recommend", "args": {"query": "{tag}", "budget": 5000}},
+                                {"tool": "check_stock", "args": {"sku": "${tool_results[0].result.items[0].sku}"}}]},
+}
+
+samples: dict[str, list[float]] = defaultdict(list)  # stage -> seconds
+errors: dict[str, int] = defaultdict(int, http=0, tools=0, llm=0, lost_replies=0)
+
+
+def timed(stage: str, func):
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            samples[stage].append(time.perf_counter() - started)
+    return wrapper
+
+
+def _serve(asgi_app) -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(asgi_app, host="127.0.0.1", port=port, log_level="warning",
+                                           timeout_keep_alive=60))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return port
+
+
+# ----- Stand-ins -----
+class _ErrorCounter(logging.Handler):
+    """Counts the errors a logger reports (llm_client logs every failed plan() call before falling back)."""
+
+    def __init__(self, kind: str):
+        super().__init__(logging.ERROR)
+        self.kind = kind
+
+    def emit(self, record):
+        errors[self.kind] += 1
+
+
+def _install_redis(redis_url: str | None):
+    from app.services import session_store
+    if redis_url:
+        os.environ["REDIS_URL"] = redis_url
+        return
+    try:
+        import fakeredis
+    except ImportError:
+        sys.exit("fakeredis is needed for the Redis stand-in (pip install fakeredis), or pass --redis-url")
+    server = fakeredis.FakeServer()
+    store = session_store.SessionStore("redis://fakeredis")
+    store._client = fakeredis.aioredis.FakeRedis(server=server, decode_responses=True)
+    session_store.session_store = store
+    session_store.set_async_client(fakeredis.aioredis.FakeRedis(server=server, decode_responses=True))
+    session_store.set_sync_client(fakeredis.FakeRedis(server=server, decode_responses=True))
+
+
+def _seed(tag: str):
+    from sqlalchemy import text
+    from app.services.db import SessionLocal
+    _cleanup(tag)  # an interrupted run's leftovers
+    db = SessionLocal()
+    try:
+        db.execute(
+            text("INSERT INTO products (sku, name, category, price, stock) VALUES (:s, :n, :c, :p, 1000)"),
+            [{"s": f"LT-{tag}-{i}", "n": f"Loadtest Tee {i}", "c": tag, "p": 299 + 100 * i} for i in range(8)],
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def _cleanup(tag: str):
+    from sqlalchemy import text
+    from app.services.db import SessionLocal
+    db = SessionLocal()
+    try:
+        db.execute(text("DELETE FROM products WHERE category = :c"), {"c": tag})
+        db.commit()
+    finally:
+        db.close()
+
+
+def _instrument():
+    """Stage timers around the chat turn's pieces (the API resolves these module attributes per call)."""
+    from app.services import chat_service, llm_client, session_store
+    llm_client.plan = timed("llm", llm_client.plan)
+    chat_service.execute_plan = timed("tools", chat_service.execute_plan)
+    logging.getLogger("llm_client").addHandler(_ErrorCounter("llm"))
+    store = session_store.session_store
+    if store is not None:
+        store.get = timed("session_get", store.get)
+        store.set = timed("session_set", store.set)
+
+
+# ----- Load -----
+async def _virtual_user(user: int, args, client: httpx.AsyncClient, run: str, deadline: float,
+                        budget: list, telegram_sends: dict, update_ids):
+    rng = random.Random(user)
+    kinds, weights = zip(*args.mix.items())
+    telegram = rng.random() < args.telegram_share
+    chat_id = 10_000 + user
+    session_id, turns = None, 0
+    while budget[0] > 0 and time.monotonic() < deadline:
+        budget[0] -= 1
+        text = MESSAGES[rng.choices(kinds, weights)[0]].format(tag=args.tag)
+        if turns % args.turns_per_session == 0:
+            session_id = f"lt-{run}-{user}-{turns}"
+        turns += 1
+
+        started = time.monotonic()
+        try:
+            if telegram:
+                update = {"update_id": next(update_ids), "message": {"chat": {"id": chat_id}, "text": text}}
+                telegram_sends[chat_id].append(started)
+                resp = await client.post("/v1/telegram/webhook", json=update)
+            else:
+                resp = await client.post("/v1/chat", json={"channel": "web", "text": text, "session_id": session_id})
+        except httpx.HTTPError:
+            errors["http"] += 1
+            continue
+        samples["http_webhook" if telegram else "http_chat"].append(time.monotonic() - started)
+        if resp.status_code >= 300:
+            errors["http"] += 1
+        elif not telegram:
+            results = ((resp.json().get("actions") or {}).get("tool_results")) or []
+            errors["tools"] += sum(1 for r in results if r.get("error") or (r.get("result") or {}).get("status") == "error")
+
+
+async def _drive(args, api_port: int, telegram) -> float:
+    telegram_sends: dict[int, list[float]] = defaultdict(list)
+    update_ids = iter(range(int(time.time() * 1000), 1 << 62))
+    run = uuid.uuid4().hex[:6]  # fresh sessions each run; prompts stay the same (replayable)
+    budget = [args.requests]
+    deadline = time.monotonic() + (args.duration or 1e9)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{api_port}", timeout=60.0, limits=limits) as client:
+        started = time.monotonic()
+        await asyncio.gather(*(_virtual_user(u, args, client, run, deadline, budget, telegram_sends, update_ids)
+                               for u in range(args.concurrency)))
+        elapsed = time.monotonic() - started
+
+    # replies: the n-th update of a chat gets the n-th message (the outbox keeps a chat's order)
+    expected = sum(len(v) for v in telegram_sends.values())
+    wait_until = time.monotonic() + 10
+    while len(telegram.messages) < expected and time.monotonic() < wait_until:
+        await asyncio.sleep(0.05)
+    arrived = defaultdict(list)
+    for t, chat_id, _ in telegram.messages:
+        arrived[chat_id].append(t)
+    for chat_id, sends in telegram_sends.items():
+        samples["reply"].extend(r - s for s, r in zip(sends, arrived[chat_id]))
+        errors["lost_replies"] += max(0, len(sends) - len(arrived[chat_id]))
+    return elapsed
+
+
+# ----- Report -----
+def _percentile(values: list[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] * 1000 if values else 0.0
+
+
+def report(args, elapsed: float) -> dict:
+    requests = len(samples["http_chat"]) + len(samples["http_webhook"]) + errors["http"]
+    failed = sum(errors.values())
+    return {
+        "config": {k: getattr(args, k) for k in ("concurrency", "requests", "duration", "llm_ms", "llm_jitter_ms",
+                                                  "llm_error_rate", "telegram_share", "turns_per_session")}
+                  | {"mix": args.mix, "database": bool(os.getenv("DATABASE_URL")),
+                     "llm": _llm_mode(args)},
+        "requests": requests,
+        "seconds": round(elapsed, 2),
+        "throughput_rps": round(requests / elapsed, 1) if elapsed else 0.0,
+        "error_rate": round(failed / requests, 4) if requests else 0.0,
+        "errors": dict(errors),
+        "stages": {
+            stage: {"count": len(v), "p50_ms": round(_percentile(v, 0.5), 1), "p95_ms": round(_percentile(v, 0.95), 1),
+                    "p99_ms": round(_percentile(v, 0.99), 1)}
+            for stage, v in sorted(samples.items())
+        },
+    }
+
+
+def compare(result: dict, baseline: dict, tolerance: float, min_delta_ms: float) -> list[str]:
+    regressions = []
+    if result["throughput_rps"] < baseline["throughput_rps"] * (1 - tolerance):
+        regressions.append(f"throughput {result['throughput_rps']} rps < baseline {baseline['throughput_rps']}")
+    if result["error_rate"] > baseline["error_rate"] + 0.01:
+        regressions.append(f"error rate {result['error_rate']} > baseline {baseline['error_rate']}")
+    for stage, base in baseline.get("stages", {}).items():
+        current = result["stages"].get(stage)
+        if current is None:
+            continue
+        for key in ("p50_ms", "p95_ms"):
+            if current[key] > base[key] * (1 + tolerance) and current[key] - base[key] > min_delta_ms:
+                regressions.append(f"{stage} {key} {current[key]} > baseline {base[key]}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, default=50, help="virtual users")
+    parser.add_argument("--requests", type=int, default=2000, help="total requests (whichever of this and --duration ends first)")
+    parser.add_argument("--duration", type=float, default=0, help="seconds (0: no limit)")
+    parser.add_argument("--telegram-share", type=float, default=0.5, help="share of users on the webhook")
+    parser.add_argument("--turns-per-session", type=int, default=10)
+    parser.add_argument("--mix", default="browse=3,stock=2,chat=1", help="message kinds and weights")
+    parser.add_argument("--llm-ms", type=float, default=300.0)
+    parser.add_argument("--llm-jitter-ms", type=float, default=100.0)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--record-llm", metavar="DIR", help="record the Gemini exchanges to this cassette directory")
+    parser.add_argument("--replay-llm", metavar="DIR", help="answer plan() from these cassettes instead of the stand-in")
+    parser.add_argument("--replay-latency", choices=("original", "zero"), default="original")
+    parser.add_argument("--gemini-url", help="record from this Gemini endpoint instead of the stand-in")
+    parser.add_argument("--tag", default="lt-load", help="seeded catalog category (keep it fixed to replay cassettes)")
+    parser.add_argument("--redis-url", help="use this Redis instead of the in-process stand-in")
+    parser.add_argument("--json", help="write the report to this file")
+    parser.add_argument("--save-baseline", nargs="?", const="", help="store the report as the baseline (default: per LLM mode)")
+    parser.add_argument("--baseline", nargs="?", const="", help="compare against a baseline (exit 1 on regression)")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative slowdown")
+    parser.add_argument("--min-delta-ms", type=float, default=5.0, help="ignore latency changes smaller than this")
+    args = parser.parse_args()
+    args.mix = {k: float(w) for k, w in (kv.split("=") for kv in args.mix.split(","))}
+    for kind in args.mix:
+        if kind not in MESSAGES:
+            parser.error(f"unknown message kind {kind!r} (one of {sorted(MESSAGES)})")
+
+    if args.record_llm and args.replay_llm:
+        parser.error("--record-llm and --replay-llm are exclusive")
+    if args.record_llm or args.replay_llm:
+        # read when llm_client opens its client, on the first turn
+        os.environ["LLM_TRANSPORT"] = "record" if args.record_llm else "replay"
+        os.environ["LLM_CASSETTE_DIR"] = args.record_llm or args.replay_llm
+        os.environ["LLM_REPLAY_LATENCY"] = args.replay_latency
+        os.environ["LLM_REPLAY_MATCH"] = "current"  # tool results (product ids) in the history differ per run
+    os.environ.setdefault("WARM_UP", "0")
+    if not args.gemini_url:
+        os.environ.setdefault("GEMINI_API_KEY", "stand-in")  # the local stand-in and replay ignore it
+    for var in ("TELEGRAM_GLOBAL_RATE", "TELEGRAM_GLOBAL_BURST", "TELEGRAM_CHAT_RATE", "TELEGRAM_CHAT_BURST"):
+        os.environ[var] = "1000000"
+    logging.disable(logging.INFO)
+
+    from app.main import app
+    from app.services import llm_client, telegram_bot
+    from app.tests.fake_gemini import FakeGemini
+    from app.tests.fake_telegram import FakeTelegram
+
+    tag = args.tag
+    database = bool(os.getenv("DATABASE_URL"))
+    if not database:
+        print("ℹ️ DATABASE_URL not set: plans run without tools")
+    plans = {k: json.loads(json.dumps(p).replace("{tag}", tag)) for k, p in PLANS.items()} if database else {}
+    gemini = FakeGemini(plans=plans, latency_ms=args.llm_ms, jitter_ms=args.llm_jitter_ms,
+                        error_rate=args.llm_error_rate, seed=1)
+    telegram = FakeTelegram()
+
+    _install_redis(args.redis_url)
+    _instrument()
+    if not args.replay_llm:
+        llm_client.GEMINI_API_URL = args.gemini_url or f"http://127.0.0.1:{_serve(gemini.app)}"
+    telegram_bot.TELEGRAM_API_BASE = f"http://127.0.0.1:{_serve(telegram.app)}/botLOADTEST"
+    if database:
+        _seed(tag)
+    try:
+        api_port = _serve(app)
+        elapsed = asyncio.run(_drive(args, api_port, telegram))
+    finally:
+        if database:
+            _cleanup(tag)
+
+    result = report(args, elapsed)
+    print(f"{result['requests']} requests in {result['seconds']}s  {result['throughput_rps']} req/s  "
+          f"error rate {result['error_rate']:.2%}  {result['errors']}")
+    print(f"{'stage':<14} {'count':>7} {'p50':>9} {'p95':>9} {'p99':>9}")
+    for stage, s in result["stages"].items():
+        print(f"{stage:<14} {s['count']:>7} {s['p50_ms']:>7.1f}ms {s['p95_ms']:>7.1f}ms {s['p99_ms']:>7.1f}ms")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+    if args.save_baseline is not None:
+        path = args.save_baseline or default_baseline(result["config"])
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"baseline saved to {path}")
+    if args.baseline is not None:
+        path = args.baseline or default_baseline(result["config"])
+        with open(path) as f:
+            baseline = json.load(f)
+        if baseline.get("config") != result["config"]:
+            changed = sorted(k for k in baseline.get("config", {}).keys() | result["config"].keys()
+                             if baseline.get("config", {}).get(k) != result["config"].get(k))
+            print(f"❌ {path} was recorded with a different config ({', '.join(changed)}); "
+                  f"record one for this config with --save-baseline <path>")
+            sys.exit(2)
+        regressions = compare(result, baseline, args.tolerance, args.min_delta_ms)
+        for r in regressions:
+            print(f"❌ {r}")
+        if regressions:
+            sys.exit(1)
+        print("✅ no regressions against the baseline")
+
+
+if __name__ == "__main__":
+    main()